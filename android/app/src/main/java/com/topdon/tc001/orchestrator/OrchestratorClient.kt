@@ -176,7 +176,7 @@ class OrchestratorClient(
         return mapOf(
             "id" to messageId,
             "type" to type,
-            "ts" to System.nanoTime(),
+            "ts" to System.currentTimeMillis() * 1000000L, // Nanoseconds since Unix epoch, as the protocol expects
             "sessionId" to currentSessionId,
             "deviceId" to deviceId,
             "payload" to payload
@@ -485,6 +485,30 @@ class OrchestratorClient(
         sendMessage(message, expectAck = false) // High-frequency data, no ACK needed
     }
 
+    /**
+     * Send a sync mark for an event seen on this device, such as a stimulus.
+     * eventMonoNs is when it happened on the System.nanoTime() clock; the
+     * same instant on the wall clock goes with it so the orchestrator can
+     * place the mark on its own clock.
+     */
+    fun sendSyncMark(markId: String, description: String? = null, eventMonoNs: Long = System.nanoTime()) {
+        if (currentSessionId == null) {
+            Log.w(TAG, "Cannot send sync mark - no active session")
+            return
+        }
+        
+        val nowUtcNs = System.currentTimeMillis() * 1000000L
+        val payload = mutableMapOf<String, Any>(
+            "markId" to markId,
+            "tMonoNs" to eventMonoNs,
+            "tUtcNs" to nowUtcNs - (System.nanoTime() - eventMonoNs)
+        )
+        description?.let { payload["description"] = it }
+        
+        val message = createMessage("SYNC_MARK", payload)
+        sendMessage(message)
+    }
+
     /**
      * Upload a file to the orchestrator using chunked transfer
      */
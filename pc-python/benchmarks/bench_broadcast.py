@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark fanning a START command out to many simulated devices.
+
+Each simulated device answers with an ACK after a random network delay.
+Compares WebSocketServer.broadcast, which sends to all devices at once and
+collects ACKs by message id, with sending to one device after another and
+waiting for each ACK in turn.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from loguru import logger
+
+from bucika_gsr_pc.protocol import (
+    MessageEnvelope, MessageType, HelloPayload, StartPayload, AckPayload
+)
+from bucika_gsr_pc.session_manager import SessionManager
+from bucika_gsr_pc.time_sync_service import TimeSyncService
+from bucika_gsr_pc.websocket_server import WebSocketServer
+
+
+class SimulatedDevice:
+    """Stands in for a phone connection, ACKing commands after a delay"""
+
+    def __init__(self, server: WebSocketServer, device_id: str, rng: random.Random,
+                 min_delay: float, max_delay: float):
+        self.server = server
+        self.device_id = device_id
+        self.rng = rng
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.remote_address = (device_id, 0)
+
+    async def send(self, message: str):
+        envelope = json.loads(message)
+        if envelope["type"] == MessageType.START.value:
+            asyncio.ensure_future(self._ack(envelope["id"]))
+
+    async def close(self):
+        pass
+
+    async def _ack(self, message_id: str):
+        await asyncio.sleep(self.rng.uniform(self.min_delay, self.max_delay))
+        ack = MessageEnvelope.create(
+            msg_id=f"ack-{message_id}", msg_type=MessageType.ACK, device_id=self.device_id,
+            payload=AckPayload(messageId=message_id, status="SESSION_STARTED")
+        )
+        await self.server.handle_message(self, ack.model_dump_json())
+
+    async def register(self):
+        hello = MessageEnvelope.create(
+            msg_id=f"hello-{self.device_id}", msg_type=MessageType.HELLO, device_id=self.device_id,
+            payload=HelloPayload(deviceName=self.device_id, capabilities=["GSR"],
+                                 batteryLevel=100, version="1.0.0")
+        )
+        await self.server.handle_message(self, hello.model_dump_json())
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server = WebSocketServer(port=0, session_manager=SessionManager(Path(temp_dir)),
+                                 time_sync_service=TimeSyncService())
+        rng = random.Random(1)
+        devices = [SimulatedDevice(server, f"device-{i:03d}", rng, args.min_delay_ms / 1000,
+                                   args.max_delay_ms / 1000)
+                   for i in range(args.devices)]
+        for device in devices:
+            await device.register()
+
+        payload = StartPayload(sessionName="Benchmark")
+        concurrent = []
+        sequential = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            result = await server.broadcast(MessageType.START, payload, timeout=5.0)
+            concurrent.append(time.perf_counter() - start)
+            assert result.all_acknowledged, result.timed_out
+
+            start = time.perf_counter()
+            for device in devices:
+                await server.broadcast(MessageType.START, payload, [device.device_id], timeout=5.0)
+            sequential.append(time.perf_counter() - start)
+
+        await server.stop()
+        return concurrent, sequential
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=50, help='Simulated devices')
+    parser.add_argument('--rounds', type=int, default=3, help='Broadcasts per measurement')
+    parser.add_argument('--min-delay-ms', type=float, default=5.0, help='Minimum ACK delay')
+    parser.add_argument('--max-delay-ms', type=float, default=20.0, help='Maximum ACK delay')
+    args = parser.parse_args()
+
+    logger.remove()
+    concurrent, sequential = asyncio.run(run(args))
+
+    print(f"START to all-ACKed, {args.devices} devices, "
+          f"ACK delay {args.min_delay_ms:.0f}-{args.max_delay_ms:.0f} ms")
+    print(f"{'path':<12} {'best ms':>10} {'mean ms':>10}")
+    for name, times in (("broadcast", concurrent), ("sequential", sequential)):
+        print(f"{name:<12} {min(times) * 1000:>10.1f} {sum(times) / len(times) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
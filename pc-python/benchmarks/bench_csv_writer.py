@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark GSR CSV writing: per-row aiofiles writes vs the background writer.
+
+Writes the same batches for several devices with both paths and reports rows
+per second, measured until every file has been flushed and closed.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import aiofiles
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bucika_gsr_pc.gsr_writer import GSRCsvWriter, GSR_CSV_HEADER
+from bucika_gsr_pc.protocol import GSRSample, GSRSampleBatch
+
+
+def make_batch(first_seq: int, count: int) -> GSRSampleBatch:
+    """Generate a 128 Hz batch of samples"""
+    start_ns = time.time_ns()
+    return GSRSampleBatch.from_samples([
+        GSRSample(
+            t_mono_ns=i * 7_812_500,
+            t_utc_ns=start_ns + i * 7_812_500,
+            seq=i,
+            gsr_raw_uS=2.5 + (i % 50) * 0.013,
+            gsr_filt_uS=2.48 + (i % 50) * 0.012,
+            temp_C=32.1 + (i % 10) * 0.01,
+            flag_spike=(i % 97 == 0)
+        )
+        for i in range(first_seq, first_seq + count)
+    ])
+
+
+async def write_per_row(directory: Path, devices: int, batches):
+    """Previous path: format each sample and await one write per row"""
+    handles = []
+    for device in range(devices):
+        handle = await aiofiles.open(directory / f"legacy_{device}.csv", 'w', newline='')
+        await handle.write(','.join(GSR_CSV_HEADER) + '\n')
+        handles.append(handle)
+
+    for batch in batches:
+        for handle in handles:
+            for sample in batch.to_samples():
+                dt = datetime.fromtimestamp(sample.t_utc_ns / 1_000_000_000)
+                dt_str = dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                row = [sample.t_utc_ns, dt_str, sample.seq, sample.gsr_raw_uS, sample.gsr_filt_uS,
+                       sample.temp_C, sample.flag_spike, sample.flag_sat, sample.flag_dropout]
+                await handle.write(','.join(str(field) for field in row) + '\n')
+            await handle.flush()
+
+    for handle in handles:
+        await handle.close()
+
+
+async def write_batched(directory: Path, devices: int, batches):
+    """Background writer: one queued batch per device, flushed on size/time"""
+    writer = GSRCsvWriter()
+    for device in range(devices):
+        await writer.wait(writer.open(device, directory / f"writer_{device}.csv"))
+
+    for batch in batches:
+        for device in range(devices):
+            writer.write(device, batch)
+
+    for device in range(devices):
+        await writer.wait(writer.close(device))
+    writer.shutdown()
+
+
+def rows_per_second(path, devices: int, batches) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        asyncio.run(path(Path(directory), devices, batches))
+        elapsed = time.perf_counter() - start
+    return devices * sum(len(batch) for batch in batches) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=4, help='Devices writing concurrently')
+    parser.add_argument('--batches', type=int, default=100, help='Batches per device')
+    parser.add_argument('--batch-size', type=int, default=128, help='Samples per batch')
+    args = parser.parse_args()
+
+    batches = [make_batch(i * args.batch_size, args.batch_size) for i in range(args.batches)]
+
+    legacy = rows_per_second(write_per_row, args.devices, batches)
+    batched = rows_per_second(write_batched, args.devices, batches)
+
+    print(f"GSR CSV writing, {args.devices} devices x {args.batches} batches of {args.batch_size} samples")
+    print(f"{'path':<30} {'rows/s':>12}")
+    print(f"{'per-row aiofiles':<30} {legacy:>12,.0f}")
+    print(f"{'background writer':<30} {batched:>12,.0f}")
+    print(f"speedup: {batched / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
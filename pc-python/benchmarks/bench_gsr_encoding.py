@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark GSR_SAMPLE wire encodings: JSON envelope vs binary columnar batch.
+
+Reports bytes per sample and decode time per sample for both paths.
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bucika_gsr_pc.protocol import (
+    MessageEnvelope, MessageType, GSRSample, GSRSamplePayload, GSRSampleBatch,
+    parse_message_payload
+)
+
+
+def make_samples(count: int):
+    """Generate a realistic 128 Hz batch of samples"""
+    start_ns = time.time_ns()
+    return [
+        GSRSample(
+            t_mono_ns=i * 7_812_500,
+            t_utc_ns=start_ns + i * 7_812_500,
+            seq=i,
+            gsr_raw_uS=2.5 + (i % 50) * 0.013,
+            gsr_filt_uS=2.48 + (i % 50) * 0.012,
+            temp_C=32.1 + (i % 10) * 0.01,
+            flag_spike=(i % 97 == 0)
+        )
+        for i in range(count)
+    ]
+
+
+def decode_json(message: str):
+    """Current server path: json.loads -> envelope -> payload"""
+    envelope = MessageEnvelope(**json.loads(message))
+    return parse_message_payload(envelope).samples
+
+
+def time_per_call(func, arg, repeat: int) -> float:
+    """Best-of-three average seconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(arg)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=128, help='Samples per message')
+    parser.add_argument('--repeat', type=int, default=200, help='Decodes per measurement')
+    args = parser.parse_args()
+
+    samples = make_samples(args.batch_size)
+
+    json_message = MessageEnvelope.create(
+        msg_id=str(uuid.uuid4()),
+        msg_type=MessageType.GSR_SAMPLE,
+        device_id="bench-device",
+        payload=GSRSamplePayload(samples=samples),
+        session_id="bench-session"
+    ).model_dump_json()
+    binary_message = GSRSampleBatch.from_samples(samples).encode()
+
+    results = [
+        ("json", len(json_message.encode()), time_per_call(decode_json, json_message, args.repeat)),
+        ("binary (columns)", len(binary_message),
+         time_per_call(GSRSampleBatch.decode, binary_message, args.repeat)),
+        ("binary (+ GSRSample objects)", len(binary_message),
+         time_per_call(lambda m: GSRSampleBatch.decode(m).to_samples(), binary_message, args.repeat)),
+    ]
+
+    n = args.batch_size
+    print(f"GSR_SAMPLE encoding, {n} samples per message")
+    print(f"{'path':<30} {'bytes/sample':>14} {'decode us/sample':>18}")
+    for name, size, seconds in results:
+        print(f"{name:<30} {size / n:>14.1f} {seconds / n * 1e6:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of each session journal fsync policy.
+
+Stores the same batches for several devices through SessionManager without a
+journal and with each fsync policy, and reports batches and samples per
+second, measured until every session has been stopped and its files closed.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bucika_gsr_pc.protocol import GSRSampleBatch
+from bucika_gsr_pc.session_manager import SessionManager
+from bucika_gsr_pc.session_journal import SessionJournal, FsyncPolicy
+
+
+def make_batch(first_seq: int, count: int) -> GSRSampleBatch:
+    """Generate a 128 Hz batch of samples"""
+    seq = np.arange(first_seq, first_seq + count, dtype=np.int64)
+    return GSRSampleBatch(
+        t_mono_ns=seq * 7_812_500,
+        t_utc_ns=time.time_ns() + seq * 7_812_500,
+        seq=seq,
+        gsr_raw_uS=2.5 + (seq % 50) * 0.013,
+        gsr_filt_uS=2.48 + (seq % 50) * 0.012,
+        temp_C=32.1 + (seq % 10) * 0.01,
+        flags=(seq % 97 == 0).astype(np.uint8)
+    )
+
+
+async def store_batches(directory: Path, policy, devices: int, batches, fsync_interval: float):
+    journal = None
+    if policy is not None:
+        journal = SessionJournal(directory / "session_journal.wal", fsync_policy=policy,
+                                 fsync_interval=fsync_interval)
+    manager = SessionManager(base_path=directory, journal=journal)
+    for device in range(devices):
+        await manager.start_session(f"Bench {device}", f"device-{device}")
+
+    for batch in batches:
+        for device in range(devices):
+            await manager.store_gsr_batch(f"device-{device}", batch)
+
+    for device in range(devices):
+        await manager.stop_session(f"device-{device}")
+    await manager.close()
+    return journal
+
+
+def measure(policy, devices: int, batches, fsync_interval: float):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        journal = asyncio.run(store_batches(Path(directory), policy, devices, batches, fsync_interval))
+        elapsed = time.perf_counter() - start
+    stored = devices * len(batches)
+    fsyncs = journal.fsyncs if journal is not None else 0
+    return stored / elapsed, stored * len(batches[0]) / elapsed, fsyncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=4, help='Devices recording concurrently')
+    parser.add_argument('--batches', type=int, default=500, help='Batches per device')
+    parser.add_argument('--batch-size', type=int, default=128, help='Samples per batch')
+    parser.add_argument('--fsync-interval', type=float, default=1.0, help='Seconds between INTERVAL fsyncs')
+    args = parser.parse_args()
+
+    batches = [make_batch(i * args.batch_size, args.batch_size) for i in range(args.batches)]
+
+    print(f"Session journal, {args.devices} devices x {args.batches} batches of {args.batch_size} samples")
+    print(f"{'durability':<20} {'batches/s':>12} {'samples/s':>14} {'fsyncs':>8}")
+    for name, policy in [("no journal", None)] + [(policy.value, policy) for policy in FsyncPolicy]:
+        batch_rate, sample_rate, fsyncs = measure(policy, args.devices, batches, args.fsync_interval)
+        print(f"{name:<20} {batch_rate:>12,.0f} {sample_rate:>14,.0f} {fsyncs:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark message decoding per message type.
+
+Compares the legacy path (json.loads -> MessageEnvelope -> parse_message_payload)
+with single-pass decode_message, which validates JSON bytes straight into a
+typed envelope and keeps GSR samples as plain records.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bucika_gsr_pc.protocol import (
+    MessageEnvelope, MessageType, EmptyPayload, HelloPayload, RegisterPayload,
+    StartPayload, SyncMarkPayload, AckPayload, ErrorPayload, GSRSample,
+    GSRSamplePayload, UploadBeginPayload, UploadChunkPayload, UploadEndPayload,
+    parse_message_payload, decode_message
+)
+
+
+def sample_payloads(batch_size: int):
+    """One representative payload per message type"""
+    samples = [
+        GSRSample(t_mono_ns=i * 7_812_500, t_utc_ns=1_700_000_000_000_000_000 + i * 7_812_500,
+                  seq=i, gsr_raw_uS=2.5, gsr_filt_uS=2.48, temp_C=32.1)
+        for i in range(batch_size)
+    ]
+    return {
+        MessageType.HELLO: HelloPayload(deviceName="Pixel", capabilities=["GSR", "THERMAL"],
+                                        batteryLevel=80, version="1.0.0"),
+        MessageType.REGISTER: RegisterPayload(accepted=True),
+        MessageType.PING: EmptyPayload(),
+        MessageType.PONG: EmptyPayload(),
+        MessageType.START: StartPayload(sessionName="Study", participantId="P001",
+                                        metadata={"condition": "baseline"}),
+        MessageType.STOP: EmptyPayload(),
+        MessageType.SYNC_MARK: SyncMarkPayload(markId="STIM_1", description="Stimulus onset"),
+        MessageType.ACK: AckPayload(messageId="abc"),
+        MessageType.ERROR: ErrorPayload(code="E", message="failure"),
+        MessageType.GSR_SAMPLE: GSRSamplePayload(samples=samples),
+        MessageType.UPLOAD_BEGIN: UploadBeginPayload(filename="video.mp4", fileSize=1 << 20,
+                                                     md5Hash="0" * 32),
+        MessageType.UPLOAD_CHUNK: UploadChunkPayload(filename="video.mp4", chunkIndex=3,
+                                                     data="A" * 10924),
+        MessageType.UPLOAD_END: UploadEndPayload(filename="video.mp4", totalChunks=128,
+                                                 success=True),
+    }
+
+
+def decode_legacy(message: bytes):
+    envelope = MessageEnvelope(**json.loads(message))
+    return parse_message_payload(envelope)
+
+
+def decode_single_pass(message: bytes):
+    envelope = decode_message(message)
+    if envelope.type == MessageType.GSR_SAMPLE:
+        return envelope.payload.to_batch()
+    return envelope.payload
+
+
+def time_per_call(func, arg, repeat: int) -> float:
+    """Best-of-three average seconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(arg)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=128, help='Samples per GSR_SAMPLE message')
+    parser.add_argument('--repeat', type=int, default=2000, help='Decodes per measurement')
+    args = parser.parse_args()
+
+    print(f"{'type':<14} {'legacy us':>10} {'single-pass us':>15} {'speedup':>8}")
+    for msg_type, payload in sample_payloads(args.batch_size).items():
+        message = MessageEnvelope.create(
+            msg_id="bench", msg_type=msg_type, device_id="bench-device", payload=payload
+        ).model_dump_json().encode()
+        repeat = max(1, args.repeat // 20) if msg_type == MessageType.GSR_SAMPLE else args.repeat
+
+        legacy = time_per_call(decode_legacy, message, repeat)
+        single_pass = time_per_call(decode_single_pass, message, repeat)
+        print(f"{msg_type.value:<14} {legacy * 1e6:>10.2f} {single_pass * 1e6:>15.2f} "
+              f"{legacy / single_pass:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading a recorded session: CSV parsing vs the binary session file.
+
+Writes one session of 128 Hz samples in both formats and reports the time to
+map the binary records, to build a DataFrame from them, and to read the CSV
+with pandas as the analysis tools did.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bucika_gsr_pc.protocol import GSRSampleBatch
+from bucika_gsr_pc.session_file import GSRSessionFile, GSRSessionFileWriter, session_file_to_csv
+
+
+def write_session(path: Path, samples: int, batch_size: int = 128):
+    """Write a binary session file of synthetic 128 Hz samples"""
+    start_ns = time.time_ns()
+    writer = GSRSessionFileWriter(path)
+    for first in range(0, samples, batch_size):
+        seq = np.arange(first, min(first + batch_size, samples), dtype=np.int64)
+        writer.append(GSRSampleBatch(
+            t_mono_ns=seq * 7_812_500,
+            t_utc_ns=start_ns + seq * 7_812_500,
+            seq=seq,
+            gsr_raw_uS=2.5 + np.sin(seq / 500.0),
+            gsr_filt_uS=2.48 + np.sin(seq / 500.0),
+            temp_C=32.1 + (seq % 10) * 0.01,
+            flags=(seq % 97 == 0).astype(np.uint8)
+        ))
+    writer.close()
+
+
+def best_time(func, repeat: int = 3) -> float:
+    """Best-of-N seconds per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--minutes', type=float, default=60, help='Session length at 128 Hz')
+    args = parser.parse_args()
+
+    samples = int(args.minutes * 60 * 128)
+    with tempfile.TemporaryDirectory() as directory:
+        binary_path = Path(directory) / "gsr_data.gsrb"
+        write_session(binary_path, samples)
+        csv_path = session_file_to_csv(binary_path)
+
+        results = [
+            ("binary memmap", best_time(lambda: GSRSessionFile(binary_path).column("gsr_raw_uS").sum())),
+            ("binary -> DataFrame", best_time(lambda: GSRSessionFile(binary_path).to_dataframe())),
+            ("CSV -> DataFrame (pandas)", best_time(lambda: pd.read_csv(csv_path))),
+        ]
+
+        print(f"Session load, {args.minutes:g} minutes at 128 Hz ({samples:,} samples)")
+        print(f"  binary file {binary_path.stat().st_size / 1e6:.1f} MB, CSV file {csv_path.stat().st_size / 1e6:.1f} MB")
+        print(f"{'path':<30} {'ms':>10}")
+        for name, seconds in results:
+            print(f"{name:<30} {seconds * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
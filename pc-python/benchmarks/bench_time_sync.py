@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark time sync offset error with and without WebSocket ingest load.
+
+A client process on the same machine, and so on the same clock, runs
+four-timestamp exchanges against the server; every offset it measures
+away from zero is error. The server answers from the asyncio loop as it
+used to, or from TimeSyncService's responder thread with user-space or
+kernel receive timestamps. Under load the loop decodes GSR_SAMPLE
+messages in bursts between yields, as ingest does with several devices
+streaming at once.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import statistics
+import struct
+import sys
+import time
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from bucika_gsr_pc.protocol import GSRSample, GSRSamplePayload, MessageEnvelope, MessageType, decode_message
+from bucika_gsr_pc.time_sync_service import TimeSyncService
+
+
+class LoopResponder(asyncio.DatagramProtocol):
+    """Time sync answered on the event loop, timestamped when the loop gets to it"""
+
+    def __init__(self, service: TimeSyncService):
+        self.service = service
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.service.handle_request(data, addr, time.time_ns(), self.transport.sendto)
+
+
+def run_client(port: int, exchanges: int, interval: float, results):
+    """Client process: exchange timestamps and send back (offset, round trip) pairs"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    measured = []
+    for _ in range(exchanges):
+        t1 = time.time_ns()
+        sock.sendto(struct.pack('>Q', t1), ('127.0.0.1', port))
+        try:
+            reply = sock.recv(64)
+        except socket.timeout:
+            continue
+        t4 = time.time_ns()
+        _, t2, t3 = struct.unpack('>QQQ', reply)
+        measured.append((((t1 - t2) + (t4 - t3)) / 2, (t4 - t1) - (t3 - t2)))
+        time.sleep(interval)
+    sock.close()
+    results.send(measured)
+
+
+def gsr_message(batch_size: int) -> bytes:
+    samples = [
+        GSRSample(t_mono_ns=i * 7_812_500, t_utc_ns=1_700_000_000_000_000_000 + i * 7_812_500,
+                  seq=i, gsr_raw_uS=2.5, gsr_filt_uS=2.48, temp_C=32.1)
+        for i in range(batch_size)
+    ]
+    return MessageEnvelope.create(
+        msg_id="bench", msg_type=MessageType.GSR_SAMPLE, device_id="bench-device",
+        payload=GSRSamplePayload(samples=samples)
+    ).model_dump_json().encode()
+
+
+async def ingest_load(message: bytes, burst: int, stop: asyncio.Event):
+    """Decode sample messages in bursts, yielding to the loop between bursts"""
+    while not stop.is_set():
+        for _ in range(burst):
+            decode_message(message).payload.to_batch()
+        await asyncio.sleep(0)
+
+
+async def measure(mode: str, loaded: bool, args, message: bytes):
+    service = TimeSyncService(port=0, host='127.0.0.1', kernel_timestamps=(mode == "thread, kernel"))
+    transport = None
+    if mode == "event loop":
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: LoopResponder(service),
+                                                           local_addr=('127.0.0.1', 0))
+        port = transport.get_extra_info('sockname')[1]
+    else:
+        await service.start()
+        port = service.port
+
+    stop = asyncio.Event()
+    load = asyncio.create_task(ingest_load(message, args.burst, stop)) if loaded else None
+
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    client = multiprocessing.Process(target=run_client, args=(port, args.exchanges, args.interval, sender))
+    client.start()
+    measured = await asyncio.get_running_loop().run_in_executor(None, receiver.recv)
+    client.join()
+
+    stop.set()
+    if load is not None:
+        await load
+    if transport is not None:
+        transport.close()
+    else:
+        await service.stop()
+    return measured
+
+
+def summarize(measured):
+    errors = sorted(abs(offset) / 1000 for offset, _ in measured)
+    rtts = [rtt / 1000 for _, rtt in measured]
+    p95 = errors[int(0.95 * (len(errors) - 1))]
+    return statistics.median(errors), p95, errors[-1], statistics.median(rtts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--exchanges', type=int, default=500, help='Exchanges per measurement')
+    parser.add_argument('--interval', type=float, default=0.002, help='Seconds between exchanges')
+    parser.add_argument('--burst', type=int, default=20, help='Messages decoded between loop yields under load')
+    parser.add_argument('--batch-size', type=int, default=128, help='Samples per GSR_SAMPLE message')
+    args = parser.parse_args()
+
+    message = gsr_message(args.batch_size)
+    start = time.perf_counter()
+    for _ in range(args.burst):
+        decode_message(message).payload.to_batch()
+    burst_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Time sync offset error, {args.exchanges} exchanges; "
+          f"under load the loop is busy {burst_ms:.1f} ms per burst")
+    print(f"{'responder':<16} {'load':<6} {'median us':>10} {'p95 us':>10} {'max us':>10} {'rtt us':>10}")
+    for mode in ("event loop", "thread", "thread, kernel"):
+        for loaded in (False, True):
+            measured = asyncio.run(measure(mode, loaded, args, message))
+            median, p95, worst, rtt = summarize(measured)
+            print(f"{mode:<16} {'heavy' if loaded else 'idle':<6} "
+                  f"{median:>10.1f} {p95:>10.1f} {worst:>10.1f} {rtt:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
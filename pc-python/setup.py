@@ -25,8 +25,11 @@ setup(
         "websockets>=12.0",
         "aiofiles>=23.2.1",
         "zeroconf>=0.131.0", 
+        "ifaddr>=0.2.0",
         "pydantic>=2.5.0",
+        "typing_extensions>=4.6.1",
         "loguru>=0.7.2",
+        "numpy>=1.24.0",
     ],
     extras_require={
         "dev": [
@@ -21,6 +21,10 @@ from .websocket_server import WebSocketServer
 from .discovery_service import DiscoveryService
 from .time_sync_service import TimeSyncService
 from .session_manager import SessionManager
+from .session_journal import SessionJournal, FsyncPolicy
+from .session_catalog import SessionCatalog
+from .session_segments import SegmentPolicy
+from .session_group import SessionGroup, MergedTimeline
 from .performance_monitor import PerformanceMonitor
 from .protocol import *
 from .data_analyzer import GSRDataAnalyzer, BatchAnalyzer, AnalysisResults
@@ -51,7 +55,9 @@ class BucikaOrchestrator:
     
     def __init__(self, headless: bool = False, 
                  data_directory: Path = None,
-                 validation_level: str = "standard"):
+                 validation_level: str = "standard",
+                 fsync_policy: FsyncPolicy = FsyncPolicy.INTERVAL,
+                 segment_policy: Optional[SegmentPolicy] = None):
         """
         Initialize the Bucika GSR PC Orchestrator
         
@@ -59,25 +65,33 @@ class BucikaOrchestrator:
             headless: Run without GUI (default: False)
             data_directory: Directory for session data (default: ./sessions)
             validation_level: Data validation strictness ("basic", "standard", "strict", "research_grade")
+            fsync_policy: Durability of the session journal ("NEVER", "INTERVAL", "ALWAYS")
+            segment_policy: When recordings roll over to a new segment file (default: 64 MiB or 1 hour)
         """
         self.headless = headless or not GUI_AVAILABLE
         self.data_directory = data_directory or Path("sessions")
         self.data_directory.mkdir(exist_ok=True)
         
         # Core services
-        self.session_manager = SessionManager(self.data_directory)
+        self.session_journal = SessionJournal(self.data_directory / "session_journal.wal",
+                                              fsync_policy=fsync_policy)
+        self.session_catalog = SessionCatalog.open(self.data_directory)
+        self.session_manager = SessionManager(self.data_directory, journal=self.session_journal,
+                                              catalog=self.session_catalog,
+                                              segment_policy=segment_policy or SegmentPolicy())
         self.time_sync_service = TimeSyncService()
+        self.performance_monitor = PerformanceMonitor()
         self.websocket_server = WebSocketServer(
             port=8080,
             session_manager=self.session_manager,
-            time_sync_service=self.time_sync_service
+            time_sync_service=self.time_sync_service,
+            performance_monitor=self.performance_monitor
         )
-        self.discovery_service = DiscoveryService()
-        self.performance_monitor = PerformanceMonitor()
+        self.discovery_service = DiscoveryService(load_source=self.websocket_server.get_load)
         
         # Advanced services
         self.error_recovery = ErrorRecoveryManager()
-        self.data_analyzer = GSRDataAnalyzer(self.data_directory)
+        self.data_analyzer = GSRDataAnalyzer(self.data_directory, self.session_catalog)
         
         # Validation level mapping
         validation_levels = {
@@ -145,6 +159,11 @@ class BucikaOrchestrator:
         logger.info("Starting Bucika GSR Orchestrator v1.0.0 (Python)")
         
         try:
+            # Recover sessions left behind by a previous run before accepting devices
+            interrupted = await self.session_manager.recover()
+            if interrupted:
+                logger.warning(f"Marked {len(interrupted)} sessions as interrupted: {', '.join(interrupted)}")
+            
             # Start error recovery first
             await self.error_recovery.start()
             
@@ -201,6 +220,11 @@ class BucikaOrchestrator:
             await self.websocket_server.stop()
             logger.info("WebSocket server stopped")
             
+            # Flush and close session data files
+            await self.session_manager.close()
+            self.session_catalog.close()
+            logger.info("Session files closed")
+            
             # Stop discovery service
             await self.discovery_service.stop()
             logger.info("mDNS service stopped")
@@ -297,7 +321,8 @@ class BucikaOrchestrator:
                 'websocket_server': {
                     'running': self.websocket_server.running if hasattr(self.websocket_server, 'running') else False,
                     'connected_clients': len(self.websocket_server.connected_clients),
-                    'port': 8080
+                    'port': 8080,
+                    'ingest_queues': self.websocket_server.get_ingest_stats()
                 },
                 'discovery_service': {
                     'running': self.discovery_service.is_running(),
@@ -351,6 +376,12 @@ __all__ = [
     'DiscoveryService', 
     'TimeSyncService',
     'SessionManager',
+    'SessionJournal',
+    'FsyncPolicy',
+    'SessionCatalog',
+    'SegmentPolicy',
+    'SessionGroup',
+    'MergedTimeline',
     'PerformanceMonitor',
     'GSRDataAnalyzer',
     'BatchAnalyzer', 
@@ -381,6 +412,13 @@ def main():
     parser.add_argument('--validation', type=str, default='standard',
                         choices=['basic', 'standard', 'strict', 'research_grade'],
                         help='Data validation level')
+    parser.add_argument('--fsync', type=str, default='INTERVAL',
+                        choices=[policy.value for policy in FsyncPolicy],
+                        help='Session journal fsync policy')
+    parser.add_argument('--segment-mb', type=float, default=64,
+                        help='Roll recordings over to a new segment file after this many MiB')
+    parser.add_argument('--segment-minutes', type=float, default=60,
+                        help='Roll recordings over to a new segment file after this many minutes')
     parser.add_argument('--port', type=int, default=8080, help='WebSocket server port')
     parser.add_argument('--sync-port', type=int, default=9123, help='Time sync service port')
     
@@ -407,7 +445,10 @@ def main():
     orchestrator = BucikaOrchestrator(
         headless=args.headless,
         data_directory=data_dir,
-        validation_level=args.validation
+        validation_level=args.validation,
+        fsync_policy=FsyncPolicy(args.fsync),
+        segment_policy=SegmentPolicy(max_bytes=int(args.segment_mb * 1024 * 1024),
+                                     max_seconds=args.segment_minutes * 60)
     )
     
     async def run_orchestrator():
@@ -0,0 +1,116 @@
+"""
+Per-device clock offset and drift estimation from four-timestamp exchanges.
+
+Each time sync exchange gives the client's send time t1 and receive time
+t4 on the device clock, and the server's receive time t2 and transmit time
+t3 on the PC clock. Its round trip is (t4 - t1) - (t3 - t2), and its
+offset estimate, device clock minus PC clock, is
+    
+    ((t1 - t2) + (t4 - t3)) / 2
+
+which is exact when the two network legs take equally long. Queueing only
+ever adds delay, so the exchanges with the smallest round trip carry the
+least asymmetry. The estimator splits its window of recent exchanges into
+stretches of time, keeps the minimum-RTT fifth of each and fits a line
+through them: the intercept is the offset and the slope the drift of the
+device clock against the PC clock.
+"""
+
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+
+
+DEFAULT_EXCHANGE_WINDOW = 128   # exchanges kept per device
+DEFAULT_FILTER_BUCKETS = 8      # stretches of the window filtered separately, so the fit spans it
+RTT_FILTER_FRACTION = 0.2       # lowest-RTT share of each stretch that is kept
+MIN_DRIFT_SPAN_NS = 10_000_000_000  # fit drift only over at least this much server time
+
+
+@dataclass
+class ClockModel:
+    """Fitted relation of a device clock to the PC clock"""
+    offset_ns: int       # device clock - PC clock at reference_ns
+    drift_ppm: float     # how much faster the device clock runs, in parts per million
+    reference_ns: int    # PC clock time the offset applies at
+    rtt_ns: int          # smallest round trip among the exchanges used
+    exchanges: int       # exchanges the fit is based on
+    
+    def offset_at(self, server_ns):
+        """Device clock - PC clock at a PC clock time; works on arrays"""
+        elapsed_ns = np.asarray(server_ns) - self.reference_ns
+        return self.offset_ns + np.rint(self.drift_ppm * 1e-6 * elapsed_ns).astype(np.int64)
+    
+    def to_server_ns(self, device_ns):
+        """Convert device clock timestamps to the PC clock; works on arrays"""
+        device_ns = np.asarray(device_ns, dtype=np.int64)
+        # The offset changes by nanoseconds per second, so evaluating it at
+        # the device time less the reference offset is close enough
+        return device_ns - self.offset_at(device_ns - self.offset_ns)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ClockModel':
+        return cls(**data)
+
+
+class ClockEstimator:
+    """Offset and drift of one device clock, from its recent time sync exchanges"""
+    
+    def __init__(self, window: int = DEFAULT_EXCHANGE_WINDOW, buckets: int = DEFAULT_FILTER_BUCKETS):
+        self.buckets = buckets
+        # (server midpoint, offset, round trip) per exchange, oldest first
+        self._exchanges: Deque[Tuple[int, float, int]] = deque(maxlen=window)
+        self._model: Optional[ClockModel] = None
+        self.rejected = 0
+    
+    def __len__(self) -> int:
+        return len(self._exchanges)
+    
+    def add_exchange(self, t1_ns: int, t2_ns: int, t3_ns: int, t4_ns: int) -> bool:
+        """Add one exchange; returns False if its timestamps are inconsistent"""
+        rtt_ns = (t4_ns - t1_ns) - (t3_ns - t2_ns)
+        if rtt_ns < 0 or t3_ns < t2_ns:
+            self.rejected += 1
+            return False
+        
+        offset_ns = ((t1_ns - t2_ns) + (t4_ns - t3_ns)) / 2
+        self._exchanges.append(((t2_ns + t3_ns) // 2, offset_ns, rtt_ns))
+        self._model = None
+        return True
+    
+    def model(self) -> Optional[ClockModel]:
+        """Current fit, or None before the first exchange"""
+        if self._model is None and self._exchanges:
+            self._model = self._fit(self._filtered())
+        return self._model
+    
+    def _filtered(self) -> List[Tuple[int, float, int]]:
+        """The minimum-RTT exchanges of each stretch of the window, oldest first"""
+        exchanges = list(self._exchanges)
+        size = max(1, -(-len(exchanges) // self.buckets))
+        kept = []
+        for start in range(0, len(exchanges), size):
+            stretch = sorted(exchanges[start:start + size], key=lambda exchange: exchange[2])
+            kept.extend(sorted(stretch[:max(1, int(len(stretch) * RTT_FILTER_FRACTION))]))
+        return kept
+    
+    def _fit(self, points: List[Tuple[int, float, int]]) -> ClockModel:
+        times = np.array([point[0] for point in points], dtype=np.int64)
+        offsets = np.array([point[1] for point in points])
+        reference_ns = int(times[-1])
+        rtt_ns = min(point[2] for point in points)
+        
+        if len(points) < 2 or times[-1] - times[0] < MIN_DRIFT_SPAN_NS:
+            # Too short to see drift: the least delayed exchange is the best estimate
+            best = min(points, key=lambda point: point[2])
+            return ClockModel(int(round(best[1])), 0.0, reference_ns, rtt_ns, len(self._exchanges))
+        
+        # Least squares in seconds relative to the newest point, which keeps
+        # the intercept at the reference time and the numbers well scaled
+        seconds = (times - reference_ns) / 1e9
+        slope, intercept = np.polyfit(seconds, offsets, 1)
+        return ClockModel(int(round(intercept)), float(slope / 1e3), reference_ns, rtt_ns, len(self._exchanges))
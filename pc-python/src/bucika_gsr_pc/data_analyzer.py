@@ -16,6 +16,9 @@ from dataclasses import dataclass
 import statistics
 from loguru import logger
 
+from .session_catalog import SessionCatalog, CatalogStatus
+from .session_segments import gsr_segment_files, read_segments_dataframe
+
 
 @dataclass
 class AnalysisResults:
@@ -37,9 +40,10 @@ class AnalysisResults:
 class GSRDataAnalyzer:
     """Advanced GSR data analysis and quality assessment"""
     
-    def __init__(self, data_directory: Path = None):
-        """Initialize the analyzer with data directory"""
+    def __init__(self, data_directory: Path = None, catalog: Optional[SessionCatalog] = None):
+        """Initialize the analyzer with data directory and optional session catalog"""
         self.data_directory = data_directory or Path("sessions")
+        self.catalog = catalog
         self.analysis_cache = {}
         
         # Analysis parameters
@@ -62,6 +66,7 @@ class GSRDataAnalyzer:
             gsr_data = self._load_gsr_data(session_path)
             if gsr_data is None or len(gsr_data) == 0:
                 logger.warning(f"No GSR data found for session: {session_id}")
+                self._record_analysis(session_id, CatalogStatus.FAILED)
                 return None
                 
             # Load sync marks
@@ -75,25 +80,35 @@ class GSRDataAnalyzer:
             
             # Save analysis report
             self._save_analysis_report(session_path, analysis)
+            self._record_analysis(session_id, CatalogStatus.COMPLETED, analysis.data_quality_score)
             
             logger.info(f"Analysis completed for session {session_id}")
             return analysis
             
         except Exception as e:
             logger.error(f"Error analyzing session {session_id}: {e}")
+            self._record_analysis(session_id, CatalogStatus.FAILED)
             return None
     
+    def _record_analysis(self, session_id: str, status: CatalogStatus, score: Optional[float] = None):
+        """Note the analysis outcome in the catalog, if there is one"""
+        if self.catalog is not None:
+            try:
+                self.catalog.record_analysis(session_id, status, score)
+            except Exception as e:
+                logger.error(f"Error cataloging analysis of session {session_id}: {e}")
+    
     def _load_gsr_data(self, session_path: Path) -> Optional[pd.DataFrame]:
-        """Load GSR data from CSV files"""
-        gsr_files = list(session_path.glob("gsr_data_*.csv"))
+        """Load GSR data from binary session or CSV files, every segment of the recording"""
+        # The catalog knows the session's files; otherwise look in its directory
+        gsr_files = self.catalog.gsr_files(session_path.name) if self.catalog is not None else []
         if not gsr_files:
-            return None
-            
-        # Load the most recent file
-        gsr_file = max(gsr_files, key=lambda x: x.stat().st_mtime)
+            gsr_files = gsr_segment_files(session_path)
+            if not gsr_files:
+                return None
         
         try:
-            df = pd.read_csv(gsr_file)
+            df = read_segments_dataframe(gsr_files)
             
             # Convert timestamp to datetime if it's not already
             if 'timestamp' in df.columns:
@@ -390,23 +405,23 @@ class GSRDataAnalyzer:
 class BatchAnalyzer:
     """Batch analysis of multiple sessions"""
     
-    def __init__(self, data_directory: Path = None):
-        self.analyzer = GSRDataAnalyzer(data_directory)
+    def __init__(self, data_directory: Path = None, catalog: Optional[SessionCatalog] = None):
+        data_directory = data_directory or Path("sessions")
+        self.catalog = catalog or SessionCatalog.open(data_directory)
+        self.analyzer = GSRDataAnalyzer(data_directory, self.catalog)
         self.results = {}
     
-    def analyze_all_sessions(self) -> Dict[str, AnalysisResults]:
-        """Analyze all sessions in the data directory"""
+    def analyze_all_sessions(self, **filters) -> Dict[str, AnalysisResults]:
+        """Analyze the cataloged sessions, optionally filtered as in SessionCatalog.find"""
         sessions_processed = 0
         
-        for session_path in self.analyzer.data_directory.iterdir():
-            if session_path.is_dir():
-                session_id = session_path.name
-                logger.info(f"Analyzing session: {session_id}")
-                
-                result = self.analyzer.analyze_session(session_id)
-                if result:
-                    self.results[session_id] = result
-                    sessions_processed += 1
+        for session_id in self.catalog.session_ids(**filters):
+            logger.info(f"Analyzing session: {session_id}")
+            
+            result = self.analyzer.analyze_session(session_id)
+            if result:
+                self.results[session_id] = result
+                sessions_processed += 1
         
         logger.info(f"Batch analysis completed: {sessions_processed} sessions processed")
         return self.results
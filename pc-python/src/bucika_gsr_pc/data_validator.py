@@ -17,6 +17,10 @@ import csv
 import re
 from loguru import logger
 
+from .session_catalog import SessionCatalog, CatalogStatus
+from .session_file import SESSION_FILE_SUFFIX, read_gsr_dataframe
+from .session_segments import gsr_segment_files
+
 
 class ValidationLevel(Enum):
     """Validation strictness levels"""
@@ -170,7 +174,7 @@ class DataValidator:
             # Perform validation checks
             results.extend(await self._validate_completeness(gsr_data, sync_marks))
             results.extend(await self._validate_accuracy(gsr_data))
-            results.extend(await self._validate_consistency(gsr_data))
+            results.extend(await self._validate_consistency(gsr_data, metadata))
             results.extend(await self._validate_timeliness(gsr_data))
             results.extend(await self._validate_data_validity(gsr_data))
             results.extend(await self._validate_file_integrity(session_path))
@@ -209,15 +213,19 @@ class DataValidator:
         sync_marks = None
         metadata = None
         
-        # Load GSR data
-        gsr_files = list(session_path.glob('gsr_data_*.csv'))
+        # Load GSR data, every segment of the recording in order
+        gsr_files = gsr_segment_files(session_path)
         if gsr_files:
-            gsr_file = max(gsr_files, key=lambda x: x.stat().st_mtime)
             try:
-                with open(gsr_file, 'r') as f:
-                    reader = csv.DictReader(f)
-                    gsr_data = list(reader)
+                gsr_data = []
+                for gsr_file in gsr_files:
+                    if gsr_file.suffix == SESSION_FILE_SUFFIX:
+                        gsr_data.extend(read_gsr_dataframe(gsr_file).to_dict('records'))
+                    else:
+                        with open(gsr_file, 'r') as f:
+                            gsr_data.extend(csv.DictReader(f))
             except Exception as e:
+                gsr_data = None
                 logger.error(f"Error loading GSR data: {e}")
         
         # Load sync marks
@@ -377,7 +385,8 @@ class DataValidator:
         
         return results
     
-    async def _validate_consistency(self, gsr_data: List[Dict]) -> List[ValidationResult]:
+    async def _validate_consistency(self, gsr_data: List[Dict],
+                                    metadata: Optional[Dict] = None) -> List[ValidationResult]:
         """Validate data consistency"""
         results = []
         
@@ -438,27 +447,44 @@ class DataValidator:
             }
         ))
         
-        # Check data sequence integrity
-        sequence_breaks = 0
-        if len(timestamps) >= 2:
-            max_gap = expected_interval * 5  # Allow up to 5 missed samples
+        # Check data sequence integrity, from the gaps the session recorded
+        # while reordering samples when it has them
+        if metadata is not None and 'sequence_gaps' in metadata:
+            gaps = metadata['sequence_gaps']
+            missing = sum(gap['last_seq'] - gap['first_seq'] + 1 for gap in gaps)
+            sequence_breaks = len(gaps)
+            sample_total = len(gsr_data)
+            sequence_score = 1.0 - missing / max(1, len(gsr_data) + missing)
+            details = {
+                'sequence_breaks': sequence_breaks,
+                'sequence_score': sequence_score,
+                'missing_samples': missing,
+                'duplicate_samples': metadata.get('duplicate_samples', 0),
+                'sequence_gaps': gaps
+            }
+        else:
+            sequence_breaks = 0
+            if len(timestamps) >= 2:
+                max_gap = expected_interval * 5  # Allow up to 5 missed samples
+                
+                for i in range(len(timestamps) - 1):
+                    gap = timestamps[i+1] - timestamps[i]
+                    if gap > max_gap:
+                        sequence_breaks += 1
             
-            for i in range(len(timestamps) - 1):
-                gap = timestamps[i+1] - timestamps[i]
-                if gap > max_gap:
-                    sequence_breaks += 1
-        
-        sequence_score = 1.0 - (sequence_breaks / max(1, len(timestamps) - 1))
+            sequence_score = 1.0 - (sequence_breaks / max(1, len(timestamps) - 1))
+            sample_total = len(timestamps)
+            details = {
+                'sequence_breaks': sequence_breaks,
+                'sequence_score': sequence_score
+            }
         
         results.append(ValidationResult(
             metric=QualityMetric.CONSISTENCY,
-            passed=sequence_breaks <= len(timestamps) * 0.01,  # Max 1% breaks
+            passed=sequence_breaks <= sample_total * 0.01,  # Max 1% breaks
             score=sequence_score,
             message=f"Sequence integrity: {sequence_breaks} breaks detected",
-            details={
-                'sequence_breaks': sequence_breaks,
-                'sequence_score': sequence_score
-            }
+            details=details
         ))
         
         return results
@@ -802,18 +828,26 @@ class BatchValidator:
         self.validator = DataValidator(validation_level)
         self.reports: Dict[str, QualityReport] = {}
     
-    async def validate_all_sessions(self, data_directory: Path) -> Dict[str, QualityReport]:
-        """Validate all sessions in directory"""
+    async def validate_all_sessions(self, data_directory: Path,
+                                    catalog: Optional[SessionCatalog] = None,
+                                    **filters) -> Dict[str, QualityReport]:
+        """Validate the cataloged sessions of a directory, optionally filtered as in SessionCatalog.find"""
         
         logger.info(f"Starting batch validation with {self.validator.validation_level.value} level")
         
-        for session_path in data_directory.iterdir():
-            if session_path.is_dir():
-                session_id = session_path.name
+        session_catalog = catalog or SessionCatalog.open(data_directory)
+        try:
+            for session_id in session_catalog.session_ids(**filters):
                 logger.info(f"Validating session: {session_id}")
                 
-                report = await self.validator.validate_session(session_path)
+                report = await self.validator.validate_session(data_directory / session_id)
                 self.reports[session_id] = report
+                
+                status = CatalogStatus.PASSED if report.overall_score >= 0.8 else CatalogStatus.FAILED
+                session_catalog.record_validation(session_id, status, report.overall_score)
+        finally:
+            if catalog is None:
+                session_catalog.close()
         
         logger.info(f"Batch validation completed: {len(self.reports)} sessions processed")
         return self.reports
@@ -1,77 +1,81 @@
 """
 mDNS discovery service for automatic device discovery on the local network.
 Maintains compatibility with the existing Kotlin implementation.
+
+The service is registered through the asyncio zeroconf API on every
+usable IPv4 interface, in a background task, so startup does not wait for
+probing. Several orchestrators can share a LAN: a taken name is changed
+rather than rejected, and the TXT record carries each one's live load so
+phones can choose the least loaded. The load is sampled every
+refresh_interval seconds and re-announced only when it changed, which
+bounds the multicast traffic whatever the ingest rate.
 """
 
 import asyncio
 import socket
-from typing import Optional
-from zeroconf import ServiceInfo, Zeroconf
+import time
+from typing import Any, Callable, Dict, List, Optional
+import ifaddr
+from zeroconf import InterfaceChoice, IPVersion
+from zeroconf.asyncio import AsyncServiceInfo, AsyncZeroconf
 from loguru import logger
 
 
+# Devices an orchestrator advertises room for
+DEFAULT_DEVICE_CAPACITY = 16
+
+# Shortest time between TXT record updates
+DEFAULT_REFRESH_INTERVAL = 5.0
+
+_STATIC_PROPERTIES = {
+    "version": "1.0.0",
+    "protocol": "BucikaGSR",
+    "capabilities": "websocket,sync,upload"
+}
+
+
+def usable_addresses() -> List[str]:
+    """IPv4 addresses of every interface a phone could reach, loopback only as a last resort"""
+    addresses = []
+    for adapter in ifaddr.get_adapters():
+        for ip in adapter.ips:
+            if ip.is_IPv4 and not ip.ip.startswith(("127.", "169.254.")) and ip.ip not in addresses:
+                addresses.append(ip.ip)
+    return addresses or ["127.0.0.1"]
+
+
 class DiscoveryService:
     """mDNS service for advertising the PC orchestrator on the network"""
     
-    def __init__(self, port: int = 8080, service_name: str = "BucikaGSR"):
+    def __init__(self, port: int = 8080, service_name: str = "BucikaGSR",
+                 capacity: int = DEFAULT_DEVICE_CAPACITY,
+                 load_source: Optional[Callable[[], Dict[str, int]]] = None,
+                 refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
         self.port = port
         self.service_name = service_name
         self.service_type = "_bucika-gsr._tcp.local."
         
-        self.zeroconf: Optional[Zeroconf] = None
-        self.service_info: Optional[ServiceInfo] = None
+        # Live load for the TXT record: load_source returns the connected
+        # device count and the running total of ingested samples
+        self.capacity = capacity
+        self.load_source = load_source
+        self.refresh_interval = refresh_interval
+        self._last_sample: Optional[tuple] = None  # (monotonic seconds, ingested samples)
+        
+        self.zeroconf: Optional[AsyncZeroconf] = None
+        self.service_info: Optional[AsyncServiceInfo] = None
+        self._register_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
         self._running = False
     
     async def start(self):
-        """Start the mDNS discovery service"""
+        """Start the mDNS discovery service; registration completes in the background"""
         try:
-            # Get local IP address
-            try:
-                hostname = socket.gethostname()
-                local_ip = socket.gethostbyname(hostname)
-            except Exception as e:
-                # Fallback to localhost if hostname resolution fails
-                logger.warning(f"Failed to get hostname IP, using 127.0.0.1: {e}")
-                hostname = "localhost"
-                local_ip = "127.0.0.1"
-            
-            # Start zeroconf in a background thread since it can be blocking
-            import threading
-            
-            def register_service():
-                try:
-                    # Create service info
-                    self.service_info = ServiceInfo(
-                        self.service_type,
-                        f"{self.service_name}.{self.service_type}",
-                        addresses=[socket.inet_aton(local_ip)],
-                        port=self.port,
-                        properties={
-                            b"version": b"1.0.0",
-                            b"protocol": b"BucikaGSR",
-                            b"capabilities": b"websocket,sync,upload"
-                        },
-                        server=f"{hostname}.local."
-                    )
-                    
-                    # Start zeroconf
-                    self.zeroconf = Zeroconf()
-                    self.zeroconf.register_service(self.service_info)
-                    
-                    logger.info(f"mDNS service started: {self.service_name} on {local_ip}:{self.port}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to register mDNS service: {e}")
-                    logger.warning("Continuing without mDNS discovery - clients will need manual connection")
-            
-            # Start registration in background thread
-            thread = threading.Thread(target=register_service, daemon=True)
-            thread.start()
-            
-            # Don't wait for completion - return immediately
+            self.zeroconf = AsyncZeroconf(interfaces=InterfaceChoice.All, ip_version=IPVersion.V4Only)
+            self._register_task = asyncio.create_task(self._register())
             logger.info("mDNS service registration started in background")
             self._running = True
-            
+        
         except Exception as e:
             # Log error but don't fail the entire startup
             logger.error(f"Failed to start mDNS discovery service: {e}")
@@ -79,13 +83,24 @@ class DiscoveryService:
     
     async def stop(self):
         """Stop the mDNS discovery service"""
-        if self.zeroconf and self.service_info:
+        for task in (self._refresh_task, self._register_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = self._register_task = None
+        
+        if self.zeroconf:
             try:
-                self.zeroconf.unregister_service(self.service_info)
-                self.zeroconf.close()
+                if self.service_info:
+                    await self.zeroconf.async_unregister_service(self.service_info)
+                await self.zeroconf.async_close()
                 logger.info("mDNS discovery service stopped")
             except Exception as e:
                 logger.error(f"Error stopping mDNS service: {e}")
+            self.zeroconf = None
         self._running = False
     
     def is_running(self) -> bool:
@@ -101,6 +116,79 @@ class DiscoveryService:
             "service_name": self.service_name,
             "service_type": self.service_type,
             "port": self.port,
-            "addresses": [socket.inet_ntoa(addr) for addr in self.service_info.addresses],
+            "addresses": self.service_info.parsed_addresses(),
             "properties": {k.decode(): v.decode() for k, v in self.service_info.properties.items()}
-        }
\ No newline at end of file
+        }
+    
+    def load_properties(self) -> Dict[str, str]:
+        """TXT properties describing the current load.
+        
+        The ingest rate is the samples per second since the previous call,
+        so it is averaged over one refresh interval.
+        """
+        if self.load_source is None:
+            return {"capacity": str(self.capacity)}
+        
+        load = self.load_source()
+        devices = load.get("devices", 0)
+        now = time.monotonic()
+        ingested = load.get("ingested_samples", 0)
+        rate = 0.0
+        if self._last_sample is not None and now > self._last_sample[0]:
+            rate = max(0, ingested - self._last_sample[1]) / (now - self._last_sample[0])
+        self._last_sample = (now, ingested)
+        
+        return {
+            "devices": str(devices),
+            "ingest_sps": str(int(round(rate))),
+            "capacity": str(max(0, self.capacity - devices)),
+            "max_devices": str(self.capacity)
+        }
+    
+    def _build_service_info(self, properties: Dict[str, Any]) -> AsyncServiceInfo:
+        hostname = socket.gethostname() or "localhost"
+        name = self.service_info.name if self.service_info else f"{self.service_name}.{self.service_type}"
+        return AsyncServiceInfo(
+            self.service_type,
+            name,
+            parsed_addresses=usable_addresses(),
+            port=self.port,
+            properties={**_STATIC_PROPERTIES, **properties},
+            server=f"{hostname}.local."
+        )
+    
+    async def _register(self):
+        try:
+            info = self._build_service_info(self.load_properties())
+            
+            # Another orchestrator on the LAN may hold the name already
+            await self.zeroconf.async_register_service(info, allow_name_change=True)
+            self.service_info = info
+            logger.info(f"mDNS service started: {info.name} on "
+                        f"{', '.join(info.parsed_addresses())}:{self.port}")
+            
+            if self.load_source is not None:
+                self._refresh_task = asyncio.create_task(self._refresh_loop())
+        
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to register mDNS service: {e}")
+            logger.warning("Continuing without mDNS discovery - clients will need manual connection")
+    
+    async def _refresh_loop(self):
+        """Re-announce the TXT record with the current load when it changes"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                properties = self.load_properties()
+                current = {k.decode(): v.decode() for k, v in self.service_info.properties.items()}
+                if all(current.get(key) == value for key, value in properties.items()):
+                    continue
+                
+                info = self._build_service_info(properties)
+                await self.zeroconf.async_update_service(info)
+                self.service_info = info
+                logger.debug(f"mDNS load updated: {properties}")
+            except Exception as e:
+                logger.error(f"Failed to update mDNS service: {e}")
@@ -0,0 +1,343 @@
+"""
+Background CSV writer for GSR sample batches.
+
+A single writer thread takes sample batches from every device, formats each
+batch in bulk with NumPy (vectorized timestamp formatting, one string per
+batch) and appends it to the session's CSV file. Output is buffered per file
+and flushed when the buffer reaches a size limit or has been waiting for
+longer than a time limit, instead of once per batch. The event loop only
+enqueues batches and never waits on file I/O.
+
+Other per-session CSV files, such as sync marks, share the thread: their
+rows are queued already formatted and buffered the same way.
+
+Files opened with a segment policy are rolled over to a new segment once
+the current one reaches its size or time limit, and the session's segment
+manifest is rewritten each time a segment is closed.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+from loguru import logger
+
+from .protocol import GSRSampleBatch, GSR_FLAG_SPIKE, GSR_FLAG_SAT, GSR_FLAG_DROPOUT
+
+
+GSR_CSV_HEADER = [
+    'Timestamp_ns',
+    'DateTime_UTC',
+    'Sequence',
+    'GSR_Raw_uS',
+    'GSR_Filtered_uS',
+    'Temperature_C',
+    'Flag_Spike',
+    'Flag_Saturation',
+    'Flag_Dropout'
+]
+
+DEFAULT_FLUSH_BYTES = 256 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+
+
+def format_gsr_rows(batch: GSRSampleBatch) -> str:
+    """Format a batch as CSV rows, matching the per-sample writer's output.
+    
+    DateTime_UTC keeps the historical format: local time at millisecond
+    resolution. The UTC offset is taken once per batch.
+    """
+    count = len(batch)
+    if not count:
+        return ""
+    
+    t_utc_ns = np.asarray(batch.t_utc_ns, dtype=np.int64)
+    utc_offset_ns = time.localtime(int(t_utc_ns[0]) // 1_000_000_000).tm_gmtoff * 1_000_000_000
+    local_times = (t_utc_ns + utc_offset_ns).astype("datetime64[ns]")
+    date_times = np.datetime_as_string(local_times, unit="ms")
+    
+    flags = np.asarray(batch.flags, dtype=np.uint8)
+    columns = (
+        t_utc_ns.astype(str),
+        np.char.replace(date_times, "T", " "),
+        np.asarray(batch.seq, dtype=np.int64).astype(str),
+        np.asarray(batch.gsr_raw_uS, dtype=np.float64).astype(str),
+        np.asarray(batch.gsr_filt_uS, dtype=np.float64).astype(str),
+        np.asarray(batch.temp_C, dtype=np.float64).astype(str),
+        np.where(flags & GSR_FLAG_SPIKE, "True", "False"),
+        np.where(flags & GSR_FLAG_SAT, "True", "False"),
+        np.where(flags & GSR_FLAG_DROPOUT, "True", "False"),
+    )
+    rows = zip(*(column.tolist() for column in columns))
+    return "\n".join(map(",".join, rows)) + "\n"
+
+
+class _OpenFile:
+    """A CSV file owned by the writer thread, with its unflushed output"""
+    
+    def __init__(self, path: Path, handle, binary=None, header_line: str = "", segment_policy=None):
+        self.path = path
+        self.handle = handle
+        self.binary = binary  # GSRSessionFileWriter, when a binary copy is kept
+        self.pending: List[str] = []
+        self.pending_bytes = 0
+        self.oldest_pending: Optional[float] = None
+        self.rows_written = 0
+        
+        # Segmented recordings: the first segment's path names the later ones
+        self.first_path = path
+        self.first_binary_path = binary.path if binary is not None else None
+        self.header_line = header_line
+        self.segment_policy = segment_policy
+        self.segment_bytes = len(header_line)
+        self.manifest = None  # SegmentManifest of the closed segments
+        self.segment = None   # SegmentInfo being written
+
+
+class GSRCsvWriter:
+    """Single background thread writing GSR CSV files for all devices"""
+    
+    def __init__(self, flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._files: Dict[Hashable, _OpenFile] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.batches_written = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.rotations = 0
+    
+    def open(self, key: Hashable, path: Path, header: List[str] = GSR_CSV_HEADER,
+             binary_path: Optional[Path] = None, segment_policy=None) -> Future:
+        """Create a CSV file with its header; the future completes once it exists.
+        
+        With a binary path, every batch is also appended to a binary session file.
+        With a SegmentPolicy, the recording is split into segment files listed
+        in a manifest next to them.
+        """
+        return self._submit("open", key, (path, ",".join(header) + "\n", binary_path, segment_policy))
+    
+    def write(self, key: Hashable, batch: GSRSampleBatch):
+        """Queue a batch for the file opened under the key, without waiting"""
+        self._submit("write", key, batch)
+    
+    def write_text(self, key: Hashable, text: str):
+        """Queue formatted CSV rows for the file opened under the key, without waiting"""
+        self._submit("write_text", key, text)
+    
+    def flush(self, key: Hashable) -> Future:
+        """Write out everything queued for a file so far"""
+        return self._submit("flush", key, None)
+    
+    def sync(self, key: Hashable) -> Future:
+        """Write out everything queued for a file so far and fsync it"""
+        return self._submit("sync", key, None)
+    
+    def close(self, key: Hashable) -> Future:
+        """Flush and close a file; the future completes once it is closed"""
+        return self._submit("close", key, None)
+    
+    def shutdown(self, timeout: Optional[float] = None):
+        """Flush and close every file and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None
+        self._queue.put(("stop", None, None, None))
+        thread.join(timeout)
+    
+    async def wait(self, future: Future):
+        """Await a writer future from the event loop"""
+        return await asyncio.wrap_future(future)
+    
+    def _submit(self, command: str, key: Hashable, argument) -> Future:
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((command, key, argument, future))
+        return future
+    
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gsr-csv-writer", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        """Writer thread: apply commands, flushing buffers on size and age"""
+        while True:
+            timeout = self._next_flush_delay()
+            try:
+                command, key, argument, future = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_due()
+                continue
+            
+            if command == "stop":
+                for key in list(self._files):
+                    self._close(key)
+                return
+            
+            try:
+                future.set_result(self._commands[command](self, key, argument))
+            except Exception as e:
+                logger.error(f"GSR writer failed to {command} {key}: {e}")
+                future.set_exception(e)
+            
+            self._flush_due()
+    
+    def _next_flush_delay(self) -> Optional[float]:
+        oldest = [f.oldest_pending for f in self._files.values() if f.oldest_pending is not None]
+        if not oldest:
+            return None
+        return max(0.0, min(oldest) + self.flush_interval - time.monotonic())
+    
+    def _open(self, key: Hashable, argument):
+        path, header_line, binary_path, segment_policy = argument
+        if key in self._files:
+            self._close(key)
+        handle, binary = self._create(path, header_line, binary_path)
+        open_file = self._files[key] = _OpenFile(path, handle, binary, header_line, segment_policy)
+        if segment_policy is not None:
+            from .session_segments import SegmentInfo, SegmentManifest
+            open_file.manifest = SegmentManifest()
+            open_file.segment = SegmentInfo(0, path.name, binary_path.name if binary_path else None)
+    
+    @staticmethod
+    def _create(path: Path, header_line: str, binary_path: Optional[Path]):
+        handle = open(path, "w", newline="")
+        handle.write(header_line)
+        handle.flush()
+        binary = None
+        if binary_path:
+            # session_file builds on this module's CSV layout
+            from .session_file import GSRSessionFileWriter
+            binary = GSRSessionFileWriter(binary_path)
+        return handle, binary
+    
+    def _write(self, key: Hashable, batch: GSRSampleBatch):
+        open_file = self._open_file(key)
+        if open_file.segment is not None and len(batch):
+            if open_file.segment.sample_count and open_file.segment_policy.should_rotate(
+                    open_file.segment_bytes, open_file.segment.t_start_ns, int(batch.t_utc_ns[0])):
+                self._rotate(open_file)
+            open_file.segment.add(batch)
+        
+        if open_file.binary is not None:
+            open_file.binary.append(batch)
+        
+        self._buffer(open_file, format_gsr_rows(batch), len(batch))
+        self.batches_written += 1
+        self.rows_written += len(batch)
+    
+    def _write_text(self, key: Hashable, text: str):
+        self._buffer(self._open_file(key), text, text.count("\n"))
+    
+    def _open_file(self, key: Hashable) -> _OpenFile:
+        open_file = self._files.get(key)
+        if open_file is None:
+            raise KeyError(f"no file open for {key}")
+        return open_file
+    
+    def _buffer(self, open_file: _OpenFile, text: str, rows: int):
+        open_file.pending.append(text)
+        open_file.pending_bytes += len(text)
+        open_file.segment_bytes += len(text)
+        open_file.rows_written += rows
+        if open_file.oldest_pending is None:
+            open_file.oldest_pending = time.monotonic()
+        if open_file.pending_bytes >= self.flush_bytes:
+            self._flush_file(open_file)
+    
+    def _flush(self, key: Hashable, _argument=None):
+        open_file = self._files.get(key)
+        if open_file is not None:
+            self._flush_file(open_file)
+    
+    def _sync(self, key: Hashable, _argument=None):
+        open_file = self._files.get(key)
+        if open_file is not None:
+            self._flush_file(open_file)
+            os.fsync(open_file.handle.fileno())
+            if open_file.binary is not None:
+                open_file.binary.sync()
+    
+    def _close(self, key: Hashable, _argument=None) -> Optional[int]:
+        open_file = self._files.pop(key, None)
+        if open_file is None:
+            return None
+        self._close_segment(open_file, complete=True)
+        return open_file.rows_written
+    
+    def _close_segment(self, open_file: _OpenFile, complete: bool):
+        """Make the current file durable and close it, listing it in the manifest if segmented"""
+        self._flush_file(open_file)
+        
+        # A closed file must be durable: the session journal drops its batches
+        os.fsync(open_file.handle.fileno())
+        open_file.handle.close()
+        if open_file.binary is not None:
+            open_file.binary.sync()
+            open_file.binary.close()
+        
+        if open_file.segment is not None:
+            from .session_segments import write_manifest
+            open_file.segment.checksum_files(open_file.path.parent)
+            open_file.manifest.segments.append(open_file.segment)
+            open_file.manifest.complete = complete
+            write_manifest(open_file.path.parent, open_file.manifest)
+    
+    def _rotate(self, open_file: _OpenFile):
+        """Close the current segment and continue in the next one"""
+        from .session_segments import SegmentInfo, segment_path
+        
+        self._close_segment(open_file, complete=False)
+        index = open_file.segment.index + 1
+        path = segment_path(open_file.first_path, index)
+        binary_path = None
+        if open_file.binary is not None:
+            binary_path = segment_path(open_file.first_binary_path, index)
+        
+        open_file.handle, open_file.binary = self._create(path, open_file.header_line, binary_path)
+        open_file.path = path
+        open_file.segment = SegmentInfo(index, path.name, binary_path.name if binary_path else None)
+        open_file.segment_bytes = len(open_file.header_line)
+        self.rotations += 1
+        logger.info(f"Continuing {open_file.first_path.name} in segment {path.name}")
+    
+    def _flush_due(self):
+        now = time.monotonic()
+        for open_file in self._files.values():
+            if open_file.oldest_pending is not None and now - open_file.oldest_pending >= self.flush_interval:
+                self._flush_file(open_file)
+    
+    def _flush_file(self, open_file: _OpenFile):
+        if open_file.pending:
+            open_file.handle.write("".join(open_file.pending))
+            open_file.pending.clear()
+        open_file.handle.flush()
+        if open_file.binary is not None:
+            open_file.binary.flush()
+        open_file.pending_bytes = 0
+        open_file.oldest_pending = None
+        self.flushes += 1
+    
+    _commands = {
+        "open": _open,
+        "write": _write,
+        "write_text": _write_text,
+        "flush": _flush,
+        "sync": _sync,
+        "close": _close
+    }
@@ -0,0 +1,267 @@
+"""
+Bounded per-device ingest queue for GSR sample batches.
+
+The WebSocket read loop hands sample batches to a queue and goes straight
+back to reading, while one consumer task per device stores them. This keeps
+a slow disk from stalling socket reads and pushing TCP backpressure onto the
+phone. When the queue is full the overflow policy decides what happens:
+block the reader, drop the oldest batch, or spill batches to a file on disk
+and read them back in order once the consumer catches up.
+
+Spill file reads and writes run in the default executor, so a slow disk
+never blocks the event loop.
+
+Barriers are callables that run on the consumer after every batch queued
+before them. They are always admitted, never dropped, and never count
+against the capacity.
+"""
+
+import asyncio
+import struct
+from collections import deque
+from enum import Enum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from loguru import logger
+
+from .protocol import GSRSampleBatch
+
+
+DEFAULT_INGEST_QUEUE_SIZE = 256
+
+_SPILL_LENGTH = struct.Struct("<I")
+
+
+class OverflowPolicy(str, Enum):
+    """What to do with a batch that arrives while the queue is full"""
+    BLOCK = "BLOCK"
+    DROP_OLDEST = "DROP_OLDEST"
+    SPILL = "SPILL"
+
+
+class IngestQueue:
+    """Bounded FIFO of sample batches drained by a single consumer task"""
+    
+    # Queue entry kinds
+    _BATCH = 0
+    _SPILLED = 1
+    _BARRIER = 2
+    
+    def __init__(self, device_id: str, handler: Callable[[GSRSampleBatch], Awaitable[None]],
+                 max_batches: int = DEFAULT_INGEST_QUEUE_SIZE,
+                 policy: OverflowPolicy = OverflowPolicy.BLOCK,
+                 spill_dir: Optional[Path] = None):
+        if max_batches <= 0:
+            raise ValueError(f"Invalid ingest queue size: {max_batches}")
+        if policy == OverflowPolicy.SPILL and spill_dir is None:
+            raise ValueError("SPILL overflow policy requires a spill directory")
+        
+        self.device_id = device_id
+        self.handler = handler
+        self.max_batches = max_batches
+        self.policy = OverflowPolicy(policy)
+        self.spill_path = spill_dir / f"{device_id}.spill" if spill_dir else None
+        
+        self._entries: Deque[Tuple[int, Any]] = deque()
+        self._memory_batches = 0
+        self._spilled_pending = 0
+        self._spill_file = None
+        self._spill_read_offset = 0
+        
+        self._changed = asyncio.Condition()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+        
+        # Counters
+        self.peak_depth = 0
+        self.enqueued_batches = 0
+        self.processed_batches = 0
+        self.dropped_batches = 0
+        self.dropped_samples = 0
+        self.spilled_batches = 0
+        self.blocked_puts = 0
+        self.handler_errors = 0
+    
+    @property
+    def depth(self) -> int:
+        """Batches waiting to be stored, in memory or spilled"""
+        return self._memory_batches + self._spilled_pending
+    
+    def start(self):
+        """Start the consumer task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._consume())
+    
+    async def put(self, batch: GSRSampleBatch):
+        """Queue a batch, applying the overflow policy if the queue is full"""
+        if self._closed:
+            raise RuntimeError(f"Ingest queue for {self.device_id} is closed")
+        
+        async with self._changed:
+            if self._spilled_pending:
+                # Keep FIFO order: nothing may overtake batches already on disk
+                await self._spill(batch)
+            elif self._memory_batches >= self.max_batches:
+                if self.policy == OverflowPolicy.BLOCK:
+                    self.blocked_puts += 1
+                    await self._changed.wait_for(
+                        lambda: self._memory_batches < self.max_batches or self._closed
+                    )
+                    self._append_batch(batch)
+                elif self.policy == OverflowPolicy.DROP_OLDEST:
+                    self._drop_oldest()
+                    self._append_batch(batch)
+                else:
+                    await self._spill(batch)
+            else:
+                self._append_batch(batch)
+            
+            self.enqueued_batches += 1
+            self.peak_depth = max(self.peak_depth, self.depth)
+            self._changed.notify_all()
+    
+    async def put_barrier(self, callback: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Queue a callback to run once every batch queued so far has been stored.
+        
+        Returns without waiting for the batches; await the returned future to
+        wait for the callback's result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._closed and (self._task is None or self._task.done()):
+            future.set_exception(RuntimeError(f"Ingest queue for {self.device_id} is closed"))
+            return future
+        
+        async with self._changed:
+            self._entries.append((self._BARRIER, (callback, future)))
+            self._changed.notify_all()
+        return future
+    
+    async def join(self):
+        """Wait until everything queued so far has been processed"""
+        await (await self.put_barrier(self._noop))
+    
+    async def close(self):
+        """Stop accepting batches and wait for the consumer to store the rest"""
+        async with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        if self._task is not None:
+            await self._task
+        self._close_spill()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and overflow counters"""
+        return {
+            'policy': self.policy.value,
+            'max_batches': self.max_batches,
+            'depth': self.depth,
+            'peak_depth': self.peak_depth,
+            'spilled_pending': self._spilled_pending,
+            'enqueued_batches': self.enqueued_batches,
+            'processed_batches': self.processed_batches,
+            'dropped_batches': self.dropped_batches,
+            'dropped_samples': self.dropped_samples,
+            'spilled_batches': self.spilled_batches,
+            'blocked_puts': self.blocked_puts,
+            'handler_errors': self.handler_errors
+        }
+    
+    @staticmethod
+    async def _noop():
+        return None
+    
+    def _append_batch(self, batch: GSRSampleBatch):
+        self._entries.append((self._BATCH, batch))
+        self._memory_batches += 1
+    
+    def _drop_oldest(self):
+        """Discard the oldest batch held in memory"""
+        for i, (kind, item) in enumerate(self._entries):
+            if kind == self._BATCH:
+                del self._entries[i]
+                self._memory_batches -= 1
+                self.dropped_batches += 1
+                self.dropped_samples += len(item)
+                logger.warning(f"Ingest queue for {self.device_id} full, dropped a batch of {len(item)} samples")
+                return
+    
+    async def _spill(self, batch: GSRSampleBatch):
+        """Append a batch to the spill file"""
+        frame = batch.encode()
+        await asyncio.get_running_loop().run_in_executor(None, self._write_spill_frame, frame)
+        
+        self._entries.append((self._SPILLED, None))
+        self._spilled_pending += 1
+        self.spilled_batches += 1
+    
+    async def _read_spilled(self) -> GSRSampleBatch:
+        """Read the next spilled batch back from disk"""
+        self._spilled_pending -= 1
+        frame = await asyncio.get_running_loop().run_in_executor(
+            None, self._read_spill_frame, not self._spilled_pending
+        )
+        return GSRSampleBatch.decode(frame)
+    
+    def _write_spill_frame(self, frame: bytes):
+        """Blocking part of _spill, run in the executor"""
+        if self._spill_file is None:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._spill_file = open(self.spill_path, "w+b")
+            self._spill_read_offset = 0
+        
+        self._spill_file.seek(0, 2)
+        self._spill_file.write(_SPILL_LENGTH.pack(len(frame)))
+        self._spill_file.write(frame)
+    
+    def _read_spill_frame(self, last: bool) -> bytes:
+        """Blocking part of _read_spilled, run in the executor"""
+        self._spill_file.flush()
+        self._spill_file.seek(self._spill_read_offset)
+        (length,) = _SPILL_LENGTH.unpack(self._spill_file.read(_SPILL_LENGTH.size))
+        frame = self._spill_file.read(length)
+        self._spill_read_offset += _SPILL_LENGTH.size + length
+        
+        if last:
+            # Everything on disk has been read back, start the file over
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read_offset = 0
+        return frame
+    
+    def _close_spill(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self.spill_path.unlink(missing_ok=True)
+    
+    async def _consume(self):
+        """Store queued batches one at a time, in arrival order"""
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._entries or self._closed)
+                if not self._entries:
+                    break
+                kind, item = self._entries.popleft()
+                if kind == self._BATCH:
+                    self._memory_batches -= 1
+                    self._changed.notify_all()
+                elif kind == self._SPILLED:
+                    item = await self._read_spilled()
+            
+            if kind == self._BARRIER:
+                callback, future = item
+                try:
+                    result = await callback()
+                    if not future.done():
+                        future.set_result(result)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            try:
+                await self.handler(item)
+            except Exception as e:
+                self.handler_errors += 1
+                logger.error(f"Failed to store GSR batch for {self.device_id}: {e}")
+            self.processed_batches += 1
@@ -14,7 +14,7 @@ from loguru import logger
 try:
     from scipy import signal, stats
     from scipy.fft import fft, fftfreq
-    from scipy.signal import butter, filtfilt, find_peaks, periodogram
+    from scipy.signal import butter, filtfilt, find_peaks, periodogram, sosfiltfilt
     from scipy.stats import zscore, pearsonr, spearmanr
     SCIPY_AVAILABLE = True
 except ImportError:
@@ -32,6 +32,16 @@ except ImportError:
     SKLEARN_AVAILABLE = False
     logger.warning("Scikit-learn not available - machine learning features disabled")
 
+from .clock_estimator import ClockModel
+
+
+# Resampling methods: plain linear interpolation, or low-pass filtering
+# below the target Nyquist frequency first when downsampling
+RESAMPLING_METHODS = ('linear', 'antialias')
+
+# A step between samples longer than this many typical sample intervals is a gap
+DEFAULT_MAX_GAP_FACTOR = 2.5
+
 
 @dataclass
 class GSRFeatures:
@@ -687,10 +697,132 @@ class AdvancedGSRAnalyzer:
         )
 
 
+@dataclass
+class DeviceStream:
+    """One device's signal for resampling"""
+    
+    name: str
+    t_ns: np.ndarray                        # sample times, ns since Unix epoch
+    values: np.ndarray
+    clock_model: Optional[ClockModel] = None  # maps t_ns onto the PC clock, if they are device times
+
+
+@dataclass
+class AlignedStreams:
+    """Several devices' signals on one time grid"""
+    
+    names: List[str]
+    rate_hz: float
+    t_ns: np.ndarray    # grid times on the PC clock
+    values: np.ndarray  # one row per stream; NaN where mask is False
+    mask: np.ndarray    # True where the stream has samples on both sides of the grid time
+    
+    def to_dataframe(self) -> pd.DataFrame:
+        """Streams as columns of a DataFrame indexed by grid time"""
+        return pd.DataFrame(self.values.T, index=pd.to_datetime(self.t_ns, unit='ns'), columns=self.names)
+
+
+class MultiDeviceResampler:
+    """Resample several device streams onto a common time grid.
+    
+    Each device samples at its own real rate on its own drifting clock.
+    Sample times are first moved onto the PC clock with the stream's clock
+    model, when it has one, then every stream is interpolated at the grid
+    times in one vectorized pass. Grid times outside a stream, or within a
+    gap of it, are masked instead of being bridged.
+    """
+    
+    def __init__(self, rate_hz: float, method: str = 'linear',
+                 max_gap_factor: float = DEFAULT_MAX_GAP_FACTOR):
+        if rate_hz <= 0:
+            raise ValueError(f"Target rate must be positive, got {rate_hz}")
+        if method not in RESAMPLING_METHODS:
+            raise ValueError(f"Unknown resampling method {method!r}, expected one of {RESAMPLING_METHODS}")
+        if method == 'antialias' and not SCIPY_AVAILABLE:
+            logger.warning("Anti-aliased resampling requires scipy - using linear interpolation")
+            method = 'linear'
+        
+        self.rate_hz = rate_hz
+        self.method = method
+        self.max_gap_factor = max_gap_factor
+    
+    def grid(self, t_start_ns: int, t_end_ns: int) -> np.ndarray:
+        """Grid times from t_start_ns up to and including t_end_ns"""
+        period_ns = 1e9 / self.rate_hz
+        count = int((t_end_ns - t_start_ns) // period_ns) + 1
+        return t_start_ns + np.rint(np.arange(count) * period_ns).astype(np.int64)
+    
+    def resample(self, streams: List[DeviceStream], t_start_ns: Optional[int] = None,
+                 t_end_ns: Optional[int] = None) -> AlignedStreams:
+        """Interpolate every stream on one grid, by default spanning all of them"""
+        times = [self._server_times(stream) for stream in streams]
+        spans = [(t[0], t[-1]) for t in times if len(t)]
+        if not spans:
+            raise ValueError("No samples to resample")
+        if t_start_ns is None:
+            t_start_ns = int(min(start for start, _ in spans))
+        if t_end_ns is None:
+            t_end_ns = int(max(end for _, end in spans))
+        
+        grid = self.grid(t_start_ns, t_end_ns)
+        values = np.full((len(streams), len(grid)), np.nan)
+        mask = np.zeros((len(streams), len(grid)), dtype=bool)
+        for row, (stream, t) in enumerate(zip(streams, times)):
+            if len(t) < 2:
+                continue
+            samples = np.asarray(stream.values, dtype=np.float64)
+            order = np.argsort(t, kind='stable') if np.any(np.diff(t) < 0) else None
+            if order is not None:
+                t, samples = t[order], samples[order]
+            
+            steps = np.diff(t)
+            max_step = self.max_gap_factor * float(np.median(steps))
+            if self.method == 'antialias':
+                samples = self._low_pass(samples, 1e9 / float(np.median(steps)), np.flatnonzero(steps > max_step))
+            
+            # Grid times count when the samples around them are not a gap apart
+            after = np.clip(np.searchsorted(t, grid, side='left'), 1, len(t) - 1)
+            valid = (grid >= t[0]) & (grid <= t[-1]) & (
+                (t[after] - t[after - 1] <= max_step) | (t[after] == grid))
+            
+            # Relative times keep nanosecond differences exact in float64
+            base = grid[0]
+            row_values = np.interp((grid[valid] - base).astype(np.float64),
+                                   (t - base).astype(np.float64), samples)
+            values[row, valid] = row_values
+            mask[row, valid] = ~np.isnan(row_values)
+        
+        return AlignedStreams([stream.name for stream in streams], self.rate_hz, grid, values, mask)
+    
+    def _server_times(self, stream: DeviceStream) -> np.ndarray:
+        t_ns = np.asarray(stream.t_ns, dtype=np.int64)
+        if stream.clock_model is None:
+            return t_ns
+        return np.asarray(stream.clock_model.to_server_ns(t_ns), dtype=np.int64)
+    
+    def _low_pass(self, samples: np.ndarray, source_rate_hz: float, gap_steps: np.ndarray) -> np.ndarray:
+        """Zero-phase low-pass below the target Nyquist frequency, run by run between gaps"""
+        if self.rate_hz >= source_rate_hz:
+            return samples
+        
+        # 80% of the target Nyquist frequency, as in apply_advanced_filtering
+        sos = butter(4, 0.8 * self.rate_hz / source_rate_hz, btype='low', output='sos')
+        pad = 3 * (2 * len(sos) + 1)
+        filtered = samples.copy()
+        bounds = np.concatenate(([0], gap_steps + 1, [len(samples)]))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop - start > pad:
+                filtered[start:stop] = sosfiltfilt(sos, samples[start:stop])
+        return filtered
+
+
 # Export main classes
 __all__ = [
     "AdvancedGSRAnalyzer", 
     "GSRFeatures", 
     "EmotionClassification", 
-    "ArtifactDetection"
+    "ArtifactDetection",
+    "DeviceStream",
+    "AlignedStreams",
+    "MultiDeviceResampler"
 ]
\ No newline at end of file
@@ -3,6 +3,7 @@ Performance monitoring and optimization for the Bucika GSR PC Orchestrator
 """
 
 import asyncio
+import math
 import time
 import psutil
 import threading
@@ -28,6 +29,58 @@ class PerformanceMetrics:
     error_rate_percent: float
 
 
+class LatencyHistogram:
+    """Latency histogram with logarithmic buckets and constant memory.
+    
+    Buckets are 1/8 of an octave wide starting at 1 microsecond, so a
+    reported percentile is within about 9% of the true value.
+    """
+    
+    BUCKETS_PER_OCTAVE = 8
+    OCTAVES = 27  # 1 us .. ~134 s
+    
+    def __init__(self):
+        self.counts = [0] * (self.BUCKETS_PER_OCTAVE * self.OCTAVES)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds: float):
+        """Record one latency sample"""
+        micros = seconds * 1_000_000
+        index = int(math.log2(micros) * self.BUCKETS_PER_OCTAVE) if micros > 1 else 0
+        self.counts[min(index, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, percent: float) -> float:
+        """Latency in seconds below which the given percentage of samples fall"""
+        if not self.count:
+            return 0.0
+        
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                upper_micros = 2 ** ((index + 1) / self.BUCKETS_PER_OCTAVE)
+                return min(upper_micros / 1_000_000, self.max)
+        return self.max
+    
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and percentiles in milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000
+        }
+
+
 class PerformanceMonitor:
     """Real-time performance monitoring and optimization"""
     
@@ -45,6 +98,9 @@ class PerformanceMonitor:
         self.error_count = 0
         self.last_reset = datetime.now()
         
+        # Per message type handler latencies
+        self.handler_latencies: Dict[str, LatencyHistogram] = {}
+        
         # Process monitoring
         self.process = psutil.Process()
         self.initial_network = psutil.net_io_counters()
@@ -55,8 +111,8 @@ class PerformanceMonitor:
         self.response_time_threshold = 100.0  # ms
         self.error_rate_threshold = 5.0  # %
         
-        # Lock for thread-safe access
-        self._lock = threading.Lock()
+        # Lock for thread-safe access, re-entered by get_performance_summary
+        self._lock = threading.RLock()
     
     async def start(self):
         """Start performance monitoring"""
@@ -176,6 +232,20 @@ class PerformanceMonitor:
             if len(self.response_times) > 1000:
                 self.response_times.pop(0)
     
+    def record_handler_latency(self, name: str, response_time: float, error: bool = False):
+        """Record how long the handler for a message type took"""
+        with self._lock:
+            histogram = self.handler_latencies.get(name)
+            if histogram is None:
+                histogram = self.handler_latencies[name] = LatencyHistogram()
+            histogram.record(response_time)
+            self.record_message(response_time, error)
+    
+    def get_handler_latencies(self) -> Dict[str, Dict[str, float]]:
+        """Get p50/p95/p99/max handler latency per message type"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self.handler_latencies.items()}
+    
     def update_session_count(self, active_sessions: int, connected_devices: int):
         """Update session and device counts"""
         if self.metrics_history:
@@ -191,6 +261,7 @@ class PerformanceMonitor:
             self.message_count = 0
             self.response_times.clear()
             self.error_count = 0
+            self.handler_latencies.clear()
             self.last_reset = datetime.now()
     
     def get_latest_metrics(self) -> Optional[PerformanceMetrics]:
@@ -326,12 +397,18 @@ class PerformanceOptimizer:
 
 
 # Decorators for performance measurement
-def measure_performance(monitor: PerformanceMonitor):
-    """Decorator to measure function performance"""
+def measure_performance(monitor: PerformanceMonitor, name: Optional[str] = None):
+    """Decorator to measure function performance, per name if one is given"""
+    def record(response_time: float, error: bool):
+        if name is None:
+            monitor.record_message(response_time, error)
+        else:
+            monitor.record_handler_latency(name, response_time, error)
+    
     def decorator(func):
         if asyncio.iscoroutinefunction(func):
             async def async_wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = time.perf_counter()
                 error = False
                 try:
                     result = await func(*args, **kwargs)
@@ -340,12 +417,12 @@ def measure_performance(monitor: PerformanceMonitor):
                     error = True
                     raise e
                 finally:
-                    response_time = time.time() - start_time
-                    monitor.record_message(response_time, error)
+                    response_time = time.perf_counter() - start_time
+                    record(response_time, error)
             return async_wrapper
         else:
             def sync_wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = time.perf_counter()
                 error = False
                 try:
                     result = func(*args, **kwargs)
@@ -354,7 +431,7 @@ def measure_performance(monitor: PerformanceMonitor):
                     error = True
                     raise e
                 finally:
-                    response_time = time.time() - start_time
-                    monitor.record_message(response_time, error)
+                    response_time = time.perf_counter() - start_time
+                    record(response_time, error)
             return sync_wrapper
     return decorator
\ No newline at end of file
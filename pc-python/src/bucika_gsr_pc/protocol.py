@@ -4,10 +4,15 @@ Maintains compatibility with the existing Kotlin implementation.
 """
 
 from abc import ABC, abstractmethod
-from enum import Enum
-from typing import Any, Dict, List, Optional, Union
-from pydantic import BaseModel
+from array import array
+from enum import Enum, IntEnum
+from typing import Any, Dict, List, Literal, Optional, Sequence, Union
+from typing_extensions import Annotated, NotRequired, TypedDict
+from pydantic import BaseModel, Field, TypeAdapter, create_model
+import struct
+import sys
 import time
+import zlib
 
 
 class MessageType(str, Enum):
@@ -25,6 +30,8 @@ class MessageType(str, Enum):
     UPLOAD_BEGIN = "UPLOAD_BEGIN"
     UPLOAD_CHUNK = "UPLOAD_CHUNK"
     UPLOAD_END = "UPLOAD_END"
+    UPLOAD_QUERY = "UPLOAD_QUERY"
+    UPLOAD_STATUS = "UPLOAD_STATUS"
 
 
 class MessagePayload(BaseModel, ABC):
@@ -78,6 +85,7 @@ class RegisterPayload(MessagePayload):
     accepted: bool
     reason: Optional[str] = None
     syncPort: int = 9123  # Time sync UDP port
+    capabilities: List[str] = []  # Optional capabilities accepted by the PC
 
 
 class StartPayload(MessagePayload):
@@ -85,12 +93,16 @@ class StartPayload(MessagePayload):
     sessionName: str
     participantId: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    startAtNs: Optional[int] = None  # Scheduled start on the PC clock, ns since Unix epoch
+    deviceStartAtNs: Optional[int] = None  # The same instant on the device clock
 
 
 class SyncMarkPayload(MessagePayload):
     """Synchronization marker"""
     markId: str
     description: Optional[str] = None
+    tMonoNs: Optional[int] = None  # When the event happened on the device's monotonic clock
+    tUtcNs: Optional[int] = None   # The same instant on the device's wall clock, ns since Unix epoch
 
 
 class AckPayload(MessagePayload):
@@ -122,6 +134,32 @@ class GSRSample(BaseModel):
 class GSRSamplePayload(MessagePayload):
     """GSR sample data message"""
     samples: List[GSRSample]
+    
+    def to_batch(self) -> 'GSRSampleBatch':
+        """Convert the samples to a columnar batch"""
+        return GSRSampleBatch.from_samples(self.samples)
+
+
+class GSRSampleRecord(TypedDict):
+    """GSR sample validated as a plain dict instead of a GSRSample model"""
+    t_mono_ns: int
+    t_utc_ns: int
+    seq: int
+    gsr_raw_uS: float
+    gsr_filt_uS: float
+    temp_C: float
+    flag_spike: NotRequired[bool]
+    flag_sat: NotRequired[bool]
+    flag_dropout: NotRequired[bool]
+
+
+class GSRSampleRecordsPayload(MessagePayload):
+    """Fast-lane GSR sample payload used by decode_message"""
+    samples: List[GSRSampleRecord]
+    
+    def to_batch(self) -> 'GSRSampleBatch':
+        """Convert the sample records to a columnar batch"""
+        return GSRSampleBatch.from_records(self.samples)
 
 
 class UploadBeginPayload(MessagePayload):
@@ -130,6 +168,7 @@ class UploadBeginPayload(MessagePayload):
     fileSize: int
     md5Hash: str
     chunkSize: int = 8192
+    uploadId: Optional[int] = None  # Connection-scoped id used by binary chunk frames
 
 
 class UploadChunkPayload(MessagePayload):
@@ -148,6 +187,21 @@ class UploadEndPayload(MessagePayload):
     message: Optional[str] = None
 
 
+class UploadQueryPayload(MessagePayload):
+    """Request for the progress of a (possibly interrupted) upload"""
+    filename: str
+
+
+class UploadStatusPayload(MessagePayload):
+    """Upload progress, listing the chunks that still have to be sent"""
+    filename: str
+    totalChunks: int
+    receivedChunks: int
+    bytesReceived: int
+    missingRanges: List[List[int]]  # Half-open [start, end) chunk index ranges
+    corruptChunks: List[int] = []
+
+
 # Payload type mapping for deserialization
 PAYLOAD_TYPE_MAP = {
     MessageType.HELLO: HelloPayload,
@@ -163,6 +217,8 @@ PAYLOAD_TYPE_MAP = {
     MessageType.UPLOAD_BEGIN: UploadBeginPayload,
     MessageType.UPLOAD_CHUNK: UploadChunkPayload,
     MessageType.UPLOAD_END: UploadEndPayload,
+    MessageType.UPLOAD_QUERY: UploadQueryPayload,
+    MessageType.UPLOAD_STATUS: UploadStatusPayload,
 }
 
 
@@ -172,4 +228,312 @@ def parse_message_payload(envelope: MessageEnvelope) -> MessagePayload:
     if not payload_class:
         raise ValueError(f"Unknown message type: {envelope.type}")
     
-    return payload_class(**envelope.payload)
\ No newline at end of file
+    return payload_class(**envelope.payload)
+
+# Optional capabilities negotiated through HelloPayload.capabilities.
+# The PC echoes the subset it accepts in RegisterPayload.capabilities.
+CAPABILITY_GSR_BINARY = "GSR_BINARY_V1"
+CAPABILITY_UPLOAD_BINARY = "UPLOAD_BINARY_V1"
+
+SERVER_CAPABILITIES = [CAPABILITY_GSR_BINARY, CAPABILITY_UPLOAD_BINARY]
+
+
+class BinaryFrameType(IntEnum):
+    """Frame types carried in binary WebSocket frames"""
+    GSR_BATCH = 1
+    UPLOAD_CHUNK = 2
+
+
+# Every binary frame starts with: magic (2 bytes), frame type (u8), version (u8)
+BINARY_FRAME_MAGIC = b"BG"
+BINARY_FRAME_VERSION = 1
+BINARY_FRAME_HEADER = struct.Struct("<2sBB")
+
+# GSR batch body: sample count (u32) followed by little-endian columns
+# t_mono_ns[i64], t_utc_ns[i64], seq[i64], raw[f64], filt[f64], temp[f64], flags[u8]
+_GSR_BATCH_COUNT = struct.Struct("<I")
+_GSR_BATCH_COLUMNS = (
+    ("t_mono_ns", "q"),
+    ("t_utc_ns", "q"),
+    ("seq", "q"),
+    ("gsr_raw_uS", "d"),
+    ("gsr_filt_uS", "d"),
+    ("temp_C", "d"),
+    ("flags", "B"),
+)
+GSR_BATCH_BYTES_PER_SAMPLE = sum(array(code).itemsize for _, code in _GSR_BATCH_COLUMNS)
+
+# Upload chunk body: upload id (u32), chunk index (u32), CRC-32 of the data (u32),
+# flags (u8), followed by the raw chunk bytes
+_UPLOAD_CHUNK_HEADER = struct.Struct("<IIIB")
+UPLOAD_CHUNK_FLAG_LAST = 0x01
+
+# Bits of the per-sample flags column
+GSR_FLAG_SPIKE = 0x01
+GSR_FLAG_SAT = 0x02
+GSR_FLAG_DROPOUT = 0x04
+
+
+def encode_binary_frame_header(frame_type: BinaryFrameType) -> bytes:
+    """Encode the common header of a binary WebSocket frame"""
+    return BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, frame_type, BINARY_FRAME_VERSION)
+
+
+def parse_binary_frame_header(data: bytes) -> BinaryFrameType:
+    """Validate the common header of a binary frame and return its type"""
+    if len(data) < BINARY_FRAME_HEADER.size:
+        raise ValueError(f"Binary frame too short: {len(data)} bytes")
+    
+    magic, frame_type, version = BINARY_FRAME_HEADER.unpack_from(data)
+    if magic != BINARY_FRAME_MAGIC:
+        raise ValueError(f"Invalid binary frame magic: {magic!r}")
+    if version != BINARY_FRAME_VERSION:
+        raise ValueError(f"Unsupported binary frame version: {version}")
+    
+    try:
+        return BinaryFrameType(frame_type)
+    except ValueError:
+        raise ValueError(f"Unknown binary frame type: {frame_type}")
+
+
+class GSRSampleBatch:
+    """Columnar batch of GSR samples, the binary counterpart of GSRSamplePayload"""
+    
+    __slots__ = tuple(name for name, _ in _GSR_BATCH_COLUMNS)
+    
+    def __init__(self, t_mono_ns: Sequence[int], t_utc_ns: Sequence[int], seq: Sequence[int],
+                 gsr_raw_uS: Sequence[float], gsr_filt_uS: Sequence[float],
+                 temp_C: Sequence[float], flags: Sequence[int]):
+        columns = (t_mono_ns, t_utc_ns, seq, gsr_raw_uS, gsr_filt_uS, temp_C, flags)
+        if len({len(column) for column in columns}) > 1:
+            raise ValueError("All GSR batch columns must have the same length")
+        
+        self.t_mono_ns = t_mono_ns
+        self.t_utc_ns = t_utc_ns
+        self.seq = seq
+        self.gsr_raw_uS = gsr_raw_uS
+        self.gsr_filt_uS = gsr_filt_uS
+        self.temp_C = temp_C
+        self.flags = flags
+    
+    def __len__(self) -> int:
+        return len(self.seq)
+    
+    @classmethod
+    def from_samples(cls, samples: List[GSRSample]) -> 'GSRSampleBatch':
+        """Build a columnar batch from GSRSample objects"""
+        return cls(
+            t_mono_ns=array("q", (s.t_mono_ns for s in samples)),
+            t_utc_ns=array("q", (s.t_utc_ns for s in samples)),
+            seq=array("q", (s.seq for s in samples)),
+            gsr_raw_uS=array("d", (s.gsr_raw_uS for s in samples)),
+            gsr_filt_uS=array("d", (s.gsr_filt_uS for s in samples)),
+            temp_C=array("d", (s.temp_C for s in samples)),
+            flags=array("B", (
+                (GSR_FLAG_SPIKE if s.flag_spike else 0)
+                | (GSR_FLAG_SAT if s.flag_sat else 0)
+                | (GSR_FLAG_DROPOUT if s.flag_dropout else 0)
+                for s in samples
+            ))
+        )
+    
+    @classmethod
+    def from_records(cls, records: List[GSRSampleRecord]) -> 'GSRSampleBatch':
+        """Build a columnar batch from validated sample dicts"""
+        return cls(
+            t_mono_ns=array("q", [r["t_mono_ns"] for r in records]),
+            t_utc_ns=array("q", [r["t_utc_ns"] for r in records]),
+            seq=array("q", [r["seq"] for r in records]),
+            gsr_raw_uS=array("d", [r["gsr_raw_uS"] for r in records]),
+            gsr_filt_uS=array("d", [r["gsr_filt_uS"] for r in records]),
+            temp_C=array("d", [r["temp_C"] for r in records]),
+            flags=array("B", [
+                (GSR_FLAG_SPIKE if r.get("flag_spike") else 0)
+                | (GSR_FLAG_SAT if r.get("flag_sat") else 0)
+                | (GSR_FLAG_DROPOUT if r.get("flag_dropout") else 0)
+                for r in records
+            ])
+        )
+    
+    def to_samples(self) -> List[GSRSample]:
+        """Materialize GSRSample objects without re-running pydantic validation"""
+        construct = GSRSample.model_construct
+        return [
+            construct(
+                t_mono_ns=t_mono, t_utc_ns=t_utc, seq=seq,
+                gsr_raw_uS=raw, gsr_filt_uS=filt, temp_C=temp,
+                flag_spike=bool(flags & GSR_FLAG_SPIKE),
+                flag_sat=bool(flags & GSR_FLAG_SAT),
+                flag_dropout=bool(flags & GSR_FLAG_DROPOUT)
+            )
+            for t_mono, t_utc, seq, raw, filt, temp, flags in zip(
+                self.t_mono_ns, self.t_utc_ns, self.seq,
+                self.gsr_raw_uS, self.gsr_filt_uS, self.temp_C, self.flags
+            )
+        ]
+    
+    def encode(self) -> bytes:
+        """Encode the batch as a binary WebSocket frame"""
+        parts = [
+            encode_binary_frame_header(BinaryFrameType.GSR_BATCH),
+            _GSR_BATCH_COUNT.pack(len(self))
+        ]
+        for name, typecode in _GSR_BATCH_COLUMNS:
+            column = array(typecode, getattr(self, name))
+            if sys.byteorder == "big":
+                column.byteswap()
+            parts.append(column.tobytes())
+        return b"".join(parts)
+    
+    @classmethod
+    def decode(cls, data: bytes) -> 'GSRSampleBatch':
+        """Decode a binary GSR batch frame into columns"""
+        frame_type = parse_binary_frame_header(data)
+        if frame_type != BinaryFrameType.GSR_BATCH:
+            raise ValueError(f"Not a GSR batch frame: {frame_type.name}")
+        
+        offset = BINARY_FRAME_HEADER.size
+        if len(data) < offset + _GSR_BATCH_COUNT.size:
+            raise ValueError("GSR batch frame is missing its sample count")
+        (count,) = _GSR_BATCH_COUNT.unpack_from(data, offset)
+        offset += _GSR_BATCH_COUNT.size
+        
+        expected_size = offset + count * GSR_BATCH_BYTES_PER_SAMPLE
+        if len(data) != expected_size:
+            raise ValueError(f"GSR batch size mismatch: expected {expected_size} bytes, got {len(data)}")
+        
+        view = memoryview(data)
+        columns = {}
+        for name, typecode in _GSR_BATCH_COLUMNS:
+            column = array(typecode)
+            end = offset + count * column.itemsize
+            column.frombytes(view[offset:end])
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns[name] = column
+            offset = end
+        
+        return cls(**columns)
+
+
+
+# Single-pass decoding: every message type gets an envelope class whose payload
+# field is the concrete payload model, and the envelopes form a union keyed on
+# "type". pydantic-core then validates raw JSON bytes into the typed envelope in
+# one pass, without the intermediate dict and the second payload validation
+# done by MessageEnvelope + parse_message_payload.
+class TypedMessageEnvelope(BaseModel):
+    """Base class for envelopes validated together with their payload"""
+    id: str
+    type: MessageType
+    ts: int  # nanoseconds since Unix epoch
+    sessionId: Optional[str] = None
+    deviceId: str
+    payload: MessagePayload
+
+
+# GSR_SAMPLE takes the fast lane: samples are validated as dicts, not models
+TYPED_PAYLOAD_TYPE_MAP = {
+    **PAYLOAD_TYPE_MAP,
+    MessageType.GSR_SAMPLE: GSRSampleRecordsPayload,
+}
+
+
+def _create_typed_envelope(msg_type: Union[MessageType, str], payload_class: type) -> type:
+    """Create the envelope class for a single message type"""
+    type_name = msg_type.value if isinstance(msg_type, MessageType) else msg_type
+    class_name = "".join(part.title() for part in type_name.split("_")) + "Envelope"
+    return create_model(
+        class_name,
+        __base__=TypedMessageEnvelope,
+        type=(Literal[msg_type], ...),
+        payload=(payload_class, ...)
+    )
+
+
+TYPED_ENVELOPE_MAP = {
+    msg_type: _create_typed_envelope(msg_type, payload_class)
+    for msg_type, payload_class in TYPED_PAYLOAD_TYPE_MAP.items()
+}
+
+def _build_envelope_adapter() -> TypeAdapter:
+    return TypeAdapter(
+        Annotated[Union[tuple(TYPED_ENVELOPE_MAP.values())], Field(discriminator="type")]
+    )
+
+
+_TYPED_ENVELOPE_ADAPTER = _build_envelope_adapter()
+
+
+def register_message_type(type_name: str, payload_class: type) -> type:
+    """Add a message type outside MessageType, so plugins can define their own.
+    
+    The envelope's type field is the plain string; registering a name again
+    replaces its payload model. Returns the typed envelope class.
+    """
+    global _TYPED_ENVELOPE_ADAPTER
+    if type_name in {msg_type.value for msg_type in MessageType}:
+        raise ValueError(f"Message type {type_name} is built in")
+    if not issubclass(payload_class, BaseModel):
+        raise TypeError(f"Payload model for {type_name} must be a pydantic model")
+    
+    TYPED_ENVELOPE_MAP[type_name] = _create_typed_envelope(type_name, payload_class)
+    _TYPED_ENVELOPE_ADAPTER = _build_envelope_adapter()
+    return TYPED_ENVELOPE_MAP[type_name]
+
+
+def decode_message(data: Union[str, bytes]) -> TypedMessageEnvelope:
+    """Validate a JSON message straight into its typed envelope.
+    
+    Raises pydantic.ValidationError for malformed JSON, unknown message
+    types and invalid payloads.
+    """
+    return _TYPED_ENVELOPE_ADAPTER.validate_json(data)
+
+
+
+class UploadChunkFrame:
+    """Binary counterpart of UploadChunkPayload carrying raw chunk bytes"""
+    
+    __slots__ = ("upload_id", "chunk_index", "crc32", "is_last", "data")
+    
+    def __init__(self, upload_id: int, chunk_index: int, data: Union[bytes, memoryview],
+                 is_last: bool = False, crc32: Optional[int] = None):
+        self.upload_id = upload_id
+        self.chunk_index = chunk_index
+        self.data = data
+        self.is_last = is_last
+        self.crc32 = zlib.crc32(data) if crc32 is None else crc32
+    
+    def verify(self) -> bool:
+        """Check the chunk data against its CRC-32"""
+        return zlib.crc32(self.data) == self.crc32
+    
+    def encode(self) -> bytes:
+        """Encode the chunk as a binary WebSocket frame"""
+        header = _UPLOAD_CHUNK_HEADER.pack(
+            self.upload_id, self.chunk_index, self.crc32,
+            UPLOAD_CHUNK_FLAG_LAST if self.is_last else 0
+        )
+        return b"".join((encode_binary_frame_header(BinaryFrameType.UPLOAD_CHUNK), header, self.data))
+    
+    @classmethod
+    def decode(cls, data: bytes) -> 'UploadChunkFrame':
+        """Decode a binary upload chunk frame; the data is a view into the frame"""
+        frame_type = parse_binary_frame_header(data)
+        if frame_type != BinaryFrameType.UPLOAD_CHUNK:
+            raise ValueError(f"Not an upload chunk frame: {frame_type.name}")
+        
+        offset = BINARY_FRAME_HEADER.size
+        if len(data) < offset + _UPLOAD_CHUNK_HEADER.size:
+            raise ValueError("Upload chunk frame header is truncated")
+        upload_id, chunk_index, crc32, flags = _UPLOAD_CHUNK_HEADER.unpack_from(data, offset)
+        offset += _UPLOAD_CHUNK_HEADER.size
+        
+        return cls(
+            upload_id=upload_id,
+            chunk_index=chunk_index,
+            data=memoryview(data)[offset:],
+            is_last=bool(flags & UPLOAD_CHUNK_FLAG_LAST),
+            crc32=crc32
+        )
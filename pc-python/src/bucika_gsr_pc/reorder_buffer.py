@@ -0,0 +1,259 @@
+"""
+Per-device reorder window for GSR samples, keyed on the sample sequence number.
+
+Reconnects and retransmits deliver samples late, twice or out of order.
+Each session passes its batches through a SeqReorderBuffer, which holds
+samples until the ones before them arrive and releases them in sequence
+order, so the data files and the in-memory window never need sorting or
+deduplicating downstream.
+
+A missing sequence number is given up on once a sample ``window`` numbers
+past it has arrived; the missing run is recorded as a SequenceGap with the
+times of the samples either side of it. Samples that arrive after their
+place has been released are dropped: a retransmit of a released sample
+counts as a duplicate, one that falls in a recorded gap counts as late.
+
+The Android client restarts its sequence numbers at 0 when it reconnects.
+A batch behind the next expected sequence number whose samples are newer
+than any released or held starts a new epoch, however few samples came
+before the restart: the held samples
+are flushed, numbering restarts from the batch and the jump is recorded as
+a SequenceReset. Retransmits from before the restart carry older times and
+are dropped as duplicates.
+"""
+
+from bisect import bisect_right
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from .protocol import GSRSampleBatch
+from .sample_store import DEFAULT_SAMPLE_RATE_HZ, GSR_STORE_FIELDS
+
+
+DEFAULT_REORDER_WINDOW = 2 * DEFAULT_SAMPLE_RATE_HZ  # sequence numbers, about two seconds
+
+
+@dataclass
+class SequenceGap:
+    """Run of sequence numbers that never arrived"""
+    first_seq: int
+    last_seq: int
+    t_before_ns: Optional[int]  # t_utc_ns of the samples either side of the gap
+    t_after_ns: int
+    
+    @property
+    def missing(self) -> int:
+        return self.last_seq - self.first_seq + 1
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class SequenceReset:
+    """Restart of the sequence numbers, such as after a device reconnect"""
+    last_seq: int   # last sequence number released before the restart
+    first_seq: int  # first sequence number after it
+    t_before_ns: Optional[int]  # t_utc_ns of the samples either side of the restart
+    t_after_ns: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SeqReorderBuffer:
+    """Releases one device's samples in sequence order, without duplicates"""
+    
+    def __init__(self, window: int = DEFAULT_REORDER_WINDOW):
+        if window < 0:
+            raise ValueError("Reorder window must not be negative")
+        self.window = window
+        
+        self.next_seq: Optional[int] = None  # first sequence number not yet released
+        self.last_t_utc_ns: Optional[int] = None
+        self._pending = self._empty()  # held samples, sorted by seq, unique
+        
+        # Accounting
+        self.gaps: List[SequenceGap] = []
+        self.resets: List[SequenceReset] = []
+        self._epoch_gaps = 0  # gaps recorded before the last reset
+        self.duplicates = 0
+        self.late = 0
+        self.released = 0
+    
+    def __len__(self) -> int:
+        """Samples held back waiting for earlier sequence numbers"""
+        return len(self._pending["seq"])
+    
+    @property
+    def missing(self) -> int:
+        """Sequence numbers recorded as gaps"""
+        return sum(gap.missing for gap in self.gaps)
+    
+    def push(self, batch: GSRSampleBatch) -> GSRSampleBatch:
+        """Add a batch as received; returns the samples now ready, in order"""
+        if not len(batch):
+            return self._batch(self._empty())
+        
+        seq = np.asarray(batch.seq, dtype=np.int64)
+        if self.next_seq is None:
+            self.next_seq = int(seq.min())
+        elif self._is_reset(int(seq[0]), int(batch.t_utc_ns[0])):
+            return self._reset(batch)
+        
+        # Fast path: nothing held back and the batch continues the sequence
+        if (not len(self) and int(seq[0]) == self.next_seq
+                and (len(seq) == 1 or bool(np.all(np.diff(seq) == 1)))):
+            self._advance(int(seq[-1]), int(batch.t_utc_ns[-1]), len(seq))
+            return batch
+        
+        columns = {name: np.concatenate([self._pending[name], np.asarray(getattr(batch, name), dtype=dtype)])
+                   for name, dtype in GSR_STORE_FIELDS}
+        columns = self._drop_stale(columns)
+        
+        # Sort by seq, keeping the first arrival of each sequence number
+        order = np.argsort(columns["seq"], kind="stable")
+        columns = {name: values[order] for name, values in columns.items()}
+        unique_seq, first = np.unique(columns["seq"], return_index=True)
+        self.duplicates += len(columns["seq"]) - len(unique_seq)
+        if len(first) != len(columns["seq"]):
+            columns = {name: values[first] for name, values in columns.items()}
+        
+        if not len(unique_seq):
+            self._pending = columns
+            return self._batch(self._empty())
+        
+        # Give up on sequence numbers a full window behind the newest arrival,
+        # then release the contiguous run that follows
+        horizon = int(unique_seq[-1]) - self.window
+        cut = int(np.searchsorted(unique_seq, horizon, side="right"))
+        expected = int(unique_seq[cut - 1]) + 1 if cut else self.next_seq
+        rest = unique_seq[cut:] - np.arange(expected, expected + len(unique_seq) - cut)
+        run = int(np.argmax(rest != 0)) if np.any(rest != 0) else len(rest)
+        return self._release(columns, cut + run)
+    
+    def held(self) -> GSRSampleBatch:
+        """The samples held back, without releasing them"""
+        return self._batch(dict(self._pending))
+    
+    def state(self) -> Dict[str, Any]:
+        """Position and accounting, for journal checkpoints; held samples are kept apart"""
+        return {
+            "next_seq": self.next_seq,
+            "last_t_utc_ns": self.last_t_utc_ns,
+            "released": self.released,
+            "sequence_gaps": self.gap_intervals(),
+            "sequence_resets": self.reset_points(),
+            "epoch_gaps": self._epoch_gaps,
+            "duplicate_samples": self.duplicates,
+            "late_samples": self.late
+        }
+    
+    @classmethod
+    def restore(cls, window: int, state: Dict[str, Any], held: GSRSampleBatch) -> "SeqReorderBuffer":
+        """Rebuild a buffer from a checkpointed state and its held samples"""
+        buffer = cls(window)
+        buffer.next_seq = state["next_seq"]
+        buffer.last_t_utc_ns = state["last_t_utc_ns"]
+        buffer.released = state["released"]
+        buffer.gaps = [SequenceGap(**gap) for gap in state["sequence_gaps"]]
+        buffer.resets = [SequenceReset(**reset) for reset in state.get("sequence_resets", [])]
+        buffer._epoch_gaps = state.get("epoch_gaps", 0)
+        buffer.duplicates = state["duplicate_samples"]
+        buffer.late = state["late_samples"]
+        buffer._pending = {name: np.asarray(getattr(held, name), dtype=dtype)
+                           for name, dtype in GSR_STORE_FIELDS}
+        return buffer
+    
+    def flush(self) -> GSRSampleBatch:
+        """Release every held sample, recording what is still missing as gaps"""
+        return self._release(self._pending, len(self))
+    
+    def gap_intervals(self) -> List[Dict[str, Any]]:
+        """Recorded gaps as dicts, for session snapshots and downstream tools"""
+        return [gap.to_dict() for gap in self.gaps]
+    
+    def reset_points(self) -> List[Dict[str, Any]]:
+        """Recorded sequence resets as dicts, for session snapshots and downstream tools"""
+        return [reset.to_dict() for reset in self.resets]
+    
+    def _is_reset(self, first_seq: int, first_t_utc_ns: int) -> bool:
+        """Whether a batch starts a new epoch rather than retransmitting old samples"""
+        if first_seq >= self.next_seq:
+            return False
+        times = [int(t) for t in self._pending["t_utc_ns"][-1:]]
+        if self.last_t_utc_ns is not None:
+            times.append(self.last_t_utc_ns)
+        return not times or first_t_utc_ns > max(times)
+    
+    def _reset(self, batch: GSRSampleBatch) -> GSRSampleBatch:
+        """Release everything held, then restart numbering from the batch"""
+        earlier = self.flush()
+        first_seq = int(np.min(batch.seq))
+        self.resets.append(SequenceReset(self.next_seq - 1, first_seq, self.last_t_utc_ns,
+                                         int(batch.t_utc_ns[0])))
+        self.next_seq = first_seq
+        self._epoch_gaps = len(self.gaps)
+        later = self.push(batch)
+        if not len(earlier):
+            return later
+        return self._batch({name: np.concatenate([np.asarray(getattr(earlier, name), dtype=dtype),
+                                                  np.asarray(getattr(later, name), dtype=dtype)])
+                            for name, dtype in GSR_STORE_FIELDS})
+    
+    def _release(self, columns: Dict[str, np.ndarray], count: int) -> GSRSampleBatch:
+        released = {name: values[:count] for name, values in columns.items()}
+        self._pending = {name: values[count:] for name, values in columns.items()}
+        if not count:
+            return self._batch(released)
+        
+        seq = released["seq"]
+        t_utc_ns = released["t_utc_ns"]
+        previous = np.concatenate([[self.next_seq - 1], seq[:-1]])
+        for index in np.flatnonzero(seq - previous > 1):
+            t_before_ns = int(t_utc_ns[index - 1]) if index else self.last_t_utc_ns
+            self.gaps.append(SequenceGap(int(previous[index]) + 1, int(seq[index]) - 1,
+                                         t_before_ns, int(t_utc_ns[index])))
+        
+        self._advance(int(seq[-1]), int(t_utc_ns[-1]), count)
+        return self._batch(released)
+    
+    def _advance(self, last_seq: int, last_t_utc_ns: int, count: int):
+        self.next_seq = last_seq + 1
+        self.last_t_utc_ns = last_t_utc_ns
+        self.released += count
+    
+    def _drop_stale(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Drop samples whose place has already been released"""
+        stale = columns["seq"] < self.next_seq
+        if self.resets:
+            # Numbered in an earlier epoch, though perhaps above the current sequence
+            earlier = columns["t_utc_ns"] < self.resets[-1].t_after_ns
+            self.duplicates += int(np.count_nonzero(earlier))
+            stale &= ~earlier
+            if earlier.any():
+                columns = {name: values[~earlier] for name, values in columns.items()}
+                stale = stale[~earlier]
+        if not stale.any():
+            return columns
+        
+        # Only gaps since the last reset are in sequence order
+        gaps = self.gaps[self._epoch_gaps:]
+        gap_starts = [gap.first_seq for gap in gaps]
+        for seq in columns["seq"][stale].tolist():
+            index = bisect_right(gap_starts, seq) - 1
+            if index >= 0 and seq <= gaps[index].last_seq:
+                self.late += 1
+            else:
+                self.duplicates += 1
+        keep = ~stale
+        return {name: values[keep] for name, values in columns.items()}
+    
+    @staticmethod
+    def _empty() -> Dict[str, np.ndarray]:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in GSR_STORE_FIELDS}
+    
+    @staticmethod
+    def _batch(columns: Dict[str, np.ndarray]) -> GSRSampleBatch:
+        return GSRSampleBatch(**columns)
@@ -30,6 +30,10 @@ try:
 except ImportError:
     SCIPY_AVAILABLE = False
 
+from .session_catalog import SessionCatalog
+from .session_file import read_gsr_dataframe
+from .session_segments import gsr_segment_files, read_segments_dataframe, read_segments_range
+
 
 @dataclass
 class ResearchSession:
@@ -107,7 +111,7 @@ class SessionExporter:
         output_file = output_dir / f"{session_id}_data_{timestamp}.csv"
         
         # Find GSR data files
-        gsr_files = list(session_path.glob("gsr_data_*.csv"))
+        gsr_files = gsr_segment_files(session_path, prefer_binary=ANALYSIS_AVAILABLE)
         
         if not gsr_files:
             raise ValueError(f"No GSR data found for session {session_id}")
@@ -117,7 +121,7 @@ class SessionExporter:
         for gsr_file in gsr_files:
             try:
                 if ANALYSIS_AVAILABLE:
-                    df = pd.read_csv(gsr_file)
+                    df = read_gsr_dataframe(gsr_file)
                     combined_data.append(df)
                 else:
                     # Fallback without pandas
@@ -162,11 +166,11 @@ class SessionExporter:
         }
         
         # Load GSR data
-        gsr_files = list(session_path.glob("gsr_data_*.csv"))
+        gsr_files = gsr_segment_files(session_path, prefer_binary=ANALYSIS_AVAILABLE)
         for gsr_file in gsr_files:
             try:
                 if ANALYSIS_AVAILABLE:
-                    df = pd.read_csv(gsr_file)
+                    df = read_gsr_dataframe(gsr_file)
                     session_data["gsr_data"].extend(df.to_dict('records'))
                 else:
                     with open(gsr_file, 'r') as f:
@@ -294,7 +298,7 @@ class SessionExporter:
         }
         
         # Scan for data files
-        gsr_files = list(session_path.glob("gsr_data_*.csv"))
+        gsr_files = gsr_segment_files(session_path, prefer_binary=ANALYSIS_AVAILABLE)
         summary["data_files_found"] = [str(f.name) for f in gsr_files]
         
         if not gsr_files or not ANALYSIS_AVAILABLE:
@@ -303,13 +307,8 @@ class SessionExporter:
         
         try:
             # Load and analyze GSR data
-            all_data = []
-            for gsr_file in gsr_files:
-                df = pd.read_csv(gsr_file)
-                all_data.append(df)
-            
-            if all_data:
-                combined_df = pd.concat(all_data, ignore_index=True)
+            combined_df = read_segments_dataframe(gsr_files)
+            if len(combined_df):
                 
                 # Basic statistics
                 if 'GSR_Value' in combined_df.columns:
@@ -486,11 +485,17 @@ Event synchronization markers for experimental coordination.
 
 | Column | Type | Description |
 |--------|------|-------------|
-| timestamp | float | Event timestamp (Unix seconds) |
-| datetime | string | Human-readable event time |
-| mark_id | string | Unique marker identifier |
-| description | string | Event description |
-| session_id | string | Associated session |
+| Mark_ID | string | Unique marker identifier |
+| Timestamp_ns | integer | When the PC processed the mark (ns since Unix epoch) |
+| DateTime_UTC | string | Human-readable processing time |
+| Description | string | Event description |
+| Session_ID | string | Associated session |
+| Monotonic_ns | integer | Processing time on the PC monotonic clock |
+| Device_Timestamp_ns | integer | Event time on the device clock (if reported) |
+| Device_Monotonic_ns | integer | Event time on the device monotonic clock (if reported) |
+| Envelope_ns | integer | Device clock time the mark was sent |
+| Corrected_ns | integer | Event time mapped onto the PC clock with the device clock model |
+| Residual_ns | integer | Bound on the error of Corrected_ns, when a clock model is available |
 
 ### session_metadata.json
 Session configuration and device information.
@@ -557,16 +562,11 @@ This data format supports:
         
         try:
             # Load GSR data
-            gsr_files = list(session_path.glob("gsr_data_*.csv"))
+            gsr_files = gsr_segment_files(session_path, prefer_binary=ANALYSIS_AVAILABLE)
             if not gsr_files:
                 return
             
-            all_data = []
-            for gsr_file in gsr_files:
-                df = pd.read_csv(gsr_file)
-                all_data.append(df)
-            
-            combined_df = pd.concat(all_data, ignore_index=True)
+            combined_df = read_segments_dataframe(gsr_files)
             
             # Determine GSR column
             if 'GSR_Value' in combined_df.columns:
@@ -697,8 +697,13 @@ This data format supports:
 class MultiSessionAnalyzer:
     """Advanced multi-session research analysis"""
     
-    def __init__(self, data_directory: Path):
+    def __init__(self, data_directory: Path, catalog: Optional[SessionCatalog] = None):
         self.data_directory = Path(data_directory)
+        self.catalog = catalog or SessionCatalog.open(self.data_directory)
+    
+    async def analyze_participant(self, participant_id: str) -> ResearchReport:
+        """Perform cross-session analysis of every cataloged session of a participant"""
+        return await self.analyze_multiple_sessions(self.catalog.session_ids(participant_id=participant_id))
     
     async def analyze_multiple_sessions(self, session_ids: List[str]) -> ResearchReport:
         """Perform cross-session analysis for research"""
@@ -737,36 +742,70 @@ class MultiSessionAnalyzer:
         
         return report
     
+    async def align_sessions(self, session_ids: List[str], rate_hz: float, column: str = "gsr_filt_uS",
+                             method: str = 'antialias') -> 'AlignedStreams':
+        """Resample one signal of several sessions, such as a group's devices, onto a common grid.
+        
+        Sessions stored on their device's clock are moved onto the PC clock
+        with the clock model kept in their metadata.
+        """
+        from .clock_estimator import ClockModel
+        from .ml_analysis import AlignedStreams, DeviceStream, MultiDeviceResampler
+        
+        def load(session_id: str) -> DeviceStream:
+            session_path = self.data_directory / session_id
+            metadata = {}
+            metadata_file = session_path / "session_metadata.json"
+            if metadata_file.exists():
+                with open(metadata_file, 'r') as f:
+                    metadata = json.load(f)
+            
+            files = gsr_segment_files(session_path)
+            data = read_segments_range(files, np.iinfo(np.int64).min, np.iinfo(np.int64).max,
+                                       ["t_utc_ns", column])
+            t_ns = data["t_utc_ns"]
+            clock_model = ClockModel.from_dict(metadata["clock_model"]) if metadata.get("clock_model") else None
+            if clock_model is not None and metadata.get("clock_corrected"):
+                # Samples stored before the model existed still carry device times
+                raw = metadata.get("clock_corrected_from_sample") or 0
+                if raw:
+                    t_ns = np.concatenate([clock_model.to_server_ns(t_ns[:raw]), t_ns[raw:]])
+                clock_model = None
+            return DeviceStream(session_id, t_ns, data[column], clock_model)
+        
+        streams = await asyncio.gather(*(asyncio.to_thread(load, session_id) for session_id in session_ids))
+        return MultiDeviceResampler(rate_hz, method).resample(list(streams))
+    
     async def _analyze_single_session(self, session_id: str) -> Optional[ResearchSession]:
         """Analyze a single session for multi-session report"""
         
         session_path = self.data_directory / session_id
-        if not session_path.exists():
+        entry = self.catalog.get(session_id)
+        if entry is None and not session_path.exists():
             logger.warning(f"Session path not found: {session_path}")
             return None
         
         try:
-            # Load session metadata
-            metadata_file = session_path / "session_metadata.json"
+            # Load session metadata, from the catalog when the session is in it
             metadata = {}
-            if metadata_file.exists():
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
+            if entry is not None:
+                metadata = {key: value for key, value in entry.items() if value is not None}
+                gsr_files = self.catalog.gsr_files(session_id, prefer_binary=ANALYSIS_AVAILABLE)
+            else:
+                metadata_file = session_path / "session_metadata.json"
+                if metadata_file.exists():
+                    with open(metadata_file, 'r') as f:
+                        metadata = json.load(f)
+                gsr_files = gsr_segment_files(session_path, prefer_binary=ANALYSIS_AVAILABLE)
             
             # Load GSR data for basic analysis
-            gsr_files = list(session_path.glob("gsr_data_*.csv"))
             gsr_samples = 0
             duration_minutes = 0.0
             quality_score = 0.0
             
             if gsr_files and ANALYSIS_AVAILABLE:
-                all_data = []
-                for gsr_file in gsr_files:
-                    df = pd.read_csv(gsr_file)
-                    all_data.append(df)
-                
-                if all_data:
-                    combined_df = pd.concat(all_data, ignore_index=True)
+                combined_df = read_segments_dataframe(gsr_files)
+                if len(combined_df):
                     gsr_samples = len(combined_df)
                     
                     if 'Timestamp' in combined_df.columns:
@@ -0,0 +1,153 @@
+"""
+Bounded in-memory store for a session's recent GSR samples.
+
+Samples are kept in one NumPy array per field, used as a ring buffer that
+holds only the retention window needed for live views. Older samples are
+overwritten; the complete recording is in the session's CSV file on disk.
+
+Memory is 49 bytes per retained sample (six 8-byte fields plus one flag
+byte), so at 128 Hz one device-hour of retention takes about 21.5 MiB. The
+default ten-minute window caps a device at about 3.6 MiB however long the
+session runs, where a list of GSRSample objects grows by several hundred
+bytes per sample for the life of the process.
+"""
+
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+from .protocol import GSRSample, GSRSampleBatch
+
+
+DEFAULT_SAMPLE_RATE_HZ = 128
+DEFAULT_RETENTION_SECONDS = 600
+
+GSR_STORE_FIELDS = (
+    ("t_mono_ns", np.int64),
+    ("t_utc_ns", np.int64),
+    ("seq", np.int64),
+    ("gsr_raw_uS", np.float64),
+    ("gsr_filt_uS", np.float64),
+    ("temp_C", np.float64),
+    ("flags", np.uint8),
+)
+
+BYTES_PER_SAMPLE = sum(np.dtype(dtype).itemsize for _, dtype in GSR_STORE_FIELDS)
+
+# Arrays start small and double up to the retention capacity
+_INITIAL_CAPACITY = 4096
+
+
+def bytes_per_device_hour(sample_rate_hz: float = DEFAULT_SAMPLE_RATE_HZ) -> int:
+    """Memory needed to retain one hour of samples from one device"""
+    return int(sample_rate_hz * 3600) * BYTES_PER_SAMPLE
+
+
+class GSRSampleStore:
+    """Columnar ring buffer of the most recent samples of one session"""
+    
+    def __init__(self, retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+                 sample_rate_hz: float = DEFAULT_SAMPLE_RATE_HZ):
+        self.capacity = max(1, int(retention_seconds * sample_rate_hz))
+        self.retention_seconds = retention_seconds
+        self.sample_rate_hz = sample_rate_hz
+        
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.empty(min(self.capacity, _INITIAL_CAPACITY), dtype=dtype)
+            for name, dtype in GSR_STORE_FIELDS
+        }
+        self._head = 0  # next write position
+        self._size = 0
+        
+        # Every sample ever appended, including those no longer retained
+        self.total_samples = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays"""
+        return sum(column.nbytes for column in self._columns.values())
+    
+    @property
+    def evicted_samples(self) -> int:
+        """Samples dropped from memory; they are only available on disk"""
+        return self.total_samples - self._size
+    
+    def append(self, batch: GSRSampleBatch):
+        """Add a batch, overwriting the oldest samples once the store is full"""
+        count = len(batch)
+        if not count:
+            return
+        self.total_samples += count
+        
+        # Only the newest `capacity` samples of an oversized batch can be kept
+        skip = max(0, count - self.capacity)
+        count -= skip
+        self._reserve(self._size + count)
+        
+        allocated = len(self._columns["seq"])
+        first = min(count, allocated - self._head)
+        for name, dtype in GSR_STORE_FIELDS:
+            values = np.asarray(getattr(batch, name), dtype=dtype)[skip:]
+            column = self._columns[name]
+            column[self._head:self._head + first] = values[:first]
+            column[:count - first] = values[first:]
+        
+        self._head = (self._head + count) % allocated
+        self._size = min(self._size + count, allocated)
+    
+    def covers(self, t_utc_ns: int) -> bool:
+        """Whether every sample from a time on is still held in memory"""
+        if not self.evicted_samples:
+            return True
+        if not self._size:
+            return False
+        column = self._columns["t_utc_ns"]
+        return t_utc_ns >= column[(self._head - self._size) % len(column)]
+    
+    def read_range(self, t_start_ns: int, t_end_ns: int,
+                   columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Retained samples with t_start_ns <= t_utc_ns < t_end_ns, by column"""
+        names = list(columns) if columns is not None else [name for name, _ in GSR_STORE_FIELDS]
+        start, stop = np.searchsorted(self.column("t_utc_ns"), [t_start_ns, t_end_ns], side="left")
+        return {name: self.column(name)[start:max(start, stop)] for name in names}
+    
+    def column(self, name: str) -> np.ndarray:
+        """Copy of one field for the retained samples, oldest first"""
+        column = self._columns[name]
+        start = (self._head - self._size) % len(column)
+        if start + self._size <= len(column):
+            return column[start:start + self._size].copy()
+        return np.concatenate((column[start:], column[:self._head]))
+    
+    def to_batch(self, since_utc_ns: Optional[int] = None) -> GSRSampleBatch:
+        """Retained samples as a columnar batch, optionally only those from a time on"""
+        columns = {name: self.column(name) for name, _ in GSR_STORE_FIELDS}
+        if since_utc_ns is not None:
+            # Samples arrive in time order, so the window is a suffix
+            first = int(np.searchsorted(columns["t_utc_ns"], since_utc_ns, side="left"))
+            columns = {name: values[first:] for name, values in columns.items()}
+        return GSRSampleBatch(**columns)
+    
+    def to_samples(self, since_utc_ns: Optional[int] = None) -> List[GSRSample]:
+        """Retained samples as GSRSample objects, oldest first"""
+        batch = self.to_batch(since_utc_ns)
+        return GSRSampleBatch(*(getattr(batch, name).tolist() for name, _ in GSR_STORE_FIELDS)).to_samples()
+    
+    def _reserve(self, needed: int):
+        """Grow the arrays towards capacity, keeping samples in order"""
+        allocated = len(self._columns["seq"])
+        if needed <= allocated or allocated >= self.capacity:
+            return
+        
+        new_size = max(allocated, 1)
+        while new_size < needed:
+            new_size *= 2
+        new_size = min(new_size, self.capacity)
+        
+        for name, dtype in GSR_STORE_FIELDS:
+            grown = np.empty(new_size, dtype=dtype)
+            grown[:self._size] = self.column(name)
+            self._columns[name] = grown
+        self._head = self._size % new_size
@@ -0,0 +1,262 @@
+"""
+Persistent catalog of recorded sessions.
+
+An SQLite database in the data directory with one row per session: who and
+what was recorded, when, how many samples, where the data files are, their
+checksums and whether the session has been analyzed and validated.
+SessionManager updates it as sessions change state, so batch tools can list
+and filter sessions and find their files with one query instead of walking
+the data directory and stat'ing every file in it.
+
+File paths under the data directory are stored relative to it, so a data
+directory can be moved or copied with its catalog.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from .session_file import SESSION_FILE_SUFFIX, gsr_data_files
+from .session_segments import SEGMENT_MANIFEST_FILE, gsr_segment_files
+
+
+CATALOG_FILE = "session_catalog.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    session_name TEXT,
+    device_id TEXT,
+    participant_id TEXT,
+    state TEXT,
+    created_at TEXT,
+    started_at TEXT,
+    ended_at TEXT,
+    sample_count INTEGER NOT NULL DEFAULT 0,
+    sync_mark_count INTEGER NOT NULL DEFAULT 0,
+    gsr_file_path TEXT,
+    gsr_binary_path TEXT,
+    gsr_checksum TEXT,
+    binary_checksum TEXT,
+    metadata TEXT,
+    analysis_status TEXT NOT NULL DEFAULT 'PENDING',
+    analysis_score REAL,
+    analyzed_at TEXT,
+    validation_status TEXT NOT NULL DEFAULT 'PENDING',
+    validation_score REAL,
+    validated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_participant ON sessions (participant_id);
+CREATE INDEX IF NOT EXISTS sessions_device ON sessions (device_id);
+CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created_at);
+"""
+
+# Columns taken from a session snapshot (Session.to_dict)
+_SESSION_COLUMNS = (
+    "session_id", "session_name", "device_id", "participant_id", "state",
+    "created_at", "started_at", "ended_at", "sample_count", "sync_mark_count",
+    "gsr_file_path", "gsr_binary_path", "metadata",
+)
+
+_FILTER_COLUMNS = ("participant_id", "device_id", "state", "analysis_status", "validation_status")
+
+
+class CatalogStatus(str, Enum):
+    """Analysis and validation status of a cataloged session"""
+    PENDING = "PENDING"
+    COMPLETED = "COMPLETED"
+    PASSED = "PASSED"
+    FAILED = "FAILED"
+
+
+class SessionCatalog:
+    """SQLite catalog of the sessions in one data directory"""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data_directory = self.path.parent
+        self.data_directory.mkdir(parents=True, exist_ok=True)
+        
+        # Shared by the event loop and analysis threads, one statement at a time
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+    
+    @classmethod
+    def open(cls, data_directory: Path) -> 'SessionCatalog':
+        """Open the catalog of a data directory, importing its sessions when it is new"""
+        path = Path(data_directory) / CATALOG_FILE
+        created = not path.exists()
+        catalog = cls(path)
+        if created:
+            catalog.import_directory()
+        return catalog
+    
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM sessions")[0][0]
+    
+    def import_directory(self) -> int:
+        """Catalog session directories written before the catalog existed.
+        
+        This is the one directory scan; session_metadata.json supplies the
+        details where present. Returns the number of sessions added.
+        """
+        imported = 0
+        for session_path in sorted(self.data_directory.iterdir()):
+            if not session_path.is_dir() or self.get(session_path.name) is not None:
+                continue
+            
+            snapshot: Dict[str, Any] = {}
+            metadata_file = session_path / "session_metadata.json"
+            if metadata_file.exists():
+                try:
+                    with open(metadata_file, 'r') as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Unreadable metadata for session {session_path.name}: {e}")
+            snapshot["session_id"] = session_path.name
+            
+            # File names carry the start time, so the last one is the newest;
+            # later segments are found through the manifest
+            csv_files = [path for path in gsr_data_files(session_path, prefer_binary=False)
+                         if not _is_later_segment(path)]
+            if csv_files:
+                snapshot.setdefault("gsr_file_path", str(csv_files[-1]))
+            binary_files = [path for path in gsr_data_files(session_path)
+                            if path.suffix == SESSION_FILE_SUFFIX and not _is_later_segment(path)]
+            if binary_files:
+                snapshot.setdefault("gsr_binary_path", str(binary_files[-1]))
+            
+            self.upsert_session(snapshot)
+            imported += 1
+        
+        logger.info(f"Imported {imported} sessions into {self.path}")
+        return imported
+    
+    def upsert_session(self, snapshot: Dict[str, Any]):
+        """Add or update a session from its to_dict snapshot"""
+        row = {
+            "session_id": snapshot["session_id"],
+            "session_name": snapshot.get("session_name"),
+            "device_id": snapshot.get("device_id"),
+            "participant_id": snapshot.get("participant_id"),
+            "state": snapshot.get("state"),
+            "created_at": snapshot.get("created_at"),
+            "started_at": snapshot.get("started_at"),
+            "ended_at": snapshot.get("ended_at"),
+            "sample_count": snapshot.get("gsr_samples_count", 0),
+            "sync_mark_count": len(snapshot.get("sync_marks", [])),
+            "gsr_file_path": self._relative(snapshot.get("gsr_file_path")),
+            "gsr_binary_path": self._relative(snapshot.get("gsr_binary_path")),
+            "metadata": json.dumps(snapshot.get("metadata") or {}, default=str),
+        }
+        columns = ", ".join(_SESSION_COLUMNS)
+        placeholders = ", ".join(f":{column}" for column in _SESSION_COLUMNS)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in _SESSION_COLUMNS[1:])
+        self._execute(f"INSERT INTO sessions ({columns}) VALUES ({placeholders}) "
+                      f"ON CONFLICT (session_id) DO UPDATE SET {updates}", row)
+    
+    def set_checksums(self, session_id: str, gsr_checksum: Optional[str],
+                      binary_checksum: Optional[str] = None):
+        """Record the checksums of a session's finished data files"""
+        self._execute("UPDATE sessions SET gsr_checksum = ?, binary_checksum = ? WHERE session_id = ?",
+                      (gsr_checksum, binary_checksum, session_id))
+    
+    def record_analysis(self, session_id: str, status: CatalogStatus, score: Optional[float] = None):
+        """Record the outcome of analyzing a session"""
+        self._execute("UPDATE sessions SET analysis_status = ?, analysis_score = ?, analyzed_at = ? "
+                      "WHERE session_id = ?",
+                      (CatalogStatus(status).value, score, datetime.now().isoformat(), session_id))
+    
+    def record_validation(self, session_id: str, status: CatalogStatus, score: Optional[float] = None):
+        """Record the outcome of validating a session"""
+        self._execute("UPDATE sessions SET validation_status = ?, validation_score = ?, validated_at = ? "
+                      "WHERE session_id = ?",
+                      (CatalogStatus(status).value, score, datetime.now().isoformat(), session_id))
+    
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Catalog entry of a session, or None"""
+        rows = self._query("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+        return self._entry(rows[0]) if rows else None
+    
+    def find(self, **filters) -> List[Dict[str, Any]]:
+        """Catalog entries matching every given column value, oldest first.
+        
+        Filters may be any of participant_id, device_id, state,
+        analysis_status and validation_status.
+        """
+        unknown = set(filters) - set(_FILTER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalog filters: {', '.join(sorted(unknown))}")
+        
+        where = " AND ".join(f"{column} = ?" for column in filters)
+        query = "SELECT * FROM sessions" + (f" WHERE {where}" if where else "") + " ORDER BY created_at, session_id"
+        values = tuple(value.value if isinstance(value, Enum) else value for value in filters.values())
+        return [self._entry(row) for row in self._query(query, values)]
+    
+    def session_ids(self, **filters) -> List[str]:
+        """Ids of the sessions matching the filters, oldest first"""
+        return [entry["session_id"] for entry in self.find(**filters)]
+    
+    def gsr_files(self, session_id: str, prefer_binary: bool = True) -> List[Path]:
+        """A session's GSR data files, as gsr_segment_files would pick them.
+        
+        An unsegmented session's file comes from the catalog without touching
+        the disk; a segmented one's come from its manifest.
+        """
+        entry = self.get(session_id)
+        if entry is None:
+            return []
+        session_path = self._absolute(entry["gsr_file_path"] or entry["session_id"]).parent
+        if (session_path / SEGMENT_MANIFEST_FILE).exists():
+            return gsr_segment_files(session_path, prefer_binary)
+        if prefer_binary and entry["gsr_binary_path"]:
+            return [self._absolute(entry["gsr_binary_path"])]
+        if entry["gsr_file_path"]:
+            return [self._absolute(entry["gsr_file_path"])]
+        return []
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._connection.close()
+    
+    def _relative(self, path: Optional[str]) -> Optional[str]:
+        if not path:
+            return None
+        try:
+            return str(Path(path).resolve().relative_to(self.data_directory.resolve()))
+        except ValueError:
+            return str(path)
+    
+    def _absolute(self, path: str) -> Path:
+        return self.data_directory / path
+    
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        entry["metadata"] = json.loads(entry["metadata"]) if entry["metadata"] else {}
+        return entry
+    
+    def _execute(self, statement: str, parameters=()):
+        with self._lock, self._connection:
+            self._connection.execute(statement, parameters)
+    
+    def _query(self, query: str, parameters=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+
+def _is_later_segment(path: Path) -> bool:
+    """Whether a data file is a second or later segment of a recording"""
+    suffix = path.stem.rsplit("_", 1)[-1]
+    return len(suffix) == 4 and suffix.isdigit()
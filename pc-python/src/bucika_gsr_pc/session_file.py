@@ -0,0 +1,384 @@
+"""
+Compact binary session file for GSR samples, written next to the CSV file.
+
+A ``.gsrb`` file is a 16-byte header followed by fixed-width little-endian
+records, one per sample, in arrival order. The records can be mapped with
+``numpy.memmap`` and used directly as a structured array, so loading a
+session does not parse any text.
+
+Every ``index_interval`` records a (t_utc_ns, seq, record) entry is appended
+to a sidecar ``.gsrb.idx`` file with the same header layout. Both files are
+append-only; a torn record at the end of a file (from a crash mid-write) is
+ignored by readers.
+"""
+
+import hashlib
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+from .gsr_writer import GSR_CSV_HEADER, format_gsr_rows
+from .protocol import GSRSampleBatch, GSR_FLAG_SPIKE, GSR_FLAG_SAT, GSR_FLAG_DROPOUT
+
+
+SESSION_FILE_SUFFIX = ".gsrb"
+INDEX_FILE_SUFFIX = ".idx"
+SESSION_FILE_VERSION = 1
+DEFAULT_INDEX_INTERVAL = 1024
+
+RECORD_DTYPE = np.dtype([
+    ("t_mono_ns", "<i8"),
+    ("t_utc_ns", "<i8"),
+    ("seq", "<i8"),
+    ("gsr_raw_uS", "<f8"),
+    ("gsr_filt_uS", "<f8"),
+    ("temp_C", "<f8"),
+    ("flags", "u1"),
+])
+
+INDEX_DTYPE = np.dtype([
+    ("t_utc_ns", "<i8"),
+    ("seq", "<i8"),
+    ("record", "<i8"),
+])
+
+# magic, version, record size, index interval, reserved
+_HEADER = struct.Struct("<4sHHII")
+_RECORD_MAGIC = b"BGSR"
+_INDEX_MAGIC = b"BGSI"
+
+# CSV columns holding the flag bits, with their bit
+_FLAG_COLUMNS = (
+    ("Flag_Spike", GSR_FLAG_SPIKE),
+    ("Flag_Saturation", GSR_FLAG_SAT),
+    ("Flag_Dropout", GSR_FLAG_DROPOUT),
+)
+
+
+def index_path_for(path: Path) -> Path:
+    """Sidecar index file of a binary session file"""
+    return path.with_name(path.name + INDEX_FILE_SUFFIX)
+
+
+def _read_header(path: Path, magic: bytes, dtype: np.dtype) -> int:
+    """Validate a file header and return the index interval it records"""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise ValueError(f"Truncated session file header: {path}")
+    
+    file_magic, version, record_size, index_interval, _ = _HEADER.unpack(header)
+    if file_magic != magic:
+        raise ValueError(f"Not a GSR session file: {path}")
+    if version != SESSION_FILE_VERSION or record_size != dtype.itemsize:
+        raise ValueError(f"Unsupported session file version {version} "
+                         f"({record_size}-byte records): {path}")
+    return index_interval
+
+
+def _map_records(path: Path, dtype: np.dtype) -> np.ndarray:
+    """Map the complete records of a file read-only"""
+    count = (path.stat().st_size - _HEADER.size) // dtype.itemsize
+    if count <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=_HEADER.size, shape=(count,))
+
+
+def _build_index(records: np.ndarray, index_interval: int) -> np.ndarray:
+    """Index entries for every index_interval-th record"""
+    positions = np.arange(0, len(records), index_interval)
+    index = np.empty(len(positions), dtype=INDEX_DTYPE)
+    index["t_utc_ns"] = records["t_utc_ns"][positions]
+    index["seq"] = records["seq"][positions]
+    index["record"] = positions
+    return index
+
+
+class GSRSessionFileWriter:
+    """Append-only writer for a binary session file and its index"""
+    
+    def __init__(self, path: Path, index_interval: int = DEFAULT_INDEX_INTERVAL,
+                 resume: bool = False):
+        """Create a new file, or with resume append to an existing one.
+        
+        A resumed file keeps its own index interval, loses any torn trailing
+        record and has its index rebuilt from the records.
+        """
+        if index_interval <= 0:
+            raise ValueError(f"Invalid index interval: {index_interval}")
+        
+        self.path = Path(path)
+        self.index_path = index_path_for(self.path)
+        self.index_interval = index_interval
+        self.record_count = 0
+        
+        index = None
+        if resume and self.path.exists():
+            self.index_interval = _read_header(self.path, _RECORD_MAGIC, RECORD_DTYPE)
+            records = _map_records(self.path, RECORD_DTYPE)
+            self.record_count = len(records)
+            index = _build_index(records, self.index_interval)
+            del records
+            
+            self._file = open(self.path, "r+b")
+            self._file.truncate(_HEADER.size + self.record_count * RECORD_DTYPE.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(self.path, "wb")
+            self._file.write(_HEADER.pack(_RECORD_MAGIC, SESSION_FILE_VERSION,
+                                          RECORD_DTYPE.itemsize, self.index_interval, 0))
+        
+        self._index_file = open(self.index_path, "wb")
+        self._index_file.write(_HEADER.pack(_INDEX_MAGIC, SESSION_FILE_VERSION,
+                                            INDEX_DTYPE.itemsize, self.index_interval, 0))
+        if index is not None:
+            self._index_file.write(index.tobytes())
+    
+    def append(self, batch: GSRSampleBatch):
+        """Append a batch of samples as records"""
+        count = len(batch)
+        if not count:
+            return
+        
+        records = np.empty(count, dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            records[name] = getattr(batch, name)
+        self._file.write(records.tobytes())
+        
+        # Index every record whose number is a multiple of the interval
+        first = -self.record_count % self.index_interval
+        positions = np.arange(first, count, self.index_interval)
+        if len(positions):
+            index = np.empty(len(positions), dtype=INDEX_DTYPE)
+            index["t_utc_ns"] = records["t_utc_ns"][positions]
+            index["seq"] = records["seq"][positions]
+            index["record"] = positions + self.record_count
+            self._index_file.write(index.tobytes())
+        
+        self.record_count += count
+    
+    def flush(self):
+        """Flush both files to the operating system"""
+        self._file.flush()
+        self._index_file.flush()
+    
+    def sync(self):
+        """Flush both files and fsync them to stable storage"""
+        self.flush()
+        os.fsync(self._file.fileno())
+        os.fsync(self._index_file.fileno())
+    
+    def close(self):
+        """Flush and close both files"""
+        self._file.close()
+        self._index_file.close()
+
+
+class GSRSessionFile:
+    """Read-only view of a binary session file through numpy.memmap"""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.index_interval = _read_header(self.path, _RECORD_MAGIC, RECORD_DTYPE)
+        self._mapped_size = self.path.stat().st_size
+        self.records = _map_records(self.path, RECORD_DTYPE)
+        self.index = self._load_index()
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def refresh(self) -> bool:
+        """Pick up records appended since the file was mapped, for live sessions"""
+        size = self.path.stat().st_size
+        if size == self._mapped_size:
+            return False
+        self._mapped_size = size
+        self.records = _map_records(self.path, RECORD_DTYPE)
+        self.index = self._load_index()
+        return True
+    
+    def column(self, name: str) -> np.ndarray:
+        """One field of every record, without copying"""
+        return self.records[name]
+    
+    def locate(self, t_utc_ns: int) -> int:
+        """Number of the first record at or after a time.
+        
+        The index narrows the search to one interval of records, so only
+        those pages of the file are read.
+        """
+        lo, hi = 0, len(self.records)
+        if len(self.index):
+            block = int(np.searchsorted(self.index["t_utc_ns"], t_utc_ns, side="left"))
+            if block > 0:
+                lo = int(self.index["record"][block - 1])
+            if block < len(self.index):
+                hi = int(self.index["record"][block]) + 1
+        return lo + int(np.searchsorted(self.records["t_utc_ns"][lo:hi], t_utc_ns, side="left"))
+    
+    def read_range(self, t_start_ns: int, t_end_ns: int,
+                   columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Copy the chosen columns of the records with t_start_ns <= t_utc_ns < t_end_ns.
+        
+        Both ends are found through the index and only that slice of the
+        mapping is touched, so the OS reads just the pages of the byte range.
+        """
+        names = select_columns(columns)
+        start = self.locate(t_start_ns)
+        stop = max(start, self.locate(t_end_ns))
+        records = self.records[start:stop]
+        return {name: np.array(records[name]) for name in names}
+    
+    def to_batch(self, start: int = 0, stop: Optional[int] = None) -> GSRSampleBatch:
+        """Records in [start, stop) as a columnar batch"""
+        records = self.records[start:stop]
+        return GSRSampleBatch(**{name: records[name] for name in RECORD_DTYPE.names})
+    
+    def to_dataframe(self):
+        """Records as a DataFrame with the CSV column names.
+        
+        DateTime_UTC holds datetime64 values in the CSV's local time instead
+        of strings.
+        """
+        import pandas as pd
+        
+        t_utc_ns = np.asarray(self.records["t_utc_ns"])
+        flags = np.asarray(self.records["flags"])
+        if len(t_utc_ns):
+            utc_offset_ns = _utc_offset_ns(int(t_utc_ns[0]))
+        else:
+            utc_offset_ns = 0
+        
+        columns = {
+            "Timestamp_ns": t_utc_ns,
+            "DateTime_UTC": (t_utc_ns + utc_offset_ns).astype("datetime64[ns]"),
+            "Sequence": np.asarray(self.records["seq"]),
+            "GSR_Raw_uS": np.asarray(self.records["gsr_raw_uS"]),
+            "GSR_Filtered_uS": np.asarray(self.records["gsr_filt_uS"]),
+            "Temperature_C": np.asarray(self.records["temp_C"]),
+        }
+        for name, bit in _FLAG_COLUMNS:
+            columns[name] = (flags & bit) != 0
+        return pd.DataFrame(columns, columns=GSR_CSV_HEADER)
+    
+    def _load_index(self) -> np.ndarray:
+        """Load the sidecar index, rebuilding it from the records if it is missing"""
+        index_path = index_path_for(self.path)
+        try:
+            _read_header(index_path, _INDEX_MAGIC, INDEX_DTYPE)
+            index = np.array(_map_records(index_path, INDEX_DTYPE))
+            return index[index["record"] < len(self.records)]
+        except (OSError, ValueError):
+            return _build_index(self.records, self.index_interval)
+
+
+def select_columns(columns: Optional[Iterable[str]]) -> List[str]:
+    """Validate requested record columns, defaulting to all of them"""
+    if columns is None:
+        return list(RECORD_DTYPE.names)
+    names = list(columns)
+    unknown = set(names) - set(RECORD_DTYPE.names)
+    if unknown:
+        raise ValueError(f"Unknown GSR columns: {sorted(unknown)}")
+    return names
+
+
+def _utc_offset_ns(t_utc_ns: int) -> int:
+    """Local UTC offset at a time, matching the CSV DateTime_UTC column"""
+    return time.localtime(t_utc_ns // 1_000_000_000).tm_gmtoff * 1_000_000_000
+
+
+def file_checksum(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def gsr_data_files(session_path: Path, prefer_binary: bool = True) -> List[Path]:
+    """GSR data files of a session, preferring binary files over their CSV twins"""
+    files = []
+    for csv_path in sorted(session_path.glob("gsr_data_*.csv")):
+        binary_path = csv_path.with_suffix(SESSION_FILE_SUFFIX)
+        files.append(binary_path if prefer_binary and binary_path.exists() else csv_path)
+    if prefer_binary:
+        for binary_path in sorted(session_path.glob(f"gsr_data_*{SESSION_FILE_SUFFIX}")):
+            if not binary_path.with_suffix(".csv").exists():
+                files.append(binary_path)
+    return files
+
+
+def read_gsr_dataframe(path: Path):
+    """Load a GSR data file, binary or CSV, into a DataFrame"""
+    import pandas as pd
+    
+    path = Path(path)
+    if path.suffix == SESSION_FILE_SUFFIX:
+        return GSRSessionFile(path).to_dataframe()
+    return pd.read_csv(path)
+
+
+def read_csv_columns(csv_path: Path) -> Dict[str, np.ndarray]:
+    """Parse a session CSV file into record columns"""
+    import pandas as pd
+    
+    df = pd.read_csv(csv_path, usecols=[name for name in GSR_CSV_HEADER if name != "DateTime_UTC"],
+                     float_precision="round_trip")
+    flags = np.zeros(len(df), dtype=np.uint8)
+    for name, bit in _FLAG_COLUMNS:
+        flags |= np.where(df[name].astype(str) == "True", bit, 0).astype(np.uint8)
+    
+    # The CSV has no monotonic clock column; the UTC timestamp stands in for it
+    t_utc_ns = df["Timestamp_ns"].to_numpy(dtype=np.int64)
+    return {
+        "t_mono_ns": t_utc_ns,
+        "t_utc_ns": t_utc_ns,
+        "seq": df["Sequence"].to_numpy(dtype=np.int64),
+        "gsr_raw_uS": df["GSR_Raw_uS"].to_numpy(dtype=np.float64),
+        "gsr_filt_uS": df["GSR_Filtered_uS"].to_numpy(dtype=np.float64),
+        "temp_C": df["Temperature_C"].to_numpy(dtype=np.float64),
+        "flags": flags
+    }
+
+
+def read_csv_range(csv_path: Path, t_start_ns: int, t_end_ns: int,
+                   columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """read_range for sessions with only a CSV file; parses the whole file"""
+    names = select_columns(columns)
+    data = read_csv_columns(csv_path)
+    mask = (data["t_utc_ns"] >= t_start_ns) & (data["t_utc_ns"] < t_end_ns)
+    return {name: data[name][mask] for name in names}
+
+
+def csv_to_session_file(csv_path: Path, binary_path: Optional[Path] = None,
+                        index_interval: int = DEFAULT_INDEX_INTERVAL) -> Path:
+    """Convert a session CSV file to the binary format"""
+    csv_path = Path(csv_path)
+    binary_path = Path(binary_path) if binary_path else csv_path.with_suffix(SESSION_FILE_SUFFIX)
+    batch = GSRSampleBatch(**read_csv_columns(csv_path))
+    
+    writer = GSRSessionFileWriter(binary_path, index_interval)
+    try:
+        writer.append(batch)
+    finally:
+        writer.close()
+    return binary_path
+
+
+def session_file_to_csv(binary_path: Path, csv_path: Optional[Path] = None,
+                        chunk_records: int = 65536) -> Path:
+    """Convert a binary session file to the CSV layout SessionManager writes"""
+    binary_path = Path(binary_path)
+    csv_path = Path(csv_path) if csv_path else binary_path.with_suffix(".csv")
+    
+    session_file = GSRSessionFile(binary_path)
+    with open(csv_path, "w", newline="") as f:
+        f.write(",".join(GSR_CSV_HEADER) + "\n")
+        for start in range(0, len(session_file), chunk_records):
+            f.write(format_gsr_rows(session_file.to_batch(start, start + chunk_records)))
+    return csv_path
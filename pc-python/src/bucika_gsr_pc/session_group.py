@@ -0,0 +1,284 @@
+"""
+Multi-device session groups with a merged timeline.
+
+A study that records several phones at once starts one session per device
+under a SessionGroup. The group keeps a MergedTimeline: one entry per
+sample of every member, in t_utc_ns order, naming the device and the
+sample's position in that device's recording. It is built while recording
+by merging each device's in-order stream as batches arrive, so group-level
+reads interleave the member sessions through the index instead of loading
+and aligning their files afterwards.
+
+A sample can be merged once no member can still deliver an earlier one:
+every device's samples are in sequence order, so the watermark is the
+oldest of the members' newest timestamps. A member whose session stops no
+longer holds the watermark back, and neither does one that falls more
+than max_lag_ns behind the newest sample of the group: it is marked
+stalled, so a silent phone cannot make the others' samples pile up
+unmerged. Should it send again, its samples rejoin the merge, and those
+behind the watermark are inserted in place.
+
+Each entry takes 18 bytes, so eight devices at 128 Hz index one hour in
+about 66 MB. The timeline is written next to the group file when the
+group stops and memory-mapped when it is loaded again. A group cut short
+by a crash has its timeline rebuilt from the member sessions' files.
+"""
+
+import json
+import os
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+GROUP_FILE_SUFFIX = ".group.json"
+TIMELINE_FILE_SUFFIX = ".timeline.npy"
+
+TIMELINE_DTYPE = np.dtype([
+    ("t_utc_ns", "<i8"),
+    ("device", "<u2"),  # index into the group's device_ids
+    ("sample", "<u8"),  # position in that device's recording
+])
+
+# Arrays start small and double as the recording grows
+_INITIAL_CAPACITY = 4096
+
+# How far a member may fall behind the newest sample before it is marked stalled
+DEFAULT_MAX_LAG_NS = 10_000_000_000
+
+
+class GroupState(str, Enum):
+    """Session group states"""
+    RECORDING = "RECORDING"
+    DONE = "DONE"
+    INTERRUPTED = "INTERRUPTED"  # the orchestrator stopped before the group did
+
+
+class MergedTimeline:
+    """Time-ordered index over the samples of several devices, merged incrementally"""
+    
+    def __init__(self, device_count: int, max_lag_ns: Optional[int] = DEFAULT_MAX_LAG_NS):
+        self.device_count = device_count
+        self.max_lag_ns = max_lag_ns  # None waits for every member indefinitely
+        self._entries = np.empty(_INITIAL_CAPACITY, dtype=TIMELINE_DTYPE)
+        self._size = 0
+        
+        # Samples received but not merged yet, per device
+        self._pending: List[List[np.ndarray]] = [[] for _ in range(device_count)]
+        self._newest_ns: List[Optional[int]] = [None] * device_count
+        self._first_ns: Optional[int] = None
+        self._finished = [False] * device_count
+        self.watermark_ns: Optional[int] = None  # every sample at or before it is merged
+        
+        # Members that fell too far behind, and samples they sent after it
+        self.stalled: List[int] = []
+        self.late_samples = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def entries(self) -> np.ndarray:
+        """Merged entries, oldest first"""
+        return self._entries[:self._size]
+    
+    @property
+    def pending(self) -> int:
+        """Samples waiting for the other devices to catch up"""
+        return sum(len(chunk) for chunks in self._pending for chunk in chunks)
+    
+    def add(self, device: int, t_utc_ns, first_sample: int):
+        """Add a device's next samples, in order, and merge whatever is now safe to"""
+        t_utc_ns = np.asarray(t_utc_ns, dtype=np.int64)
+        if not len(t_utc_ns):
+            return
+        
+        chunk = np.empty(len(t_utc_ns), dtype=TIMELINE_DTYPE)
+        chunk["t_utc_ns"] = t_utc_ns
+        chunk["device"] = device
+        chunk["sample"] = np.arange(first_sample, first_sample + len(t_utc_ns))
+        if self._first_ns is None:
+            self._first_ns = int(t_utc_ns[0])
+        
+        # A stalled member that sends again rejoins; what it sent from behind
+        # the watermark is inserted in place
+        if device in self.stalled:
+            self.stalled.remove(device)
+            self._finished[device] = False
+            if self.watermark_ns is not None:
+                cut = int(np.searchsorted(t_utc_ns, self.watermark_ns, side="right"))
+                if cut:
+                    self._insert(chunk[:cut])
+                    self.late_samples += cut
+                    chunk = chunk[cut:]
+        
+        if len(chunk):
+            self._pending[device].append(chunk)
+        self._newest_ns[device] = int(t_utc_ns[-1])
+        self._merge()
+    
+    def finish(self, device: int):
+        """A device has stopped recording; stop waiting for it"""
+        self._finished[device] = True
+        self._merge()
+    
+    def flush(self):
+        """Merge everything pending, as when the whole group stops"""
+        self._finished = [True] * self.device_count
+        self._merge()
+    
+    def range(self, t_start_ns: int, t_end_ns: int) -> np.ndarray:
+        """Merged entries with t_start_ns <= t_utc_ns < t_end_ns"""
+        start, stop = np.searchsorted(self.entries["t_utc_ns"], [t_start_ns, t_end_ns], side="left")
+        return self.entries[start:stop]
+    
+    def save(self, path: Path):
+        """Write the merged entries to an .npy file"""
+        temp_path = Path(path).with_name(Path(path).name + ".tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, self.entries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def load(cls, path: Path, device_count: int) -> 'MergedTimeline':
+        """Map a saved timeline without reading it into memory"""
+        timeline = cls(device_count)
+        timeline._entries = np.load(path, mmap_mode="r")
+        timeline._size = len(timeline._entries)
+        timeline._finished = [True] * device_count
+        if timeline._size:
+            timeline.watermark_ns = int(timeline._entries["t_utc_ns"][-1])
+        return timeline
+    
+    def _merge(self):
+        self._mark_stalled()
+        active = [newest for newest, finished in zip(self._newest_ns, self._finished) if not finished]
+        if any(newest is None for newest in active):
+            return  # a member has not sent anything yet
+        watermark = min(active) if active else None
+        
+        # Each device contributes its run of samples up to the watermark
+        runs = []
+        for device, chunks in enumerate(self._pending):
+            if not chunks:
+                continue
+            samples = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+            cut = len(samples) if watermark is None else int(
+                np.searchsorted(samples["t_utc_ns"], watermark, side="right"))
+            if cut:
+                runs.append(samples[:cut])
+            self._pending[device] = [samples[cut:]] if cut < len(samples) else []
+        if not runs:
+            return
+        
+        # k-way merge of the sorted runs: a stable sort on the run
+        # concatenation merges runs rather than re-sorting, and keeps devices
+        # in index order on equal timestamps
+        merged = np.concatenate(runs)
+        if len(runs) > 1:
+            merged = merged[np.argsort(merged["t_utc_ns"], kind="stable")]
+        self._append(merged)
+        self.watermark_ns = int(merged["t_utc_ns"][-1]) if watermark is None else watermark
+    
+    def _mark_stalled(self):
+        """Stop waiting for members more than max_lag_ns behind the newest sample"""
+        if self.max_lag_ns is None or self._first_ns is None:
+            return
+        lead = max(newest for newest in self._newest_ns if newest is not None)
+        for device, (newest, finished) in enumerate(zip(self._newest_ns, self._finished)):
+            behind = self._first_ns if newest is None else newest
+            if not finished and lead - behind > self.max_lag_ns:
+                self._finished[device] = True
+                self.stalled.append(device)
+    
+    def _insert(self, late: np.ndarray):
+        """Place samples behind the watermark among the merged entries"""
+        # After entries with equal timestamps, so earlier arrivals keep their place
+        positions = np.searchsorted(self.entries["t_utc_ns"], late["t_utc_ns"], side="right")
+        merged = np.insert(self.entries, positions, late)
+        self._size = 0
+        self._append(merged)
+    
+    def _append(self, merged: np.ndarray):
+        needed = self._size + len(merged)
+        if needed > len(self._entries):
+            capacity = max(needed, 2 * len(self._entries))
+            grown = np.empty(capacity, dtype=TIMELINE_DTYPE)
+            grown[:self._size] = self._entries[:self._size]
+            self._entries = grown
+        self._entries[self._size:needed] = merged
+        self._size = needed
+
+
+class SessionGroup:
+    """Sessions of several devices recorded together, with their merged timeline"""
+    
+    def __init__(self, group_id: str, group_name: str, device_ids: List[str],
+                 participant_id: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+        self.group_id = group_id
+        self.group_name = group_name
+        self.device_ids = list(device_ids)
+        self.participant_id = participant_id
+        self.metadata = metadata or {}
+        
+        self.state = GroupState.RECORDING
+        self.created_at = datetime.now()
+        self.ended_at: Optional[datetime] = None
+        
+        # Member session per device
+        self.session_ids: Dict[str, str] = {}
+        self.timeline = MergedTimeline(len(self.device_ids))
+    
+    def device_index(self, device_id: str) -> int:
+        """Index of a member device in the timeline"""
+        return self.device_ids.index(device_id)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the group to a dictionary for serialization"""
+        return {
+            "group_id": self.group_id,
+            "group_name": self.group_name,
+            "device_ids": self.device_ids,
+            "participant_id": self.participant_id,
+            "metadata": self.metadata,
+            "state": self.state.value,
+            "created_at": self.created_at.isoformat(),
+            "ended_at": self.ended_at.isoformat() if self.ended_at else None,
+            "session_ids": self.session_ids,
+            "timeline_entries": len(self.timeline),
+            "stalled_devices": [self.device_ids[device] for device in self.timeline.stalled],
+            "late_samples": self.timeline.late_samples
+        }
+    
+    def save(self, base_path: Path):
+        """Write the group file, and the timeline once the group has stopped"""
+        if self.state != GroupState.RECORDING:
+            self.timeline.save(Path(base_path) / f"{self.group_id}{TIMELINE_FILE_SUFFIX}")
+        group_path = Path(base_path) / f"{self.group_id}{GROUP_FILE_SUFFIX}"
+        temp_path = group_path.with_name(group_path.name + ".tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_path, group_path)
+    
+    @classmethod
+    def load(cls, base_path: Path, group_id: str) -> 'SessionGroup':
+        """Load a saved group, mapping its timeline if it was written"""
+        with open(Path(base_path) / f"{group_id}{GROUP_FILE_SUFFIX}", 'r') as f:
+            data = json.load(f)
+        
+        group = cls(data["group_id"], data["group_name"], data["device_ids"],
+                    data.get("participant_id"), data.get("metadata"))
+        group.state = GroupState(data["state"])
+        group.created_at = datetime.fromisoformat(data["created_at"])
+        if data.get("ended_at"):
+            group.ended_at = datetime.fromisoformat(data["ended_at"])
+        group.session_ids = dict(data.get("session_ids", {}))
+        
+        timeline_path = Path(base_path) / f"{group_id}{TIMELINE_FILE_SUFFIX}"
+        if timeline_path.exists():
+            group.timeline = MergedTimeline.load(timeline_path, len(group.device_ids))
+        return group
@@ -0,0 +1,317 @@
+"""
+Write-ahead journal of session lifecycle events and GSR sample batches.
+
+Every session state change is journaled as a snapshot of the session and
+every sample batch is journaled before it is handed to the background file
+writer, so a crash loses at most what the fsync policy allows instead of
+everything the writer had buffered. On restart the journal is replayed to
+rebuild the session list, fill in samples missing from the data files and
+mark sessions that were cut short. Sync marks are journaled as records of
+their own, so a burst of marks does not snapshot the session each time.
+
+fsync never runs on the appending thread: appends that make an fsync due
+wake the journal's sync thread, which covers everything written so far.
+The journal is kept short by checkpoints, which replace it with one
+snapshot per session and one checkpoint record per active session, naming
+the samples already durable in its data files and carrying those it still
+had to reorder, followed by whatever was appended while the new file was
+being written off the appending thread.
+
+Records are framed as (kind, payload length, CRC-32) followed by the
+payload. Replay stops at the first incomplete or corrupt record and
+truncates the file there, so a torn tail from a crash mid-append is
+dropped.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from .protocol import GSRSampleBatch
+
+
+DEFAULT_FSYNC_INTERVAL = 1.0  # seconds
+
+_RECORD_HEADER = struct.Struct("<BII")  # kind, payload length, crc32
+_SESSION_ID_LENGTH = struct.Struct("<H")
+_JSON_LENGTH = struct.Struct("<I")
+
+
+class FsyncPolicy(str, Enum):
+    """How hard the journal pushes records to stable storage"""
+    NEVER = "NEVER"        # written to the OS on every append, survives a process crash
+    INTERVAL = "INTERVAL"  # also fsync at most once per fsync interval
+    ALWAYS = "ALWAYS"      # fsync as soon as possible after every record, survives power loss
+
+
+class JournalRecordKind(IntEnum):
+    """Kinds of journal record"""
+    SESSION = 1     # JSON snapshot of a session (Session.to_dict)
+    BATCH = 2       # session id followed by an encoded GSRSampleBatch
+    SYNC_MARK = 3   # JSON sync mark, which carries its session id
+    CHECKPOINT = 4  # JSON checkpoint of an active session followed by its held-back samples
+
+
+@dataclass
+class JournalRecord:
+    """A replayed journal record"""
+    kind: JournalRecordKind
+    session_id: str
+    snapshot: Optional[Dict[str, Any]] = None
+    batch: Optional[GSRSampleBatch] = None
+    sync_mark: Optional[Dict[str, Any]] = None
+    checkpoint: Optional[Dict[str, Any]] = None
+
+
+class SessionJournal:
+    """Append-only journal file with a configurable fsync policy"""
+    
+    def __init__(self, path: Path, fsync_policy: FsyncPolicy = FsyncPolicy.INTERVAL,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.path = Path(path)
+        self.fsync_policy = FsyncPolicy(fsync_policy)
+        self.fsync_interval = fsync_interval
+        
+        self._file = None
+        self._last_fsync = time.monotonic()
+        self._synced_records = 0
+        
+        # The sync thread, and the lock it holds while using the file
+        self._file_lock = threading.Lock()
+        self._sync_wanted = threading.Event()
+        self._sync_thread: Optional[threading.Thread] = None
+        self._stopping = False
+        
+        # Frames appended while a checkpoint writes the new file
+        self._diverted: Optional[List[bytes]] = None
+        
+        # Counters
+        self.records_written = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.truncated_bytes = 0
+        self.checkpoints = 0
+    
+    def append_session(self, snapshot: Dict[str, Any]):
+        """Journal a snapshot of a session's state"""
+        payload = json.dumps(snapshot, default=str).encode()
+        self._append(JournalRecordKind.SESSION, payload)
+    
+    def append_batch(self, session_id: str, batch: GSRSampleBatch):
+        """Journal a sample batch before it is written to the session files"""
+        session_id_bytes = session_id.encode()
+        payload = _SESSION_ID_LENGTH.pack(len(session_id_bytes)) + session_id_bytes + batch.encode()
+        self._append(JournalRecordKind.BATCH, payload)
+    
+    def append_sync_mark(self, sync_mark: Dict[str, Any]):
+        """Journal a sync mark without snapshotting its whole session"""
+        self._append(JournalRecordKind.SYNC_MARK, json.dumps(sync_mark, default=str).encode())
+    
+    def replay(self) -> List[JournalRecord]:
+        """Read every intact record, truncating the file after the last one"""
+        return list(self.iter_replay())
+    
+    def iter_replay(self) -> Iterator[JournalRecord]:
+        """Yield intact records one at a time, truncating the file after the last one.
+        
+        Only one record is held in memory at a time.
+        """
+        self.close()
+        if not self.path.exists():
+            return
+        
+        with open(self.path, "r+b") as f:
+            offset = 0
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                kind, length, crc = _RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                try:
+                    record = self._decode(kind, payload)
+                except Exception as e:
+                    logger.warning(f"Unreadable journal record at offset {offset}: {e}")
+                    break
+                offset += _RECORD_HEADER.size + length
+                yield record
+            
+            size = os.fstat(f.fileno()).st_size
+            if offset < size:
+                self.truncated_bytes = size - offset
+                logger.warning(f"Truncating {self.truncated_bytes} bytes of torn journal tail "
+                               f"from {self.path}")
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def compact(self, snapshots: Iterable[Dict[str, Any]]):
+        """Replace the journal with one snapshot per session and no batches.
+        
+        Only safe once the session data files hold every journaled batch.
+        """
+        self.close()
+        temp_path = self._temp_path()
+        with open(temp_path, "wb") as f:
+            self._write_checkpoint_head(f, snapshots, [])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+    
+    def begin_checkpoint(self):
+        """Start a checkpoint at the current end of the journal.
+        
+        The caller takes its snapshots and checkpoints at this point; records
+        appended from here on are carried over by finish_checkpoint.
+        """
+        self._diverted = []
+    
+    def write_checkpoint(self, snapshots: Iterable[Dict[str, Any]],
+                         checkpoints: Iterable[Tuple[Dict[str, Any], GSRSampleBatch]]):
+        """Write and fsync the start of the new journal beside the current one.
+        
+        Blocking; run it in an executor between begin_checkpoint and
+        finish_checkpoint while appends continue.
+        """
+        with open(self._temp_path(), "wb") as f:
+            self._write_checkpoint_head(f, snapshots, checkpoints)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def finish_checkpoint(self):
+        """Add the records appended since begin_checkpoint and switch to the new journal"""
+        diverted, self._diverted = self._diverted or [], None
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+            with open(self._temp_path(), "ab") as f:
+                f.write(b"".join(diverted))
+            os.replace(self._temp_path(), self.path)
+            self._file = open(self.path, "ab", buffering=0)
+            # The carried-over records are fsynced with the next sync
+            self._synced_records = min(self._synced_records, self.records_written - len(diverted))
+        self.checkpoints += 1
+        if diverted:
+            self._request_sync()
+    
+    def abort_checkpoint(self):
+        """Give up on a checkpoint; the journal stays as it was"""
+        self._diverted = None
+        self._temp_path().unlink(missing_ok=True)
+    
+    def sync(self):
+        """fsync anything appended since the last fsync"""
+        with self._file_lock:
+            target = self.records_written
+            if self._file is not None and target > self._synced_records:
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+                self._synced_records = target
+                self._last_fsync = time.monotonic()
+    
+    @property
+    def synced(self) -> bool:
+        """Whether every record appended so far has been fsynced"""
+        return self._synced_records >= self.records_written
+    
+    def close(self):
+        """Stop the sync thread, then fsync and close the journal file"""
+        thread, self._sync_thread = self._sync_thread, None
+        if thread is not None:
+            self._stopping = True
+            self._sync_wanted.set()
+            thread.join()
+            self._stopping = False
+        if self._file is not None:
+            self.sync()
+            with self._file_lock:
+                self._file.close()
+                self._file = None
+    
+    def _temp_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".tmp")
+    
+    def _write_checkpoint_head(self, f, snapshots: Iterable[Dict[str, Any]],
+                               checkpoints: Iterable[Tuple[Dict[str, Any], GSRSampleBatch]]):
+        for snapshot in snapshots:
+            f.write(self._frame(JournalRecordKind.SESSION, json.dumps(snapshot, default=str).encode()))
+        for checkpoint, held in checkpoints:
+            header = json.dumps(checkpoint, default=str).encode()
+            payload = _JSON_LENGTH.pack(len(header)) + header + held.encode()
+            f.write(self._frame(JournalRecordKind.CHECKPOINT, payload))
+    
+    @staticmethod
+    def _frame(kind: JournalRecordKind, payload: bytes) -> bytes:
+        return _RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload
+    
+    def _append(self, kind: JournalRecordKind, payload: bytes):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Unbuffered: each record reaches the OS in a single write
+            with self._file_lock:
+                self._file = open(self.path, "ab", buffering=0)
+        
+        frame = self._frame(kind, payload)
+        self._file.write(frame)
+        if self._diverted is not None:
+            self._diverted.append(frame)
+        self.records_written += 1
+        self.bytes_written += len(frame)
+        
+        if self.fsync_policy == FsyncPolicy.ALWAYS:
+            self._request_sync()
+        elif (self.fsync_policy == FsyncPolicy.INTERVAL
+              and time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self._request_sync()
+    
+    def _request_sync(self):
+        """Wake the sync thread, starting it on first use"""
+        if self._sync_thread is None:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+            self._sync_thread.start()
+        self._sync_wanted.set()
+    
+    def _sync_loop(self):
+        """Sync thread: one fsync per wake-up, covering every record written before it"""
+        while True:
+            self._sync_wanted.wait()
+            self._sync_wanted.clear()
+            if self._stopping:
+                return
+            try:
+                self.sync()
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to fsync session journal: {e}")
+    
+    @staticmethod
+    def _decode(kind: int, payload: bytes) -> JournalRecord:
+        if kind == JournalRecordKind.SESSION:
+            snapshot = json.loads(payload)
+            return JournalRecord(JournalRecordKind.SESSION, snapshot["session_id"], snapshot=snapshot)
+        if kind == JournalRecordKind.BATCH:
+            (length,) = _SESSION_ID_LENGTH.unpack_from(payload)
+            start = _SESSION_ID_LENGTH.size
+            session_id = payload[start:start + length].decode()
+            batch = GSRSampleBatch.decode(payload[start + length:])
+            return JournalRecord(JournalRecordKind.BATCH, session_id, batch=batch)
+        if kind == JournalRecordKind.SYNC_MARK:
+            sync_mark = json.loads(payload)
+            return JournalRecord(JournalRecordKind.SYNC_MARK, sync_mark["session_id"], sync_mark=sync_mark)
+        if kind == JournalRecordKind.CHECKPOINT:
+            (length,) = _JSON_LENGTH.unpack_from(payload)
+            start = _JSON_LENGTH.size
+            checkpoint = json.loads(payload[start:start + length])
+            batch = GSRSampleBatch.decode(payload[start + length:])
+            return JournalRecord(JournalRecordKind.CHECKPOINT, checkpoint["session_id"],
+                                 batch=batch, checkpoint=checkpoint)
+        raise ValueError(f"Unknown journal record kind {kind}")
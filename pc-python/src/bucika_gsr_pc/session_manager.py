@@ -5,14 +5,36 @@ Maintains compatibility with the existing session management features.
 
 import asyncio
 import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Any, Tuple
 import aiofiles
+import numpy as np
 from loguru import logger
 
-from .protocol import GSRSample
+from .clock_estimator import ClockModel
+from .gsr_writer import GSRCsvWriter, GSR_CSV_HEADER, format_gsr_rows
+from .protocol import GSRSample, GSRSampleBatch
+from .reorder_buffer import DEFAULT_REORDER_WINDOW, SeqReorderBuffer, SequenceGap, SequenceReset
+from .sample_store import GSRSampleStore, DEFAULT_RETENTION_SECONDS
+from .session_file import (
+    RECORD_DTYPE, SESSION_FILE_SUFFIX, GSRSessionFile, GSRSessionFileWriter, file_checksum, select_columns
+)
+from .session_catalog import SessionCatalog
+from .session_group import GROUP_FILE_SUFFIX, GroupState, MergedTimeline, SessionGroup
+from .session_journal import SessionJournal, JournalRecord, JournalRecordKind
+from .session_segments import (
+    SEGMENT_MANIFEST_FILE, SegmentPolicy, gsr_segment_files, read_manifest, read_segments_range,
+    rebuild_manifest, segment_paths
+)
+from .time_sync_service import MAX_CLOCK_OFFSET_NS
 
 
 class SessionState(str, Enum):
@@ -23,33 +45,111 @@ class SessionState(str, Enum):
     FINALISING = "FINALISING"
     DONE = "DONE"
     FAILED = "FAILED"
+    INTERRUPTED = "INTERRUPTED"  # the orchestrator stopped before the session did
+
+
+# States a session never leaves
+FINAL_SESSION_STATES = (SessionState.DONE, SessionState.FAILED, SessionState.INTERRUPTED)
+
+# Binary session files kept mapped for range reads
+MAX_OPEN_SESSION_FILES = 32
+
+# A recording checkpoints the journal once this much has been journaled
+# since the last checkpoint, or this long after it
+JOURNAL_CHECKPOINT_BYTES = 64 * 1024 * 1024
+JOURNAL_CHECKPOINT_INTERVAL = 300.0  # seconds
+
+SESSION_METADATA_FILE = "session_metadata.json"
+SYNC_MARKS_FILE = "sync_marks.csv"
+
+SYNC_MARK_CSV_HEADER = [
+    'Mark_ID',
+    'Timestamp_ns',
+    'DateTime_UTC',
+    'Description',
+    'Session_ID',
+    'Monotonic_ns',
+    'Device_Timestamp_ns',
+    'Device_Monotonic_ns',
+    'Envelope_ns',
+    'Corrected_ns',
+    'Residual_ns'
+]
+
+
+def format_sync_mark_rows(sync_marks: List[Dict[str, Any]]) -> str:
+    """Format sync marks as CSV rows; DateTime_UTC is local time, as for GSR rows"""
+    lines = []
+    for sync_mark in sync_marks:
+        dt = datetime.fromisoformat(sync_mark["timestamp"])
+        row = [
+            sync_mark["mark_id"],
+            sync_mark["timestamp_ns"],
+            dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            sync_mark["description"] or "",
+            sync_mark["session_id"],
+            sync_mark.get("timestamp_mono_ns", "")
+        ] + [
+            "" if sync_mark.get(key) is None else sync_mark[key]
+            for key in ("device_t_utc_ns", "device_t_mono_ns", "envelope_ts_ns", "corrected_ns", "residual_ns")
+        ]
+        lines.append(','.join(f'"{field}"' if isinstance(field, str) and ',' in field else str(field)
+                              for field in row) + '\n')
+    return "".join(lines)
 
 
 class Session:
     """Represents a recording session"""
     
     def __init__(self, session_id: str, session_name: str, device_id: str,
-                 participant_id: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+                 participant_id: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None,
+                 retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+                 reorder_window: int = DEFAULT_REORDER_WINDOW):
         self.session_id = session_id
         self.session_name = session_name
         self.device_id = device_id
         self.participant_id = participant_id
         self.metadata = metadata or {}
+        self.group_id: Optional[str] = None  # SessionGroup this session records in
         
         self.state = SessionState.NEW
         self.created_at = datetime.now()
         self.started_at: Optional[datetime] = None
         self.ended_at: Optional[datetime] = None
         
-        # GSR data storage
-        self.gsr_samples: List[GSRSample] = []
+        # GSR data storage: recent samples in memory, the full recording on disk
+        self.gsr_store = GSRSampleStore(retention_seconds)
         self.gsr_file_path: Optional[Path] = None
+        self.gsr_binary_path: Optional[Path] = None
+        
+        # Puts samples in sequence order and accounts for gaps and duplicates
+        self.reorder = SeqReorderBuffer(reorder_window)
         
         # Uploaded files
         self.uploaded_files: List[str] = []
         
-        # Sync marks for synchronization events
+        # Sync marks for synchronization events, and their CSV file once one is recorded
         self.sync_marks: List[Dict[str, Any]] = []
+        self.sync_marks_file_path: Optional[Path] = None
+        
+        # Scheduled start (PC clock, ns) and how far the device's first
+        # sample landed from it
+        self.scheduled_start_ns: Optional[int] = None
+        self.clock_offset_ns = 0  # device clock - PC clock
+        self.start_skew_ns: Optional[int] = None
+        self.pre_start_samples = 0  # dropped for predating the scheduled start
+        
+        # Latest offset and drift fit of the device clock, whether stored
+        # t_utc_ns values were moved onto the PC clock, and from which sample
+        # of the recording on: the first, or none for the whole session
+        self.clock_model: Optional[ClockModel] = None
+        self.clock_corrected = False
+        self.clock_corrected_from_sample: Optional[int] = None
+    
+    @property
+    def gsr_samples(self) -> List[GSRSample]:
+        """Samples still held in memory, oldest first; older ones are in the CSV file"""
+        return self.gsr_store.to_samples()
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert session to dictionary for serialization"""
@@ -59,21 +159,120 @@ class Session:
             "device_id": self.device_id,
             "participant_id": self.participant_id,
             "metadata": self.metadata,
+            "group_id": self.group_id,
             "state": self.state.value,
             "created_at": self.created_at.isoformat(),
             "started_at": self.started_at.isoformat() if self.started_at else None,
             "ended_at": self.ended_at.isoformat() if self.ended_at else None,
-            "gsr_samples_count": len(self.gsr_samples),
+            "gsr_samples_count": self.gsr_store.total_samples,
+            "gsr_samples_retained": len(self.gsr_store),
+            "reorder_window": self.reorder.window,
+            "sequence_gaps": self.reorder.gap_intervals(),
+            "missing_samples": self.reorder.missing,
+            "sequence_resets": self.reorder.reset_points(),
+            "duplicate_samples": self.reorder.duplicates,
+            "late_samples": self.reorder.late,
             "uploaded_files": self.uploaded_files,
-            "sync_marks": self.sync_marks
+            "sync_marks": self.sync_marks,
+            "scheduled_start_ns": self.scheduled_start_ns,
+            "clock_offset_ns": self.clock_offset_ns,
+            "start_skew_ns": self.start_skew_ns,
+            "pre_start_samples": self.pre_start_samples,
+            "clock_model": self.clock_model.to_dict() if self.clock_model else None,
+            "clock_corrected": self.clock_corrected,
+            "clock_corrected_from_sample": self.clock_corrected_from_sample,
+            "gsr_file_path": str(self.gsr_file_path) if self.gsr_file_path else None,
+            "gsr_binary_path": str(self.gsr_binary_path) if self.gsr_binary_path else None
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any],
+                  retention_seconds: float = DEFAULT_RETENTION_SECONDS) -> 'Session':
+        """Rebuild a session from to_dict output, without its in-memory samples"""
+        session = cls(
+            session_id=data["session_id"],
+            session_name=data["session_name"],
+            device_id=data["device_id"],
+            participant_id=data.get("participant_id"),
+            metadata=data.get("metadata"),
+            retention_seconds=retention_seconds,
+            reorder_window=data.get("reorder_window", DEFAULT_REORDER_WINDOW)
+        )
+        session.group_id = data.get("group_id")
+        session.state = SessionState(data["state"])
+        session.created_at = datetime.fromisoformat(data["created_at"])
+        if data.get("started_at"):
+            session.started_at = datetime.fromisoformat(data["started_at"])
+        if data.get("ended_at"):
+            session.ended_at = datetime.fromisoformat(data["ended_at"])
+        
+        # Samples are on disk only; count them as already evicted from memory
+        session.gsr_store.total_samples = data.get("gsr_samples_count", 0)
+        session.reorder.gaps = [SequenceGap(**gap) for gap in data.get("sequence_gaps", [])]
+        session.reorder.resets = [SequenceReset(**reset) for reset in data.get("sequence_resets", [])]
+        session.reorder.duplicates = data.get("duplicate_samples", 0)
+        session.reorder.late = data.get("late_samples", 0)
+        if data.get("gsr_file_path"):
+            session.gsr_file_path = Path(data["gsr_file_path"])
+        if data.get("gsr_binary_path"):
+            session.gsr_binary_path = Path(data["gsr_binary_path"])
+        
+        session.uploaded_files = list(data.get("uploaded_files", []))
+        session.sync_marks = list(data.get("sync_marks", []))
+        session.scheduled_start_ns = data.get("scheduled_start_ns")
+        session.clock_offset_ns = data.get("clock_offset_ns", 0)
+        session.start_skew_ns = data.get("start_skew_ns")
+        session.pre_start_samples = data.get("pre_start_samples", 0)
+        if data.get("clock_model"):
+            session.clock_model = ClockModel.from_dict(data["clock_model"])
+        session.clock_corrected = data.get("clock_corrected", False)
+        session.clock_corrected_from_sample = data.get("clock_corrected_from_sample",
+                                                       0 if session.clock_corrected else None)
+        return session
 
 
 class SessionManager:
     """Manages recording sessions and data storage"""
     
-    def __init__(self, base_path: Optional[Path] = None):
+    def __init__(self, base_path: Optional[Path] = None,
+                 gsr_writer: Optional[GSRCsvWriter] = None,
+                 retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+                 write_binary: bool = True,
+                 journal: Optional[SessionJournal] = None,
+                 catalog: Optional[SessionCatalog] = None,
+                 segment_policy: Optional[SegmentPolicy] = None,
+                 reorder_window: int = DEFAULT_REORDER_WINDOW,
+                 correct_clock: bool = False):
         self.base_path = base_path or Path("./sessions")
+        self.retention_seconds = retention_seconds
+        
+        # Sequence numbers a sample may arrive behind its successors
+        self.reorder_window = reorder_window
+        
+        # Move t_utc_ns onto the PC clock as samples are stored, for sessions
+        # starting with a clock model, instead of keeping device times and
+        # the clock model for post-processing
+        self.correct_clock = correct_clock
+        
+        # Write-ahead journal of session changes and sample batches, and
+        # when it was last checkpointed
+        self.journal = journal
+        self.journal_checkpoint_bytes = JOURNAL_CHECKPOINT_BYTES
+        self.journal_checkpoint_interval = JOURNAL_CHECKPOINT_INTERVAL
+        self._journal_checkpoint_lock = asyncio.Lock()
+        self._journal_checkpoint_task: Optional[asyncio.Task] = None
+        self._journal_checkpoint_bytes = 0
+        self._journal_checkpoint_time = time.monotonic()
+        
+        # Catalog of every session in base_path, kept current for batch tools
+        self.catalog = catalog
+        
+        # Also write each session to a binary file next to the CSV; range
+        # reads seek through its index, while a CSV is parsed in full
+        self.write_binary = write_binary
+        
+        # Split long recordings into segment files, or keep one file per session
+        self.segment_policy = segment_policy
         self.base_path.mkdir(exist_ok=True)
         
         # Active sessions by device
@@ -82,13 +281,188 @@ class SessionManager:
         # All sessions (for history/monitoring)
         self.all_sessions: Dict[str, Session] = {}
         
-        # GSR file writers for active sessions
-        self.gsr_files: Dict[str, Any] = {}
+        # Latest clock model of each device seen by time sync
+        self.clock_models: Dict[str, ClockModel] = {}
+        
+        # Multi-device groups by id
+        self.session_groups: Dict[str, SessionGroup] = {}
+        
+        # Background writer for the GSR CSV files of active sessions
+        self.gsr_writer = gsr_writer or GSRCsvWriter()
+        
+        # Binary session files opened for range reads, by path, least
+        # recently used first; reads run in executor threads
+        self.session_files: 'OrderedDict[Path, GSRSessionFile]' = OrderedDict()
+        self.max_open_session_files = MAX_OPEN_SESSION_FILES
+        self._session_files_lock = threading.Lock()
     
     async def start_session(self, session_name: str, device_id: str,
                            participant_id: Optional[str] = None,
                            metadata: Optional[Dict[str, Any]] = None) -> str:
         """Start a new recording session"""
+        session = await self._create_session(session_name, device_id, participant_id, metadata)
+        
+        # Update session state
+        session.state = SessionState.RECORDING
+        session.started_at = datetime.now()
+        self._set_clock_correction(session)
+        self._save_session(session)
+        
+        logger.info(f"Started session {session.session_id} for device {device_id}")
+        
+        return session.session_id
+    
+    async def start_group(self, group_name: str, device_ids: List[str],
+                          participant_id: Optional[str] = None,
+                          metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Start a session on every device of a group, merging their samples into one timeline"""
+        if len(set(device_ids)) != len(device_ids):
+            raise ValueError("A device can only be in a group once")
+        busy = [device_id for device_id in device_ids if device_id in self.active_sessions]
+        if busy:
+            raise ValueError(f"Devices already recording: {', '.join(busy)}")
+        
+        group_id = f"group_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        group = SessionGroup(group_id, group_name, device_ids, participant_id, metadata)
+        try:
+            for device_id in device_ids:
+                session_id = await self.start_session(group_name, device_id, participant_id, metadata)
+                session = self.all_sessions[session_id]
+                session.group_id = group_id
+                group.session_ids[device_id] = session_id
+                self._save_session(session)
+        except Exception:
+            # Fail the members already started rather than leave them recording
+            # alone; none of the devices was recording before
+            started = [device_id for device_id in device_ids if device_id in self.active_sessions]
+            for device_id in started:
+                await self._fail_session(device_id)
+            logger.error(f"Failed to start group {group_id}; rolled back {len(started)} member sessions")
+            raise
+        
+        self.session_groups[group_id] = group
+        group.save(self.base_path)
+        
+        logger.info(f"Started group {group_id} with {len(device_ids)} devices")
+        return group_id
+    
+    async def stop_group(self, group_id: str):
+        """Stop every member session of a group and write its merged timeline"""
+        group = self.session_groups.get(group_id)
+        if group is None:
+            logger.warning(f"No session group {group_id}")
+            return
+        
+        for device_id, session_id in group.session_ids.items():
+            session = self.active_sessions.get(device_id)
+            if session is not None and session.session_id == session_id:
+                await self.stop_session(device_id)
+        
+        group.timeline.flush()
+        group.state = GroupState.DONE
+        group.ended_at = datetime.now()
+        await asyncio.get_running_loop().run_in_executor(None, group.save, self.base_path)
+        
+        logger.info(f"Stopped group {group_id}: {len(group.timeline)} samples on its timeline")
+    
+    def get_group(self, group_id: str) -> Optional[SessionGroup]:
+        """A group started by this manager or saved in base_path"""
+        group = self.session_groups.get(group_id)
+        if group is None:
+            try:
+                group = self.session_groups[group_id] = SessionGroup.load(self.base_path, group_id)
+            except FileNotFoundError:
+                return None
+        return group
+    
+    async def read_group_range(self, group_id: str, t_start_ns: int, t_end_ns: int,
+                               columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Samples of every device in a group with t_start_ns <= t_utc_ns < t_end_ns, in time order.
+        
+        The merged timeline gives the order, so each member session is read
+        with read_range and its samples are placed without sorting. A
+        "device" column holds each sample's index into the group's
+        device_ids. Samples not merged yet, because another member is
+        behind, are left out until it catches up.
+        """
+        group = self.get_group(group_id)
+        if group is None:
+            raise ValueError(f"No session group {group_id}")
+        
+        names = select_columns(columns)
+        timeline = group.timeline
+        if timeline.watermark_ns is not None:
+            t_end_ns = min(t_end_ns, timeline.watermark_ns + 1)
+        entries = timeline.range(t_start_ns, t_end_ns)
+        devices = np.asarray(entries["device"])
+        
+        result: Dict[str, np.ndarray] = {}
+        for index, device_id in enumerate(group.device_ids):
+            rows = devices == index
+            if not rows.any():
+                continue
+            data = await self.read_range(group.session_ids[device_id], t_start_ns, t_end_ns, names)
+            if len(data[names[0]]) != int(rows.sum()):
+                raise ValueError(f"Session {group.session_ids[device_id]} is out of step with "
+                                 f"the timeline of group {group_id}")
+            for name in names:
+                if name not in result:
+                    result[name] = np.empty(len(entries), dtype=data[name].dtype)
+                result[name][rows] = data[name]
+        
+        if not result:
+            result = {name: np.empty(0, dtype=RECORD_DTYPE[name]) for name in names}
+        result["device"] = devices.astype(np.int64)
+        return result
+    
+    async def arm_session(self, session_name: str, device_id: str, start_at_ns: int,
+                          clock_offset_ns: int = 0,
+                          participant_id: Optional[str] = None,
+                          metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Create a session that starts recording at a scheduled instant"""
+        session = await self._create_session(session_name, device_id, participant_id, metadata)
+        session.state = SessionState.ARMED
+        session.scheduled_start_ns = start_at_ns
+        session.clock_offset_ns = clock_offset_ns
+        self._set_clock_correction(session)
+        self._save_session(session)
+        
+        logger.info(f"Armed session {session.session_id} for device {device_id}, "
+                    f"starting at {start_at_ns}")
+        
+        return session.session_id
+    
+    def begin_armed_session(self, device_id: str):
+        """Move an armed session to RECORDING once its start instant is reached"""
+        session = self.active_sessions.get(device_id)
+        if session and session.state == SessionState.ARMED:
+            session.state = SessionState.RECORDING
+            session.started_at = datetime.now()
+            self._save_session(session)
+    
+    async def abort_armed_session(self, device_id: str):
+        """Discard an armed session whose device never confirmed the start"""
+        session = self.active_sessions.get(device_id)
+        if not session or session.state != SessionState.ARMED:
+            return
+        
+        await self._fail_session(device_id)
+        logger.warning(f"Aborted armed session {session.session_id}")
+    
+    async def _fail_session(self, device_id: str):
+        """Close an active session's files and mark it FAILED"""
+        session = self.active_sessions.pop(device_id)
+        await self._close_gsr_file(device_id)
+        session.state = SessionState.FAILED
+        session.ended_at = datetime.now()
+        self._forget_session_files(session.session_id)
+        self._save_session(session)
+        await self.checkpoint_journal()
+    
+    async def _create_session(self, session_name: str, device_id: str,
+                              participant_id: Optional[str],
+                              metadata: Optional[Dict[str, Any]]) -> Session:
+        """Create and register a session with its directory and GSR file"""
         # Generate session ID
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         session_id = f"{device_id}_{timestamp}"
@@ -99,7 +473,9 @@ class SessionManager:
             session_name=session_name,
             device_id=device_id,
             participant_id=participant_id,
-            metadata=metadata
+            metadata=metadata,
+            retention_seconds=self.retention_seconds,
+            reorder_window=self.reorder_window
         )
         
         # Create session directory
@@ -109,21 +485,17 @@ class SessionManager:
         # Set up GSR data file
         gsr_filename = f"gsr_data_{timestamp}.csv"
         session.gsr_file_path = session_dir / gsr_filename
+        if self.write_binary:
+            session.gsr_binary_path = session.gsr_file_path.with_suffix(SESSION_FILE_SUFFIX)
         
         # Initialize GSR CSV file
         await self._init_gsr_file(session)
         
-        # Update session state
-        session.state = SessionState.RECORDING
-        session.started_at = datetime.now()
-        
         # Register session
         self.active_sessions[device_id] = session
         self.all_sessions[session_id] = session
         
-        logger.info(f"Started session {session_id} for device {device_id}")
-        
-        return session_id
+        return session
     
     async def stop_session(self, device_id: str):
         """Stop the active session for a device"""
@@ -136,59 +508,195 @@ class SessionManager:
         session.state = SessionState.FINALISING
         session.ended_at = datetime.now()
         
-        # Close GSR file
+        # Release samples still waiting on earlier ones, then close GSR file
+        self._store_ordered(session, session.reorder.flush())
         await self._close_gsr_file(device_id)
         
+        # Its group's timeline no longer waits for this device
+        group = self.session_groups.get(session.group_id)
+        if group is not None:
+            group.timeline.finish(group.device_index(device_id))
+        
         # Finalize session
         session.state = SessionState.DONE
         
         # Remove from active sessions
         del self.active_sessions[device_id]
+        self._forget_session_files(session.session_id)
+        self._save_session(session)
+        await self.checkpoint_journal()
+        await self._catalog_checksums(session)
         
         logger.info(f"Stopped session {session.session_id}")
     
     async def store_gsr_samples(self, device_id: str, samples: List[GSRSample]):
         """Store GSR samples for an active session"""
+        await self.store_gsr_batch(device_id, GSRSampleBatch.from_samples(samples))
+    
+    async def store_gsr_batch(self, device_id: str, batch: GSRSampleBatch):
+        """Store a batch of GSR samples for an active session"""
         session = self.active_sessions.get(device_id)
         if not session:
             logger.warning(f"No active session found for device {device_id}")
             return
         
-        # Add to session samples
-        session.gsr_samples.extend(samples)
+        # Samples from before a scheduled start, sent while the session is
+        # still armed, are not part of the recording
+        if session.scheduled_start_ns is not None and len(batch):
+            keep = (np.asarray(batch.t_utc_ns, dtype=np.int64) - session.clock_offset_ns
+                    >= session.scheduled_start_ns)
+            if not keep.all():
+                session.pre_start_samples += int(np.count_nonzero(~keep))
+                batch = GSRSampleBatch(**{name: np.asarray(getattr(batch, name))[keep]
+                                          for name in GSRSampleBatch.__slots__})
+                if not len(batch):
+                    return
+        
+        # The first sample of a scheduled session shows how late it started
+        if session.scheduled_start_ns is not None and session.start_skew_ns is None and len(batch):
+            first_sample_ns = batch.t_utc_ns[0] - session.clock_offset_ns
+            session.start_skew_ns = first_sample_ns - session.scheduled_start_ns
+            logger.info(f"Session {session.session_id} started "
+                        f"{session.start_skew_ns / 1_000_000:+.1f} ms from its scheduled start")
+        
+        # Journal the batch as received first so a crash cannot lose it in the
+        # reorder window or the writer's buffer; recovery replays the reordering
+        if self.journal is not None:
+            try:
+                self.journal.append_batch(session.session_id, batch)
+            except OSError as e:
+                logger.error(f"Failed to journal GSR batch for session {session.session_id}: {e}")
+            self._checkpoint_journal_if_due()
         
-        # Write to CSV file
-        await self._write_gsr_samples(device_id, samples)
+        gaps, resets = len(session.reorder.gaps), len(session.reorder.resets)
+        self._store_ordered(session, session.reorder.push(batch))
+        for gap in session.reorder.gaps[gaps:]:
+            logger.warning(f"Session {session.session_id} is missing samples {gap.first_seq}-{gap.last_seq}")
         
-        logger.debug(f"Stored {len(samples)} GSR samples for session {session.session_id}")
+        # A device that restarted its numbering is recorded in the session metadata
+        for reset in session.reorder.resets[resets:]:
+            logger.warning(f"Session {session.session_id} sequence restarted at {reset.first_seq} "
+                           f"after {reset.last_seq}")
+        if len(session.reorder.resets) > resets:
+            self._save_session(session)
+        
+        logger.debug(f"Stored {len(batch)} GSR samples for session {session.session_id}")
+    
+    def _store_ordered(self, session: Session, batch: GSRSampleBatch):
+        """Keep samples released in sequence order and hand them to the writer"""
+        if not len(batch):
+            return
+        
+        # Put device timestamps on the PC clock before anything keeps them
+        if session.clock_corrected:
+            batch = _on_server_clock(batch, session.clock_model)
+        
+        # Merge into the group timeline, numbering samples across the recording
+        group = self.session_groups.get(session.group_id)
+        if group is not None:
+            group.timeline.add(group.device_index(session.device_id), batch.t_utc_ns,
+                               session.gsr_store.total_samples)
+        
+        # Keep the recent window in memory for live views
+        session.gsr_store.append(batch)
+        
+        # Hand the batch to the CSV writer thread
+        self._write_gsr_batch(session.device_id, batch)
     
-    async def record_sync_mark(self, device_id: str, mark_id: str, description: Optional[str] = None):
-        """Record a synchronization mark for an active session"""
+    def set_clock_model(self, device_id: str, model: ClockModel):
+        """Record the latest fit of a device's clock against the PC clock, for its active session
+        and the sessions it starts later"""
+        self.clock_models[device_id] = model
+        session = self.active_sessions.get(device_id)
+        if session is not None:
+            session.clock_model = model
+    
+    def _set_clock_correction(self, session: Session):
+        """Decide once, as a session starts, whether its times go on the PC clock.
+        
+        Only a session whose device already has a clock model is corrected:
+        switching partway through would make t_utc_ns jump by the offset,
+        and range reads rely on it being sorted. Other sessions keep device
+        times and the model for post-processing.
+        """
+        session.clock_model = self.clock_models.get(session.device_id, session.clock_model)
+        session.clock_corrected = self.correct_clock and session.clock_model is not None
+        session.clock_corrected_from_sample = 0 if session.clock_corrected else None
+        if self.correct_clock and not session.clock_corrected:
+            logger.warning(f"Session {session.session_id} keeps device clock times: "
+                           f"no clock model for {session.device_id} yet")
+    
+    def to_server_time(self, session_id: str, t_utc_ns, first_sample: int = 0) -> np.ndarray:
+        """A session's stored t_utc_ns values on the PC clock, for post-processing.
+        
+        first_sample is the position of the first value in the recording.
+        Times stored already corrected, or from a device never seen by time
+        sync, are returned as they are.
+        """
+        session = self.all_sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"Unknown session {session_id}")
+        t_utc_ns = np.asarray(t_utc_ns, dtype=np.int64)
+        if session.clock_model is None:
+            return t_utc_ns
+        raw = len(t_utc_ns) if not session.clock_corrected else \
+            max(0, min(len(t_utc_ns), session.clock_corrected_from_sample - first_sample))
+        if not raw:
+            return t_utc_ns
+        return np.concatenate([session.clock_model.to_server_ns(t_utc_ns[:raw]), t_utc_ns[raw:]])
+    
+    async def record_sync_mark(self, device_id: str, mark_id: str, description: Optional[str] = None,
+                               device_t_utc_ns: Optional[int] = None, device_t_mono_ns: Optional[int] = None,
+                               envelope_ts_ns: Optional[int] = None):
+        """Record a synchronization mark for an active session.
+        
+        timestamp_ns is when the PC processed the mark, which trails the
+        event by the network and queueing delay. When the device reports
+        when the event happened on its own clock, or at least the envelope
+        time it sent the mark at, that time is mapped onto the PC clock as
+        corrected_ns, with residual_ns bounding its remaining error. An
+        envelope time further than MAX_CLOCK_OFFSET_NS from the PC clock is
+        not wall clock time (older Android clients send System.nanoTime())
+        and leaves corrected_ns empty.
+        """
         session = self.active_sessions.get(device_id)
         if not session:
             logger.warning(f"No active session found for device {device_id}")
             return
         
-        # Create sync mark record
+        # Read each clock once so every time of the mark agrees
+        t_mono_ns = time.monotonic_ns()
+        t_utc_ns = time.time_ns()
         sync_mark = {
             "mark_id": mark_id,
-            "timestamp": datetime.now().isoformat(),
-            "timestamp_ns": int(datetime.now().timestamp() * 1_000_000_000),
+            "timestamp": _local_datetime(t_utc_ns).isoformat(),
+            "timestamp_ns": t_utc_ns,
+            "timestamp_mono_ns": t_mono_ns,
             "description": description,
-            "session_id": session.session_id
+            "session_id": session.session_id,
+            "device_t_utc_ns": device_t_utc_ns,
+            "device_t_mono_ns": device_t_mono_ns,
+            "envelope_ts_ns": envelope_ts_ns,
+            **_corrected_mark_time(session, device_t_utc_ns if device_t_utc_ns is not None
+                                   else _epoch_envelope_time(envelope_ts_ns, t_utc_ns))
         }
         
-        # Add to session sync marks
+        # Add to session sync marks; the session snapshot catches up when it stops
         session.sync_marks.append(sync_mark)
+        if self.journal is not None:
+            try:
+                self.journal.append_sync_mark(sync_mark)
+            except OSError as e:
+                logger.error(f"Failed to journal sync mark for session {session.session_id}: {e}")
         
         # Also write to a separate sync marks file for the session
-        await self._write_sync_mark(session, sync_mark)
+        self._write_sync_mark(session, sync_mark)
         
         logger.info(f"Recorded sync mark '{mark_id}' for session {session.session_id}")
     
     
-    async def save_uploaded_file(self, device_id: str, filename: str, file_data: bytes):
-        """Save an uploaded file for the session"""
+    def get_upload_path(self, device_id: str, filename: str) -> Path:
+        """Get the destination path for a file uploaded by a device"""
         session = self.active_sessions.get(device_id)
         if session:
             session_dir = self.base_path / session.session_id
@@ -197,15 +705,25 @@ class SessionManager:
             session_dir = self.base_path / f"{device_id}_uploads"
         
         session_dir.mkdir(exist_ok=True)
-        file_path = session_dir / filename
+        return session_dir / Path(filename).name
+    
+    def register_uploaded_file(self, device_id: str, filename: str):
+        """Track a file that was written to its upload path"""
+        session = self.active_sessions.get(device_id)
+        if session:
+            session.uploaded_files.append(filename)
+            self._save_session(session)
+    
+    async def save_uploaded_file(self, device_id: str, filename: str, file_data: bytes):
+        """Save an uploaded file for the session"""
+        file_path = self.get_upload_path(device_id, filename)
         
         # Save file
         async with aiofiles.open(file_path, 'wb') as f:
             await f.write(file_data)
         
         # Track in session if available
-        if session:
-            session.uploaded_files.append(filename)
+        self.register_uploaded_file(device_id, filename)
         
         logger.info(f"Saved uploaded file: {filename} ({len(file_data)} bytes)")
     
@@ -214,112 +732,316 @@ class SessionManager:
         if not session.gsr_file_path:
             return
         
-        # Open file for writing
-        file_handle = await aiofiles.open(session.gsr_file_path, 'w', newline='')
-        
-        # Write header
-        header = [
-            'Timestamp_ns',
-            'DateTime_UTC', 
-            'Sequence',
-            'GSR_Raw_uS',
-            'GSR_Filtered_uS',
-            'Temperature_C',
-            'Flag_Spike',
-            'Flag_Saturation',
-            'Flag_Dropout'
-        ]
-        
-        # Write header as CSV line
-        header_line = ','.join(header) + '\n'
-        await file_handle.write(header_line)
-        await file_handle.flush()
-        
-        # Store references
-        self.gsr_files[session.device_id] = file_handle
+        # Create the file and write its header on the writer thread
+        await self.gsr_writer.wait(self.gsr_writer.open(session.device_id, session.gsr_file_path,
+                                                        binary_path=session.gsr_binary_path,
+                                                        segment_policy=self.segment_policy))
+    
+    def _write_gsr_batch(self, device_id: str, batch: GSRSampleBatch):
+        """Queue GSR samples for the writer thread to append to the CSV file"""
+        self.gsr_writer.write(device_id, batch)
+    
+    def _write_sync_mark(self, session: Session, sync_mark: Dict[str, Any]):
+        """Queue a sync mark for the writer thread to append to the session's sync marks file"""
+        key = (session.device_id, SYNC_MARKS_FILE)
+        try:
+            # The file is created with the first mark and stays open until the session stops
+            if session.sync_marks_file_path is None:
+                session.sync_marks_file_path = self.base_path / session.session_id / SYNC_MARKS_FILE
+                self.gsr_writer.open(key, session.sync_marks_file_path, header=SYNC_MARK_CSV_HEADER)
+            self.gsr_writer.write_text(key, format_sync_mark_rows([sync_mark]))
+        except Exception as e:
+            logger.error(f"Failed to write sync mark: {e}")
+    
     
-    async def _write_gsr_samples(self, device_id: str, samples: List[GSRSample]):
-        """Write GSR samples to CSV file"""
-        file_handle = self.gsr_files.get(device_id)
+    async def _close_gsr_file(self, device_id: str):
+        """Flush and close the GSR and sync mark files for a device"""
+        try:
+            await self.gsr_writer.wait(self.gsr_writer.close(device_id))
+            await self.gsr_writer.wait(self.gsr_writer.close((device_id, SYNC_MARKS_FILE)))
+        except Exception as e:
+            logger.error(f"Error closing GSR file: {e}")
+    
+    async def close(self):
+        """Flush every open GSR file, stop the writer thread and close the journal"""
+        # Sessions still recording are checkpointed for recovery
+        await self.checkpoint_journal()
+        await asyncio.get_running_loop().run_in_executor(None, self.gsr_writer.shutdown)
+        if self.journal is not None:
+            self.journal.close()
+    
+    async def checkpoint_journal(self):
+        """Drop journaled batches that are durable in the session data files.
         
-        if not file_handle:
-            logger.warning(f"No GSR file writer found for device {device_id}")
+        The writer fsyncs each active session's files up to the batches
+        handed to it so far. The journal is then replaced by a snapshot of
+        every session, a checkpoint of each active one with the samples its
+        reorder window still holds, and the records appended meanwhile.
+        """
+        if self.journal is None:
             return
         
-        try:
-            for sample in samples:
-                # Convert timestamp to human-readable format
-                dt = datetime.fromtimestamp(sample.t_utc_ns / 1_000_000_000)
-                dt_str = dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]  # microsecond precision
-                
-                row = [
-                    sample.t_utc_ns,
-                    dt_str,
-                    sample.seq,
-                    sample.gsr_raw_uS,
-                    sample.gsr_filt_uS,
-                    sample.temp_C,
-                    sample.flag_spike,
-                    sample.flag_sat,
-                    sample.flag_dropout
-                ]
-                
-                # Write CSV row
-                csv_row = ','.join(str(field) for field in row) + '\n'
-                await file_handle.write(csv_row)
+        async with self._journal_checkpoint_lock:
+            # No await until every sync is queued: each batch journaled so far
+            # has been handed to the writer or is held in a reorder window
+            self.journal.begin_checkpoint()
+            syncs = [self.gsr_writer.sync(device_id) for device_id in self.active_sessions]
+            snapshots = [session.to_dict() for session in self.all_sessions.values()]
+            checkpoints = [
+                ({"session_id": session.session_id,
+                  "base_samples": session.gsr_store.total_samples,
+                  "reorder": session.reorder.state()},
+                 session.reorder.held())
+                for session in self.active_sessions.values()
+            ]
+            self._journal_checkpoint_bytes = self.journal.bytes_written
+            self._journal_checkpoint_time = time.monotonic()
             
-            await file_handle.flush()
+            try:
+                for future in syncs:
+                    await self.gsr_writer.wait(future)
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.journal.write_checkpoint, snapshots, checkpoints
+                )
+                self.journal.finish_checkpoint()
+            except Exception as e:
+                self.journal.abort_checkpoint()
+                logger.error(f"Failed to checkpoint session journal: {e}")
+    
+    def _checkpoint_journal_if_due(self):
+        """Start a checkpoint in the background once enough has been journaled"""
+        if self._journal_checkpoint_task is not None and not self._journal_checkpoint_task.done():
+            return
+        if (self.journal.bytes_written - self._journal_checkpoint_bytes >= self.journal_checkpoint_bytes
+                or time.monotonic() - self._journal_checkpoint_time >= self.journal_checkpoint_interval):
+            self._journal_checkpoint_task = asyncio.create_task(self.checkpoint_journal())
+    
+    async def recover(self) -> List[str]:
+        """Rebuild sessions from the journal after a restart.
+        
+        Samples journaled but missing from a session's files are written to
+        them, sessions that never finished are marked INTERRUPTED and the
+        journal is compacted. Returns the ids of the interrupted sessions.
+        """
+        if self.journal is None:
+            return []
+        
+        loop = asyncio.get_running_loop()
+        snapshots, batches, checkpoints = await loop.run_in_executor(None, _read_journal, self.journal)
+        
+        interrupted = []
+        for session_id, snapshot in snapshots.items():
+            if session_id in self.all_sessions:
+                continue
             
-        except Exception as e:
-            logger.error(f"Failed to write GSR samples: {e}")
+            session = Session.from_dict(snapshot, self.retention_seconds)
+            if session.state not in FINAL_SESSION_STATES:
+                # The journal holds every batch as received since the session
+                # started or was last checkpointed; reordering them again
+                # reproduces what was written after that
+                checkpoint = checkpoints.get(session_id)
+                ordered = _replay_reorder(session, batches.get(session_id, []), checkpoint)
+                base = checkpoint.checkpoint["base_samples"] if checkpoint else 0
+                ordered = _correct_replayed(session, ordered, base)
+                session.gsr_store.total_samples = base + sum(len(batch) for batch in ordered)
+                restored = await loop.run_in_executor(None, self._restore_gsr_files, session, ordered, base)
+                session.state = SessionState.INTERRUPTED
+                self._save_session(session)
+                await self._catalog_checksums(session)
+                interrupted.append(session_id)
+                logger.warning(f"Session {session_id} was interrupted; restored {restored} "
+                               f"samples from the journal")
+            self.all_sessions[session_id] = session
+        
+        for group_path in sorted(self.base_path.glob(f"*{GROUP_FILE_SUFFIX}")):
+            await self._recover_group(group_path.name[:-len(GROUP_FILE_SUFFIX)])
+        
+        await self.checkpoint_journal()
+        logger.info(f"Recovered {len(snapshots)} sessions from the journal "
+                    f"({len(interrupted)} interrupted)")
+        return interrupted
     
-    async def _write_sync_mark(self, session: Session, sync_mark: Dict[str, Any]):
-        """Write sync mark to session's sync marks file"""
+    async def _recover_group(self, group_id: str):
+        """Rebuild the timeline of a group still recording when the orchestrator stopped"""
+        if group_id in self.session_groups:
+            return
         try:
-            # Create sync marks file path
-            session_dir = self.base_path / session.session_id
-            sync_marks_file = session_dir / "sync_marks.csv"
-            
-            # Check if file exists to decide on header
-            file_exists = sync_marks_file.exists()
-            
-            # Write sync mark 
-            async with aiofiles.open(sync_marks_file, 'a', newline='') as f:
-                # Write header if new file
-                if not file_exists:
-                    header = "Mark_ID,Timestamp_ns,DateTime_UTC,Description,Session_ID\n"
-                    await f.write(header)
-                
-                # Convert timestamp to human-readable format
-                dt = datetime.fromisoformat(sync_mark["timestamp"])
-                dt_str = dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                
-                # Write sync mark row
-                row = [
-                    sync_mark["mark_id"],
-                    sync_mark["timestamp_ns"],
-                    dt_str,
-                    sync_mark["description"] or "",
-                    sync_mark["session_id"]
-                ]
-                
-                csv_row = ','.join(f'"{field}"' if isinstance(field, str) and ',' in field else str(field) for field in row) + '\n'
-                await f.write(csv_row)
-                await f.flush()
-                
-        except Exception as e:
-            logger.error(f"Failed to write sync mark: {e}")
+            group = SessionGroup.load(self.base_path, group_id)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load group {group_id}: {e}")
+            return
+        if group.state != GroupState.RECORDING:
+            return
+        
+        # Members' files hold every sample now, in the order they were numbered
+        group.timeline = MergedTimeline(len(group.device_ids), max_lag_ns=None)
+        for index, device_id in enumerate(group.device_ids):
+            session_id = group.session_ids.get(device_id)
+            try:
+                if session_id is None:
+                    raise ValueError(f"No session for device {device_id}")
+                t_utc_ns = (await self.read_range(session_id, np.iinfo(np.int64).min,
+                                                  np.iinfo(np.int64).max, ["t_utc_ns"]))["t_utc_ns"]
+            except ValueError as e:
+                logger.warning(f"Group {group_id} has no samples from {device_id}: {e}")
+                continue
+            group.timeline.add(index, t_utc_ns, 0)
+        group.timeline.flush()
+        
+        group.state = GroupState.INTERRUPTED
+        group.ended_at = datetime.now()
+        await asyncio.get_running_loop().run_in_executor(None, group.save, self.base_path)
+        self.session_groups[group_id] = group
+        logger.warning(f"Group {group_id} was interrupted; rebuilt its timeline of "
+                       f"{len(group.timeline)} samples")
     
+    async def read_range(self, session_id: str, t_start_ns: int, t_end_ns: int,
+                         columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Read a session's samples with t_start_ns <= t_utc_ns < t_end_ns.
+        
+        Works for sessions still recording: recent ranges come from the
+        in-memory window, older ones from the binary session files through
+        their index, after the writer has flushed what it buffered. Segments
+        outside the range are skipped and the rest are read in parallel.
+        Sessions recorded with write_binary off have only CSV segments, which
+        are parsed in full.
+        """
+        names = select_columns(columns)
+        session = self.all_sessions.get(session_id)
+        
+        if session is not None:
+            if session.gsr_store.covers(t_start_ns):
+                return session.gsr_store.read_range(t_start_ns, t_end_ns, names)
+            if self.active_sessions.get(session.device_id) is session:
+                await self.gsr_writer.wait(self.gsr_writer.flush(session.device_id))
+        
+        session_dir = self.base_path / session_id
+        if not session_dir.is_dir() or not gsr_segment_files(session_dir):
+            raise ValueError(f"No GSR data found for session {session_id}")
+        
+        data_files = gsr_segment_files(session_dir, t_start_ns=t_start_ns, t_end_ns=t_end_ns)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: read_segments_range(data_files, t_start_ns, t_end_ns, names, self._session_file)
+        )
     
-    async def _close_gsr_file(self, device_id: str):
-        """Close GSR file for a device"""
-        file_handle = self.gsr_files.get(device_id)
-        if file_handle:
+    def _session_file(self, path: Path) -> GSRSessionFile:
+        """Cached reader of a binary session file, refreshed to see appended records"""
+        with self._session_files_lock:
+            session_file = self.session_files.pop(path, None)
+            if session_file is None:
+                session_file = GSRSessionFile(path)
+            else:
+                session_file.refresh()
+            self.session_files[path] = session_file
+            while len(self.session_files) > self.max_open_session_files:
+                self.session_files.popitem(last=False)
+        return session_file
+    
+    def _forget_session_files(self, session_id: str):
+        """Unmap a finished session's files; later reads map them again"""
+        session_dir = self.base_path / session_id
+        with self._session_files_lock:
+            for path in [path for path in self.session_files if path.parent == session_dir]:
+                del self.session_files[path]
+    
+    def _save_session(self, session: Session):
+        """Journal a session's state, rewrite its session_metadata.json and catalog it"""
+        snapshot = session.to_dict()
+        if self.journal is not None:
             try:
-                await file_handle.close()
-                del self.gsr_files[device_id]
-            except Exception as e:
-                logger.error(f"Error closing GSR file: {e}")
+                self.journal.append_session(snapshot)
+            except OSError as e:
+                logger.error(f"Failed to journal session {session.session_id}: {e}")
+        self._write_session_metadata(session)
+        if self.catalog is not None:
+            try:
+                self.catalog.upsert_session(snapshot)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to catalog session {session.session_id}: {e}")
+    
+    async def _catalog_checksums(self, session: Session):
+        """Checksum a finished session's data files into the catalog.
+        
+        A segmented recording is checksummed through its manifest, which
+        holds the checksum of every segment.
+        """
+        if self.catalog is None:
+            return
+        
+        def checksums():
+            manifest_path = self.base_path / session.session_id / SEGMENT_MANIFEST_FILE
+            if manifest_path.exists():
+                return file_checksum(manifest_path), None
+            return tuple(
+                file_checksum(path) if path and path.exists() else None
+                for path in (session.gsr_file_path, session.gsr_binary_path)
+            )
+        
+        try:
+            gsr_checksum, binary_checksum = await asyncio.get_running_loop().run_in_executor(None, checksums)
+            self.catalog.set_checksums(session.session_id, gsr_checksum, binary_checksum)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Failed to checksum session {session.session_id}: {e}")
+    
+    def _write_session_metadata(self, session: Session):
+        """Atomically replace the session's session_metadata.json"""
+        # Readers treat a present key as a value, so leave unset fields out
+        metadata = {key: value for key, value in session.to_dict().items() if value is not None}
+        metadata_path = self.base_path / session.session_id / SESSION_METADATA_FILE
+        temp_path = metadata_path.with_name(metadata_path.name + ".tmp")
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(metadata, f, indent=2, default=str)
+            os.replace(temp_path, metadata_path)
+        except OSError as e:
+            logger.error(f"Failed to write metadata for session {session.session_id}: {e}")
+    
+    def _restore_gsr_files(self, session: Session, batches: List[GSRSampleBatch], base: int = 0) -> int:
+        """Append journaled samples and sync marks missing from a session's data files.
+        
+        batches continue the first base samples of the recording, which a
+        checkpoint found durable. Every file holds a prefix of the samples, so
+        whatever is past the rows already on disk is appended to the last
+        segment, and the segment manifest is rebuilt. Returns the samples
+        restored to the CSV file.
+        """
+        columns = {
+            name: np.concatenate([np.asarray(getattr(batch, name)) for batch in batches])
+            if batches else np.empty(0)
+            for name in GSRSampleBatch.__slots__
+        }
+        
+        def remaining(start: int) -> GSRSampleBatch:
+            start = max(0, start - base)
+            return GSRSampleBatch(**{name: values[start:] for name, values in columns.items()})
+        
+        restored = 0
+        segments = segment_paths(session.gsr_file_path) if session.gsr_file_path else []
+        if segments:
+            # Earlier segments were closed durably before the next one was started
+            earlier_rows = sum(_count_csv_rows(path) for path in segments[:-1])
+            restored = _restore_csv_file(segments[-1], GSR_CSV_HEADER,
+                                         lambda rows: format_gsr_rows(remaining(earlier_rows + rows)))
+        
+        if session.sync_marks:
+            _restore_csv_file(self.base_path / session.session_id / SYNC_MARKS_FILE, SYNC_MARK_CSV_HEADER,
+                              lambda rows_on_disk: format_sync_mark_rows(session.sync_marks[rows_on_disk:]))
+        
+        if session.gsr_binary_path and segments:
+            binary_segments = [path.with_suffix(SESSION_FILE_SUFFIX) for path in segments]
+            earlier_records = sum(len(GSRSessionFile(path)) for path in binary_segments[:-1])
+            writer = GSRSessionFileWriter(binary_segments[-1], resume=True)
+            try:
+                writer.append(remaining(earlier_records + writer.record_count))
+                writer.sync()
+            finally:
+                writer.close()
+        
+        session_dir = self.base_path / session.session_id
+        if segments and (self.segment_policy is not None or len(segments) > 1
+                         or read_manifest(session_dir) is not None):
+            rebuild_manifest(session.gsr_file_path, binary=session.gsr_binary_path is not None)
+        return restored
     
     def get_active_session(self, device_id: str) -> Optional[Session]:
         """Get the active session for a device"""
@@ -335,4 +1057,143 @@ class SessionManager:
     
     def get_active_sessions(self) -> Dict[str, Session]:
         """Get all active sessions"""
-        return self.active_sessions.copy()
\ No newline at end of file
+        return self.active_sessions.copy()
+
+
+def _local_datetime(t_ns: int) -> datetime:
+    """Local datetime of a nanosecond UTC timestamp, without a float round trip"""
+    return datetime.fromtimestamp(t_ns // 1_000_000_000).replace(microsecond=t_ns // 1_000 % 1_000_000)
+
+
+def _epoch_envelope_time(envelope_ts_ns: Optional[int], t_utc_ns: int) -> Optional[int]:
+    """An envelope time, if it is plausibly nanoseconds since the Unix epoch"""
+    if envelope_ts_ns is None or abs(envelope_ts_ns - t_utc_ns) > MAX_CLOCK_OFFSET_NS:
+        return None
+    return envelope_ts_ns
+
+
+def _corrected_mark_time(session: Session, device_ns: Optional[int]) -> Dict[str, Optional[int]]:
+    """A sync mark's device time on the PC clock, and the bound on its error.
+    
+    With a clock model the error is at most half the smallest round trip
+    the model was fitted from, the most two network legs can differ by.
+    Otherwise the offset measured when the session was armed is used, and
+    how far it is off is not known.
+    """
+    if device_ns is None:
+        return {"corrected_ns": None, "residual_ns": None}
+    if session.clock_model is not None:
+        return {"corrected_ns": int(session.clock_model.to_server_ns(device_ns)),
+                "residual_ns": session.clock_model.rtt_ns // 2}
+    return {"corrected_ns": device_ns - session.clock_offset_ns, "residual_ns": None}
+
+
+def _read_journal(journal: SessionJournal) -> Tuple[Dict[str, Dict[str, Any]],
+                                                     Dict[str, List[GSRSampleBatch]],
+                                                     Dict[str, JournalRecord]]:
+    """Latest snapshot, batches since the last checkpoint and that checkpoint, by session.
+    
+    Records are read one at a time; batches of sessions that reach a final
+    state are let go, as their data files are complete.
+    """
+    snapshots: Dict[str, Dict[str, Any]] = {}
+    batches: Dict[str, List[GSRSampleBatch]] = {}
+    checkpoints: Dict[str, JournalRecord] = {}
+    for record in journal.iter_replay():
+        session_id = record.session_id
+        if record.kind == JournalRecordKind.SESSION:
+            snapshots[session_id] = record.snapshot
+            if SessionState(record.snapshot["state"]) in FINAL_SESSION_STATES:
+                batches.pop(session_id, None)
+                checkpoints.pop(session_id, None)
+        elif session_id not in snapshots:
+            continue
+        elif record.kind == JournalRecordKind.CHECKPOINT:
+            checkpoints[session_id] = record
+            batches[session_id] = []
+        elif record.kind == JournalRecordKind.BATCH:
+            batches.setdefault(session_id, []).append(record.batch)
+        elif record.kind == JournalRecordKind.SYNC_MARK:
+            snapshots[session_id].setdefault("sync_marks", []).append(record.sync_mark)
+    return snapshots, batches, checkpoints
+
+
+def _correct_replayed(session: Session, batches: List[GSRSampleBatch], base: int) -> List[GSRSampleBatch]:
+    """Put replayed samples stored on the PC clock back on it.
+    
+    The journal keeps device times. The latest model the session saved is
+    used, which may differ slightly from the one in use when they were stored.
+    """
+    if not session.clock_corrected or session.clock_model is None:
+        return batches
+    corrected = []
+    for batch in batches:
+        raw = max(0, min(len(batch), session.clock_corrected_from_sample - base))
+        if raw < len(batch):
+            columns = {name: np.asarray(getattr(batch, name)) for name in GSRSampleBatch.__slots__}
+            columns["t_utc_ns"] = np.concatenate([columns["t_utc_ns"][:raw],
+                                                  session.clock_model.to_server_ns(columns["t_utc_ns"][raw:])])
+            batch = GSRSampleBatch(**columns)
+        corrected.append(batch)
+        base += len(batch)
+    return corrected
+
+
+def _on_server_clock(batch: GSRSampleBatch, model: ClockModel) -> GSRSampleBatch:
+    """A batch with its t_utc_ns moved onto the PC clock"""
+    columns = {name: getattr(batch, name) for name in GSRSampleBatch.__slots__}
+    columns["t_utc_ns"] = model.to_server_ns(batch.t_utc_ns)
+    return GSRSampleBatch(**columns)
+
+
+def _replay_reorder(session: Session, batches: List[GSRSampleBatch],
+                    checkpoint: Optional[JournalRecord] = None) -> List[GSRSampleBatch]:
+    """Pass journaled batches through the reorder window as checkpointed, flushing it at the end"""
+    if checkpoint is None:
+        session.reorder = SeqReorderBuffer(session.reorder.window)
+    else:
+        session.reorder = SeqReorderBuffer.restore(session.reorder.window,
+                                                   checkpoint.checkpoint["reorder"], checkpoint.batch)
+    ordered = [session.reorder.push(batch) for batch in batches]
+    ordered.append(session.reorder.flush())
+    return [batch for batch in ordered if len(batch)]
+
+
+def _count_csv_rows(path: Path) -> int:
+    """Data rows of a CSV file with a header line"""
+    with open(path, 'rb') as f:
+        return max(0, sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1)
+
+
+def _last_line_end(f: BinaryIO) -> int:
+    """Offset just past the last newline of an open file, searching back from its end"""
+    position = f.seek(0, os.SEEK_END)
+    while position > 0:
+        step = min(position, 1 << 16)
+        position -= step
+        f.seek(position)
+        newline = f.read(step).rfind(b"\n")
+        if newline >= 0:
+            return position + newline + 1
+    return 0
+
+
+def _restore_csv_file(path: Path, header: List[str], format_missing: Callable[[int], str]) -> int:
+    """Drop a torn last row from a CSV file and append the rows it is missing.
+    
+    format_missing is given the number of intact data rows and returns the
+    rows to append. Returns the number of rows appended.
+    """
+    with open(path, 'a+b') as f:
+        end = _last_line_end(f)
+        f.truncate(end)
+        if end == 0:
+            f.write((",".join(header) + "\n").encode())
+        f.flush()
+        rows_on_disk = _count_csv_rows(path)
+        
+        missing = format_missing(rows_on_disk)
+        f.write(missing.encode())
+        f.flush()
+        os.fsync(f.fileno())
+    return missing.count("\n")
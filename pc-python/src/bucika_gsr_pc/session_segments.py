@@ -0,0 +1,221 @@
+"""
+Segmented GSR recordings.
+
+Long recordings are rolled over to new segment files by size or by recorded
+time. The first segment keeps the session's usual ``gsr_data_<start>.csv``
+name and later ones add a four-digit index (``gsr_data_<start>_0001.csv``),
+each with its binary twin when one is written. A ``segments.json`` manifest
+in the session directory lists every closed segment with its time range,
+sequence range, sample count and checksums, so readers can load segments in
+parallel and skip the ones outside a query range.
+
+Sessions recorded before segmentation have no manifest; their data files
+are read as before.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import numpy as np
+
+from .protocol import GSRSampleBatch
+from .session_file import (
+    RECORD_DTYPE, SESSION_FILE_SUFFIX, GSRSessionFile, file_checksum, gsr_data_files,
+    read_csv_columns, read_csv_range, read_gsr_dataframe, select_columns
+)
+
+
+SEGMENT_MANIFEST_FILE = "segments.json"
+SEGMENT_MANIFEST_VERSION = 1
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_SEGMENT_SECONDS = 3600.0
+
+
+@dataclass
+class SegmentPolicy:
+    """When a recording rolls over to a new segment; None disables a limit"""
+    max_bytes: Optional[int] = DEFAULT_SEGMENT_BYTES        # CSV bytes per segment
+    max_seconds: Optional[float] = DEFAULT_SEGMENT_SECONDS  # recorded time per segment
+    
+    def should_rotate(self, segment_bytes: int, segment_start_ns: Optional[int], t_utc_ns: int) -> bool:
+        """Whether a batch starting at t_utc_ns belongs in a new segment"""
+        if self.max_bytes is not None and segment_bytes >= self.max_bytes:
+            return True
+        return (self.max_seconds is not None and segment_start_ns is not None
+                and t_utc_ns - segment_start_ns >= self.max_seconds * 1_000_000_000)
+
+
+@dataclass
+class SegmentInfo:
+    """One segment of a recording, as listed in the manifest"""
+    index: int
+    path: str                          # CSV file name in the session directory
+    binary_path: Optional[str] = None  # binary twin, when written
+    sample_count: int = 0
+    t_start_ns: Optional[int] = None   # first and last sample t_utc_ns
+    t_end_ns: Optional[int] = None
+    seq_first: Optional[int] = None
+    seq_last: Optional[int] = None
+    checksum: Optional[str] = None
+    binary_checksum: Optional[str] = None
+    
+    def add(self, batch: GSRSampleBatch):
+        """Account for a batch written to the segment"""
+        if not len(batch):
+            return
+        if self.t_start_ns is None:
+            self.t_start_ns = int(batch.t_utc_ns[0])
+            self.seq_first = int(batch.seq[0])
+        self.t_end_ns = int(batch.t_utc_ns[-1])
+        self.seq_last = int(batch.seq[-1])
+        self.sample_count += len(batch)
+    
+    def overlaps(self, t_start_ns: int, t_end_ns: int) -> bool:
+        """Whether any sample may fall in t_start_ns <= t_utc_ns < t_end_ns"""
+        if not self.sample_count:
+            return False
+        return self.t_start_ns < t_end_ns and self.t_end_ns >= t_start_ns
+    
+    def checksum_files(self, session_path: Path):
+        """Record the checksums of the finished segment files"""
+        self.checksum = file_checksum(session_path / self.path)
+        if self.binary_path:
+            self.binary_checksum = file_checksum(session_path / self.binary_path)
+
+
+@dataclass
+class SegmentManifest:
+    """Segments of a recording; complete once the recording has stopped"""
+    segments: List[SegmentInfo] = field(default_factory=list)
+    complete: bool = False
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": SEGMENT_MANIFEST_VERSION,
+            "complete": self.complete,
+            "segments": [asdict(segment) for segment in self.segments]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SegmentManifest':
+        return cls([SegmentInfo(**segment) for segment in data["segments"]], data.get("complete", False))
+
+
+def segment_path(first_path: Path, index: int) -> Path:
+    """Path of a segment, given the recording's first segment"""
+    first_path = Path(first_path)
+    if index == 0:
+        return first_path
+    return first_path.with_name(f"{first_path.stem}_{index:04d}{first_path.suffix}")
+
+
+def segment_paths(first_path: Path) -> List[Path]:
+    """CSV segment files of a recording on disk, in order"""
+    first_path = Path(first_path)
+    later = sorted(first_path.parent.glob(f"{first_path.stem}_[0-9][0-9][0-9][0-9]{first_path.suffix}"))
+    return [first_path] + later
+
+
+def read_manifest(session_path: Path) -> Optional[SegmentManifest]:
+    """The session's segment manifest, or None for an unsegmented session"""
+    try:
+        with open(Path(session_path) / SEGMENT_MANIFEST_FILE, 'r') as f:
+            return SegmentManifest.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(session_path: Path, manifest: SegmentManifest):
+    """Atomically replace the session's segment manifest"""
+    manifest_path = Path(session_path) / SEGMENT_MANIFEST_FILE
+    temp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(temp_path, 'w') as f:
+        json.dump(manifest.to_dict(), f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, manifest_path)
+
+
+def scan_segment(index: int, csv_path: Path, binary_path: Optional[Path] = None) -> SegmentInfo:
+    """Build a segment's manifest entry from its files, e.g. after a crash"""
+    segment = SegmentInfo(index, csv_path.name, binary_path.name if binary_path else None)
+    if binary_path:
+        columns = {name: GSRSessionFile(binary_path).column(name) for name in GSRSampleBatch.__slots__}
+    else:
+        columns = read_csv_columns(csv_path)
+    segment.add(GSRSampleBatch(**columns))
+    segment.checksum_files(csv_path.parent)
+    return segment
+
+
+def rebuild_manifest(first_path: Path, binary: bool = False) -> SegmentManifest:
+    """Scan every segment of a recording into a complete manifest and write it"""
+    segments = []
+    for index, csv_path in enumerate(segment_paths(first_path)):
+        binary_path = csv_path.with_suffix(SESSION_FILE_SUFFIX) if binary else None
+        segments.append(scan_segment(index, csv_path, binary_path))
+    manifest = SegmentManifest(segments, complete=True)
+    write_manifest(Path(first_path).parent, manifest)
+    return manifest
+
+
+def gsr_segment_files(session_path: Path, prefer_binary: bool = True,
+                      t_start_ns: Optional[int] = None, t_end_ns: Optional[int] = None) -> List[Path]:
+    """GSR data files of a session in order, optionally only those that may hold a time range.
+    
+    Without a manifest this is gsr_data_files. Segments of a recording still
+    in progress that are not in the manifest yet are always included.
+    """
+    session_path = Path(session_path)
+    manifest = read_manifest(session_path)
+    if manifest is None:
+        return gsr_data_files(session_path, prefer_binary)
+    
+    files = []
+    for segment in manifest.segments:
+        if t_start_ns is not None and not segment.overlaps(t_start_ns, t_end_ns):
+            continue
+        name = segment.binary_path if prefer_binary and segment.binary_path else segment.path
+        files.append(session_path / name)
+    
+    if not manifest.complete:
+        listed = {segment.path for segment in manifest.segments}
+        files.extend(path for path in gsr_data_files(session_path, prefer_binary)
+                     if path.with_suffix(".csv").name not in listed)
+    return files
+
+
+def read_segments_dataframe(files: List[Path], max_workers: Optional[int] = None):
+    """Load GSR data files into one DataFrame, reading them in parallel"""
+    import pandas as pd
+    
+    if len(files) == 1:
+        return read_gsr_dataframe(files[0])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(read_gsr_dataframe, files))
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_segments_range(files: List[Path], t_start_ns: int, t_end_ns: int,
+                        columns: Optional[Iterable[str]] = None,
+                        open_session_file: Callable[[Path], GSRSessionFile] = GSRSessionFile,
+                        max_workers: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Samples with t_start_ns <= t_utc_ns < t_end_ns from several data files, by column"""
+    names = select_columns(columns)
+    
+    def read(path: Path) -> Dict[str, np.ndarray]:
+        if path.suffix == SESSION_FILE_SUFFIX:
+            return open_session_file(path).read_range(t_start_ns, t_end_ns, names)
+        return read_csv_range(path, t_start_ns, t_end_ns, names)
+    
+    if not files:
+        return {name: np.empty(0, dtype=RECORD_DTYPE[name]) for name in names}
+    if len(files) == 1:
+        return read(files[0])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        parts = list(executor.map(read, files))
+    return {name: np.concatenate([part[name] for part in parts]) for name in names}
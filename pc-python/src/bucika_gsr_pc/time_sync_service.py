@@ -1,46 +1,138 @@
 """
 Time synchronization service providing high-precision time sync via UDP.
 Maintains compatibility with the existing SNTP-like protocol.
+
+A request starts with the client's send time t1. The reply carries t1, the
+server's receive time t2 and its transmit time t3; clients that read only
+the first two fields see the original reply. A client can append the t1
+of its previous request and the time t4 it received that reply, which
+completes a four-timestamp exchange and feeds the per-device clock
+estimator. Clients that never do are still tracked from one-way
+observations.
+
+Estimates are kept per client: the device id, when the request carries
+one in UTF-8 after those two fields (zeros if there is no previous
+exchange), otherwise the source address. Phones behind one NAT share an
+address, so they need to send their id. A request whose t1 is further
+from the server clock than MAX_CLOCK_OFFSET_NS is not a clock reading
+(the old text "SYNC_REQUEST" request decodes as a time 136 years out)
+and gets no reply.
+
+Requests are answered by a dedicated thread blocking on the socket, not
+by the asyncio loop, so parsing sample batches on the loop cannot delay
+the server's timestamps. On Linux the socket has SO_TIMESTAMPNS set and
+t2 is the kernel's arrival time of the datagram; elsewhere it is taken
+as soon as the thread receives it. The thread still needs the GIL to
+reply, which can add to the round trip under load but not to the offset
+error, since t3 is taken right before sending.
 """
 
 import asyncio
+import socket
 import struct
+import sys
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional, Tuple
 from loguru import logger
 
+from .clock_estimator import ClockEstimator, ClockModel
+
+
+# Recent offset observations kept per client
+OFFSET_WINDOW = 8
+
+# Replies per client remembered until the client reports receiving them
+PENDING_EXCHANGES = 32
+
+_REQUEST = struct.Struct('>Q')          # t1
+_REPORT = struct.Struct('>QQ')          # t1 and t4 of the previous exchange
+_RESPONSE = struct.Struct('>QQQ')       # t1, t2, t3
+
+# Longest request read from the socket, device id included
+MAX_REQUEST_SIZE = 256
+
+# Largest believable difference between a client's clock and the server's
+MAX_CLOCK_OFFSET_NS = 24 * 3600 * 1_000_000_000
+
+# How often the responder thread checks whether it should stop
+RECEIVE_POLL_SECONDS = 0.2
+
+# Linux socket option for nanosecond kernel receive timestamps, which the
+# socket module does not export; the control message type has the same value
+_SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+_TIMESPEC = struct.Struct('@ll')
+
+
+def kernel_receive_ns(ancdata) -> Optional[int]:
+    """Arrival time of a datagram from its SO_TIMESTAMPNS control message"""
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == _SO_TIMESTAMPNS and len(data) >= _TIMESPEC.size:
+            seconds, nanoseconds = _TIMESPEC.unpack_from(data)
+            return seconds * 1_000_000_000 + nanoseconds
+    return None
+
 
 class TimeSyncService:
     """UDP time synchronization service for precise timing"""
     
-    def __init__(self, port: int = 9123):
+    def __init__(self, port: int = 9123, host: str = '0.0.0.0', kernel_timestamps: bool = True,
+                 max_offset_ns: int = MAX_CLOCK_OFFSET_NS):
         self.port = port
-        self.transport: Optional[asyncio.DatagramTransport] = None
-        self.protocol: Optional['TimeSyncProtocol'] = None
+        self.host = host
+        self.max_offset_ns = max_offset_ns
         self._running = False
+        
+        # Responder thread and its socket; kernel_timestamps says whether
+        # SO_TIMESTAMPNS is asked for, uses_kernel_timestamps whether it is on
+        self.kernel_timestamps = kernel_timestamps
+        self.uses_kernel_timestamps = False
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        
+        # The responder thread records exchanges while the loop reads estimates
+        self._lock = threading.Lock()
+        
+        # Recent (client clock - server clock) observations per client,
+        # keyed by device id or host
+        self.client_offsets: Dict[str, Deque[int]] = {}
+        
+        # Four-timestamp exchanges: replies awaiting the client's t4, and
+        # the offset and drift estimator of each client
+        self.pending_exchanges: Dict[str, 'OrderedDict[int, Tuple[int, int]]'] = {}
+        self.clock_estimators: Dict[str, ClockEstimator] = {}
     
     async def start(self):
         """Start the time synchronization service"""
         try:
-            loop = asyncio.get_running_loop()
-            
-            # Create UDP server
-            self.transport, self.protocol = await loop.create_datagram_endpoint(
-                lambda: TimeSyncProtocol(),
-                local_addr=('0.0.0.0', self.port)
-            )
+            self._socket = self._open_socket()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._serve, args=(self._socket,),
+                                            name="time-sync", daemon=True)
+            self._thread.start()
             
-            logger.info(f"Time sync service started on UDP port {self.port}")
+            timestamps = "kernel" if self.uses_kernel_timestamps else "user-space"
+            logger.info(f"Time sync service started on UDP port {self.port} ({timestamps} receive timestamps)")
             self._running = True
             
         except Exception as e:
             logger.error(f"Failed to start time sync service: {e}")
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
             raise
     
     async def stop(self):
         """Stop the time synchronization service"""
-        if self.transport:
-            self.transport.close()
+        if self._thread is not None:
+            self._stop_event.set()
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
             logger.info("Time sync service stopped")
         self._running = False
     
@@ -51,43 +143,130 @@ class TimeSyncService:
     def get_current_time_ns(self) -> int:
         """Get current time in nanoseconds since Unix epoch"""
         return time.time_ns()
-
-
-class TimeSyncProtocol(asyncio.DatagramProtocol):
-    """UDP protocol handler for time synchronization requests"""
     
-    def connection_made(self, transport: asyncio.DatagramTransport):
-        self.transport = transport
+    def handle_request(self, data: bytes, addr: tuple, receive_ns: int,
+                       sendto: Callable[[bytes, tuple], object]) -> bool:
+        """Answer one time sync request received at receive_ns; False if it is malformed"""
+        if len(data) < _REQUEST.size:
+            logger.warning(f"Invalid time sync request from {addr}: {len(data)} bytes")
+            return False
+        
+        (client_timestamp,) = _REQUEST.unpack_from(data)
+        if abs(client_timestamp - receive_ns) > self.max_offset_ns:
+            logger.warning(f"Invalid time sync request from {addr}: client time "
+                           f"{(client_timestamp - receive_ns) / 1e9:+.0f} s from the server clock")
+            return False
+        
+        # Reply with the receive and transmit times, then do the bookkeeping
+        transmit_time_ns = time.time_ns()
+        sendto(_RESPONSE.pack(client_timestamp, receive_ns, transmit_time_ns), addr)
+        
+        client = addr[0]
+        if len(data) > _REQUEST.size + _REPORT.size:
+            device_id = data[_REQUEST.size + _REPORT.size:].decode('utf-8', errors='replace').strip()
+            client = device_id or client
+        
+        self.record_client_time(client, client_timestamp, receive_ns)
+        self.record_reply(client, client_timestamp, receive_ns, transmit_time_ns)
+        if len(data) >= _REQUEST.size + _REPORT.size:
+            previous_t1, previous_t4 = _REPORT.unpack_from(data, _REQUEST.size)
+            self.record_client_receipt(client, previous_t1, previous_t4)
+        return True
     
-    def datagram_received(self, data: bytes, addr: tuple):
-        """Handle incoming time sync request"""
-        try:
-            # Parse request (simple 8-byte timestamp request)
-            if len(data) >= 8:
-                client_timestamp = struct.unpack('>Q', data[:8])[0]
-                
-                # Get current server time with high precision
-                server_time_ns = time.time_ns()
-                
-                # Prepare response with server time
-                response = struct.pack('>QQ', client_timestamp, server_time_ns)
-                
-                # Send response
-                self.transport.sendto(response, addr)
-                
-                logger.debug(f"Time sync response sent to {addr}")
-                
-            else:
-                logger.warning(f"Invalid time sync request from {addr}: {len(data)} bytes")
-                
-        except Exception as e:
-            logger.error(f"Error handling time sync request from {addr}: {e}")
+    def has_client(self, client: str) -> bool:
+        """Whether any request has been recorded under this device id or host"""
+        with self._lock:
+            return client in self.client_offsets
+    
+    def record_client_time(self, host: str, client_time_ns: int, server_time_ns: int):
+        """Record a client's clock reading against the server clock on arrival"""
+        with self._lock:
+            offsets = self.client_offsets.get(host)
+            if offsets is None:
+                offsets = self.client_offsets[host] = deque(maxlen=OFFSET_WINDOW)
+            offsets.append(client_time_ns - server_time_ns)
+    
+    def record_reply(self, host: str, t1_ns: int, t2_ns: int, t3_ns: int):
+        """Remember the server times of a reply until the client reports receiving it"""
+        with self._lock:
+            pending = self.pending_exchanges.get(host)
+            if pending is None:
+                pending = self.pending_exchanges[host] = OrderedDict()
+            pending[t1_ns] = (t2_ns, t3_ns)
+            while len(pending) > PENDING_EXCHANGES:
+                pending.popitem(last=False)
+    
+    def record_client_receipt(self, host: str, t1_ns: int, t4_ns: int) -> bool:
+        """Complete an exchange with the client's receive time of its reply"""
+        with self._lock:
+            server_times = self.pending_exchanges.get(host, {}).pop(t1_ns, None)
+            if server_times is None or abs(t4_ns - server_times[1]) > self.max_offset_ns:
+                return False
+            
+            estimator = self.clock_estimators.get(host)
+            if estimator is None:
+                estimator = self.clock_estimators[host] = ClockEstimator()
+            return estimator.add_exchange(t1_ns, server_times[0], server_times[1], t4_ns)
+    
+    def get_clock_model(self, host: str) -> Optional[ClockModel]:
+        """Fitted offset and drift of a client's clock, once it has completed an exchange"""
+        with self._lock:
+            estimator = self.clock_estimators.get(host)
+            return estimator.model() if estimator is not None else None
     
-    def error_received(self, exc: Exception):
-        logger.error(f"Time sync protocol error: {exc}")
+    def get_client_offset_ns(self, host: str) -> Optional[int]:
+        """Estimated offset of a client's clock from the server clock, now.
+        
+        From the clock model when the client completes four-timestamp
+        exchanges. Otherwise each observation is the true offset minus the
+        request's one-way delay, so the largest recent one is the least
+        delayed estimate.
+        """
+        model = self.get_clock_model(host)
+        if model is not None:
+            return int(model.offset_at(self.get_current_time_ns()))
+        with self._lock:
+            offsets = self.client_offsets.get(host)
+            return max(offsets) if offsets else None
     
-    def connection_lost(self, exc: Optional[Exception]):
-        if exc:
-            logger.error(f"Time sync connection lost: {exc}")
-        else:
-            logger.debug("Time sync connection closed")
\ No newline at end of file
+    def _open_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind((self.host, self.port))
+            self.port = sock.getsockname()[1]  # the port picked when asked for 0
+            sock.settimeout(RECEIVE_POLL_SECONDS)
+            
+            self.uses_kernel_timestamps = False
+            if self.kernel_timestamps and sys.platform.startswith('linux'):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, _SO_TIMESTAMPNS, 1)
+                    self.uses_kernel_timestamps = True
+                except OSError as e:
+                    logger.warning(f"Kernel receive timestamps unavailable, timing in user space: {e}")
+        except Exception:
+            sock.close()
+            raise
+        return sock
+    
+    def _serve(self, sock: socket.socket):
+        """Responder thread: answer requests until stopped"""
+        ancillary_size = socket.CMSG_SPACE(_TIMESPEC.size) if self.uses_kernel_timestamps else 0
+        while not self._stop_event.is_set():
+            try:
+                if ancillary_size:
+                    data, ancdata, _, addr = sock.recvmsg(MAX_REQUEST_SIZE, ancillary_size)
+                    receive_ns = kernel_receive_ns(ancdata) or time.time_ns()
+                else:
+                    data, addr = sock.recvfrom(MAX_REQUEST_SIZE)
+                    receive_ns = time.time_ns()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop_event.is_set():
+                    logger.error(f"Time sync socket error: {e}")
+                continue
+            
+            try:
+                self.handle_request(data, addr, receive_ns, sock.sendto)
+            except Exception as e:
+                logger.error(f"Error handling time sync request from {addr}: {e}")
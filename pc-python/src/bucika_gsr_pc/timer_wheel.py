@@ -0,0 +1,66 @@
+"""
+Hashed timer wheel for scheduling many periodic per-connection checks.
+
+Timers are hashed into a fixed ring of slots by their due tick, so
+scheduling and cancelling are O(1) and each tick only visits the timers in
+one slot instead of every connection. Timers further out than one turn of
+the wheel stay in their slot and count down the remaining turns.
+"""
+
+import math
+from typing import Dict, Hashable, List
+
+
+class TimerWheel:
+    """Fixed-size ring of timer slots advanced one tick at a time"""
+    
+    def __init__(self, tick_interval: float, slot_count: int):
+        if tick_interval <= 0 or slot_count <= 0:
+            raise ValueError(f"Invalid timer wheel: {slot_count} slots of {tick_interval}s")
+        
+        self.tick_interval = tick_interval
+        self.slot_count = slot_count
+        
+        # Each slot maps a timer key to the number of full turns still to wait
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slot_count)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._cursor = 0
+    
+    def __len__(self) -> int:
+        return len(self._slot_of)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+    
+    def schedule(self, key: Hashable, delay: float):
+        """Schedule a timer, replacing any timer already set for the key"""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick_interval))
+        slot = (self._cursor + ticks) % self.slot_count
+        self._slots[slot][key] = (ticks - 1) // self.slot_count
+        self._slot_of[key] = slot
+    
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel a timer, returning whether one was set"""
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+    
+    def advance(self) -> List[Hashable]:
+        """Move to the next tick and return the keys of the timers now due"""
+        self._cursor = (self._cursor + 1) % self.slot_count
+        bucket = self._slots[self._cursor]
+        
+        due = []
+        for key, turns in bucket.items():
+            if turns:
+                bucket[key] = turns - 1
+            else:
+                due.append(key)
+        
+        for key in due:
+            del bucket[key]
+            del self._slot_of[key]
+        return due
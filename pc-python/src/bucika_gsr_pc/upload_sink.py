@@ -0,0 +1,307 @@
+"""
+Streaming sink for chunked file uploads.
+
+Chunks are written straight to a temporary file next to the destination with
+positioned writes, so they may arrive in any order. The MD5 digest is updated
+incrementally over the contiguous prefix of the file; chunks that arrive ahead
+of that prefix are kept in memory only up to a configurable window and are
+otherwise read back from the temporary file when the prefix catches up. On
+success the temporary file is fsynced and atomically renamed into place.
+
+Next to the temporary file a fixed-size state file records a CRC-32 per chunk
+and a received-chunk bitmap, so an interrupted upload can be resumed after a
+reconnect or a restart and only missing or corrupt chunks are sent again.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+from loguru import logger
+
+
+DEFAULT_UPLOAD_WINDOW_BYTES = 4 * 1024 * 1024
+
+# State file: magic, version, file size, chunk size, expected MD5 (hex),
+# then a u32 CRC-32 per chunk, then the received-chunk bitmap
+_STATE_MAGIC = b"BUPL"
+_STATE_VERSION = 1
+_STATE_HEADER = struct.Struct("<4sIQI32s")
+
+
+class UploadSink:
+    """Writes upload chunks to disk while hashing them incrementally"""
+    
+    def __init__(self, destination: Path, file_size: int, chunk_size: int,
+                 window_bytes: int = DEFAULT_UPLOAD_WINDOW_BYTES, md5_hash: str = ""):
+        if chunk_size <= 0:
+            raise ValueError(f"Invalid chunk size: {chunk_size}")
+        
+        self.destination = destination
+        self.temp_path = destination.with_name(destination.name + ".part")
+        self.state_path = destination.with_name(destination.name + ".part.state")
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.window_bytes = window_bytes
+        self.md5_hash = md5_hash.lower()[:32]
+        self.total_chunks = -(-file_size // chunk_size)
+        
+        self._file = None
+        self._state_file = None
+        self._md5 = hashlib.md5()
+        self._hashed_bytes = 0
+        
+        # Length of every chunk written so far, by file offset
+        self._written: Dict[int, int] = {}
+        self.bytes_received = 0
+        
+        # Persisted per-chunk CRC-32 and received bitmap
+        self._crcs = array("I", bytes(4 * self.total_chunks))
+        self._bitmap = bytearray(-(-self.total_chunks // 8))
+        self.corrupt_chunks: Set[int] = set()
+        
+        # Chunks ahead of the hashed prefix that are still held in memory
+        self._pending: Dict[int, bytes] = {}
+        self.pending_bytes = 0
+        self.peak_pending_bytes = 0
+    
+    @classmethod
+    def resume(cls, destination: Path, file_size: int, chunk_size: int, md5_hash: str,
+               window_bytes: int = DEFAULT_UPLOAD_WINDOW_BYTES) -> Optional['UploadSink']:
+        """Reopen a partial upload of the same file, if its state is on disk.
+        
+        Every chunk marked as received is read back and checked against its
+        recorded CRC-32; chunks that fail are reported as corrupt and must be
+        sent again. Blocking; call it from an executor on the event loop.
+        """
+        sink = cls(destination, file_size, chunk_size, window_bytes, md5_hash)
+        if not sink.temp_path.exists() or not sink.state_path.exists():
+            return None
+        
+        try:
+            state = sink.state_path.read_bytes()
+            magic, version, size, chunk, md5 = _STATE_HEADER.unpack_from(state)
+            if (magic != _STATE_MAGIC or version != _STATE_VERSION or size != file_size
+                    or chunk != chunk_size or md5 != sink._md5_field()):
+                logger.info(f"Partial upload {sink.temp_path} belongs to a different file, restarting")
+                sink.abort()
+                return None
+            
+            crc_end = _STATE_HEADER.size + 4 * sink.total_chunks
+            stored_crcs = array("I")
+            stored_crcs.frombytes(state[_STATE_HEADER.size:crc_end])
+            if sys.byteorder == "big":
+                stored_crcs.byteswap()
+            bitmap = state[crc_end:crc_end + len(sink._bitmap)]
+            if len(bitmap) != len(sink._bitmap):
+                raise ValueError("truncated state file")
+        except (struct.error, ValueError) as e:
+            logger.warning(f"Discarding unreadable upload state {sink.state_path}: {e}")
+            sink.abort()
+            return None
+        
+        sink._open()
+        for index in range(sink.total_chunks):
+            if not bitmap[index >> 3] & (1 << (index & 7)):
+                continue
+            
+            offset = index * chunk_size
+            length = min(chunk_size, file_size - offset)
+            sink._file.seek(offset)
+            data = sink._file.read(length)
+            if len(data) != length or zlib.crc32(data) != stored_crcs[index]:
+                sink.corrupt_chunks.add(index)
+                continue
+            
+            sink._written[offset] = length
+            sink.bytes_received += length
+            sink._crcs[index] = stored_crcs[index]
+            sink._bitmap[index >> 3] |= 1 << (index & 7)
+            if offset == sink._hashed_bytes:
+                sink._md5.update(data)
+                sink._hashed_bytes += length
+        
+        sink._drain()
+        sink._write_state()
+        
+        logger.info(f"Resumed upload {destination.name}: {sink.chunks_written}/{sink.total_chunks} chunks, "
+                    f"{len(sink.corrupt_chunks)} corrupt")
+        return sink
+    
+    @property
+    def chunks_written(self) -> int:
+        """Number of distinct chunks written"""
+        return len(self._written)
+    
+    @property
+    def is_complete(self) -> bool:
+        """Whether every byte of the file has been written and hashed"""
+        return self._hashed_bytes == self.file_size
+    
+    def missing_chunks(self) -> List[int]:
+        """Indices of chunks that still have to be sent"""
+        return [index for index in range(self.total_chunks)
+                if not self._bitmap[index >> 3] & (1 << (index & 7))]
+    
+    def missing_ranges(self) -> List[Tuple[int, int]]:
+        """Missing chunk indices as half-open [start, end) ranges"""
+        ranges = []
+        for index in self.missing_chunks():
+            if ranges and ranges[-1][1] == index:
+                ranges[-1] = (ranges[-1][0], index + 1)
+            else:
+                ranges.append((index, index + 1))
+        return ranges
+    
+    def mark_corrupt(self, chunk_index: int):
+        """Record a chunk that arrived damaged and must be resent"""
+        if 0 <= chunk_index < self.total_chunks and (chunk_index * self.chunk_size) not in self._written:
+            self.corrupt_chunks.add(chunk_index)
+    
+    def write_chunk(self, chunk_index: int, data: Union[bytes, memoryview]) -> bool:
+        """Write a chunk at its position in the file.
+        
+        Returns False for a chunk that was already written. Blocking; call it
+        from an executor when running on the event loop.
+        """
+        offset = chunk_index * self.chunk_size
+        length = len(data)
+        if chunk_index < 0 or offset + length > self.file_size:
+            raise ValueError(f"Chunk {chunk_index} ({length} bytes) is outside a "
+                             f"{self.file_size}-byte file")
+        if length != self.chunk_size and offset + length != self.file_size:
+            raise ValueError(f"Chunk {chunk_index} has {length} bytes, expected {self.chunk_size}")
+        
+        if offset in self._written:
+            return False
+        
+        if self._file is None:
+            self._open()
+        
+        self._file.seek(offset)
+        self._file.write(data)
+        self._written[offset] = length
+        self.bytes_received += length
+        self.corrupt_chunks.discard(chunk_index)
+        self._record_chunk(chunk_index, zlib.crc32(data))
+        
+        if offset == self._hashed_bytes:
+            self._md5.update(data)
+            self._hashed_bytes += length
+            self._drain()
+        elif self.pending_bytes + length <= self.window_bytes:
+            self._pending[offset] = bytes(data)
+            self.pending_bytes += length
+            self.peak_pending_bytes = max(self.peak_pending_bytes, self.pending_bytes)
+        
+        return True
+    
+    def _open(self):
+        """Open the partial file and its state file, creating them if needed"""
+        self.temp_path.parent.mkdir(parents=True, exist_ok=True)
+        mode = "r+b" if self.temp_path.exists() else "w+b"
+        self._file = open(self.temp_path, mode)
+        
+        if self.state_path.exists():
+            self._state_file = open(self.state_path, "r+b")
+        else:
+            self._state_file = open(self.state_path, "w+b")
+            self._write_state()
+    
+    def _md5_field(self) -> bytes:
+        return self.md5_hash.encode("ascii", "replace").ljust(32, b"\0")
+    
+    def _write_state(self):
+        """Rewrite the whole state file from memory"""
+        crcs = array("I", self._crcs)
+        if sys.byteorder == "big":
+            crcs.byteswap()
+        self._state_file.seek(0)
+        self._state_file.write(_STATE_HEADER.pack(
+            _STATE_MAGIC, _STATE_VERSION, self.file_size, self.chunk_size,
+            self._md5_field()
+        ))
+        self._state_file.write(crcs.tobytes())
+        self._state_file.write(self._bitmap)
+        self._state_file.truncate()
+        self._state_file.flush()
+    
+    def _record_chunk(self, chunk_index: int, crc32: int):
+        """Persist a chunk's CRC-32 and its bit in the received bitmap"""
+        self._crcs[chunk_index] = crc32
+        byte_index = chunk_index >> 3
+        self._bitmap[byte_index] |= 1 << (chunk_index & 7)
+        
+        self._state_file.seek(_STATE_HEADER.size + 4 * chunk_index)
+        self._state_file.write(struct.pack("<I", crc32))
+        self._state_file.seek(_STATE_HEADER.size + 4 * self.total_chunks + byte_index)
+        self._state_file.write(self._bitmap[byte_index:byte_index + 1])
+        self._state_file.flush()
+    
+    def _drain(self):
+        """Extend the hashed prefix over chunks that are now contiguous"""
+        while self._hashed_bytes in self._written:
+            offset = self._hashed_bytes
+            length = self._written[offset]
+            data = self._pending.pop(offset, None)
+            if data is None:
+                # Chunk did not fit in the window, read it back from disk
+                self._file.seek(offset)
+                data = self._file.read(length)
+            else:
+                self.pending_bytes -= length
+            self._md5.update(data)
+            self._hashed_bytes += length
+    
+    def hexdigest(self) -> Optional[str]:
+        """MD5 of the complete file, or None while bytes are still missing"""
+        return self._md5.hexdigest() if self.is_complete else None
+    
+    def commit(self) -> Path:
+        """Flush the temporary file to disk and atomically move it into place"""
+        if not self.is_complete:
+            raise ValueError(f"Upload incomplete: {self._hashed_bytes} of {self.file_size} bytes")
+        
+        if self._file is None:
+            # Zero-length file
+            self._open()
+        
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._close()
+        
+        os.replace(self.temp_path, self.destination)
+        self._unlink(self.state_path)
+        return self.destination
+    
+    def suspend(self):
+        """Close file handles but keep the partial upload for a later resume"""
+        self._pending.clear()
+        self.pending_bytes = 0
+        self._close()
+    
+    def abort(self):
+        """Discard the partial upload"""
+        self.suspend()
+        self._unlink(self.temp_path)
+        self._unlink(self.state_path)
+    
+    def _close(self):
+        for handle in (self._file, self._state_file):
+            if handle is not None:
+                handle.close()
+        self._file = None
+        self._state_file = None
+    
+    def _unlink(self, path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove partial upload file {path}: {e}")
+
@@ -4,25 +4,65 @@ Maintains full compatibility with the existing Kotlin implementation.
 """
 
 import asyncio
-import json
-import hashlib
 import base64
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Set, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set, Optional, Tuple, Union
 import uuid
 import websockets
 from websockets.server import WebSocketServerProtocol
 from loguru import logger
+from pydantic import ValidationError
 
 from .protocol import (
     MessageEnvelope, MessageType, MessagePayload, EmptyPayload,
     HelloPayload, RegisterPayload, StartPayload, SyncMarkPayload, AckPayload, 
-    ErrorPayload, GSRSamplePayload, UploadBeginPayload,
-    UploadChunkPayload, UploadEndPayload, parse_message_payload
+    ErrorPayload, GSRSamplePayload, GSRSampleRecordsPayload, UploadBeginPayload,
+    UploadChunkPayload, UploadEndPayload, UploadQueryPayload, UploadStatusPayload,
+    TypedMessageEnvelope, decode_message, register_message_type,
+    BinaryFrameType, GSRSampleBatch, UploadChunkFrame, parse_binary_frame_header,
+    CAPABILITY_GSR_BINARY, CAPABILITY_UPLOAD_BINARY, SERVER_CAPABILITIES
 )
+from .performance_monitor import measure_performance
+from .ingest_queue import IngestQueue, OverflowPolicy, DEFAULT_INGEST_QUEUE_SIZE
 from .session_manager import SessionManager
 from .time_sync_service import TimeSyncService
+from .timer_wheel import TimerWheel
+from .upload_sink import UploadSink, DEFAULT_UPLOAD_WINDOW_BYTES
+
+
+# Handler for one message type: (websocket, envelope, payload)
+MessageHandler = Callable[[WebSocketServerProtocol, TypedMessageEnvelope, Any], Awaitable[None]]
+
+
+@dataclass
+class BroadcastResult:
+    """Outcome of sending one command to a group of devices"""
+    msg_type: MessageType
+    round_trip_ms: Dict[str, float] = field(default_factory=dict)
+    statuses: Dict[str, str] = field(default_factory=dict)
+    timed_out: List[str] = field(default_factory=list)
+    unreachable: List[str] = field(default_factory=list)
+    
+    @property
+    def all_acknowledged(self) -> bool:
+        """Whether every targeted device acknowledged the command"""
+        return not self.timed_out and not self.unreachable
+    
+    @property
+    def max_round_trip_ms(self) -> float:
+        """Time until the last ACK arrived"""
+        return max(self.round_trip_ms.values(), default=0.0)
+
+
+@dataclass
+class SynchronizedStart:
+    """A START scheduled for the same instant on several devices"""
+    start_at_ns: int
+    session_ids: Dict[str, str]
+    broadcast: BroadcastResult
 
 
 class ConnectedDevice:
@@ -38,18 +78,30 @@ class ConnectedDevice:
         self.version = version
         self.connected_at = datetime.now()
         self.last_ping = None
+        
+        # Monotonic time of the last message received from the device
+        self.last_seen = time.monotonic()
+        
+        # Optional protocol features agreed during HELLO/REGISTER
+        self.negotiated_capabilities = [c for c in SERVER_CAPABILITIES if c in capabilities]
+        
+        # Binary upload ids announced in UPLOAD_BEGIN, mapped to upload keys
+        self.binary_uploads: Dict[int, str] = {}
 
 
 class FileUploadTracker:
     """Tracks file upload progress"""
     
-    def __init__(self, filename: str, file_size: int, md5_hash: str, chunk_size: int):
+    def __init__(self, filename: str, file_size: int, md5_hash: str, chunk_size: int,
+                 sink: UploadSink, upload_id: Optional[int] = None):
         self.filename = filename
         self.file_size = file_size
         self.md5_hash = md5_hash
         self.chunk_size = chunk_size
+        self.sink = sink
+        self.upload_id = upload_id
         self.chunks_received = 0
-        self.data_chunks = {}
+        self.last_chunk_received = False
         self.started_at = datetime.now()
 
 
@@ -67,11 +119,90 @@ class WebSocketServer:
         self.server = None
         self.connected_devices: Dict[str, ConnectedDevice] = {}
         self.device_connections: Dict[str, WebSocketServerProtocol] = {}
+        
+        # Reverse index of device_connections
+        self.socket_devices: Dict[WebSocketServerProtocol, str] = {}
         self.active_uploads: Dict[str, FileUploadTracker] = {}
         
-        # Ping/pong tracking
+        # Out-of-order upload chunks held in memory per upload, beyond that
+        # they are read back from the partial file
+        self.upload_window_bytes = DEFAULT_UPLOAD_WINDOW_BYTES
+        
+        # Per-device GSR ingest queues, drained by one consumer task each so
+        # slow storage never stalls socket reads. A full queue spills to disk
+        # rather than blocking, which would hold up the device's control
+        # messages behind its sample batches.
+        self.ingest_queues: Dict[str, IngestQueue] = {}
+        self.ingest_queue_size = DEFAULT_INGEST_QUEUE_SIZE
+        self.ingest_overflow_policy = OverflowPolicy.SPILL
+        self.ingest_spill_dir = session_manager.base_path / ".ingest_spill"
+        
+        # Samples stored since the server was created, for advertised load
+        self.ingested_samples = 0
+        
+        # STOPs acknowledged but waiting for earlier sample batches to be stored
+        self.pending_stops: Dict[str, asyncio.Future] = {}
+        
+        # Heartbeats: a single task advances a timer wheel once per tick,
+        # PINGs the devices that are due and evicts silent ones
         self.ping_interval = 30  # seconds
-        self.ping_tasks: Set[asyncio.Task] = set()
+        self.heartbeat_timeout = 90  # seconds without any message
+        self.max_heartbeats_per_tick = 256
+        self.heartbeat_wheel = TimerWheel(tick_interval=1.0, slot_count=64)
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # ACKs awaited by broadcast(), keyed by the device the message was
+        # sent to and the id of the message, so one device cannot complete
+        # another's ACK
+        self.pending_acks: Dict[Tuple[str, str], asyncio.Future] = {}
+        
+        # How far ahead a synchronized START is scheduled, covering the
+        # broadcast and ACK round trip
+        self.start_lead_time = 0.5  # seconds
+        
+        # Message dispatch table, extended by plugins through register_handler
+        self.message_handlers: Dict[Union[MessageType, str], MessageHandler] = {}
+        for msg_type, handler in (
+            (MessageType.HELLO, self.handle_hello),
+            (MessageType.PING, self.handle_ping),
+            (MessageType.PONG, self.handle_pong),
+            (MessageType.ACK, self.handle_ack),
+            (MessageType.START, self.handle_start),
+            (MessageType.STOP, self.handle_stop),
+            (MessageType.SYNC_MARK, self.handle_sync_mark),
+            (MessageType.GSR_SAMPLE, self.handle_gsr_sample),
+            (MessageType.UPLOAD_BEGIN, self.handle_upload_begin),
+            (MessageType.UPLOAD_CHUNK, self.handle_upload_chunk),
+            (MessageType.UPLOAD_END, self.handle_upload_end),
+            (MessageType.UPLOAD_QUERY, self.handle_upload_query),
+        ):
+            self.register_handler(msg_type, handler)
+    
+    def register_handler(self, msg_type: Union[MessageType, str], handler: MessageHandler,
+                         payload_model: Optional[type] = None):
+        """Register the handler for a message type, replacing any existing one.
+        
+        A type that is not a MessageType member needs payload_model, the
+        pydantic model its payload is validated into; it is then decoded
+        like a built-in type. With a performance monitor, every call is
+        timed into the latency histogram for the message type.
+        """
+        if isinstance(msg_type, str) and msg_type in {t.value for t in MessageType}:
+            msg_type = MessageType(msg_type)
+        if payload_model is not None:
+            register_message_type(msg_type, payload_model)
+        elif not isinstance(msg_type, MessageType):
+            raise ValueError(f"Message type {msg_type} needs a payload model")
+        
+        name = msg_type.value if isinstance(msg_type, MessageType) else msg_type
+        if self.performance_monitor is not None:
+            handler = measure_performance(self.performance_monitor, name)(handler)
+        self.message_handlers[msg_type] = handler
+    
+    def unregister_handler(self, msg_type: Union[MessageType, str]):
+        """Remove the handler for a message type"""
+        self.message_handlers.pop(msg_type, None)
     
     @property
     def connected_clients(self):
@@ -95,10 +226,18 @@ class WebSocketServer:
     
     async def stop(self):
         """Stop the WebSocket server"""
+        # Store every batch that was already received
+        await self._close_ingest_queues()
+        
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        
         if self.server:
-            # Cancel all ping tasks
-            for task in self.ping_tasks:
-                task.cancel()
+            # Keep partial uploads on disk so they can resume after a restart
+            for tracker in self.active_uploads.values():
+                tracker.sink.suspend()
+            self.active_uploads.clear()
             
             # Close all connections
             for device in self.connected_devices.values():
@@ -123,47 +262,86 @@ class WebSocketServer:
         finally:
             await self.cleanup_connection(websocket)
     
-    async def handle_message(self, websocket: WebSocketServerProtocol, message: str):
+    async def handle_message(self, websocket: WebSocketServerProtocol, message: Union[str, bytes]):
         """Handle incoming WebSocket message"""
+        # Any message counts as a sign of life
+        device_id = self.socket_devices.get(websocket)
+        if device_id is not None:
+            self.connected_devices[device_id].last_seen = time.monotonic()
+        
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            await self.handle_binary_message(websocket, message)
+            return
+        
         try:
-            # Parse message envelope
-            data = json.loads(message)
-            envelope = MessageEnvelope(**data)
-            payload = parse_message_payload(envelope)
+            # Validate envelope and payload in a single pass
+            envelope = decode_message(message)
+            payload = envelope.payload
             
             logger.debug(f"Received {envelope.type} message from {envelope.deviceId}")
             
             # Handle message based on type
-            if envelope.type == MessageType.HELLO:
-                await self.handle_hello(websocket, envelope, payload)
-            elif envelope.type == MessageType.PING:
-                await self.handle_ping(websocket, envelope, payload)
-            elif envelope.type == MessageType.START:
-                await self.handle_start(websocket, envelope, payload)
-            elif envelope.type == MessageType.STOP:
-                await self.handle_stop(websocket, envelope, payload)
-            elif envelope.type == MessageType.SYNC_MARK:
-                await self.handle_sync_mark(websocket, envelope, payload)
-            elif envelope.type == MessageType.GSR_SAMPLE:
-                await self.handle_gsr_sample(websocket, envelope, payload)
-            elif envelope.type == MessageType.UPLOAD_BEGIN:
-                await self.handle_upload_begin(websocket, envelope, payload)
-            elif envelope.type == MessageType.UPLOAD_CHUNK:
-                await self.handle_upload_chunk(websocket, envelope, payload)
-            elif envelope.type == MessageType.UPLOAD_END:
-                await self.handle_upload_end(websocket, envelope, payload)
-            else:
+            handler = self.message_handlers.get(envelope.type)
+            if handler is None:
                 logger.warning(f"Unknown message type: {envelope.type}")
                 await self.send_error(websocket, envelope.deviceId, "UNKNOWN_MESSAGE_TYPE", 
                                     f"Unknown message type: {envelope.type}")
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON message: {e}")
+                return
+            
+            await handler(websocket, envelope, payload)
+        
+        except ValidationError as e:
+            logger.error(f"Invalid message: {e}")
         except Exception as e:
             logger.error(f"Error handling message: {e}")
     
+    async def handle_binary_message(self, websocket: WebSocketServerProtocol, message: bytes):
+        """Handle incoming binary WebSocket frame"""
+        device = self._find_device_by_websocket(websocket)
+        if not device:
+            logger.warning("Binary frame received before HELLO, ignoring")
+            return
+        
+        frame_type = None
+        start_time = time.perf_counter()
+        error = False
+        try:
+            frame_type = parse_binary_frame_header(message)
+            
+            if frame_type == BinaryFrameType.GSR_BATCH:
+                if CAPABILITY_GSR_BINARY not in device.negotiated_capabilities:
+                    await self.send_error(websocket, device.device_id, "CAPABILITY_NOT_NEGOTIATED",
+                                        f"{CAPABILITY_GSR_BINARY} was not negotiated for this connection")
+                    return
+                
+                batch = GSRSampleBatch.decode(message)
+                await self.handle_gsr_batch(websocket, device.device_id, batch)
+            
+            elif frame_type == BinaryFrameType.UPLOAD_CHUNK:
+                if CAPABILITY_UPLOAD_BINARY not in device.negotiated_capabilities:
+                    await self.send_error(websocket, device.device_id, "CAPABILITY_NOT_NEGOTIATED",
+                                        f"{CAPABILITY_UPLOAD_BINARY} was not negotiated for this connection")
+                    return
+                
+                frame = UploadChunkFrame.decode(message)
+                await self.handle_upload_chunk_frame(websocket, device, frame)
+                
+        except ValueError as e:
+            error = True
+            logger.error(f"Invalid binary frame from {device.device_id}: {e}")
+            await self.send_error(websocket, device.device_id, "INVALID_BINARY_FRAME", str(e))
+        except Exception as e:
+            error = True
+            logger.error(f"Error handling binary frame: {e}")
+        finally:
+            # Binary frames share the latency histograms with JSON messages
+            if self.performance_monitor is not None and frame_type is not None:
+                self.performance_monitor.record_handler_latency(
+                    f"BINARY_{frame_type.name}", time.perf_counter() - start_time, error
+                )
+    
     async def handle_hello(self, websocket: WebSocketServerProtocol, 
-                          envelope: MessageEnvelope, payload: HelloPayload):
+                          envelope: TypedMessageEnvelope, payload: HelloPayload):
         """Handle HELLO message from Android client"""
         device_id = envelope.deviceId
         
@@ -177,26 +355,36 @@ class WebSocketServer:
             version=payload.version
         )
         
+        # A reconnect replaces the device's previous connection
+        previous = self.connected_devices.get(device_id)
+        if previous and previous.websocket is not websocket:
+            self.socket_devices.pop(previous.websocket, None)
+            self._run_in_background(previous.websocket.close())
+            logger.info(f"Device {device_id} reconnected, closing its previous connection")
+        
         # Register device
         self.connected_devices[device_id] = device
         self.device_connections[device_id] = websocket
+        self.socket_devices[websocket] = device_id
         
         logger.info(f"Device registered: {payload.deviceName} ({device_id})")
         
-        # Send REGISTER response
+        # Send REGISTER response, echoing the optional capabilities we accept
         register_response = RegisterPayload(
             accepted=True,
-            syncPort=9123
+            syncPort=9123,
+            capabilities=device.negotiated_capabilities
         )
         
         await self.send_message(websocket, device_id, MessageType.REGISTER, register_response)
         
-        # Start ping task for this device
-        ping_task = asyncio.create_task(self.ping_loop(websocket, device_id))
-        self.ping_tasks.add(ping_task)
+        # Schedule heartbeats for this device, replacing any earlier timer
+        self.heartbeat_wheel.schedule(device_id, self.ping_interval)
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self.heartbeat_loop())
     
     async def handle_ping(self, websocket: WebSocketServerProtocol,
-                         envelope: MessageEnvelope, payload: EmptyPayload):
+                         envelope: TypedMessageEnvelope, payload: EmptyPayload):
         """Handle PING message"""
         device = self.connected_devices.get(envelope.deviceId)
         if device:
@@ -205,12 +393,35 @@ class WebSocketServer:
         # Send PONG response
         await self.send_message(websocket, envelope.deviceId, MessageType.PONG, EmptyPayload())
     
+    async def handle_pong(self, websocket: WebSocketServerProtocol,
+                         envelope: TypedMessageEnvelope, payload: EmptyPayload):
+        """Handle PONG message, which only refreshes the device's last_seen"""
+        pass
+    
+    async def handle_ack(self, websocket: WebSocketServerProtocol,
+                        envelope: TypedMessageEnvelope, payload: AckPayload):
+        """Handle ACK message for a command sent by the PC"""
+        received_at = time.perf_counter()
+        # Trust the connection the ACK arrived on, not the deviceId it claims
+        device_id = self.socket_devices.get(websocket)
+        if device_id is None:
+            return
+        future = self.pending_acks.pop((device_id, payload.messageId), None)
+        if future and not future.done():
+            future.set_result((payload, received_at))
+    
     async def handle_start(self, websocket: WebSocketServerProtocol,
-                          envelope: MessageEnvelope, payload: StartPayload):
+                          envelope: TypedMessageEnvelope, payload: StartPayload):
         """Handle START session message"""
         device_id = envelope.deviceId
         
-        # Start session
+        # A STOP still waiting for queued samples must finish first
+        pending_stop = self.pending_stops.get(device_id)
+        if pending_stop:
+            await asyncio.wait([pending_stop])
+        
+        # Start session, with the clock fit so far deciding whether its times are corrected
+        self._refresh_clock_model(device_id)
         session_id = await self.session_manager.start_session(
             session_name=payload.sessionName,
             device_id=device_id,
@@ -225,12 +436,19 @@ class WebSocketServer:
         await self.send_message(websocket, device_id, MessageType.ACK, ack, session_id)
     
     async def handle_stop(self, websocket: WebSocketServerProtocol,
-                         envelope: MessageEnvelope, payload: EmptyPayload):
+                         envelope: TypedMessageEnvelope, payload: EmptyPayload):
         """Handle STOP session message"""
         device_id = envelope.deviceId
         
-        # Stop session
-        await self.session_manager.stop_session(device_id)
+        # Stop the session once the batches received before STOP are stored,
+        # without waiting for them here
+        queue = self.ingest_queues.get(device_id)
+        if queue:
+            stop = await queue.put_barrier(lambda: self.session_manager.stop_session(device_id))
+            self.pending_stops[device_id] = stop
+            stop.add_done_callback(lambda f: self._stop_completed(device_id, f))
+        else:
+            await self.session_manager.stop_session(device_id)
         
         logger.info(f"Stopped session for device {device_id}")
         
@@ -239,15 +457,19 @@ class WebSocketServer:
         await self.send_message(websocket, device_id, MessageType.ACK, ack)
     
     async def handle_sync_mark(self, websocket: WebSocketServerProtocol,
-                              envelope: MessageEnvelope, payload: SyncMarkPayload):
+                              envelope: TypedMessageEnvelope, payload: SyncMarkPayload):
         """Handle SYNC_MARK message"""
         device_id = envelope.deviceId
         
-        # Record sync mark in the session
+        # Record sync mark in the session, with the device's own time of it
+        self._refresh_clock_model(device_id)
         await self.session_manager.record_sync_mark(
             device_id, 
             payload.markId, 
-            payload.description
+            payload.description,
+            device_t_utc_ns=payload.tUtcNs,
+            device_t_mono_ns=payload.tMonoNs,
+            envelope_ts_ns=envelope.ts
         )
         
         logger.info(f"Sync mark '{payload.markId}' recorded for device {device_id}")
@@ -257,37 +479,142 @@ class WebSocketServer:
         await self.send_message(websocket, envelope.deviceId, MessageType.ACK, ack)
     
     async def handle_gsr_sample(self, websocket: WebSocketServerProtocol,
-                               envelope: MessageEnvelope, payload: GSRSamplePayload):
+                               envelope: TypedMessageEnvelope,
+                               payload: Union[GSRSamplePayload, GSRSampleRecordsPayload]):
         """Handle GSR sample data"""
         device_id = envelope.deviceId
         
         # Store GSR samples
-        await self.session_manager.store_gsr_samples(device_id, payload.samples)
+        await self.handle_gsr_batch(websocket, device_id, payload.to_batch())
         
         # Note: No ACK for GSR samples to avoid overwhelming the connection
     
+    async def handle_gsr_batch(self, websocket: WebSocketServerProtocol,
+                               device_id: str, batch: GSRSampleBatch):
+        """Queue a GSR sample batch for storage"""
+        await self._get_ingest_queue(device_id).put(batch)
+    
+    async def store_gsr_batch(self, device_id: str, batch: GSRSampleBatch):
+        """Store a GSR sample batch, called from the device's ingest queue"""
+        self._refresh_clock_model(device_id)
+        await self.session_manager.store_gsr_batch(device_id, batch)
+        self.ingested_samples += len(batch)
+    
+    def _refresh_clock_model(self, device_id: str):
+        """Hand the device's latest clock fit from time sync to its session"""
+        client = self._time_sync_client(device_id)
+        model = self.time_sync_service.get_clock_model(client) if client else None
+        if model is not None:
+            self.session_manager.set_clock_model(device_id, model)
+    
+    def _get_ingest_queue(self, device_id: str) -> IngestQueue:
+        """Get the device's ingest queue, starting it on first use"""
+        queue = self.ingest_queues.get(device_id)
+        if queue is None:
+            async def handler(batch: GSRSampleBatch):
+                await self.store_gsr_batch(device_id, batch)
+            
+            queue = IngestQueue(
+                device_id=device_id,
+                handler=handler,
+                max_batches=self.ingest_queue_size,
+                policy=self.ingest_overflow_policy,
+                spill_dir=self.ingest_spill_dir
+            )
+            queue.start()
+            self.ingest_queues[device_id] = queue
+        return queue
+    
+    def _stop_completed(self, device_id: str, stop: asyncio.Future):
+        """Forget a deferred STOP once the session has been closed"""
+        if self.pending_stops.get(device_id) is stop:
+            del self.pending_stops[device_id]
+        if not stop.cancelled() and stop.exception():
+            logger.error(f"Failed to stop session for device {device_id}: {stop.exception()}")
+    
+    def _detach_ingest_queues(self, device_id: Optional[str] = None) -> List[IngestQueue]:
+        """Take ingest queues out of the server, for one device or all of them"""
+        device_ids = [device_id] if device_id else list(self.ingest_queues)
+        queues = [self.ingest_queues.pop(key, None) for key in device_ids]
+        return [queue for queue in queues if queue]
+    
+    async def _drain_ingest_queues(self, queues: List[IngestQueue]):
+        """Drain and close detached ingest queues"""
+        for queue in queues:
+            await queue.close()
+            if queue.dropped_batches:
+                logger.warning(f"Ingest queue for {queue.device_id} dropped {queue.dropped_samples} samples")
+    
+    async def _close_ingest_queues(self, device_id: Optional[str] = None):
+        """Drain and close ingest queues, for one device or all of them"""
+        await self._drain_ingest_queues(self._detach_ingest_queues(device_id))
+    
+    def get_ingest_stats(self) -> Dict[str, Dict]:
+        """Queue depth and drop counters for every device's ingest queue"""
+        return {device_id: queue.get_stats() for device_id, queue in self.ingest_queues.items()}
+    
     async def handle_upload_begin(self, websocket: WebSocketServerProtocol,
-                                 envelope: MessageEnvelope, payload: UploadBeginPayload):
+                                 envelope: TypedMessageEnvelope, payload: UploadBeginPayload):
         """Handle file upload begin"""
-        upload_key = f"{envelope.deviceId}:{payload.filename}"
+        device_id = envelope.deviceId
+        upload_key = f"{device_id}:{payload.filename}"
         
-        tracker = FileUploadTracker(
-            filename=payload.filename,
-            file_size=payload.fileSize,
-            md5_hash=payload.md5Hash,
-            chunk_size=payload.chunkSize
-        )
+        # Beginning a different file under the same name discards the old partial file
+        tracker = self.active_uploads.get(upload_key)
+        if tracker and not (tracker.file_size == payload.fileSize
+                            and tracker.chunk_size == payload.chunkSize
+                            and tracker.md5_hash.lower() == payload.md5Hash.lower()):
+            self._remove_upload(device_id, upload_key)
+            tracker = None
         
-        self.active_uploads[upload_key] = tracker
+        if tracker is None:
+            # Pick up a partial upload of the same file left by an earlier connection
+            destination = self.session_manager.get_upload_path(device_id, payload.filename)
+            loop = asyncio.get_running_loop()
+            sink = await loop.run_in_executor(
+                None, UploadSink.resume, destination, payload.fileSize,
+                payload.chunkSize, payload.md5Hash, self.upload_window_bytes
+            )
+            if sink is None:
+                sink = UploadSink(
+                    destination=destination,
+                    file_size=payload.fileSize,
+                    chunk_size=payload.chunkSize,
+                    window_bytes=self.upload_window_bytes,
+                    md5_hash=payload.md5Hash
+                )
+            
+            tracker = FileUploadTracker(
+                filename=payload.filename,
+                file_size=payload.fileSize,
+                md5_hash=payload.md5Hash,
+                chunk_size=payload.chunkSize,
+                sink=sink
+            )
+            self.active_uploads[upload_key] = tracker
         
-        logger.info(f"Starting upload: {payload.filename} ({payload.fileSize} bytes)")
+        # Binary chunk frames refer to the upload by its numeric id
+        device = self.connected_devices.get(device_id)
+        if (payload.uploadId is not None and device
+                and CAPABILITY_UPLOAD_BINARY in device.negotiated_capabilities):
+            tracker.upload_id = payload.uploadId
+            device.binary_uploads[payload.uploadId] = upload_key
         
-        # Send ACK
-        ack = AckPayload(messageId=envelope.id, status="UPLOAD_READY")
-        await self.send_message(websocket, envelope.deviceId, MessageType.ACK, ack)
+        resumed = tracker.sink.chunks_written > 0 or bool(tracker.sink.corrupt_chunks)
+        if resumed:
+            logger.info(f"Resuming upload: {payload.filename} "
+                        f"({tracker.sink.bytes_received}/{payload.fileSize} bytes received)")
+        else:
+            logger.info(f"Starting upload: {payload.filename} ({payload.fileSize} bytes)")
+        
+        # Send ACK, followed by the chunks still needed when resuming
+        ack = AckPayload(messageId=envelope.id, status="UPLOAD_RESUMED" if resumed else "UPLOAD_READY")
+        await self.send_message(websocket, device_id, MessageType.ACK, ack)
+        if resumed:
+            await self.send_upload_status(websocket, device_id, tracker)
     
     async def handle_upload_chunk(self, websocket: WebSocketServerProtocol,
-                                 envelope: MessageEnvelope, payload: UploadChunkPayload):
+                                 envelope: TypedMessageEnvelope, payload: UploadChunkPayload):
         """Handle file upload chunk"""
         upload_key = f"{envelope.deviceId}:{payload.filename}"
         tracker = self.active_uploads.get(upload_key)
@@ -299,57 +626,135 @@ class WebSocketServer:
         
         # Decode and store chunk
         chunk_data = base64.b64decode(payload.data)
-        tracker.data_chunks[payload.chunkIndex] = chunk_data
+        await self._store_upload_chunk(websocket, envelope.deviceId, upload_key, tracker,
+                                       payload.chunkIndex, chunk_data, payload.isLast)
+    
+    async def handle_upload_chunk_frame(self, websocket: WebSocketServerProtocol,
+                                        device: ConnectedDevice, frame: UploadChunkFrame):
+        """Handle a binary file upload chunk"""
+        upload_key = device.binary_uploads.get(frame.upload_id)
+        tracker = self.active_uploads.get(upload_key) if upload_key else None
+        
+        if not tracker:
+            await self.send_error(websocket, device.device_id, "UPLOAD_NOT_FOUND",
+                                f"Upload not found for id {frame.upload_id}")
+            return
+        
+        if not frame.verify():
+            tracker.sink.mark_corrupt(frame.chunk_index)
+            await self.send_error(websocket, device.device_id, "CHUNK_CRC_MISMATCH",
+                                f"CRC mismatch for chunk {frame.chunk_index} of {tracker.filename}")
+            return
+        
+        await self._store_upload_chunk(websocket, device.device_id, upload_key, tracker,
+                                       frame.chunk_index, frame.data, frame.is_last)
+    
+    async def _store_upload_chunk(self, websocket: WebSocketServerProtocol, device_id: str,
+                                  upload_key: str, tracker: FileUploadTracker,
+                                  chunk_index: int, chunk_data: Union[bytes, memoryview],
+                                  is_last: bool):
+        """Store a received chunk and finalize the upload after the last one"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, tracker.sink.write_chunk, chunk_index, chunk_data)
+        except ValueError as e:
+            await self.send_error(websocket, device_id, "INVALID_CHUNK", str(e))
+            return
         tracker.chunks_received += 1
         
-        logger.debug(f"Received chunk {payload.chunkIndex} for {payload.filename}")
+        logger.debug(f"Received chunk {chunk_index} for {tracker.filename}")
         
-        # If this is the last chunk, finalize upload
-        if payload.isLast:
-            await self.finalize_upload(websocket, envelope.deviceId, tracker)
-            del self.active_uploads[upload_key]
+        # Finalize once the last chunk was seen and no earlier chunk is missing
+        if is_last:
+            tracker.last_chunk_received = True
+        if tracker.last_chunk_received and tracker.sink.is_complete:
+            await self.finalize_upload(websocket, device_id, tracker)
+            self._remove_upload(device_id, upload_key)
     
     async def handle_upload_end(self, websocket: WebSocketServerProtocol,
-                               envelope: MessageEnvelope, payload: UploadEndPayload):
+                               envelope: TypedMessageEnvelope, payload: UploadEndPayload):
         """Handle file upload end"""
         upload_key = f"{envelope.deviceId}:{payload.filename}"
         tracker = self.active_uploads.get(upload_key)
         
         if tracker:
             await self.finalize_upload(websocket, envelope.deviceId, tracker)
-            del self.active_uploads[upload_key]
+            self._remove_upload(envelope.deviceId, upload_key)
+    
+    async def handle_upload_query(self, websocket: WebSocketServerProtocol,
+                                  envelope: TypedMessageEnvelope, payload: UploadQueryPayload):
+        """Handle a query for the missing and corrupt chunks of an upload"""
+        tracker = self.active_uploads.get(f"{envelope.deviceId}:{payload.filename}")
+        
+        if not tracker:
+            await self.send_error(websocket, envelope.deviceId, "UPLOAD_NOT_FOUND",
+                                f"Upload not found for {payload.filename}")
+            return
+        
+        await self.send_upload_status(websocket, envelope.deviceId, tracker)
+    
+    async def send_upload_status(self, websocket: WebSocketServerProtocol,
+                                 device_id: str, tracker: FileUploadTracker):
+        """Send the chunks an upload still needs"""
+        sink = tracker.sink
+        status = UploadStatusPayload(
+            filename=tracker.filename,
+            totalChunks=sink.total_chunks,
+            receivedChunks=sink.chunks_written,
+            bytesReceived=sink.bytes_received,
+            missingRanges=[list(r) for r in sink.missing_ranges()],
+            corruptChunks=sorted(sink.corrupt_chunks)
+        )
+        await self.send_message(websocket, device_id, MessageType.UPLOAD_STATUS, status)
+    
+    def _suspend_uploads(self, device_id: str):
+        """Close a device's partial uploads, keeping them on disk for a resume"""
+        prefix = f"{device_id}:"
+        for upload_key in [key for key in self.active_uploads if key.startswith(prefix)]:
+            tracker = self.active_uploads.pop(upload_key)
+            tracker.sink.suspend()
+            logger.info(f"Suspended upload {tracker.filename} at "
+                        f"{tracker.sink.bytes_received}/{tracker.file_size} bytes")
+    
+    def _remove_upload(self, device_id: str, upload_key: str):
+        """Forget an upload and its binary upload id"""
+        tracker = self.active_uploads.pop(upload_key, None)
+        if tracker:
+            tracker.sink.abort()
+        
+        device = self.connected_devices.get(device_id)
+        if tracker and device and tracker.upload_id is not None:
+            device.binary_uploads.pop(tracker.upload_id, None)
     
     async def finalize_upload(self, websocket: WebSocketServerProtocol, 
                              device_id: str, tracker: FileUploadTracker):
-        """Finalize file upload by reassembling chunks and verifying integrity"""
+        """Finalize file upload by verifying integrity and moving it into place"""
+        sink = tracker.sink
         try:
-            # Reassemble file data
-            file_data = b""
-            for i in sorted(tracker.data_chunks.keys()):
-                file_data += tracker.data_chunks[i]
-            
             # Verify file size
-            if len(file_data) != tracker.file_size:
+            if not sink.is_complete:
                 await self.send_error(websocket, device_id, "SIZE_MISMATCH",
-                                    f"File size mismatch: expected {tracker.file_size}, got {len(file_data)}")
+                                    f"File size mismatch: expected {tracker.file_size}, got {sink.bytes_received}")
                 return
             
-            # Verify MD5 hash
-            calculated_md5 = hashlib.md5(file_data).hexdigest()
+            # Verify MD5 hash, computed incrementally while chunks arrived
+            calculated_md5 = sink.hexdigest()
             if calculated_md5.lower() != tracker.md5_hash.lower():
                 await self.send_error(websocket, device_id, "HASH_MISMATCH",
                                     f"MD5 hash mismatch: expected {tracker.md5_hash}, got {calculated_md5}")
                 return
             
-            # Save file
-            await self.session_manager.save_uploaded_file(device_id, tracker.filename, file_data)
+            # Flush and atomically rename the partial file
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, sink.commit)
+            self.session_manager.register_uploaded_file(device_id, tracker.filename)
             
-            logger.info(f"Upload completed successfully: {tracker.filename}")
+            logger.info(f"Upload completed successfully: {tracker.filename} ({tracker.file_size} bytes)")
             
             # Send success response
             upload_end_response = UploadEndPayload(
                 filename=tracker.filename,
-                totalChunks=len(tracker.data_chunks),
+                totalChunks=sink.chunks_written,
                 success=True,
                 message="Upload completed successfully"
             )
@@ -362,11 +767,13 @@ class WebSocketServer:
     
     async def send_message(self, websocket: WebSocketServerProtocol, device_id: str,
                           msg_type: MessageType, payload: MessagePayload,
-                          session_id: Optional[str] = None):
-        """Send a message to a WebSocket client"""
+                          session_id: Optional[str] = None,
+                          msg_id: Optional[str] = None) -> Optional[str]:
+        """Send a message to a WebSocket client, returning its id once sent"""
         try:
+            msg_id = msg_id or str(uuid.uuid4())
             envelope = MessageEnvelope.create(
-                msg_id=str(uuid.uuid4()),
+                msg_id=msg_id,
                 msg_type=msg_type,
                 device_id=device_id,
                 payload=payload,
@@ -377,9 +784,187 @@ class WebSocketServer:
             await websocket.send(message)
             
             logger.debug(f"Sent {msg_type} message to {device_id}")
+            return msg_id
             
         except Exception as e:
             logger.error(f"Failed to send message: {e}")
+            return None
+    
+    async def broadcast(self, msg_type: MessageType,
+                        payload: Union[MessagePayload, Callable[[str], MessagePayload]],
+                        device_ids: Optional[Iterable[str]] = None,
+                        timeout: float = 5.0,
+                        session_id: Optional[str] = None) -> BroadcastResult:
+        """Send a command to a group of devices at once and collect their ACKs.
+        
+        Sends to all connected devices when no group is given. The payload
+        may be a function of the device id for per-device payloads. ACKs are
+        matched through AckPayload.messageId; devices that do not answer
+        within the timeout are reported in timed_out.
+        """
+        result = BroadcastResult(msg_type=msg_type)
+        targets: List[Tuple[str, ConnectedDevice]] = []
+        for device_id in (self.connected_devices if device_ids is None else device_ids):
+            device = self.connected_devices.get(device_id)
+            if device is None:
+                result.unreachable.append(device_id)
+            else:
+                targets.append((device_id, device))
+        
+        if not targets:
+            return result
+        
+        # Register every expected ACK before the first command goes out
+        loop = asyncio.get_running_loop()
+        expected: Dict[str, Tuple[str, asyncio.Future]] = {}
+        for device_id, _ in targets:
+            msg_id = str(uuid.uuid4())
+            future = loop.create_future()
+            self.pending_acks[(device_id, msg_id)] = future
+            expected[device_id] = (msg_id, future)
+        
+        sent_at = time.perf_counter()
+        sent = await asyncio.gather(*(
+            self.send_message(device.websocket, device_id, msg_type,
+                              payload(device_id) if callable(payload) else payload,
+                              session_id=session_id, msg_id=expected[device_id][0])
+            for device_id, device in targets
+        ))
+        
+        waiting = set()
+        for (device_id, _), msg_id in zip(targets, sent):
+            future = expected[device_id][1]
+            if msg_id is None:
+                result.unreachable.append(device_id)
+                future.cancel()
+            else:
+                waiting.add(future)
+        
+        if waiting:
+            await asyncio.wait(waiting, timeout=timeout)
+        
+        for device_id, (msg_id, future) in expected.items():
+            self.pending_acks.pop((device_id, msg_id), None)
+            if future.cancelled():
+                continue
+            if future.done():
+                ack, received_at = future.result()
+                result.round_trip_ms[device_id] = (received_at - sent_at) * 1000
+                result.statuses[device_id] = ack.status
+            else:
+                future.cancel()
+                result.timed_out.append(device_id)
+        
+        if result.timed_out:
+            logger.warning(f"{msg_type} not acknowledged by {', '.join(result.timed_out)}")
+        return result
+    
+    async def broadcast_start(self, session_name: str, device_ids: Optional[Iterable[str]] = None,
+                              participant_id: Optional[str] = None,
+                              metadata: Optional[Dict[str, Any]] = None,
+                              timeout: float = 5.0) -> BroadcastResult:
+        """Tell a group of devices to start recording"""
+        payload = StartPayload(sessionName=session_name, participantId=participant_id,
+                               metadata=metadata)
+        return await self.broadcast(MessageType.START, payload, device_ids, timeout)
+    
+    async def start_synchronized(self, session_name: str, device_ids: Optional[Iterable[str]] = None,
+                                 participant_id: Optional[str] = None,
+                                 metadata: Optional[Dict[str, Any]] = None,
+                                 lead_time: Optional[float] = None,
+                                 timeout: Optional[float] = None) -> SynchronizedStart:
+        """Start recording on a group of devices at one scheduled instant.
+        
+        Each device gets the start instant on the PC clock and, where the
+        time sync service has seen the device, on its own clock. Devices arm
+        and begin at that instant, so their start skew no longer depends on
+        when the START arrived. Devices that do not ACK before the start
+        instant have their armed session aborted.
+        """
+        lead_time = self.start_lead_time if lead_time is None else lead_time
+        targets = list(self.connected_devices if device_ids is None else device_ids)
+        start_at_ns = self.time_sync_service.get_current_time_ns() + int(lead_time * 1_000_000_000)
+        
+        offsets = {device_id: self._clock_offset_ns(device_id) for device_id in targets}
+        armed = [device_id for device_id in targets if device_id in self.connected_devices]
+        for device_id in armed:
+            self._refresh_clock_model(device_id)
+        # Arm concurrently so the lead time is not spent one device at a time
+        session_ids = dict(zip(armed, await asyncio.gather(*(
+            self.session_manager.arm_session(
+                session_name, device_id, start_at_ns, offsets[device_id] or 0,
+                participant_id=participant_id, metadata=metadata
+            )
+            for device_id in armed
+        ))))
+        
+        def start_payload(device_id: str) -> StartPayload:
+            offset = offsets.get(device_id)
+            return StartPayload(
+                sessionName=session_name,
+                participantId=participant_id,
+                metadata=metadata,
+                startAtNs=start_at_ns,
+                deviceStartAtNs=start_at_ns + offset if offset is not None else None
+            )
+        
+        if timeout is None:
+            # ACKs are only useful up to the start instant itself
+            timeout = max(0, (start_at_ns - self.time_sync_service.get_current_time_ns()) / 1_000_000_000)
+        result = await self.broadcast(MessageType.START, start_payload, targets, timeout=timeout)
+        
+        for device_id in result.timed_out + result.unreachable:
+            await self.session_manager.abort_armed_session(device_id)
+        
+        acknowledged = list(result.round_trip_ms)
+        self._run_in_background(self._begin_armed_sessions(start_at_ns, acknowledged))
+        
+        logger.info(f"Synchronized start of '{session_name}' at {start_at_ns} armed on "
+                    f"{len(acknowledged)}/{len(targets)} devices")
+        return SynchronizedStart(
+            start_at_ns=start_at_ns,
+            session_ids={device_id: session_ids[device_id] for device_id in acknowledged},
+            broadcast=result
+        )
+    
+    async def _begin_armed_sessions(self, start_at_ns: int, device_ids: List[str]):
+        """Switch armed sessions to RECORDING at their start instant"""
+        delay = (start_at_ns - self.time_sync_service.get_current_time_ns()) / 1_000_000_000
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for device_id in device_ids:
+            self.session_manager.begin_armed_session(device_id)
+    
+    def _clock_offset_ns(self, device_id: str) -> Optional[int]:
+        """Clock offset of a device as seen by the time sync service"""
+        client = self._time_sync_client(device_id)
+        return self.time_sync_service.get_client_offset_ns(client) if client else None
+    
+    def _time_sync_client(self, device_id: str) -> Optional[str]:
+        """Key of a connected device's time sync estimates.
+        
+        The device id when its requests carry it, which keeps phones
+        behind one NAT apart; otherwise the address they come from.
+        """
+        if self.time_sync_service.has_client(device_id):
+            return device_id
+        device = self.connected_devices.get(device_id)
+        try:
+            return device.websocket.remote_address[0]
+        except (AttributeError, IndexError, TypeError):
+            return None
+    
+    async def broadcast_stop(self, device_ids: Optional[Iterable[str]] = None,
+                             timeout: float = 5.0) -> BroadcastResult:
+        """Tell a group of devices to stop recording"""
+        return await self.broadcast(MessageType.STOP, EmptyPayload(), device_ids, timeout)
+    
+    async def broadcast_sync_mark(self, mark_id: str, description: Optional[str] = None,
+                                  device_ids: Optional[Iterable[str]] = None,
+                                  timeout: float = 5.0) -> BroadcastResult:
+        """Send a synchronization mark to a group of devices"""
+        payload = SyncMarkPayload(markId=mark_id, description=description)
+        return await self.broadcast(MessageType.SYNC_MARK, payload, device_ids, timeout)
     
     async def send_error(self, websocket: WebSocketServerProtocol, device_id: str,
                         error_code: str, error_message: str):
@@ -387,46 +972,84 @@ class WebSocketServer:
         error_payload = ErrorPayload(code=error_code, message=error_message)
         await self.send_message(websocket, device_id, MessageType.ERROR, error_payload)
     
-    async def ping_loop(self, websocket: WebSocketServerProtocol, device_id: str):
-        """Ping loop for keeping connection alive"""
+    async def heartbeat_loop(self):
+        """Advance the heartbeat timer wheel once per tick"""
         try:
             while True:
-                await asyncio.sleep(self.ping_interval)
-                
-                # Check if device is still connected
-                if device_id not in self.connected_devices:
-                    break
-                
-                # Send ping
-                await self.send_message(websocket, device_id, MessageType.PING, EmptyPayload())
-                
+                await asyncio.sleep(self.heartbeat_wheel.tick_interval)
+                await self.heartbeat_tick()
         except asyncio.CancelledError:
-            logger.debug(f"Ping loop cancelled for device {device_id}")
-        except Exception as e:
-            logger.error(f"Error in ping loop for device {device_id}: {e}")
+            logger.debug("Heartbeat loop cancelled")
+    
+    async def heartbeat_tick(self):
+        """PING the devices due in this tick and evict those silent for too long.
+        
+        At most max_heartbeats_per_tick devices are handled; the rest move to
+        the next tick.
+        """
+        due = self.heartbeat_wheel.advance()
+        for device_id in due[self.max_heartbeats_per_tick:]:
+            self.heartbeat_wheel.schedule(device_id, self.heartbeat_wheel.tick_interval)
+        
+        now = time.monotonic()
+        pings = []
+        for device_id in due[:self.max_heartbeats_per_tick]:
+            device = self.connected_devices.get(device_id)
+            if device is None:
+                continue
+            
+            silent = now - device.last_seen
+            if silent >= self.heartbeat_timeout:
+                logger.warning(f"Device {device_id} silent for {silent:.0f}s, disconnecting")
+                # Storing what is still queued must not hold up the other devices
+                self._run_in_background(self._drain_ingest_queues(self._drop_connection(device.websocket)))
+                self._run_in_background(device.websocket.close())
+                continue
+            
+            if silent < self.ping_interval:
+                # Heard from recently, check again one interval after that
+                self.heartbeat_wheel.schedule(device_id, self.ping_interval - silent)
+                continue
+            
+            pings.append(self.send_message(device.websocket, device_id, MessageType.PING, EmptyPayload()))
+            self.heartbeat_wheel.schedule(device_id, self.ping_interval)
+        
+        if pings:
+            await asyncio.gather(*pings)
+    
+    def _run_in_background(self, coroutine: Awaitable):
+        """Run a coroutine without waiting for it, keeping a reference until done"""
+        task = asyncio.ensure_future(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _find_device_by_websocket(self, websocket: WebSocketServerProtocol) -> Optional[ConnectedDevice]:
+        """Find the registered device that owns a connection"""
+        device_id = self.socket_devices.get(websocket)
+        return self.connected_devices.get(device_id) if device_id is not None else None
+    
+    def _drop_connection(self, websocket: WebSocketServerProtocol) -> List[IngestQueue]:
+        """Forget a connection's device, returning its ingest queues still to be drained"""
+        # Find and remove device
+        device_to_remove = self.socket_devices.pop(websocket, None)
+        
+        if not device_to_remove:
+            return []
+        del self.connected_devices[device_to_remove]
+        del self.device_connections[device_to_remove]
+        self.heartbeat_wheel.cancel(device_to_remove)
+        self._suspend_uploads(device_to_remove)
+        logger.info(f"Device {device_to_remove} disconnected")
+        return self._detach_ingest_queues(device_to_remove)
     
     async def cleanup_connection(self, websocket: WebSocketServerProtocol):
         """Clean up after connection close"""
-        # Find and remove device
-        device_to_remove = None
-        for device_id, device in self.connected_devices.items():
-            if device.websocket == websocket:
-                device_to_remove = device_id
-                break
-        
-        if device_to_remove:
-            del self.connected_devices[device_to_remove]
-            del self.device_connections[device_to_remove]
-            logger.info(f"Device {device_to_remove} disconnected")
-        
-        # Cancel ping tasks
-        tasks_to_remove = set()
-        for task in self.ping_tasks:
-            if task.done() or task.cancelled():
-                tasks_to_remove.add(task)
-        
-        for task in tasks_to_remove:
-            self.ping_tasks.remove(task)
+        # Store what is still queued for the device
+        await self._drain_ingest_queues(self._drop_connection(websocket))
+    
+    def get_load(self) -> Dict[str, int]:
+        """Connected devices and samples ingested so far, for the discovery TXT record"""
+        return {"devices": len(self.connected_devices), "ingested_samples": self.ingested_samples}
     
     def get_connected_devices(self) -> Dict[str, ConnectedDevice]:
         """Get all connected devices"""
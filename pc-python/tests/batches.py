@@ -0,0 +1,34 @@
+"""
+Shared GSR sample batch factory for the test suite
+"""
+
+from typing import Callable, Optional, Sequence
+import numpy as np
+from src.bucika_gsr_pc.protocol import GSRSampleBatch
+
+
+T0_NS = 1_700_000_000_000_000_000
+SAMPLE_PERIOD_NS = 7_812_500  # 128 Hz
+
+
+def make_batch(first_seq: int = 0, count: int = 128, *, seq: Optional[Sequence[int]] = None,
+               offset_ns: int = 0, gsr: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+               flag_period: int = 1) -> GSRSampleBatch:
+    """Create a batch of 128 Hz samples.
+    
+    Sequence numbers run from first_seq unless seq lists them. gsr maps
+    them to raw conductance (a slow ramp by default), the filtered value
+    is 0.1 uS below it, and flags count seq modulo flag_period.
+    """
+    seq = np.arange(first_seq, first_seq + count, dtype=np.int64) if seq is None \
+        else np.asarray(seq, dtype=np.int64)
+    raw = 2.5 + seq * 0.001 if gsr is None else np.asarray(gsr(seq), dtype=np.float64)
+    return GSRSampleBatch(
+        t_mono_ns=seq * SAMPLE_PERIOD_NS,
+        t_utc_ns=T0_NS + offset_ns + seq * SAMPLE_PERIOD_NS,
+        seq=seq,
+        gsr_raw_uS=raw,
+        gsr_filt_uS=raw - 0.1,
+        temp_C=np.full(len(seq), 32.0),
+        flags=(seq % flag_period).astype(np.uint8)
+    )
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test suite for clock offset and drift estimation
+"""
+
+import unittest
+import numpy as np
+from src.bucika_gsr_pc.clock_estimator import ClockEstimator, ClockModel
+
+
+class SimulatedExchanges:
+    """Time sync exchanges between the PC and a device clock with known offset and drift"""
+    
+    def __init__(self, offset_ns: int, drift_ppm: float, seed: int = 7):
+        self.offset_ns = offset_ns
+        self.drift_ppm = drift_ppm
+        self.rng = np.random.default_rng(seed)
+    
+    def device_ns(self, server_ns: int) -> int:
+        """Device clock reading at a PC clock time"""
+        return int(server_ns + self.offset_ns + self.drift_ppm * 1e-6 * server_ns)
+    
+    def true_offset_ns(self, server_ns: int) -> float:
+        return self.offset_ns + self.drift_ppm * 1e-6 * server_ns
+    
+    def exchange(self, server_ns: int):
+        """One exchange sent at server_ns: 1 ms legs plus independent queueing on each"""
+        uplink = 1_000_000 + int(self.rng.exponential(3_000_000))
+        downlink = 1_000_000 + int(self.rng.exponential(3_000_000))
+        t2 = server_ns + uplink
+        t3 = t2 + 50_000
+        return self.device_ns(server_ns), t2, t3, self.device_ns(t3 + downlink)
+
+
+class TestClockEstimator(unittest.TestCase):
+    """Test the minimum-RTT filter and the offset and drift fit"""
+    
+    def test_simulated_clock_with_drift(self):
+        """Test estimation error against a device clock 37 ms ahead and 42 ppm fast"""
+        clock = SimulatedExchanges(offset_ns=37_000_000, drift_ppm=42.0)
+        estimator = ClockEstimator(window=240)
+        
+        naive = []
+        for server_ns in range(0, 120_000_000_000, 500_000_000):
+            t1, t2, t3, t4 = clock.exchange(server_ns)
+            self.assertTrue(estimator.add_exchange(t1, t2, t3, t4))
+            naive.append(((t1 - t2) + (t4 - t3)) / 2)
+        
+        model = estimator.model()
+        now_ns = 120_000_000_000
+        offset_error_ns = abs(int(model.offset_at(now_ns)) - clock.true_offset_ns(now_ns))
+        drift_error_ppm = abs(model.drift_ppm - clock.drift_ppm)
+        naive_error_ns = abs(np.mean(naive[-16:]) - clock.true_offset_ns(now_ns))
+        
+        # Queueing adds milliseconds to single exchanges; the fit stays within
+        # a fraction of one, and well inside the averaged estimate's error
+        self.assertLess(offset_error_ns, 150_000, f"offset error {offset_error_ns / 1000:.1f} us")
+        self.assertLess(drift_error_ppm, 2.0, f"drift error {drift_error_ppm:.2f} ppm")
+        self.assertLess(offset_error_ns, naive_error_ns / 3)
+        
+        # Device timestamps convert onto the PC clock with the same accuracy
+        server_times = np.array([10_000_000_000, 60_000_000_000, 119_000_000_000])
+        device_times = [clock.device_ns(int(t)) for t in server_times]
+        conversion_error = np.abs(model.to_server_ns(device_times) - server_times)
+        self.assertLess(int(conversion_error.max()), 200_000)
+    
+    def test_short_history_uses_best_exchange(self):
+        """Test without enough time span to see drift, the least delayed exchange wins"""
+        estimator = ClockEstimator()
+        self.assertIsNone(estimator.model())
+        
+        estimator.add_exchange(1_000, 0, 10, 9_010)      # rtt 9000, offset 5000
+        estimator.add_exchange(11_000, 10_000, 10_010, 13_010)  # rtt 2000, offset 2000
+        model = estimator.model()
+        
+        self.assertEqual(model.offset_ns, 2_000)
+        self.assertEqual(model.drift_ppm, 0.0)
+        self.assertEqual(model.rtt_ns, 2_000)
+        self.assertEqual(model.exchanges, 2)
+    
+    def test_inconsistent_exchange_rejected(self):
+        """Test exchanges with a negative round trip are not used"""
+        estimator = ClockEstimator()
+        
+        self.assertFalse(estimator.add_exchange(1_000, 0, 5_000, 2_000))
+        self.assertEqual(estimator.rejected, 1)
+        self.assertEqual(len(estimator), 0)
+    
+    def test_model_round_trip(self):
+        """Test a clock model survives serialization in session snapshots"""
+        model = ClockModel(offset_ns=40_000_000, drift_ppm=-12.5, reference_ns=5_000_000_000,
+                           rtt_ns=1_500_000, exchanges=30)
+        
+        self.assertEqual(ClockModel.from_dict(model.to_dict()), model)
+        self.assertEqual(int(model.offset_at(5_000_000_000 + 2_000_000_000)), 40_000_000 - 25_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,7 @@ import tempfile
 import shutil
 from pathlib import Path
 from unittest.mock import Mock, patch, AsyncMock
-from src.bucika_gsr_pc.discovery_service import DiscoveryService
+from src.bucika_gsr_pc.discovery_service import DiscoveryService, usable_addresses
 
 
 class TestDiscoveryService(unittest.TestCase):
@@ -129,6 +129,63 @@ class TestDiscoveryService(unittest.TestCase):
                 self.assertTrue(True)  # Test passes if we reach this point
         
         asyncio.run(run_test())
+    
+    def test_load_properties(self):
+        """Test the TXT record reports devices, ingest rate and free capacity"""
+        load = {"devices": 3, "ingested_samples": 1_000}
+        service = DiscoveryService(capacity=8, load_source=lambda: dict(load))
+        self.assertEqual(DiscoveryService(capacity=8).load_properties(), {"capacity": "8"})
+        
+        with patch('src.bucika_gsr_pc.discovery_service.time.monotonic', side_effect=[100.0, 102.0, 102.0]):
+            first = service.load_properties()
+            load.update(devices=10, ingested_samples=1_768)
+            second = service.load_properties()
+            third = service.load_properties()
+        
+        self.assertEqual(first, {"devices": "3", "ingest_sps": "0", "capacity": "5", "max_devices": "8"})
+        self.assertEqual(second, {"devices": "10", "ingest_sps": "384", "capacity": "0", "max_devices": "8"})
+        self.assertEqual(third["ingest_sps"], "0")
+    
+    def test_usable_addresses(self):
+        """Test advertised addresses skip loopback and link-local ones when others exist"""
+        addresses = usable_addresses()
+        self.assertTrue(addresses)
+        self.assertFalse(any(address.startswith("169.254.") for address in addresses))
+        if addresses != ["127.0.0.1"]:
+            self.assertNotIn("127.0.0.1", addresses)
+    
+    def test_registration_publishes_live_load(self):
+        """Test start returns before registration and the TXT record follows the load"""
+        load = {"devices": 1, "ingested_samples": 0}
+        service = DiscoveryService(port=8082, service_name="BucikaGSRLoadTest",
+                                   load_source=lambda: dict(load), refresh_interval=0.1)
+        
+        async def wait_for(condition, timeout=5.0):
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not condition():
+                if asyncio.get_running_loop().time() > deadline:
+                    return False
+                await asyncio.sleep(0.05)
+            return True
+        
+        async def run_test():
+            await service.start()
+            self.assertTrue(service.is_running())
+            self.assertEqual(service.get_service_info(), {})  # still probing
+            
+            if not await wait_for(lambda: service.service_info is not None):
+                await service.stop()
+                self.skipTest("mDNS registration unavailable in this environment")
+            self.assertEqual(service.get_service_info()["properties"]["devices"], "1")
+            self.assertEqual(service.get_service_info()["properties"]["protocol"], "BucikaGSR")
+            
+            load["devices"] = 4
+            updated = await wait_for(lambda: service.get_service_info()["properties"]["devices"] == "4")
+            await service.stop()
+            return updated
+        
+        self.assertTrue(asyncio.run(run_test()))
+        self.assertFalse(service.is_running())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test suite for the background GSR CSV writer
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from src.bucika_gsr_pc.gsr_writer import GSRCsvWriter, GSR_CSV_HEADER, format_gsr_rows
+from src.bucika_gsr_pc.protocol import GSRSample, GSRSampleBatch
+
+
+def make_samples(first_seq: int, count: int = 4):
+    """Create samples with awkward float values and every flag combination"""
+    return [
+        GSRSample(t_mono_ns=seq, t_utc_ns=1_700_000_000_123_456_789 + seq * 7_812_500, seq=seq,
+                  gsr_raw_uS=0.1 + 0.2 * seq, gsr_filt_uS=1e-07 * seq, temp_C=123456.789 - seq,
+                  flag_spike=bool(seq & 1), flag_sat=bool(seq & 2), flag_dropout=bool(seq & 4))
+        for seq in range(first_seq, first_seq + count)
+    ]
+
+
+def legacy_rows(samples) -> str:
+    """Rows as the previous per-sample writer formatted them"""
+    rows = []
+    for sample in samples:
+        dt = datetime.fromtimestamp(sample.t_utc_ns / 1_000_000_000)
+        row = [sample.t_utc_ns, dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3], sample.seq,
+               sample.gsr_raw_uS, sample.gsr_filt_uS, sample.temp_C,
+               sample.flag_spike, sample.flag_sat, sample.flag_dropout]
+        rows.append(','.join(str(field) for field in row) + '\n')
+    return ''.join(rows)
+
+
+class TestGSRCsvWriter(unittest.TestCase):
+    """Test bulk formatting and the flush policy"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "gsr_data.csv"
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_format_matches_per_sample_rows(self):
+        """Test bulk formatting produces the same rows as the per-sample writer"""
+        samples = make_samples(0, 16)
+        
+        self.assertEqual(format_gsr_rows(GSRSampleBatch.from_samples(samples)), legacy_rows(samples))
+        self.assertEqual(format_gsr_rows(GSRSampleBatch.from_samples([])), "")
+    
+    def test_batches_written_in_order(self):
+        """Test batches from several files are written in order and closed"""
+        async def run_test():
+            writer = GSRCsvWriter()
+            other_path = Path(self.temp_dir) / "other.csv"
+            await writer.wait(writer.open("a", self.path))
+            await writer.wait(writer.open("b", other_path))
+            
+            for first in range(0, 12, 4):
+                writer.write("a", GSRSampleBatch.from_samples(make_samples(first)))
+            writer.write("b", GSRSampleBatch.from_samples(make_samples(100)))
+            
+            self.assertEqual(await writer.wait(writer.close("a")), 12)
+            self.assertEqual(await writer.wait(writer.close("b")), 4)
+            writer.shutdown()
+            
+            header = ','.join(GSR_CSV_HEADER) + '\n'
+            self.assertEqual(self.path.read_text(), header + legacy_rows(make_samples(0, 12)))
+            self.assertEqual(other_path.read_text(), header + legacy_rows(make_samples(100)))
+        
+        asyncio.run(run_test())
+    
+    def test_flush_on_size(self):
+        """Test buffered rows are flushed once the size limit is reached"""
+        async def run_test():
+            writer = GSRCsvWriter(flush_bytes=1024, flush_interval=60.0)
+            await writer.wait(writer.open("a", self.path))
+            header_size = self.path.stat().st_size
+            
+            writer.write("a", GSRSampleBatch.from_samples(make_samples(0)))
+            await writer.wait(writer.flush("b"))
+            self.assertEqual(self.path.stat().st_size, header_size)
+            
+            writer.write("a", GSRSampleBatch.from_samples(make_samples(4, 16)))
+            await writer.wait(writer.flush("b"))
+            self.assertEqual(self.path.read_text().count('\n'), 21)
+            self.assertEqual(writer.flushes, 1)
+            writer.shutdown()
+        
+        asyncio.run(run_test())
+    
+    def test_flush_on_interval(self):
+        """Test buffered rows are flushed once they have waited the flush interval"""
+        async def run_test():
+            writer = GSRCsvWriter(flush_interval=0.05)
+            await writer.wait(writer.open("a", self.path))
+            
+            writer.write("a", GSRSampleBatch.from_samples(make_samples(0)))
+            deadline = time.monotonic() + 2.0
+            while self.path.read_text().count('\n') < 5 and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            
+            self.assertEqual(self.path.read_text().count('\n'), 5)
+            writer.shutdown()
+        
+        asyncio.run(run_test())
+    
+    def test_text_rows_share_the_buffer(self):
+        """Test formatted rows for another file are buffered and counted like batches"""
+        async def run_test():
+            writer = GSRCsvWriter(flush_interval=60.0)
+            await writer.wait(writer.open("marks", self.path, header=["Mark_ID", "Timestamp_ns"]))
+            
+            writer.write_text("marks", "A,1\n")
+            writer.write_text("marks", "B,2\nC,3\n")
+            await writer.wait(writer.flush("other"))
+            self.assertEqual(self.path.read_text(), "Mark_ID,Timestamp_ns\n")
+            
+            self.assertEqual(await writer.wait(writer.close("marks")), 3)
+            self.assertEqual(self.path.read_text(), "Mark_ID,Timestamp_ns\nA,1\nB,2\nC,3\n")
+            self.assertEqual(writer.rows_written, 0)
+            writer.shutdown()
+        
+        asyncio.run(run_test())
+    
+    def test_write_without_open_file(self):
+        """Test writes for an unknown file fail without stopping the writer"""
+        async def run_test():
+            writer = GSRCsvWriter()
+            writer.write("missing", GSRSampleBatch.from_samples(make_samples(0)))
+            await writer.wait(writer.open("a", self.path))
+            writer.write("a", GSRSampleBatch.from_samples(make_samples(0)))
+            
+            self.assertEqual(await writer.wait(writer.close("a")), 4)
+            self.assertIsNone(await writer.wait(writer.close("missing")))
+            writer.shutdown()
+        
+        asyncio.run(run_test())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test suite for the per-device GSR ingest queue
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+from src.bucika_gsr_pc.ingest_queue import IngestQueue, OverflowPolicy
+from src.bucika_gsr_pc.protocol import GSRSampleBatch
+from tests.batches import make_batch
+
+
+class TestIngestQueue(unittest.TestCase):
+    """Test ingest queue overflow policies and ordering"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.stored = []
+        self.release = None
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    async def _handler(self, batch: GSRSampleBatch):
+        """Record stored batches, optionally waiting to simulate slow storage"""
+        if self.release is not None:
+            await self.release.wait()
+        self.stored.extend(sample.seq for sample in batch.to_samples())
+    
+    def _queue(self, policy: OverflowPolicy, max_batches: int = 2) -> IngestQueue:
+        queue = IngestQueue("test-device", self._handler, max_batches=max_batches,
+                            policy=policy, spill_dir=Path(self.temp_dir))
+        queue.start()
+        return queue
+    
+    def test_batches_stored_in_order(self):
+        """Test queued batches are stored in arrival order"""
+        async def run_test():
+            queue = self._queue(OverflowPolicy.BLOCK, max_batches=8)
+            for i in range(5):
+                await queue.put(make_batch(i * 4, 4))
+            await queue.close()
+            
+            self.assertEqual(self.stored, list(range(20)))
+            self.assertEqual(queue.processed_batches, 5)
+            self.assertEqual(queue.depth, 0)
+        
+        asyncio.run(run_test())
+    
+    def test_drop_oldest_policy(self):
+        """Test the oldest batches are dropped and counted when storage stalls"""
+        async def run_test():
+            self.release = asyncio.Event()
+            queue = self._queue(OverflowPolicy.DROP_OLDEST)
+            
+            # The consumer takes the first batch and stalls on it
+            await queue.put(make_batch(0, 4))
+            await asyncio.sleep(0)
+            for i in range(1, 6):
+                await queue.put(make_batch(i * 4, 4))
+            
+            self.assertEqual(queue.depth, 2)
+            self.assertEqual(queue.dropped_batches, 3)
+            self.assertEqual(queue.dropped_samples, 12)
+            
+            self.release.set()
+            await queue.close()
+            self.assertEqual(self.stored, list(range(4)) + list(range(16, 24)))
+            self.assertEqual(queue.get_stats()['dropped_batches'], 3)
+        
+        asyncio.run(run_test())
+    
+    def test_spill_policy_preserves_order(self):
+        """Test overflow batches spill to disk and are read back in order"""
+        async def run_test():
+            self.release = asyncio.Event()
+            queue = self._queue(OverflowPolicy.SPILL)
+            
+            await queue.put(make_batch(0, 4))
+            await asyncio.sleep(0)
+            for i in range(1, 8):
+                await queue.put(make_batch(i * 4, 4))
+            
+            self.assertEqual(queue.depth, 7)
+            self.assertEqual(queue.spilled_batches, 5)
+            self.assertTrue(queue.spill_path.exists())
+            
+            self.release.set()
+            await queue.close()
+            self.assertEqual(self.stored, list(range(32)))
+            self.assertEqual(queue.dropped_batches, 0)
+            self.assertFalse(queue.spill_path.exists())
+        
+        asyncio.run(run_test())
+    
+    def test_block_policy_waits_for_space(self):
+        """Test a full queue blocks the producer until the consumer catches up"""
+        async def run_test():
+            self.release = asyncio.Event()
+            queue = self._queue(OverflowPolicy.BLOCK)
+            
+            await queue.put(make_batch(0, 4))
+            await asyncio.sleep(0)
+            await queue.put(make_batch(4, 4))
+            await queue.put(make_batch(8, 4))
+            
+            blocked = asyncio.create_task(queue.put(make_batch(12, 4)))
+            await asyncio.sleep(0.01)
+            self.assertFalse(blocked.done())
+            self.assertEqual(queue.blocked_puts, 1)
+            
+            self.release.set()
+            await blocked
+            await queue.close()
+            self.assertEqual(self.stored, list(range(16)))
+        
+        asyncio.run(run_test())
+    
+    def test_barrier_runs_after_queued_batches(self):
+        """Test barriers are admitted immediately and run after earlier batches"""
+        async def run_test():
+            self.release = asyncio.Event()
+            queue = self._queue(OverflowPolicy.DROP_OLDEST)
+            await queue.put(make_batch(0, 4))
+            await asyncio.sleep(0)
+            for i in range(1, 3):
+                await queue.put(make_batch(i * 4, 4))
+            
+            async def barrier():
+                return list(self.stored)
+            
+            # Admitted even though the queue is full, and never dropped
+            result = await queue.put_barrier(barrier)
+            await asyncio.sleep(0.01)
+            self.assertFalse(result.done())
+            self.assertEqual(queue.depth, 2)
+            
+            self.release.set()
+            self.assertEqual(await result, list(range(12)))
+            await queue.close()
+        
+        asyncio.run(run_test())
+
+
+if __name__ == '__main__':
+    unittest.main()
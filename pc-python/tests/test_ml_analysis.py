@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test suite for resampling device streams onto a common timeline
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+import numpy as np
+from src.bucika_gsr_pc.clock_estimator import ClockModel
+from src.bucika_gsr_pc.ml_analysis import DeviceStream, MultiDeviceResampler
+from src.bucika_gsr_pc.protocol import GSRSampleBatch
+from src.bucika_gsr_pc.research_tools import MultiSessionAnalyzer
+from src.bucika_gsr_pc.session_manager import SessionManager
+
+
+T0_NS = 1_700_000_000_000_000_000
+
+
+def device_stream(name: str, rate_hz: float, seconds: float, signal, offset_ns: int = 0,
+                  drift_ppm: float = 0.0, clock_model=None) -> DeviceStream:
+    """Samples of signal(true seconds) at a device's real rate, stamped by its clock"""
+    true_ns = T0_NS + np.rint(np.arange(int(seconds * rate_hz)) * 1e9 / rate_hz).astype(np.int64)
+    device_ns = true_ns + offset_ns + np.rint((true_ns - T0_NS) * drift_ppm * 1e-6).astype(np.int64)
+    return DeviceStream(name, device_ns, signal((true_ns - T0_NS) / 1e9), clock_model)
+
+
+class TestMultiDeviceResampler(unittest.TestCase):
+    """Test alignment, clock correction, gap masking and anti-aliasing"""
+    
+    def test_streams_aligned_with_clock_correction(self):
+        """Test devices at different real rates and clocks land on one grid"""
+        ramp = lambda seconds: 2.0 + 0.1 * seconds
+        # The second device runs 0.3% slow and its clock is 40 ms ahead and 50 ppm fast
+        model = ClockModel(offset_ns=40_000_000, drift_ppm=50.0, reference_ns=T0_NS, rtt_ns=1_000_000, exchanges=32)
+        streams = [
+            device_stream("phone-1", 128.0, 60, ramp),
+            device_stream("phone-2", 127.6, 60, ramp, offset_ns=40_000_000, drift_ppm=50.0, clock_model=model),
+        ]
+        
+        aligned = MultiDeviceResampler(32.0).resample(streams, T0_NS, T0_NS + 59 * 1_000_000_000)
+        
+        self.assertEqual(aligned.names, ["phone-1", "phone-2"])
+        self.assertEqual(aligned.values.shape, (2, 59 * 32 + 1))
+        self.assertEqual(int(aligned.t_ns[32]), T0_NS + 1_000_000_000)
+        self.assertTrue(aligned.mask.all())
+        expected = ramp((aligned.t_ns - T0_NS) / 1e9)
+        np.testing.assert_allclose(aligned.values, np.vstack([expected, expected]), atol=1e-6)
+        
+        # Without its clock model the second device is 40 ms late
+        uncorrected = MultiDeviceResampler(32.0).resample([DeviceStream("phone-2", streams[1].t_ns, streams[1].values)],
+                                                          T0_NS + 1_000_000_000, T0_NS + 2_000_000_000)
+        self.assertAlmostEqual(float(expected[32] - uncorrected.values[0, 0]), 0.004, places=4)
+    
+    def test_gaps_and_missing_ends_are_masked(self):
+        """Test grid times inside a gap or outside a stream are masked, not bridged"""
+        stream = device_stream("phone-1", 128.0, 10, lambda seconds: seconds)
+        keep = (stream.t_ns < T0_NS + 4_000_000_000) | (stream.t_ns >= T0_NS + 5_000_000_000)
+        gappy = DeviceStream("phone-1", stream.t_ns[keep], stream.values[keep])
+        late = device_stream("phone-2", 128.0, 5, lambda seconds: seconds)
+        late.t_ns = late.t_ns + 6_000_000_000
+        
+        aligned = MultiDeviceResampler(10.0).resample([gappy, late])
+        
+        self.assertEqual(int(aligned.t_ns[0]), T0_NS)
+        seconds = (aligned.t_ns - T0_NS) / 1e9
+        in_gap = (seconds > 3.995) & (seconds < 5.0)
+        self.assertFalse(aligned.mask[0][in_gap].any())
+        self.assertTrue(np.isnan(aligned.values[0][in_gap]).all())
+        self.assertTrue(aligned.mask[0][~in_gap & (seconds < 9.99)].all())
+        self.assertFalse(aligned.mask[1][seconds < 6.0].any())
+        self.assertTrue(aligned.mask[1][(seconds >= 6.0) & (seconds < 10.99)].all())
+        
+        frame = aligned.to_dataframe()
+        self.assertEqual(list(frame.columns), ["phone-1", "phone-2"])
+        self.assertEqual(frame["phone-1"].isna().sum(), int((~aligned.mask[0]).sum()))
+    
+    def test_antialias_removes_components_above_target_nyquist(self):
+        """Test downsampling filters content the target rate cannot represent"""
+        slow = lambda seconds: np.sin(2 * np.pi * 0.5 * seconds)
+        noisy = lambda seconds: slow(seconds) + 0.5 * np.sin(2 * np.pi * 30.0 * seconds)
+        stream = device_stream("phone-1", 128.0, 30, noisy)
+        window = (T0_NS + 5_000_000_000, T0_NS + 25_000_000_000)
+        
+        linear = MultiDeviceResampler(16.0).resample([stream], *window)
+        antialiased = MultiDeviceResampler(16.0, method='antialias').resample([stream], *window)
+        expected = slow((linear.t_ns - T0_NS) / 1e9)
+        
+        self.assertGreater(np.abs(linear.values[0] - expected).max(), 0.3)
+        self.assertLess(np.abs(antialiased.values[0] - expected).max(), 0.02)
+    
+    def test_invalid_arguments(self):
+        """Test unknown methods, bad rates and empty input are rejected"""
+        with self.assertRaises(ValueError):
+            MultiDeviceResampler(32.0, method='cubic')
+        with self.assertRaises(ValueError):
+            MultiDeviceResampler(0)
+        with self.assertRaises(ValueError):
+            MultiDeviceResampler(32.0).resample([DeviceStream("empty", np.empty(0, np.int64), np.empty(0))])
+
+
+class TestAlignSessions(unittest.TestCase):
+    """Test multi-session alignment of recorded sessions"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_align_recorded_sessions(self):
+        """Test sessions are read from disk and aligned on the PC clock"""
+        model = ClockModel(offset_ns=20_000_000, drift_ppm=0.0, reference_ns=T0_NS, rtt_ns=1_000_000, exchanges=32)
+        
+        def batch(offset_ns: int) -> GSRSampleBatch:
+            seq = np.arange(1280, dtype=np.int64)
+            seconds = seq / 128.0
+            return GSRSampleBatch(
+                t_mono_ns=seq * 7_812_500,
+                t_utc_ns=T0_NS + offset_ns + seq * 7_812_500,
+                seq=seq,
+                gsr_raw_uS=2.0 + seconds,
+                gsr_filt_uS=2.0 + seconds,
+                temp_C=np.full(len(seq), 32.0),
+                flags=np.zeros(len(seq), dtype=np.uint8)
+            )
+        
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir))
+            session_ids = [await manager.start_session("Study", device_id) for device_id in ("phone-1", "phone-2")]
+            manager.set_clock_model("phone-2", model)
+            await manager.store_gsr_batch("phone-1", batch(0))
+            await manager.store_gsr_batch("phone-2", batch(20_000_000))
+            await manager.stop_session("phone-1")
+            await manager.stop_session("phone-2")
+            await manager.close()
+            
+            analyzer = MultiSessionAnalyzer(Path(self.temp_dir))
+            aligned = await analyzer.align_sessions(session_ids, 32.0, method='linear')
+            analyzer.catalog.close()
+            return session_ids, aligned
+        
+        session_ids, aligned = asyncio.run(run_test())
+        
+        self.assertEqual(aligned.names, session_ids)
+        self.assertEqual(int(aligned.t_ns[0]), T0_NS)
+        both = aligned.mask.all(axis=0)
+        self.assertGreater(both.sum(), 300)
+        np.testing.assert_allclose(aligned.values[0][both], aligned.values[1][both], atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,9 @@ import shutil
 import time
 from pathlib import Path
 from unittest.mock import Mock, patch
-from src.bucika_gsr_pc.performance_monitor import PerformanceMonitor, PerformanceMetrics
+from src.bucika_gsr_pc.performance_monitor import (
+    PerformanceMonitor, PerformanceMetrics, LatencyHistogram, measure_performance
+)
 
 
 class TestPerformanceMonitor(unittest.TestCase):
@@ -163,6 +165,46 @@ class TestPerformanceMonitor(unittest.TestCase):
         
         asyncio.run(run_test())
 
+    
+    def test_latency_histogram_percentiles(self):
+        """Test histogram percentiles stay within one bucket of the true value"""
+        histogram = LatencyHistogram()
+        for micros in range(1, 10001):
+            histogram.record(micros / 1_000_000)
+        
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 10000)
+        self.assertAlmostEqual(summary['max_ms'], 10.0)
+        for percent, key in ((50, 'p50_ms'), (95, 'p95_ms'), (99, 'p99_ms')):
+            expected_ms = percent / 10
+            self.assertGreaterEqual(summary[key], expected_ms)
+            self.assertLessEqual(summary[key], expected_ms * 1.1)
+        
+        self.assertEqual(LatencyHistogram().summary()['p99_ms'], 0.0)
+    
+    def test_handler_latencies(self):
+        """Test per message type latencies, also via measure_performance"""
+        async def run_test():
+            @measure_performance(self.monitor, "SYNC_MARK")
+            async def handle_sync_mark():
+                await asyncio.sleep(0.01)
+            
+            for _ in range(3):
+                await handle_sync_mark()
+        
+        asyncio.run(run_test())
+        self.monitor.record_handler_latency("PING", 0.0002)
+        
+        latencies = self.monitor.get_handler_latencies()
+        self.assertEqual(set(latencies), {"SYNC_MARK", "PING"})
+        self.assertEqual(latencies["SYNC_MARK"]["count"], 3)
+        self.assertGreaterEqual(latencies["SYNC_MARK"]["p50_ms"], 10.0)
+        self.assertLess(latencies["PING"]["max_ms"], 1.0)
+        self.assertEqual(self.monitor.message_count, 4)
+        
+        self.monitor.reset_counters()
+        self.assertEqual(self.monitor.get_handler_latencies(), {})
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
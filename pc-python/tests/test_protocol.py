@@ -8,8 +8,11 @@ from datetime import datetime
 from src.bucika_gsr_pc.protocol import (
     MessageType, MessageEnvelope, HelloPayload, RegisterPayload,
     StartPayload, SyncMarkPayload, GSRSamplePayload, GSRSample,
-    parse_message_payload
+    parse_message_payload, GSRSampleBatch, GSR_BATCH_BYTES_PER_SAMPLE,
+    BINARY_FRAME_HEADER, BinaryFrameType, parse_binary_frame_header,
+    decode_message, GSRSampleRecordsPayload, UploadChunkFrame
 )
+from pydantic import ValidationError
 
 
 class TestProtocol(unittest.TestCase):
@@ -104,6 +107,104 @@ class TestProtocol(unittest.TestCase):
         self.assertEqual(envelope.deviceId, "device-456")
         self.assertIsInstance(envelope.ts, int)
         self.assertGreater(envelope.ts, 0)
+    
+    def test_gsr_binary_batch_round_trip(self):
+        """Test binary GSR batch encoding and decoding"""
+        samples = [
+            GSRSample(
+                t_mono_ns=1_000_000_000 + i * 7_812_500,
+                t_utc_ns=1_700_000_000_000_000_000 + i * 7_812_500,
+                seq=i,
+                gsr_raw_uS=2.5 + i * 0.01,
+                gsr_filt_uS=2.48 + i * 0.01,
+                temp_C=32.1,
+                flag_spike=(i == 1),
+                flag_sat=(i == 2),
+                flag_dropout=(i == 2)
+            )
+            for i in range(4)
+        ]
+        
+        frame = GSRSampleBatch.from_samples(samples).encode()
+        
+        self.assertEqual(len(frame), BINARY_FRAME_HEADER.size + 4 + 4 * GSR_BATCH_BYTES_PER_SAMPLE)
+        self.assertEqual(parse_binary_frame_header(frame), BinaryFrameType.GSR_BATCH)
+        
+        decoded = GSRSampleBatch.decode(frame)
+        self.assertEqual(len(decoded), 4)
+        self.assertEqual(decoded.to_samples(), samples)
+    
+    def test_gsr_binary_batch_rejects_malformed_frames(self):
+        """Test binary GSR batch validation"""
+        sample = GSRSample(t_mono_ns=1, t_utc_ns=2, seq=3, gsr_raw_uS=1.0,
+                           gsr_filt_uS=1.0, temp_C=30.0)
+        frame = GSRSampleBatch.from_samples([sample]).encode()
+        
+        with self.assertRaises(ValueError):
+            GSRSampleBatch.decode(frame[:-1])
+        with self.assertRaises(ValueError):
+            GSRSampleBatch.decode(b"XX" + frame[2:])
+
+    
+    def test_decode_message_single_pass(self):
+        """Test typed envelope decoding straight from JSON bytes"""
+        envelope = MessageEnvelope.create(
+            msg_id="test-123",
+            msg_type=MessageType.SYNC_MARK,
+            device_id="device-456",
+            payload=SyncMarkPayload(markId="MARK001", description="Start of stimulus"),
+            session_id="session-1"
+        )
+        
+        decoded = decode_message(envelope.model_dump_json().encode())
+        
+        self.assertEqual(decoded.type, MessageType.SYNC_MARK)
+        self.assertEqual(decoded.sessionId, "session-1")
+        self.assertIsInstance(decoded.payload, SyncMarkPayload)
+        self.assertEqual(decoded.payload.markId, "MARK001")
+    
+    def test_decode_message_gsr_fast_lane(self):
+        """Test GSR_SAMPLE messages decode to records, not GSRSample models"""
+        sample = GSRSample(t_mono_ns=1, t_utc_ns=2, seq=3, gsr_raw_uS=2.5,
+                           gsr_filt_uS=2.48, temp_C=32.1, flag_sat=True)
+        envelope = MessageEnvelope.create(
+            msg_id="test-123",
+            msg_type=MessageType.GSR_SAMPLE,
+            device_id="device-456",
+            payload=GSRSamplePayload(samples=[sample])
+        )
+        
+        decoded = decode_message(envelope.model_dump_json())
+        
+        self.assertIsInstance(decoded.payload, GSRSampleRecordsPayload)
+        self.assertIsInstance(decoded.payload.samples[0], dict)
+        self.assertEqual(decoded.payload.to_batch().to_samples(), [sample])
+    
+    def test_decode_message_rejects_invalid_messages(self):
+        """Test decode_message validation errors"""
+        with self.assertRaises(ValidationError):
+            decode_message("{not json")
+        with self.assertRaises(ValidationError):
+            decode_message('{"id": "1", "type": "BOGUS", "ts": 1, "deviceId": "d", "payload": {}}')
+        with self.assertRaises(ValidationError):
+            decode_message('{"id": "1", "type": "SYNC_MARK", "ts": 1, "deviceId": "d", "payload": {}}')
+
+    
+    def test_upload_chunk_frame_round_trip(self):
+        """Test binary upload chunk encoding, decoding and CRC check"""
+        data = bytes(range(256)) * 4
+        frame = UploadChunkFrame(upload_id=7, chunk_index=3, data=data, is_last=True).encode()
+        
+        decoded = UploadChunkFrame.decode(frame)
+        self.assertEqual(decoded.upload_id, 7)
+        self.assertEqual(decoded.chunk_index, 3)
+        self.assertTrue(decoded.is_last)
+        self.assertEqual(bytes(decoded.data), data)
+        self.assertTrue(decoded.verify())
+        
+        corrupted = bytearray(frame)
+        corrupted[-1] ^= 0xFF
+        self.assertFalse(UploadChunkFrame.decode(bytes(corrupted)).verify())
 
 
 if __name__ == "__main__":
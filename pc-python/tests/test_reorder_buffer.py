@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test suite for the sequence-number reorder buffer
+"""
+
+import unittest
+import numpy as np
+from src.bucika_gsr_pc.reorder_buffer import SeqReorderBuffer, SequenceGap, SequenceReset
+from tests.batches import make_batch, SAMPLE_PERIOD_NS, T0_NS
+
+
+def released_seq(buffer: SeqReorderBuffer, *batches) -> list:
+    seq = []
+    for batch in batches:
+        seq.extend(np.asarray(buffer.push(make_batch(seq=batch)).seq).tolist())
+    return seq
+
+
+class TestSeqReorderBuffer(unittest.TestCase):
+    """Test ordering, duplicate dropping and gap accounting"""
+    
+    def test_in_order_batches_pass_through(self):
+        """Test contiguous batches are released as they are"""
+        buffer = SeqReorderBuffer(window=16)
+        batch = make_batch(seq=range(0, 10))
+        
+        self.assertIs(buffer.push(batch), batch)
+        self.assertEqual(released_seq(buffer, range(10, 20)), list(range(10, 20)))
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.released, 20)
+        self.assertEqual(buffer.gaps, [])
+    
+    def test_out_of_order_samples_are_released_in_order(self):
+        """Test samples are held until the ones before them arrive"""
+        buffer = SeqReorderBuffer(window=16)
+        
+        self.assertEqual(released_seq(buffer, range(0, 5)), list(range(5)))
+        self.assertEqual(released_seq(buffer, [8, 7, 9]), [])
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(released_seq(buffer, [6, 5]), list(range(5, 10)))
+        self.assertEqual(buffer.gaps, [])
+        
+        released = buffer.push(make_batch(seq=[11, 10]))
+        self.assertEqual(np.asarray(released.t_utc_ns).tolist(),
+                         [1_700_000_000_000_000_000 + seq * 7_812_500 for seq in (10, 11)])
+    
+    def test_duplicates_are_dropped(self):
+        """Test retransmits of held and released samples are counted and dropped"""
+        buffer = SeqReorderBuffer(window=16)
+        
+        released = released_seq(buffer, range(0, 10), range(5, 12), [14, 14, 13], [12, 12, 3])
+        
+        self.assertEqual(released, list(range(15)))
+        self.assertEqual(buffer.duplicates, 5 + 1 + 1 + 1)
+        self.assertEqual(buffer.late, 0)
+    
+    def test_gap_recorded_once_window_passes(self):
+        """Test missing samples become a gap once a sample a window past them arrives"""
+        buffer = SeqReorderBuffer(window=8)
+        
+        self.assertEqual(released_seq(buffer, range(0, 10), range(13, 18)), list(range(10)))
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(released_seq(buffer, range(18, 22)), list(range(13, 22)))
+        
+        self.assertEqual(buffer.gaps, [SequenceGap(10, 12, 1_700_000_000_000_000_000 + 9 * 7_812_500,
+                                                   1_700_000_000_000_000_000 + 13 * 7_812_500)])
+        self.assertEqual(buffer.missing, 3)
+        
+        # A sample of the gap arriving afterwards is too late to use
+        self.assertEqual(released_seq(buffer, [11, 22]), [22])
+        self.assertEqual(buffer.late, 1)
+        self.assertEqual(buffer.duplicates, 0)
+    
+    def test_flush_releases_held_samples_with_gaps(self):
+        """Test flushing at the end of a session releases everything held"""
+        buffer = SeqReorderBuffer(window=100)
+        released_seq(buffer, range(0, 4), [6, 7], [10])
+        
+        self.assertEqual(np.asarray(buffer.flush().seq).tolist(), [6, 7, 10])
+        self.assertEqual([(gap.first_seq, gap.last_seq) for gap in buffer.gaps], [(4, 5), (8, 9)])
+        self.assertEqual(buffer.gap_intervals()[1]["first_seq"], 8)
+        self.assertEqual(len(buffer.flush()), 0)
+    
+    def test_sequence_restart_starts_new_epoch(self):
+        """Test a reconnect that restarts numbering at 0 is released, not dropped as stale"""
+        buffer = SeqReorderBuffer(window=256)
+        buffer.push(make_batch(5000, 99))
+        buffer.push(make_batch(seq=[5100]))  # held waiting for 5099
+        
+        # The device reconnects a minute later and numbers from 0 again
+        restart_ns = 60_000_000_000
+        released = buffer.push(make_batch(0, 3000, offset_ns=restart_ns))
+        
+        self.assertEqual(np.asarray(released.seq).tolist(), [5100] + list(range(3000)))
+        self.assertEqual(buffer.resets, [SequenceReset(5100, 0, T0_NS + 5100 * SAMPLE_PERIOD_NS,
+                                                       T0_NS + restart_ns)])
+        self.assertEqual(buffer.reset_points()[0]["first_seq"], 0)
+        self.assertEqual([(gap.first_seq, gap.last_seq) for gap in buffer.gaps], [(5099, 5099)])
+        self.assertEqual(buffer.duplicates, 0)
+        
+        # Retransmits from before the restart carry old times and are still dropped
+        self.assertEqual(released_seq(buffer, range(5050, 5060)), [])
+        self.assertEqual(buffer.duplicates, 10)
+        self.assertEqual(len(buffer.resets), 1)
+        released = buffer.push(make_batch(seq=[3001, 3000], offset_ns=restart_ns))
+        self.assertEqual(np.asarray(released.seq).tolist(), [3000, 3001])
+    
+    def test_sequence_restart_within_first_window(self):
+        """Test a restart decided by time is caught before a window of samples was released"""
+        buffer = SeqReorderBuffer(window=256)
+        buffer.push(make_batch(0, 100))
+        
+        released = buffer.push(make_batch(0, 100, offset_ns=5_000_000_000))
+        
+        self.assertEqual(np.asarray(released.seq).tolist(), list(range(100)))
+        self.assertEqual(buffer.duplicates, 0)
+        self.assertEqual([(reset.last_seq, reset.first_seq) for reset in buffer.resets], [(99, 0)])
+        
+        # A retransmit of the first epoch is still a duplicate
+        self.assertEqual(released_seq(buffer, range(50, 60)), [])
+        self.assertEqual(buffer.duplicates, 10)
+        self.assertEqual(len(buffer.resets), 1)
+    
+    def test_zero_window_never_holds_samples(self):
+        """Test a zero window sorts each batch and records gaps immediately"""
+        buffer = SeqReorderBuffer(window=0)
+        
+        self.assertEqual(released_seq(buffer, [0, 1, 3], [2, 5, 4]), [0, 1, 3, 4, 5])
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.missing, 1)
+        self.assertEqual(buffer.late, 1)
+        with self.assertRaises(ValueError):
+            SeqReorderBuffer(window=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
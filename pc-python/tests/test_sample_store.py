@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test suite for the bounded in-memory GSR sample store
+"""
+
+import unittest
+import tracemalloc
+from src.bucika_gsr_pc.sample_store import (
+    GSRSampleStore, BYTES_PER_SAMPLE, DEFAULT_SAMPLE_RATE_HZ, bytes_per_device_hour
+)
+from tests.batches import make_batch
+
+
+class TestGSRSampleStore(unittest.TestCase):
+    """Test ring buffer ordering, retention and memory bounds"""
+    
+    def test_retains_newest_samples_in_order(self):
+        """Test the oldest samples are overwritten once the window is full"""
+        store = GSRSampleStore(retention_seconds=10, sample_rate_hz=100)
+        for first in range(0, 2500, 100):
+            store.append(make_batch(first, 100, flag_period=2))
+        
+        self.assertEqual(len(store), 1000)
+        self.assertEqual(store.total_samples, 2500)
+        self.assertEqual(store.evicted_samples, 1500)
+        self.assertEqual(store.column("seq").tolist(), list(range(1500, 2500)))
+        
+        samples = store.to_samples()
+        self.assertEqual(samples[0].seq, 1500)
+        self.assertIsInstance(samples[0].seq, int)
+        self.assertTrue(samples[1].flag_spike)
+    
+    def test_batch_larger_than_window(self):
+        """Test a batch larger than the window keeps only its newest samples"""
+        store = GSRSampleStore(retention_seconds=1, sample_rate_hz=50)
+        store.append(make_batch(0, 30, flag_period=2))
+        store.append(make_batch(30, 120, flag_period=2))
+        
+        self.assertEqual(store.column("seq").tolist(), list(range(100, 150)))
+        self.assertEqual(store.total_samples, 150)
+    
+    def test_since_returns_recent_suffix(self):
+        """Test the batch view can be limited to samples from a given time"""
+        store = GSRSampleStore()
+        store.append(make_batch(0, 256, flag_period=2))
+        
+        since = int(make_batch(200, 1).t_utc_ns[0])
+        batch = store.to_batch(since_utc_ns=since)
+        
+        self.assertEqual(len(batch), 56)
+        self.assertEqual(int(batch.seq[0]), 200)
+    
+    def test_memory_per_device_hour(self):
+        """Test an hour of 128 Hz samples stays within the documented bound"""
+        hour = DEFAULT_SAMPLE_RATE_HZ * 3600
+        self.assertEqual(BYTES_PER_SAMPLE, 49)
+        self.assertEqual(bytes_per_device_hour(), hour * 49)
+        self.assertLess(bytes_per_device_hour(), 22 * 1024 * 1024)
+        
+        batch = make_batch(0, 1280, flag_period=2)
+        tracemalloc.start()
+        try:
+            store = GSRSampleStore(retention_seconds=3600)
+            for _ in range(hour // len(batch)):
+                store.append(batch)
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        self.assertEqual(len(store), hour)
+        self.assertEqual(store.nbytes, bytes_per_device_hour())
+        self.assertLess(retained, bytes_per_device_hour() * 1.05)
+        # Growing the arrays briefly holds the old and new copies
+        self.assertLess(peak, bytes_per_device_hour() * 2)
+    
+    def test_memory_bounded_by_retention(self):
+        """Test memory stops growing once the retention window is full"""
+        store = GSRSampleStore(retention_seconds=60)
+        batch = make_batch(0, 1280, flag_period=2)
+        for _ in range(60):
+            store.append(batch)
+        full = store.nbytes
+        for _ in range(600):
+            store.append(batch)
+        
+        self.assertEqual(store.nbytes, full)
+        self.assertEqual(full, 60 * DEFAULT_SAMPLE_RATE_HZ * BYTES_PER_SAMPLE)
+
+
+if __name__ == '__main__':
+    unittest.main()
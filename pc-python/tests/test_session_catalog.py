@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test suite for the persistent session catalog
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+import numpy as np
+from src.bucika_gsr_pc.session_manager import SessionManager
+from src.bucika_gsr_pc.session_catalog import SessionCatalog, CatalogStatus, CATALOG_FILE
+from src.bucika_gsr_pc.session_file import file_checksum
+from src.bucika_gsr_pc.data_analyzer import BatchAnalyzer
+from src.bucika_gsr_pc.data_validator import BatchValidator, ValidationLevel
+from tests.batches import make_batch
+
+
+class TestSessionCatalog(unittest.TestCase):
+    """Test cataloging sessions, queries and the batch tools built on them"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _record_sessions(self, catalog: SessionCatalog, write_binary: bool = False):
+        async def run_test():
+            manager = SessionManager(base_path=self.temp_dir, write_binary=write_binary, catalog=catalog)
+            session_ids = []
+            for device_id, participant_id in (("device-1", "P001"), ("device-2", "P002"), ("device-3", "P001")):
+                session_ids.append(await manager.start_session("Catalog", device_id, participant_id=participant_id))
+                await manager.store_gsr_batch(device_id, make_batch(0, 1000, gsr=lambda seq: 2.5 + np.sin(seq / 50.0)))
+                await manager.stop_session(device_id)
+            await manager.close()
+            return session_ids
+        
+        return asyncio.run(run_test())
+    
+    def test_session_manager_catalogs_sessions(self):
+        """Test finished sessions are cataloged with counts, paths and checksums"""
+        catalog = SessionCatalog.open(self.temp_dir)
+        session_ids = self._record_sessions(catalog, write_binary=True)
+        
+        self.assertEqual(len(catalog), 3)
+        entry = catalog.get(session_ids[0])
+        self.assertEqual(entry["state"], "DONE")
+        self.assertEqual(entry["participant_id"], "P001")
+        self.assertEqual(entry["sample_count"], 1000)
+        self.assertEqual(entry["analysis_status"], CatalogStatus.PENDING.value)
+        self.assertFalse(Path(entry["gsr_file_path"]).is_absolute())
+        
+        csv_path, = catalog.gsr_files(session_ids[0], prefer_binary=False)
+        binary_path, = catalog.gsr_files(session_ids[0])
+        self.assertEqual(csv_path.parent, self.temp_dir / session_ids[0])
+        self.assertEqual(binary_path.suffix, ".gsrb")
+        self.assertEqual(entry["gsr_checksum"], file_checksum(csv_path))
+        self.assertEqual(entry["binary_checksum"], file_checksum(binary_path))
+        
+        self.assertEqual(catalog.session_ids(participant_id="P001"), [session_ids[0], session_ids[2]])
+        self.assertEqual(catalog.session_ids(device_id="device-2", state="DONE"), [session_ids[1]])
+        self.assertEqual(catalog.gsr_files("missing-session"), [])
+        with self.assertRaises(ValueError):
+            catalog.find(session_name="Catalog")
+        catalog.close()
+    
+    def test_import_existing_directory(self):
+        """Test a new catalog imports sessions recorded without one"""
+        session_ids = self._record_sessions(None)
+        (self.temp_dir / "empty_session").mkdir()
+        
+        catalog = SessionCatalog.open(self.temp_dir)
+        
+        self.assertTrue((self.temp_dir / CATALOG_FILE).exists())
+        self.assertEqual(set(catalog.session_ids()), set(session_ids + ["empty_session"]))
+        self.assertEqual(catalog.get(session_ids[1])["participant_id"], "P002")
+        self.assertEqual(catalog.gsr_files("empty_session"), [])
+        self.assertEqual(len(catalog.gsr_files(session_ids[1])), 1)
+        catalog.close()
+        
+        # Reopening does not scan again
+        (self.temp_dir / "late_session").mkdir()
+        catalog = SessionCatalog.open(self.temp_dir)
+        self.assertIsNone(catalog.get("late_session"))
+        catalog.close()
+    
+    def test_batch_tools_record_status(self):
+        """Test batch analysis and validation run on cataloged sessions and record their outcome"""
+        catalog = SessionCatalog.open(self.temp_dir)
+        session_ids = self._record_sessions(catalog)
+        (self.temp_dir / "not_a_session").mkdir()
+        
+        # The analyzer does not understand the recorded column names, so its runs fail
+        BatchAnalyzer(self.temp_dir, catalog).analyze_all_sessions(participant_id="P001")
+        
+        reports = asyncio.run(BatchValidator(ValidationLevel.BASIC).validate_all_sessions(self.temp_dir, catalog))
+        self.assertEqual(set(reports), set(session_ids))
+        
+        entry = catalog.get(session_ids[0])
+        self.assertEqual(entry["analysis_status"], CatalogStatus.FAILED.value)
+        self.assertIsNotNone(entry["analyzed_at"])
+        self.assertIn(entry["validation_status"], (CatalogStatus.PASSED.value, CatalogStatus.FAILED.value))
+        self.assertAlmostEqual(entry["validation_score"], reports[session_ids[0]].overall_score)
+        self.assertEqual(catalog.get(session_ids[1])["analysis_status"], CatalogStatus.PENDING.value)
+        self.assertEqual(catalog.session_ids(analysis_status=CatalogStatus.PENDING), [session_ids[1]])
+        catalog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
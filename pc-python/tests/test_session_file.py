@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test suite for the binary session file format
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.bucika_gsr_pc.session_manager import SessionManager
+from src.bucika_gsr_pc.session_file import (
+    GSRSessionFile, GSRSessionFileWriter, RECORD_DTYPE, index_path_for, gsr_data_files,
+    read_gsr_dataframe, csv_to_session_file, session_file_to_csv
+)
+from tests.batches import make_batch
+
+
+class TestSessionFile(unittest.TestCase):
+    """Test binary session files, their index and the CSV converters"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "gsr_data_20240101_100000.gsrb"
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _write(self, batches, index_interval: int = 100):
+        writer = GSRSessionFileWriter(self.path, index_interval=index_interval)
+        for batch in batches:
+            writer.append(batch)
+        writer.close()
+    
+    def test_records_mapped_without_parsing(self):
+        """Test written records read back through a memmap"""
+        self._write([make_batch(0, 130, flag_period=8), make_batch(130, 200, flag_period=8)])
+        
+        session_file = GSRSessionFile(self.path)
+        
+        self.assertIsInstance(session_file.records, np.memmap)
+        self.assertEqual(session_file.records.dtype, RECORD_DTYPE)
+        self.assertEqual(len(session_file), 330)
+        self.assertEqual(session_file.column("seq").tolist(), list(range(330)))
+        self.assertEqual(session_file.index["record"].tolist(), [0, 100, 200, 300])
+        self.assertEqual(session_file.index["seq"].tolist(), [0, 100, 200, 300])
+    
+    def test_locate_uses_index(self):
+        """Test locating times before, between and after indexed records"""
+        self._write([make_batch(0, 1000, flag_period=8)])
+        session_file = GSRSessionFile(self.path)
+        t_utc_ns = session_file.column("t_utc_ns")
+        
+        for record in (0, 1, 99, 100, 101, 555, 999):
+            self.assertEqual(session_file.locate(int(t_utc_ns[record])), record)
+            self.assertEqual(session_file.locate(int(t_utc_ns[record]) - 1), record)
+        self.assertEqual(session_file.locate(int(t_utc_ns[-1]) + 1), 1000)
+    
+    def test_read_range_columns(self):
+        """Test range reads return the half-open time range for chosen columns"""
+        self._write([make_batch(0, 1000, flag_period=8)])
+        session_file = GSRSessionFile(self.path)
+        t_utc_ns = session_file.column("t_utc_ns")
+        
+        data = session_file.read_range(int(t_utc_ns[250]), int(t_utc_ns[380]), columns=["seq", "gsr_raw_uS"])
+        
+        self.assertEqual(set(data), {"seq", "gsr_raw_uS"})
+        self.assertEqual(data["seq"].tolist(), list(range(250, 380)))
+        self.assertEqual(len(session_file.read_range(int(t_utc_ns[-1]) + 1, int(t_utc_ns[-1]) + 10)["seq"]), 0)
+        self.assertEqual(len(session_file.read_range(int(t_utc_ns[500]), int(t_utc_ns[100]))["seq"]), 0)
+        with self.assertRaises(ValueError):
+            session_file.read_range(0, 1, columns=["GSR_Value"])
+    
+    def test_refresh_sees_appended_records(self):
+        """Test a reader of a file still being written picks up new records"""
+        writer = GSRSessionFileWriter(self.path, index_interval=100)
+        writer.append(make_batch(0, 150, flag_period=8))
+        writer.flush()
+        
+        session_file = GSRSessionFile(self.path)
+        self.assertEqual(len(session_file), 150)
+        
+        writer.append(make_batch(150, 200, flag_period=8))
+        writer.flush()
+        self.assertTrue(session_file.refresh())
+        self.assertFalse(session_file.refresh())
+        writer.close()
+        
+        end_ns = int(session_file.column("t_utc_ns")[-1]) + 1
+        self.assertEqual(session_file.read_range(int(session_file.column("t_utc_ns")[320]), end_ns)["seq"].tolist(),
+                         list(range(320, 350)))
+        self.assertEqual(session_file.index["record"].tolist(), [0, 100, 200, 300])
+    
+    def test_torn_record_and_missing_index(self):
+        """Test a partial trailing record is ignored and a lost index is rebuilt"""
+        self._write([make_batch(0, 250, flag_period=8)])
+        with open(self.path, "ab") as f:
+            f.write(b"\x00" * 20)
+        index_path_for(self.path).unlink()
+        
+        session_file = GSRSessionFile(self.path)
+        
+        self.assertEqual(len(session_file), 250)
+        self.assertEqual(session_file.index["record"].tolist(), [0, 100, 200])
+        self.assertEqual(session_file.locate(int(session_file.column("t_utc_ns")[150])), 150)
+    
+    def test_csv_round_trip(self):
+        """Test converting to and from the CSV layout reproduces the CSV file"""
+        async def write_csv():
+            manager = SessionManager(base_path=Path(self.temp_dir))
+            await manager.start_session("Convert", "device-1")
+            session = manager.get_active_session("device-1")
+            await manager.store_gsr_batch("device-1", make_batch(0, 500, flag_period=8))
+            await manager.stop_session("device-1")
+            await manager.close()
+            return session.gsr_file_path
+        
+        csv_path = asyncio.run(write_csv())
+        binary_path = csv_to_session_file(csv_path, self.path)
+        round_trip = session_file_to_csv(binary_path, Path(self.temp_dir) / "round_trip.csv",
+                                         chunk_records=128)
+        
+        self.assertEqual(round_trip.read_text(), csv_path.read_text())
+        session_file = GSRSessionFile(binary_path)
+        self.assertEqual(session_file.column("flags").tolist(), [seq % 8 for seq in range(500)])
+    
+    def test_session_manager_writes_binary_file(self):
+        """Test the binary file is written next to the CSV and preferred by readers"""
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir), write_binary=True)
+            await manager.start_session("Binary", "device-1")
+            session = manager.get_active_session("device-1")
+            for first in range(0, 600, 128):
+                await manager.store_gsr_batch("device-1", make_batch(first, 128, flag_period=8))
+            await manager.stop_session("device-1")
+            await manager.close()
+            return session
+        
+        session = asyncio.run(run_test())
+        session_dir = session.gsr_file_path.parent
+        
+        self.assertEqual(gsr_data_files(session_dir), [session.gsr_binary_path])
+        self.assertEqual(gsr_data_files(session_dir, prefer_binary=False), [session.gsr_file_path])
+        
+        binary_df = read_gsr_dataframe(session.gsr_binary_path)
+        csv_df = pd.read_csv(session.gsr_file_path, float_precision="round_trip")
+        self.assertEqual(list(binary_df.columns), list(csv_df.columns))
+        self.assertEqual(len(binary_df), 640)
+        for column in ("Timestamp_ns", "Sequence", "GSR_Raw_uS", "Flag_Spike", "Flag_Dropout"):
+            self.assertEqual(binary_df[column].tolist(), csv_df[column].tolist())
+        self.assertEqual(binary_df["DateTime_UTC"].dt.strftime("%Y-%m-%d %H:%M:%S.%f").str[:-3].tolist(),
+                         csv_df["DateTime_UTC"].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Test suite for multi-device session groups and their merged timeline
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from src.bucika_gsr_pc.gsr_writer import GSRCsvWriter
+from src.bucika_gsr_pc.session_journal import SessionJournal
+from src.bucika_gsr_pc.session_manager import SessionManager, SessionState
+from src.bucika_gsr_pc.session_group import GroupState, MergedTimeline, SessionGroup
+from tests.batches import T0_NS, make_batch
+
+
+class TestMergedTimeline(unittest.TestCase):
+    """Test the incremental merge of device streams"""
+    
+    def test_merges_up_to_watermark(self):
+        """Test samples are merged once every device has caught up to them"""
+        timeline = MergedTimeline(2)
+        
+        timeline.add(0, [10, 20, 30, 40], 0)
+        self.assertEqual(len(timeline), 0)
+        self.assertEqual(timeline.pending, 4)
+        
+        timeline.add(1, [15, 25], 0)
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), [10, 15, 20, 25])
+        self.assertEqual(timeline.entries["device"].tolist(), [0, 1, 0, 1])
+        self.assertEqual(timeline.watermark_ns, 25)
+        
+        timeline.add(1, [30, 45], 2)
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), [10, 15, 20, 25, 30, 30, 40])
+        self.assertEqual(timeline.entries["device"].tolist()[4:], [0, 1, 0])
+        self.assertEqual(timeline.entries["sample"].tolist(), [0, 0, 1, 1, 2, 2, 3])
+        self.assertEqual(timeline.pending, 1)
+    
+    def test_finished_device_stops_holding_back(self):
+        """Test a stopped device no longer holds the watermark back"""
+        timeline = MergedTimeline(3)
+        timeline.add(0, [10, 20, 30], 0)
+        timeline.add(1, [12], 0)
+        self.assertEqual(len(timeline), 0)  # device 2 has not sent anything
+        
+        timeline.finish(2)
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), [10, 12])
+        timeline.finish(1)
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), [10, 12, 20, 30])
+        
+        self.assertEqual(timeline.range(12, 30)["t_utc_ns"].tolist(), [12, 20])
+    
+    def test_stalled_device_stops_holding_back(self):
+        """Test a silent member is marked stalled and its late samples are inserted in place"""
+        timeline = MergedTimeline(2, max_lag_ns=100)
+        timeline.add(0, [10, 20], 0)
+        self.assertEqual(len(timeline), 0)
+        
+        timeline.add(0, [150], 2)
+        self.assertEqual(timeline.stalled, [1])
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), [10, 20, 150])
+        self.assertEqual(timeline.pending, 0)
+        
+        # The device comes back: it rejoins, and its sample behind the watermark is placed
+        timeline.add(1, [15, 160], 0)
+        self.assertEqual(timeline.stalled, [])
+        self.assertEqual(timeline.late_samples, 1)
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), [10, 15, 20, 150])
+        self.assertEqual(timeline.entries["device"].tolist(), [0, 1, 0, 0])
+        self.assertEqual(timeline.pending, 1)
+    
+    def test_grows_and_saves(self):
+        """Test a long timeline grows past its first allocation and maps back from disk"""
+        timeline = MergedTimeline(2)
+        for first in range(0, 10_000, 500):
+            timeline.add(0, np.arange(first, first + 500) * 2, first)
+            timeline.add(1, np.arange(first, first + 500) * 2 + 1, first)
+        timeline.flush()
+        
+        self.assertEqual(timeline.entries["t_utc_ns"].tolist(), list(range(20_000)))
+        
+        path = Path(tempfile.mkdtemp()) / "timeline.npy"
+        try:
+            timeline.save(path)
+            loaded = MergedTimeline.load(path, 2)
+            self.assertIsInstance(loaded.entries, np.memmap)
+            self.assertEqual(loaded.watermark_ns, 19_999)
+            self.assertEqual(loaded.range(100, 104)["device"].tolist(), [0, 1, 0, 1])
+        finally:
+            shutil.rmtree(path.parent)
+
+
+class TestSessionGroup(unittest.TestCase):
+    """Test recording several devices as one group"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_group_recording_reads_merged(self):
+        """Test a group's devices are read back interleaved in time order"""
+        devices = ["phone-1", "phone-2", "phone-3"]
+        offsets = [0, 2_000_000, 5_000_000]
+        
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir))
+            group_id = await manager.start_group("Study", devices, participant_id="P001")
+            group = manager.get_group(group_id)
+            self.assertEqual(len(group.session_ids), 3)
+            with self.assertRaises(ValueError):
+                await manager.start_group("Again", ["phone-1"])
+            
+            # Devices deliver batches of different sizes at different moments
+            for first in range(0, 512, 128):
+                await manager.store_gsr_batch("phone-1", make_batch(first, 128, offset_ns=offsets[0]))
+                for half in (first, first + 64):
+                    await manager.store_gsr_batch("phone-2", make_batch(half, 64, offset_ns=offsets[1]))
+            for first in range(0, 512, 256):
+                await manager.store_gsr_batch("phone-3", make_batch(first, 256, offset_ns=offsets[2]))
+            
+            live = await manager.read_group_range(group_id, 0, T0_NS + 10 ** 12, ["seq", "t_utc_ns"])
+            self.assertEqual(int(live["t_utc_ns"][-1]), group.timeline.watermark_ns)
+            self.assertEqual(group.timeline.watermark_ns, T0_NS + offsets[0] + 511 * 7_812_500)
+            await manager.stop_group(group_id)
+            done = await manager.read_group_range(group_id, 0, T0_NS + 10 ** 12, ["seq", "t_utc_ns"])
+            await manager.close()
+            return group_id, group, live, done
+        
+        group_id, group, live, done = asyncio.run(run_test())
+        
+        self.assertEqual(len(done["seq"]), 3 * 512)
+        self.assertTrue(np.all(np.diff(done["t_utc_ns"]) >= 0))
+        self.assertEqual(done["device"][:6].tolist(), [0, 1, 2, 0, 1, 2])
+        for index, offset in enumerate(offsets):
+            rows = done["device"] == index
+            self.assertEqual(done["seq"][rows].tolist(), list(range(512)))
+            self.assertTrue(np.all(done["t_utc_ns"][rows] == T0_NS + offset + done["seq"][rows] * 7_812_500))
+        
+        # While recording, samples past the slowest device wait for it
+        self.assertEqual(live["t_utc_ns"].tolist(), done["t_utc_ns"][:len(live["t_utc_ns"])].tolist())
+        self.assertLess(len(live["seq"]), len(done["seq"]))
+        
+        # The group and its timeline load from disk
+        manager = SessionManager(base_path=Path(self.temp_dir))
+        loaded = SessionGroup.load(Path(self.temp_dir), group_id)
+        self.assertEqual(loaded.state, GroupState.DONE)
+        self.assertEqual(loaded.session_ids, group.session_ids)
+        reloaded = asyncio.run(manager.read_group_range(group_id, T0_NS, T0_NS + 10_000_000, ["seq"]))
+        self.assertEqual(reloaded["device"].tolist(), [0, 1, 2, 0, 1])
+        self.assertEqual(reloaded["seq"].tolist(), [0, 0, 0, 1, 1])
+        manager.gsr_writer.shutdown()
+    
+    def test_member_stop_releases_group(self):
+        """Test stopping one member lets the others' samples onto the timeline"""
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir))
+            group_id = await manager.start_group("Study", ["phone-1", "phone-2"])
+            await manager.store_gsr_batch("phone-1", make_batch(0, 100))
+            group = manager.get_group(group_id)
+            self.assertEqual(len(group.timeline), 0)
+            
+            await manager.stop_session("phone-2")
+            self.assertEqual(len(group.timeline), 100)
+            self.assertEqual(manager.all_sessions[group.session_ids["phone-2"]].group_id, group_id)
+            self.assertEqual(manager.all_sessions[group.session_ids["phone-2"]].state, SessionState.DONE)
+            
+            await manager.stop_group(group_id)
+            self.assertIsNone(manager.get_active_session("phone-1"))
+            self.assertIsNone(manager.get_group("group_missing"))
+            await manager.close()
+        
+        asyncio.run(run_test())
+    
+    def test_failed_start_rolls_back_members(self):
+        """Test members already started are failed when a later device cannot start"""
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir))
+            init_gsr_file = manager._init_gsr_file
+            
+            async def failing_init(session):
+                if session.device_id == "phone-2":
+                    raise OSError("disk full")
+                await init_gsr_file(session)
+            
+            with mock.patch.object(manager, "_init_gsr_file", side_effect=failing_init):
+                with self.assertRaises(OSError):
+                    await manager.start_group("Study", ["phone-1", "phone-2"])
+            
+            self.assertEqual(manager.get_active_sessions(), {})
+            self.assertEqual(manager.session_groups, {})
+            session, = manager.get_all_sessions().values()
+            self.assertEqual(session.state, SessionState.FAILED)
+            
+            # The devices are free for the next attempt
+            group_id = await manager.start_group("Study", ["phone-1", "phone-2"])
+            await manager.stop_group(group_id)
+            await manager.close()
+        
+        asyncio.run(run_test())
+    
+    def test_recover_rebuilds_interrupted_group(self):
+        """Test a group cut short by a crash gets its timeline back from the member files"""
+        journal_path = Path(self.temp_dir) / "session_journal.wal"
+        
+        async def run_test():
+            crashed_writer = GSRCsvWriter(flush_bytes=1 << 30, flush_interval=60)
+            manager = SessionManager(base_path=Path(self.temp_dir), gsr_writer=crashed_writer,
+                                     journal=SessionJournal(journal_path))
+            group_id = await manager.start_group("Study", ["phone-1", "phone-2"])
+            await manager.store_gsr_batch("phone-1", make_batch(0, 200))
+            await manager.store_gsr_batch("phone-2", make_batch(0, 150, offset_ns=1_000_000))
+            
+            recovered = SessionManager(base_path=Path(self.temp_dir), journal=SessionJournal(journal_path))
+            await recovered.recover()
+            data = await recovered.read_group_range(group_id, 0, T0_NS + 10 ** 12, ["seq"])
+            await recovered.close()
+            crashed_writer.shutdown()
+            return group_id, data
+        
+        group_id, data = asyncio.run(run_test())
+        
+        loaded = SessionGroup.load(Path(self.temp_dir), group_id)
+        self.assertEqual(loaded.state, GroupState.INTERRUPTED)
+        self.assertEqual(len(loaded.timeline), 350)
+        self.assertEqual(data["device"][:4].tolist(), [0, 1, 0, 1])
+        self.assertEqual(data["seq"][data["device"] == 0].tolist(), list(range(200)))
+        self.assertEqual(data["seq"][data["device"] == 1].tolist(), list(range(150)))
+
+
+if __name__ == '__main__':
+    unittest.main()
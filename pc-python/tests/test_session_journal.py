@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test suite for the session write-ahead journal
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+from src.bucika_gsr_pc.session_journal import SessionJournal, FsyncPolicy, JournalRecordKind
+from tests.batches import make_batch
+
+
+class TestSessionJournal(unittest.TestCase):
+    """Test journal replay, torn tail handling, fsync policies, compaction and checkpoints"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "session_journal.wal"
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _write(self, journal: SessionJournal):
+        journal.append_session({"session_id": "s1", "state": "RECORDING"})
+        journal.append_batch("s1", make_batch(0, flag_period=2))
+        journal.append_batch("s1", make_batch(128, flag_period=2))
+        journal.append_session({"session_id": "s1", "state": "DONE"})
+    
+    def test_replay_round_trip(self):
+        """Test snapshots and batches replay in the order they were appended"""
+        journal = SessionJournal(self.path)
+        self._write(journal)
+        journal.close()
+        
+        records = SessionJournal(self.path).replay()
+        
+        self.assertEqual([record.kind for record in records],
+                         [JournalRecordKind.SESSION, JournalRecordKind.BATCH,
+                          JournalRecordKind.BATCH, JournalRecordKind.SESSION])
+        self.assertTrue(all(record.session_id == "s1" for record in records))
+        self.assertEqual(records[3].snapshot["state"], "DONE")
+        self.assertEqual(list(records[2].batch.seq), list(range(128, 256)))
+        self.assertEqual(list(records[2].batch.flags), [seq % 2 for seq in range(128, 256)])
+    
+    def test_sync_mark_records(self):
+        """Test sync marks replay with the session id they carry"""
+        journal = SessionJournal(self.path)
+        journal.append_sync_mark({"mark_id": "STIM", "timestamp_ns": 1, "session_id": "s1"})
+        journal.close()
+        
+        record, = SessionJournal(self.path).replay()
+        
+        self.assertEqual(record.kind, JournalRecordKind.SYNC_MARK)
+        self.assertEqual(record.session_id, "s1")
+        self.assertEqual(record.sync_mark["mark_id"], "STIM")
+    
+    def test_torn_tail_truncated(self):
+        """Test a partial last record is dropped and cut from the file"""
+        journal = SessionJournal(self.path)
+        self._write(journal)
+        journal.close()
+        intact_size = self.path.stat().st_size
+        with open(self.path, "ab") as f:
+            f.write(SessionJournal._frame(JournalRecordKind.BATCH, b"\x02\x00s1" + b"\x00" * 64)[:40])
+        
+        journal = SessionJournal(self.path)
+        records = journal.replay()
+        
+        self.assertEqual(len(records), 4)
+        self.assertEqual(journal.truncated_bytes, 40)
+        self.assertEqual(self.path.stat().st_size, intact_size)
+        
+        # Appends continue after the last intact record
+        journal.append_session({"session_id": "s2", "state": "RECORDING"})
+        journal.close()
+        self.assertEqual([record.session_id for record in SessionJournal(self.path).replay()],
+                         ["s1", "s1", "s1", "s1", "s2"])
+    
+    def test_corrupt_record_stops_replay(self):
+        """Test replay stops at a record whose checksum does not match"""
+        journal = SessionJournal(self.path)
+        self._write(journal)
+        journal.close()
+        data = bytearray(self.path.read_bytes())
+        first_record = 9 + int.from_bytes(data[1:5], "little")
+        data[first_record + 20] ^= 0xFF
+        self.path.write_bytes(bytes(data))
+        
+        records = SessionJournal(self.path).replay()
+        
+        self.assertEqual(len(records), 1)
+        self.assertEqual(self.path.stat().st_size, first_record)
+    
+    def test_fsync_policies(self):
+        """Test each policy's fsyncs run on the sync thread, never on the appending one"""
+        journal = SessionJournal(self.path, fsync_policy=FsyncPolicy.NEVER)
+        self._write(journal)
+        self.assertEqual(journal.fsyncs, 0)
+        self.assertIsNone(journal._sync_thread)
+        journal.close()
+        
+        journal = SessionJournal(self.path, fsync_policy=FsyncPolicy.ALWAYS)
+        fsync_threads = []
+        with mock.patch("src.bucika_gsr_pc.session_journal.os.fsync",
+                        side_effect=lambda fd: fsync_threads.append(threading.current_thread())):
+            self._write(journal)
+            deadline = time.monotonic() + 5
+            while not journal.synced and time.monotonic() < deadline:
+                time.sleep(0.01)
+            journal.close()
+        self.assertTrue(journal.synced)
+        self.assertTrue(1 <= journal.fsyncs <= 4)
+        self.assertNotIn(threading.main_thread(), fsync_threads)
+        
+        journal = SessionJournal(self.path, fsync_policy=FsyncPolicy.INTERVAL, fsync_interval=3600)
+        self._write(journal)
+        self.assertEqual(journal.fsyncs, 0)
+        journal.close()
+        self.assertEqual(journal.fsyncs, 1)
+    
+    def test_compact_keeps_snapshots_only(self):
+        """Test compaction replaces the journal with the given snapshots"""
+        journal = SessionJournal(self.path)
+        self._write(journal)
+        journal.compact([{"session_id": "s1", "state": "DONE"}])
+        journal.append_session({"session_id": "s2", "state": "RECORDING"})
+        journal.close()
+        
+        records = SessionJournal(self.path).replay()
+        
+        self.assertEqual([(record.session_id, record.snapshot["state"]) for record in records],
+                         [("s1", "DONE"), ("s2", "RECORDING")])
+        self.assertFalse(self.path.with_name(self.path.name + ".tmp").exists())
+    
+    def test_checkpoint_keeps_records_appended_meanwhile(self):
+        """Test a checkpoint replaces earlier records and keeps those appended while it was written"""
+        journal = SessionJournal(self.path)
+        self._write(journal)
+        journal.begin_checkpoint()
+        journal.append_batch("s2", make_batch(0, 4))
+        journal.write_checkpoint([{"session_id": "s2", "state": "RECORDING"}],
+                                 [({"session_id": "s2", "base_samples": 100}, make_batch(200, 2))])
+        journal.append_batch("s2", make_batch(4, 4))
+        journal.finish_checkpoint()
+        journal.append_session({"session_id": "s2", "state": "DONE"})
+        journal.close()
+        
+        records = list(SessionJournal(self.path).iter_replay())
+        
+        self.assertEqual([record.kind for record in records],
+                         [JournalRecordKind.SESSION, JournalRecordKind.CHECKPOINT, JournalRecordKind.BATCH,
+                          JournalRecordKind.BATCH, JournalRecordKind.SESSION])
+        self.assertEqual(records[1].checkpoint["base_samples"], 100)
+        self.assertEqual(records[1].batch.seq.tolist(), [200, 201])
+        self.assertEqual([records[2].batch.seq[0], records[3].batch.seq[0]], [0, 4])
+        self.assertFalse(self.path.with_name(self.path.name + ".tmp").exists())
+    
+    def test_streaming_replay_truncates_after_last_record(self):
+        """Test records are yielded one at a time and the torn tail is cut once read through"""
+        journal = SessionJournal(self.path)
+        self._write(journal)
+        journal.close()
+        intact_size = self.path.stat().st_size
+        with open(self.path, "ab") as f:
+            f.write(b"\x02\xff\xff")
+        
+        records = SessionJournal(self.path).iter_replay()
+        self.assertEqual(next(records).kind, JournalRecordKind.SESSION)
+        self.assertGreater(self.path.stat().st_size, intact_size)
+        self.assertEqual(len(list(records)), 3)
+        self.assertEqual(self.path.stat().st_size, intact_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
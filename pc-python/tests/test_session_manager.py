@@ -7,9 +7,18 @@ import unittest
 import asyncio
 import tempfile
 import shutil
+import json
+import csv
+import time
+from datetime import datetime
 from pathlib import Path
-from src.bucika_gsr_pc.session_manager import SessionManager, SessionState
+from src.bucika_gsr_pc.session_manager import Session, SessionManager, SessionState, SESSION_METADATA_FILE
+from src.bucika_gsr_pc.session_journal import SessionJournal, JournalRecordKind
+from src.bucika_gsr_pc.session_file import GSRSessionFile
+from src.bucika_gsr_pc.gsr_writer import GSRCsvWriter
 from src.bucika_gsr_pc.protocol import GSRSample
+from src.bucika_gsr_pc.clock_estimator import ClockModel
+from tests.batches import make_batch, SAMPLE_PERIOD_NS, T0_NS
 
 
 class TestSessionManager(unittest.TestCase):
@@ -22,6 +31,7 @@ class TestSessionManager(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment"""
+        self.session_manager.gsr_writer.shutdown()
         shutil.rmtree(self.temp_dir)
     
     def test_start_session(self):
@@ -114,6 +124,357 @@ class TestSessionManager(unittest.TestCase):
         
         asyncio.run(run_test())
     
+    def test_gsr_samples_retention_window(self):
+        """Test only the retention window stays in memory while every sample is counted"""
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir), retention_seconds=1)
+            await manager.start_session("Retention Test", "device-123")
+            
+            samples = [
+                GSRSample(t_mono_ns=seq, t_utc_ns=1_700_000_000_000_000_000 + seq, seq=seq,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                for seq in range(300)
+            ]
+            await manager.store_gsr_samples("device-123", samples)
+            
+            session = manager.get_active_session("device-123")
+            self.assertEqual([s.seq for s in session.gsr_samples], list(range(172, 300)))
+            self.assertEqual(session.to_dict()["gsr_samples_count"], 300)
+            self.assertEqual(session.to_dict()["gsr_samples_retained"], 128)
+            
+            await manager.stop_session("device-123")
+            await manager.close()
+        
+        asyncio.run(run_test())
+    
+    def test_read_range_live_and_finished(self):
+        """Test range reads from memory, from the binary file while recording, and from CSV"""
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir), retention_seconds=1)
+            session_id = await manager.start_session("Range Test", "device-123")
+            
+            def t(seq):
+                return 1_700_000_000_000_000_000 + seq * 7_812_500
+            
+            samples = [
+                GSRSample(t_mono_ns=seq, t_utc_ns=t(seq), seq=seq,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                for seq in range(1000)
+            ]
+            await manager.store_gsr_samples("device-123", samples)
+            
+            # Still in the in-memory window
+            recent = await manager.read_range(session_id, t(950), t(960))
+            self.assertEqual(recent["seq"].tolist(), list(range(950, 960)))
+            
+            # Evicted from memory, read from the file while the session records
+            older = await manager.read_range(session_id, t(100), t(110), columns=["seq", "temp_C"])
+            self.assertEqual(older["seq"].tolist(), list(range(100, 110)))
+            self.assertEqual(set(older), {"seq", "temp_C"})
+            self.assertEqual(len(manager.session_files), 1)
+            
+            # Finishing the session unmaps its file; reads map it again
+            await manager.stop_session("device-123")
+            self.assertEqual(len(manager.session_files), 0)
+            again = await manager.read_range(session_id, t(100), t(110))
+            self.assertEqual(again["seq"].tolist(), list(range(100, 110)))
+            
+            # A session that has only a CSV file
+            csv_manager = SessionManager(base_path=Path(self.temp_dir), retention_seconds=1, write_binary=False)
+            csv_session_id = await csv_manager.start_session("CSV Range", "device-456")
+            await csv_manager.store_gsr_samples("device-456", samples)
+            await csv_manager.stop_session("device-456")
+            
+            from_csv = await csv_manager.read_range(csv_session_id, t(100), t(110))
+            self.assertEqual(from_csv["seq"].tolist(), list(range(100, 110)))
+            
+            with self.assertRaises(ValueError):
+                await manager.read_range("missing-session", 0, 1)
+            await manager.close()
+            await csv_manager.close()
+        
+        asyncio.run(run_test())
+    
+    def test_gsr_csv_written_on_stop(self):
+        """Test stored samples are in the CSV file once the session stops"""
+        async def run_test():
+            await self.session_manager.start_session("CSV Test", "device-123")
+            session = self.session_manager.get_active_session("device-123")
+            
+            samples = [
+                GSRSample(t_mono_ns=seq, t_utc_ns=1_700_000_000_000_000_000 + seq, seq=seq,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0, flag_sat=(seq == 3))
+                for seq in range(8)
+            ]
+            await self.session_manager.store_gsr_samples("device-123", samples[:4])
+            await self.session_manager.store_gsr_samples("device-123", samples[4:])
+            await self.session_manager.stop_session("device-123")
+            
+            lines = session.gsr_file_path.read_text().splitlines()
+            self.assertEqual(len(lines), 9)
+            self.assertTrue(lines[0].startswith("Timestamp_ns,DateTime_UTC,Sequence"))
+            self.assertEqual(lines[4].split(',')[2:], ["3", "2.5", "2.4", "32.0", "False", "True", "False"])
+        
+        asyncio.run(run_test())
+    
+    def test_session_metadata_written(self):
+        """Test session_metadata.json follows the session state"""
+        async def run_test():
+            session_id = await self.session_manager.start_session("Metadata Test", "device-123",
+                                                                  participant_id="P001")
+            metadata_path = Path(self.temp_dir) / session_id / SESSION_METADATA_FILE
+            self.assertEqual(json.loads(metadata_path.read_text())["state"], "RECORDING")
+            
+            await self.session_manager.stop_session("device-123")
+            metadata = json.loads(metadata_path.read_text())
+            self.assertEqual(metadata["state"], "DONE")
+            self.assertEqual(metadata["participant_id"], "P001")
+            self.assertNotIn("error_message", metadata)
+        
+        asyncio.run(run_test())
+    
+    def test_recover_interrupted_session(self):
+        """Test a session cut short by a crash is restored from the journal"""
+        journal_path = Path(self.temp_dir) / "session_journal.wal"
+        
+        def make_samples(first, count):
+            return [
+                GSRSample(t_mono_ns=seq, t_utc_ns=1_700_000_000_000_000_000 + seq * 7_812_500, seq=seq,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                for seq in range(first, first + count)
+            ]
+        
+        async def run_test():
+            # Finished session, then one whose writer never flushed before the crash
+            crashed_writer = GSRCsvWriter(flush_bytes=1 << 30, flush_interval=60)
+            manager = SessionManager(base_path=Path(self.temp_dir), gsr_writer=crashed_writer,
+                                     write_binary=True, journal=SessionJournal(journal_path))
+            done_id = await manager.start_session("Finished", "device-1")
+            await manager.stop_session("device-1")
+            
+            session_id = await manager.start_session("Crashed", "device-2")
+            session = manager.get_active_session("device-2")
+            for first in range(0, 500, 100):
+                await manager.store_gsr_samples("device-2", make_samples(first, 100))
+                await manager.record_sync_mark("device-2", f"MARK_{first}")
+            with open(session.gsr_file_path, "a") as f:
+                f.write("1700000000000000000,2023-11-14 22:13:20.0")
+            
+            recovered = SessionManager(base_path=Path(self.temp_dir), journal=SessionJournal(journal_path))
+            interrupted = await recovered.recover()
+            
+            self.assertEqual(interrupted, [session_id])
+            self.assertEqual(set(recovered.all_sessions), {done_id, session_id})
+            self.assertEqual(recovered.all_sessions[done_id].state, SessionState.DONE)
+            restored = recovered.all_sessions[session_id]
+            self.assertEqual(restored.state, SessionState.INTERRUPTED)
+            self.assertEqual(restored.to_dict()["gsr_samples_count"], 500)
+            
+            lines = restored.gsr_file_path.read_text().splitlines()
+            self.assertEqual(len(lines), 501)
+            self.assertTrue(lines[0].startswith("Timestamp_ns,DateTime_UTC,Sequence"))
+            self.assertEqual([int(line.split(',')[2]) for line in lines[1:]], list(range(500)))
+            self.assertEqual(GSRSessionFile(restored.gsr_binary_path).column("seq").tolist(), list(range(500)))
+            
+            metadata_path = Path(self.temp_dir) / session_id / SESSION_METADATA_FILE
+            self.assertEqual(json.loads(metadata_path.read_text())["state"], "INTERRUPTED")
+            
+            # Sync marks journaled after the last snapshot are restored too
+            self.assertEqual([mark["mark_id"] for mark in restored.sync_marks],
+                             [f"MARK_{first}" for first in range(0, 500, 100)])
+            with open(Path(self.temp_dir) / session_id / "sync_marks.csv", newline='') as f:
+                self.assertEqual([row["Mark_ID"] for row in csv.DictReader(f)],
+                                 [f"MARK_{first}" for first in range(0, 500, 100)])
+            
+            # Compaction leaves one snapshot per session and no batches
+            records = recovered.journal.replay()
+            self.assertEqual([record.kind for record in records], [JournalRecordKind.SESSION] * 2)
+            await recovered.close()
+            crashed_writer.shutdown()
+        
+        asyncio.run(run_test())
+    
+    def test_checkpoint_while_another_session_records(self):
+        """Test stopping one session checkpoints the journal without losing another's samples"""
+        journal_path = Path(self.temp_dir) / "session_journal.wal"
+        
+        async def run_test():
+            crashed_writer = GSRCsvWriter(flush_bytes=1 << 30, flush_interval=60)
+            manager = SessionManager(base_path=Path(self.temp_dir), gsr_writer=crashed_writer,
+                                     reorder_window=64, journal=SessionJournal(journal_path))
+            done_id = await manager.start_session("Finished", "device-1")
+            session_id = await manager.start_session("Crashed", "device-2")
+            await manager.store_gsr_batch("device-1", make_batch(0, 200))
+            await manager.store_gsr_batch("device-2", make_batch(0, 100))
+            await manager.store_gsr_batch("device-2", make_batch(110, 20))  # held back
+            await manager.stop_session("device-1")
+            
+            # The checkpoint keeps device-2's held samples, not the batches behind them
+            records = SessionJournal(journal_path).replay()
+            self.assertNotIn(JournalRecordKind.BATCH, [record.kind for record in records])
+            checkpoint, = [record for record in records if record.kind == JournalRecordKind.CHECKPOINT]
+            self.assertEqual(checkpoint.checkpoint["base_samples"], 100)
+            self.assertEqual(checkpoint.batch.seq.tolist(), list(range(110, 130)))
+            
+            await manager.store_gsr_batch("device-2", make_batch(100, 10))
+            await manager.store_gsr_batch("device-2", make_batch(130, 70))
+            
+            recovered = SessionManager(base_path=Path(self.temp_dir), journal=SessionJournal(journal_path))
+            interrupted = await recovered.recover()
+            await recovered.close()
+            crashed_writer.shutdown()
+            return interrupted, recovered.all_sessions[done_id], recovered.all_sessions[session_id]
+        
+        interrupted, done, restored = asyncio.run(run_test())
+        
+        self.assertEqual(interrupted, [restored.session_id])
+        self.assertEqual(done.state, SessionState.DONE)
+        self.assertEqual(restored.to_dict()["gsr_samples_count"], 200)
+        self.assertEqual(restored.to_dict()["missing_samples"], 0)
+        with open(restored.gsr_file_path, newline='') as f:
+            self.assertEqual([int(row["Sequence"]) for row in csv.DictReader(f)], list(range(200)))
+        self.assertEqual(GSRSessionFile(restored.gsr_binary_path).column("seq").tolist(), list(range(200)))
+    
+    def test_samples_reordered_by_sequence(self):
+        """Test retransmitted and out-of-order samples are written once, in order, with gaps recorded"""
+        journal_path = Path(self.temp_dir) / "session_journal.wal"
+        
+        def make_samples(seqs):
+            return [
+                GSRSample(t_mono_ns=seq, t_utc_ns=1_700_000_000_000_000_000 + seq * 7_812_500, seq=seq,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                for seq in seqs
+            ]
+        
+        arrivals = [range(0, 100), range(150, 200), range(90, 120), range(130, 150), range(200, 260)]
+        expected = list(range(0, 120)) + list(range(130, 260))
+        
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir), reorder_window=64,
+                                     journal=SessionJournal(journal_path))
+            session_id = await manager.start_session("Reorder", "device-1")
+            for seqs in arrivals:
+                await manager.store_gsr_samples("device-1", make_samples(seqs))
+            
+            # Crash before stopping: recovery replays the reordering from the journal
+            recovered = SessionManager(base_path=Path(self.temp_dir), journal=SessionJournal(journal_path))
+            await recovered.recover()
+            restored = recovered.all_sessions[session_id].to_dict()
+            manager.gsr_writer.shutdown()
+            await recovered.close()
+            
+            # A clean stop of the same arrivals records the same gap
+            clean = SessionManager(base_path=Path(self.temp_dir), reorder_window=64)
+            await clean.start_session("Reorder", "device-2")
+            for seqs in arrivals:
+                await clean.store_gsr_samples("device-2", make_samples(seqs))
+            session = clean.get_active_session("device-2")
+            await clean.stop_session("device-2")
+            await clean.close()
+            return restored, session
+        
+        restored, session = asyncio.run(run_test())
+        
+        for snapshot in (restored, session.to_dict()):
+            self.assertEqual(snapshot["gsr_samples_count"], len(expected))
+            self.assertEqual(snapshot["duplicate_samples"], 10)
+            self.assertEqual(snapshot["missing_samples"], 10)
+            self.assertEqual([(gap["first_seq"], gap["last_seq"]) for gap in snapshot["sequence_gaps"]],
+                             [(120, 129)])
+        with open(session.gsr_file_path, newline='') as f:
+            self.assertEqual([int(row["Sequence"]) for row in csv.DictReader(f)], expected)
+        metadata = json.loads((session.gsr_file_path.parent / SESSION_METADATA_FILE).read_text())
+        self.assertEqual(metadata["sequence_gaps"][0]["t_after_ns"], 1_700_000_000_000_000_000 + 130 * 7_812_500)
+    
+    def test_clock_correction(self):
+        """Test device timestamps are moved onto the PC clock at write time or afterwards"""
+        model = ClockModel(offset_ns=30_000_000, drift_ppm=0.0, reference_ns=0, rtt_ns=1_000_000, exchanges=20)
+        samples = [
+            GSRSample(t_mono_ns=seq, t_utc_ns=1_700_000_000_030_000_000 + seq * 7_812_500, seq=seq,
+                      gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+            for seq in range(10)
+        ]
+        pc_times = [1_700_000_000_000_000_000 + seq * 7_812_500 for seq in range(10)]
+        
+        async def run_test():
+            corrected = SessionManager(base_path=Path(self.temp_dir), correct_clock=True)
+            corrected.set_clock_model("device-1", model)
+            corrected_id = await corrected.start_session("Corrected", "device-1")
+            await corrected.store_gsr_samples("device-1", samples)
+            corrected_session = corrected.get_active_session("device-1")
+            await corrected.stop_session("device-1")
+            
+            # Without write-time correction the device times are kept, with the model
+            await self.session_manager.start_session("Raw", "device-2")
+            self.session_manager.set_clock_model("device-2", model)
+            await self.session_manager.store_gsr_samples("device-2", samples)
+            raw_session = self.session_manager.get_active_session("device-2")
+            await self.session_manager.stop_session("device-2")
+            
+            self.assertEqual(corrected.to_server_time(corrected_id, pc_times).tolist(), pc_times)
+            await corrected.close()
+            return corrected_session, raw_session
+        
+        corrected_session, raw_session = asyncio.run(run_test())
+        
+        with open(corrected_session.gsr_file_path, newline='') as f:
+            self.assertEqual([int(row["Timestamp_ns"]) for row in csv.DictReader(f)], pc_times)
+        with open(raw_session.gsr_file_path, newline='') as f:
+            raw_times = [int(row["Timestamp_ns"]) for row in csv.DictReader(f)]
+        self.assertEqual(raw_times, [sample.t_utc_ns for sample in samples])
+        self.assertEqual(self.session_manager.to_server_time(raw_session.session_id, raw_times).tolist(), pc_times)
+        
+        restored = Session.from_dict(raw_session.to_dict())
+        self.assertEqual(restored.clock_model, model)
+        self.assertFalse(restored.clock_corrected)
+    
+    def test_clock_correction_never_switches_mid_session(self):
+        """Test a model arriving mid-session leaves its times on the device clock, still sorted"""
+        model = ClockModel(offset_ns=-2_000_000_000, drift_ppm=0.0, reference_ns=0, rtt_ns=1_000_000,
+                           exchanges=20)
+        
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir), correct_clock=True)
+            session_id = await manager.start_session("Late model", "device-1")
+            session = manager.get_active_session("device-1")
+            await manager.store_gsr_batch("device-1", make_batch(0, 128))
+            manager.set_clock_model("device-1", model)
+            await manager.store_gsr_batch("device-1", make_batch(128, 128))
+            
+            # A 500 ms window straddling the model's arrival
+            window = (T0_NS + 96 * SAMPLE_PERIOD_NS, T0_NS + 160 * SAMPLE_PERIOD_NS)
+            live = await manager.read_range(session_id, *window, ["seq"])
+            await manager.stop_session("device-1")
+            manager.session_files.clear()
+            stored = await manager.read_range(session_id, *window, ["seq"])
+            everything = await manager.read_range(session_id, 0, T0_NS + 10 ** 12, ["t_utc_ns"])
+            server = manager.to_server_time(session_id, everything["t_utc_ns"])
+            
+            # A session starting with a model is corrected throughout
+            manager.set_clock_model("device-2", model)
+            await manager.start_session("With model", "device-2")
+            await manager.store_gsr_batch("device-2", make_batch(0, 10))
+            next_session = manager.get_active_session("device-2")
+            await manager.stop_session("device-2")
+            await manager.close()
+            return session, live, stored, everything["t_utc_ns"], server, next_session
+        
+        session, live, stored, times, server, next_session = asyncio.run(run_test())
+        
+        device_times = make_batch(0, 256).t_utc_ns
+        self.assertFalse(session.clock_corrected)
+        self.assertIsNone(session.clock_corrected_from_sample)
+        self.assertEqual(session.clock_model, model)
+        self.assertEqual(live["seq"].tolist(), list(range(96, 160)))
+        self.assertEqual(stored["seq"].tolist(), list(range(96, 160)))
+        self.assertEqual(times.tolist(), device_times.tolist())
+        self.assertEqual(server.tolist(), (device_times + 2_000_000_000).tolist())
+        
+        self.assertTrue(next_session.clock_corrected)
+        self.assertEqual(next_session.clock_corrected_from_sample, 0)
+        metadata = json.loads((next_session.gsr_file_path.parent / SESSION_METADATA_FILE).read_text())
+        self.assertEqual(metadata["clock_corrected_from_sample"], 0)
+    
     def test_sync_mark_recording(self):
         """Test sync mark recording"""
         async def run_test():
@@ -142,6 +503,82 @@ class TestSessionManager(unittest.TestCase):
         
         asyncio.run(run_test())
     
+    def test_sync_marks_file(self):
+        """Test sync marks are written through the writer with one timestamp pair each"""
+        async def run_test():
+            await self.session_manager.start_session("Sync File Test", "device-123")
+            session = self.session_manager.get_active_session("device-123")
+            
+            for index in range(50):
+                await self.session_manager.record_sync_mark("device-123", f"STIM_{index}", "onset, left")
+            self.assertEqual(session.sync_marks_file_path.name, "sync_marks.csv")
+            await self.session_manager.stop_session("device-123")
+            
+            with open(session.sync_marks_file_path, newline='') as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([row["Mark_ID"] for row in rows], [f"STIM_{index}" for index in range(50)])
+            self.assertEqual(rows[0]["Description"], "onset, left")
+            
+            for row, sync_mark in zip(rows, session.sync_marks):
+                self.assertEqual(int(row["Timestamp_ns"]), sync_mark["timestamp_ns"])
+                self.assertEqual(int(row["Monotonic_ns"]), sync_mark["timestamp_mono_ns"])
+                
+                # The ISO time is the nanosecond time truncated to microseconds
+                iso_us = int(datetime.fromisoformat(sync_mark["timestamp"]).timestamp() * 1_000_000)
+                self.assertAlmostEqual(iso_us, sync_mark["timestamp_ns"] // 1_000, delta=1)
+            
+            monotonic = [sync_mark["timestamp_mono_ns"] for sync_mark in session.sync_marks]
+            self.assertEqual(monotonic, sorted(monotonic))
+        
+        asyncio.run(run_test())
+    
+    def test_sync_mark_latency_compensation(self):
+        """Test marks with device times are placed on the PC clock with their residual error"""
+        model = ClockModel(offset_ns=30_000_000, drift_ppm=0.0, reference_ns=0, rtt_ns=4_000_000, exchanges=20)
+        
+        async def run_test():
+            await self.session_manager.start_session("Marks", "device-1")
+            session = self.session_manager.get_active_session("device-1")
+            
+            # Before any clock fit the mark is only stored as the PC saw it
+            await self.session_manager.record_sync_mark("device-1", "PLAIN")
+            
+            # The event happened 10 ms before the PC processed it, on a clock 30 ms ahead
+            self.session_manager.set_clock_model("device-1", model)
+            event_ns = time.time_ns() - 10_000_000
+            await self.session_manager.record_sync_mark("device-1", "STIM", device_t_utc_ns=event_ns + 30_000_000,
+                                                        device_t_mono_ns=123, envelope_ts_ns=event_ns + 31_000_000)
+            
+            # Without its own time of the event, the envelope time stands in
+            await self.session_manager.record_sync_mark("device-1", "ENVELOPE", envelope_ts_ns=event_ns + 30_000_000)
+            
+            # An envelope time on a clock counting from boot is not placed at all
+            await self.session_manager.record_sync_mark("device-1", "UPTIME", envelope_ts_ns=time.monotonic_ns())
+            await self.session_manager.stop_session("device-1")
+            return session, event_ns
+        
+        session, event_ns = asyncio.run(run_test())
+        
+        plain, stim, envelope, uptime = session.sync_marks
+        self.assertIsNone(plain["corrected_ns"])
+        self.assertEqual(stim["corrected_ns"], event_ns)
+        self.assertEqual(stim["residual_ns"], 2_000_000)
+        self.assertGreaterEqual(stim["timestamp_ns"] - stim["corrected_ns"], 10_000_000)
+        self.assertEqual(envelope["corrected_ns"], event_ns)
+        self.assertIsNotNone(uptime["envelope_ts_ns"])
+        self.assertIsNone(uptime["corrected_ns"])
+        self.assertIsNone(uptime["residual_ns"])
+        
+        with open(session.sync_marks_file_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]["Corrected_ns"], "")
+        self.assertEqual(rows[0]["Residual_ns"], "")
+        self.assertEqual(int(rows[1]["Device_Timestamp_ns"]), event_ns + 30_000_000)
+        self.assertEqual(int(rows[1]["Device_Monotonic_ns"]), 123)
+        self.assertEqual(int(rows[1]["Envelope_ns"]), event_ns + 31_000_000)
+        self.assertEqual(int(rows[1]["Corrected_ns"]), event_ns)
+        self.assertEqual(int(rows[1]["Residual_ns"]), 2_000_000)
+    
     def test_multiple_sync_marks(self):
         """Test recording multiple sync marks"""
         async def run_test():
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Test suite for segmented session recordings
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+from src.bucika_gsr_pc.gsr_writer import GSRCsvWriter
+from src.bucika_gsr_pc.session_manager import SessionManager, SessionState
+from src.bucika_gsr_pc.session_journal import SessionJournal
+from src.bucika_gsr_pc.session_catalog import SessionCatalog
+from src.bucika_gsr_pc.session_file import GSRSessionFile, file_checksum, gsr_data_files
+from src.bucika_gsr_pc.session_segments import (
+    SEGMENT_MANIFEST_FILE, SegmentPolicy, gsr_segment_files, read_manifest, read_segments_dataframe,
+    read_segments_range, segment_paths
+)
+from tests.batches import T0_NS, make_batch
+
+
+class TestSessionSegments(unittest.TestCase):
+    """Test segment rotation, the manifest and segment-aware readers"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = Path(self.temp_dir) / "gsr_data_20240101_100000.csv"
+        self.writer = GSRCsvWriter()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.writer.shutdown()
+        shutil.rmtree(self.temp_dir)
+    
+    def _record(self, policy: SegmentPolicy, batches: int, batch_size: int = 128):
+        self.writer.open("device-1", self.path, binary_path=self.path.with_suffix(".gsrb"),
+                         segment_policy=policy).result()
+        for batch in range(batches):
+            self.writer.write("device-1", make_batch(batch * batch_size, batch_size))
+        self.writer.close("device-1").result()
+    
+    def test_rotates_by_size(self):
+        """Test a recording over the size limit is split into checksummed segments"""
+        self._record(SegmentPolicy(max_bytes=16 * 1024, max_seconds=None), batches=10)
+        
+        paths = segment_paths(self.path)
+        manifest = read_manifest(self.temp_dir)
+        
+        self.assertGreater(len(paths), 1)
+        self.assertEqual(paths[1].name, "gsr_data_20240101_100000_0001.csv")
+        self.assertEqual(self.writer.rotations, len(paths) - 1)
+        self.assertTrue(manifest.complete)
+        self.assertEqual([segment.path for segment in manifest.segments], [path.name for path in paths])
+        self.assertEqual(sum(segment.sample_count for segment in manifest.segments), 1280)
+        
+        seq = []
+        for segment, path in zip(manifest.segments, paths):
+            self.assertEqual(segment.checksum, file_checksum(path))
+            binary = GSRSessionFile(Path(self.temp_dir) / segment.binary_path)
+            self.assertEqual(binary.column("seq").tolist(), list(range(segment.seq_first, segment.seq_last + 1)))
+            self.assertEqual(segment.binary_checksum, file_checksum(binary.path))
+            seq.extend(binary.column("seq").tolist())
+        self.assertEqual(seq, list(range(1280)))
+    
+    def test_rotates_by_time(self):
+        """Test a recording is split every max_seconds of recorded time"""
+        self._record(SegmentPolicy(max_bytes=None, max_seconds=2.0), batches=6)
+        
+        manifest = read_manifest(self.temp_dir)
+        
+        self.assertEqual([segment.sample_count for segment in manifest.segments], [256, 256, 256])
+        self.assertEqual([segment.t_start_ns for segment in manifest.segments],
+                         [T0_NS, T0_NS + 2_000_000_000, T0_NS + 4_000_000_000])
+        self.assertEqual(manifest.segments[0].t_end_ns, T0_NS + 255 * 7_812_500)
+    
+    def test_range_reads_skip_segments(self):
+        """Test range reads open only overlapping segments and join them in order"""
+        self._record(SegmentPolicy(max_bytes=None, max_seconds=2.0), batches=6)
+        
+        inside = gsr_segment_files(self.temp_dir, t_start_ns=T0_NS + 2_500_000_000, t_end_ns=T0_NS + 3_000_000_000)
+        self.assertEqual([path.name for path in inside], ["gsr_data_20240101_100000_0001.gsrb"])
+        csv_only = gsr_segment_files(self.temp_dir, prefer_binary=False)
+        self.assertEqual([path.suffix for path in csv_only], [".csv"] * 3)
+        
+        t_start_ns = T0_NS + 200 * 7_812_500
+        t_end_ns = T0_NS + 600 * 7_812_500
+        files = gsr_segment_files(self.temp_dir, t_start_ns=t_start_ns, t_end_ns=t_end_ns)
+        self.assertEqual(len(files), 3)
+        for files in (files, csv_only):
+            data = read_segments_range(files, t_start_ns, t_end_ns, columns=["seq"])
+            self.assertEqual(data["seq"].tolist(), list(range(200, 600)))
+        
+        self.assertEqual(gsr_segment_files(self.temp_dir, t_start_ns=0, t_end_ns=T0_NS), [])
+        self.assertEqual(len(read_segments_range([], 0, T0_NS)["seq"]), 0)
+        self.assertEqual(read_segments_dataframe(files)["Sequence"].tolist(), list(range(768)))
+    
+    def test_unsegmented_session_still_loads(self):
+        """Test a session recorded without a manifest is read from its single file"""
+        async def run_test():
+            manager = SessionManager(base_path=Path(self.temp_dir), write_binary=True)
+            await manager.start_session("Legacy", "device-1")
+            session = manager.get_active_session("device-1")
+            await manager.store_gsr_batch("device-1", make_batch(0, 500))
+            await manager.stop_session("device-1")
+            data = await manager.read_range(session.session_id, T0_NS, T0_NS + 10 ** 10, ["seq"])
+            await manager.close()
+            return session, data
+        
+        session, data = asyncio.run(run_test())
+        session_dir = session.gsr_file_path.parent
+        
+        self.assertIsNone(read_manifest(session_dir))
+        self.assertEqual(gsr_segment_files(session_dir), gsr_data_files(session_dir))
+        self.assertEqual(data["seq"].tolist(), list(range(500)))
+        self.assertEqual(len(read_segments_dataframe(gsr_segment_files(session_dir))), 500)
+    
+    def test_session_manager_segmented_recording(self):
+        """Test a live segmented session is read across segments and cataloged by its manifest"""
+        async def run_test():
+            catalog = SessionCatalog.open(Path(self.temp_dir))
+            manager = SessionManager(base_path=Path(self.temp_dir), write_binary=True, catalog=catalog,
+                                     segment_policy=SegmentPolicy(max_bytes=None, max_seconds=1.0))
+            session_id = await manager.start_session("Segmented", "device-1")
+            for first in range(0, 640, 128):
+                await manager.store_gsr_batch("device-1", make_batch(first, 128))
+            
+            # Reads of a live session span closed segments and the one being written
+            live = await manager.read_range(session_id, T0_NS + 100 * 7_812_500, T0_NS + 600 * 7_812_500, ["seq"])
+            self.assertEqual(live["seq"].tolist(), list(range(100, 600)))
+            
+            await manager.stop_session("device-1")
+            data = await manager.read_range(session_id, 0, T0_NS + 10 ** 12, ["seq"])
+            self.assertEqual(data["seq"].tolist(), list(range(640)))
+            
+            session_dir = Path(self.temp_dir) / session_id
+            self.assertEqual(catalog.gsr_files(session_id), gsr_segment_files(session_dir))
+            self.assertEqual(len(catalog.gsr_files(session_id)), 5)
+            self.assertEqual(catalog.get(session_id)["gsr_checksum"],
+                             file_checksum(session_dir / SEGMENT_MANIFEST_FILE))
+            await manager.close()
+            catalog.close()
+        
+        asyncio.run(run_test())
+    
+    def test_recover_segmented_session(self):
+        """Test a crash mid-segment restores the last segment and rebuilds the manifest"""
+        journal_path = Path(self.temp_dir) / "session_journal.wal"
+        policy = SegmentPolicy(max_bytes=None, max_seconds=1.0)
+        
+        async def run_test():
+            crashed_writer = GSRCsvWriter(flush_bytes=1 << 30, flush_interval=60)
+            manager = SessionManager(base_path=Path(self.temp_dir), gsr_writer=crashed_writer,
+                                     write_binary=True, journal=SessionJournal(journal_path),
+                                     segment_policy=policy)
+            session_id = await manager.start_session("Crashed", "device-1")
+            for first in range(0, 600, 100):
+                await manager.store_gsr_batch("device-1", make_batch(first, 100))
+            await asyncio.sleep(0.2)
+            self.assertFalse(read_manifest(Path(self.temp_dir) / session_id).complete)
+            
+            recovered = SessionManager(base_path=Path(self.temp_dir), journal=SessionJournal(journal_path),
+                                       write_binary=True, segment_policy=policy)
+            self.assertEqual(await recovered.recover(), [session_id])
+            self.assertEqual(recovered.all_sessions[session_id].state, SessionState.INTERRUPTED)
+            await recovered.close()
+            crashed_writer.shutdown()
+            return session_id
+        
+        session_id = asyncio.run(run_test())
+        session_dir = Path(self.temp_dir) / session_id
+        manifest = read_manifest(session_dir)
+        
+        self.assertTrue(manifest.complete)
+        self.assertEqual(sum(segment.sample_count for segment in manifest.segments), 600)
+        self.assertEqual(read_segments_dataframe(gsr_segment_files(session_dir))["Sequence"].tolist(),
+                         list(range(600)))
+        self.assertEqual(read_segments_dataframe(gsr_segment_files(session_dir, prefer_binary=False))
+                         ["Sequence"].tolist(), list(range(600)))
+
+
+if __name__ == '__main__':
+    unittest.main()
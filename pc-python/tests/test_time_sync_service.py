@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test suite for the UDP time synchronization service
+"""
+
+import unittest
+import asyncio
+import socket
+import struct
+import sys
+import time
+from unittest.mock import Mock
+from src.bucika_gsr_pc.time_sync_service import TimeSyncService
+
+
+class TestTimeSyncService(unittest.TestCase):
+    """Test time sync requests, exchanges and the responder thread"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.service = TimeSyncService(port=0, host='127.0.0.1')
+    
+    def test_four_timestamp_exchange(self):
+        """Test a client reporting reply receipt times gets a fitted clock model"""
+        sendto = Mock()
+        addr = ("10.0.0.5", 40000)
+        offset_ns = 25_000_000  # the client's clock is 25 ms ahead
+        
+        # First request: plain 8-byte form, answered with t1, t2 and t3
+        t1 = time.time_ns() + offset_ns
+        receive_ns = time.time_ns()
+        self.assertTrue(self.service.handle_request(struct.pack('>Q', t1), addr, receive_ns, sendto))
+        reply, reply_addr = sendto.call_args[0]
+        self.assertEqual(reply_addr, addr)
+        self.assertEqual(len(reply), 24)
+        echoed, t2, t3 = struct.unpack('>QQQ', reply)
+        self.assertEqual((echoed, t2), (t1, receive_ns))
+        self.assertLessEqual(t2, t3)
+        self.assertIsNone(self.service.get_clock_model(addr[0]))
+        
+        # Next request reports when that reply arrived, completing the exchange
+        t4 = time.time_ns() + offset_ns
+        self.service.handle_request(struct.pack('>QQQ', t4 + 1, t1, t4), addr, time.time_ns(), sendto)
+        model = self.service.get_clock_model(addr[0])
+        self.assertEqual(model.exchanges, 1)
+        self.assertLess(abs(model.offset_ns - offset_ns), 5_000_000)
+        self.assertEqual(self.service.get_client_offset_ns(addr[0]), model.offset_ns)
+        
+        # A report for a reply that was never sent is ignored, as is a short request
+        self.assertFalse(self.service.record_client_receipt(addr[0], 12345, t4))
+        self.assertFalse(self.service.handle_request(b"\x00" * 4, addr, time.time_ns(), sendto))
+        self.assertEqual(sendto.call_count, 2)
+    
+    def test_clients_keyed_by_device_id_and_bad_times_rejected(self):
+        """Test phones sharing an address stay apart and implausible clocks are ignored"""
+        sendto = Mock()
+        addr = ("10.0.0.5", 40000)
+        now = time.time_ns()
+        
+        # Two phones behind one NAT, sending their ids after an empty report
+        for device_id, offset_ns in (("phone-1", 10_000_000), ("phone-2", -30_000_000)):
+            request = struct.pack('>QQQ', now + offset_ns, 0, 0) + device_id.encode()
+            self.assertTrue(self.service.handle_request(request, addr, now, sendto))
+        self.assertEqual(self.service.get_client_offset_ns("phone-1"), 10_000_000)
+        self.assertEqual(self.service.get_client_offset_ns("phone-2"), -30_000_000)
+        self.assertTrue(self.service.has_client("phone-1"))
+        self.assertFalse(self.service.has_client(addr[0]))
+        
+        # The old text request reads as a time 136 years out and gets no reply
+        self.assertFalse(self.service.handle_request(b"SYNC_REQUEST", addr, now, sendto))
+        self.assertEqual(sendto.call_count, 2)
+        self.assertIsNone(self.service.get_client_offset_ns(addr[0]))
+    
+    def test_responder_thread_answers_while_loop_is_busy(self):
+        """Test requests are answered, with arrival times, while the event loop is blocked"""
+        async def run_test():
+            await self.service.start()
+            self.assertTrue(self.service.is_running())
+            self.assertEqual(self.service.uses_kernel_timestamps, sys.platform.startswith('linux'))
+            
+            client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            client.settimeout(2.0)
+            try:
+                t1 = time.time_ns()
+                client.sendto(struct.pack('>Q', t1), ('127.0.0.1', self.service.port))
+                time.sleep(0.1)  # the loop is stuck; the thread is not
+                reply = client.recv(64)
+                t4 = time.time_ns()
+            finally:
+                client.close()
+            
+            await self.service.stop()
+            self.assertFalse(self.service.is_running())
+            return t1, reply, t4
+        
+        t1, reply, t4 = asyncio.run(run_test())
+        
+        echoed, t2, t3 = struct.unpack('>QQQ', reply)
+        self.assertEqual(echoed, t1)
+        self.assertTrue(t1 <= t2 <= t3 <= t4)
+        self.assertLess(t2 - t1, 50_000_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
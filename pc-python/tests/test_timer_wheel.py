@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test suite for the heartbeat timer wheel
+"""
+
+import unittest
+from src.bucika_gsr_pc.timer_wheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    """Test timer wheel scheduling"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.wheel = TimerWheel(tick_interval=1.0, slot_count=8)
+    
+    def advance(self, ticks: int):
+        """Advance the wheel, returning the due keys per tick"""
+        return [self.wheel.advance() for _ in range(ticks)]
+    
+    def test_timers_fire_on_their_tick(self):
+        """Test timers fire once, after their delay"""
+        self.wheel.schedule("a", 1.0)
+        self.wheel.schedule("b", 3.0)
+        self.wheel.schedule("c", 2.5)
+        
+        self.assertEqual(self.advance(4), [["a"], [], ["b", "c"], []])
+        self.assertEqual(len(self.wheel), 0)
+    
+    def test_timers_beyond_one_turn(self):
+        """Test delays longer than the wheel wait the extra turns"""
+        self.wheel.schedule("far", 20.0)
+        
+        fired = self.advance(24)
+        
+        self.assertEqual([i + 1 for i, keys in enumerate(fired) if keys], [20])
+    
+    def test_reschedule_and_cancel(self):
+        """Test rescheduling replaces the old timer and cancel removes it"""
+        self.wheel.schedule("device", 2.0)
+        self.wheel.schedule("device", 5.0)
+        self.assertEqual(len(self.wheel), 1)
+        
+        fired = self.advance(5)
+        self.assertEqual(fired[1], [])
+        self.assertEqual(fired[4], ["device"])
+        
+        self.wheel.schedule("device", 1.0)
+        self.assertTrue(self.wheel.cancel("device"))
+        self.assertFalse(self.wheel.cancel("device"))
+        self.assertNotIn("device", self.wheel)
+        self.assertEqual(self.advance(8), [[]] * 8)
+    
+    def test_invalid_wheel(self):
+        """Test invalid wheel dimensions are rejected"""
+        with self.assertRaises(ValueError):
+            TimerWheel(tick_interval=0, slot_count=8)
+
+
+if __name__ == '__main__':
+    unittest.main()
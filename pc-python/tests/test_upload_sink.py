@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test suite for the streaming upload sink
+"""
+
+import unittest
+import hashlib
+import random
+import tempfile
+import shutil
+from pathlib import Path
+from src.bucika_gsr_pc.upload_sink import UploadSink
+
+
+class TestUploadSink(unittest.TestCase):
+    """Test streaming upload sink functionality"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.destination = Path(self.temp_dir) / "video.mp4"
+        self.chunk_size = 1024
+        self.data = bytes(random.Random(1).getrandbits(8) for _ in range(50 * self.chunk_size + 100))
+        self.chunks = [self.data[i:i + self.chunk_size]
+                       for i in range(0, len(self.data), self.chunk_size)]
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_in_order_upload(self):
+        """Test chunks written in order are hashed without buffering"""
+        sink = UploadSink(self.destination, len(self.data), self.chunk_size)
+        
+        for index, chunk in enumerate(self.chunks):
+            self.assertTrue(sink.write_chunk(index, chunk))
+        
+        self.assertTrue(sink.is_complete)
+        self.assertEqual(sink.peak_pending_bytes, 0)
+        self.assertEqual(sink.hexdigest(), hashlib.md5(self.data).hexdigest())
+        
+        sink.commit()
+        self.assertEqual(self.destination.read_bytes(), self.data)
+        self.assertFalse(sink.temp_path.exists())
+    
+    def test_out_of_order_upload_bounded_window(self):
+        """Test out-of-order chunks never buffer more than the window"""
+        window = 4 * self.chunk_size
+        sink = UploadSink(self.destination, len(self.data), self.chunk_size, window_bytes=window)
+        
+        order = list(range(len(self.chunks)))
+        random.Random(2).shuffle(order)
+        for index in order:
+            sink.write_chunk(index, self.chunks[index])
+            self.assertLessEqual(sink.pending_bytes, window)
+        
+        self.assertTrue(sink.is_complete)
+        self.assertLessEqual(sink.peak_pending_bytes, window)
+        self.assertEqual(sink.pending_bytes, 0)
+        self.assertEqual(sink.hexdigest(), hashlib.md5(self.data).hexdigest())
+        
+        sink.commit()
+        self.assertEqual(self.destination.read_bytes(), self.data)
+    
+    def test_duplicate_and_invalid_chunks(self):
+        """Test duplicate chunks are ignored and out-of-range chunks rejected"""
+        sink = UploadSink(self.destination, len(self.data), self.chunk_size)
+        
+        self.assertTrue(sink.write_chunk(0, self.chunks[0]))
+        self.assertFalse(sink.write_chunk(0, self.chunks[0]))
+        self.assertEqual(sink.bytes_received, self.chunk_size)
+        
+        with self.assertRaises(ValueError):
+            sink.write_chunk(len(self.chunks), b"x")
+        with self.assertRaises(ValueError):
+            sink.write_chunk(1, self.chunks[1][:10])
+        
+        self.assertFalse(sink.is_complete)
+        self.assertIsNone(sink.hexdigest())
+        with self.assertRaises(ValueError):
+            sink.commit()
+    
+    def test_abort_removes_partial_file(self):
+        """Test aborting discards the partial file"""
+        sink = UploadSink(self.destination, len(self.data), self.chunk_size)
+        sink.write_chunk(1, self.chunks[1])
+        self.assertTrue(sink.temp_path.exists())
+        
+        sink.abort()
+        
+        self.assertFalse(sink.temp_path.exists())
+        self.assertFalse(self.destination.exists())
+    
+    def _sink(self):
+        return UploadSink(self.destination, len(self.data), self.chunk_size,
+                          md5_hash=hashlib.md5(self.data).hexdigest())
+    
+    def test_resume_after_suspend(self):
+        """Test a suspended upload resumes with only missing chunks outstanding"""
+        sink = self._sink()
+        for index in list(range(10)) + [20, 21, 30]:
+            sink.write_chunk(index, self.chunks[index])
+        sink.suspend()
+        
+        resumed = UploadSink.resume(self.destination, len(self.data), self.chunk_size,
+                                    hashlib.md5(self.data).hexdigest())
+        
+        self.assertIsNotNone(resumed)
+        self.assertEqual(resumed.chunks_written, 13)
+        self.assertEqual(resumed.missing_ranges(),
+                         [(10, 20), (22, 30), (31, len(self.chunks))])
+        self.assertEqual(resumed.corrupt_chunks, set())
+        
+        for index in resumed.missing_chunks():
+            resumed.write_chunk(index, self.chunks[index])
+        
+        self.assertEqual(resumed.hexdigest(), hashlib.md5(self.data).hexdigest())
+        resumed.commit()
+        self.assertEqual(self.destination.read_bytes(), self.data)
+        self.assertFalse(resumed.state_path.exists())
+    
+    def test_resume_detects_corrupt_chunks(self):
+        """Test chunks damaged on disk are reported as corrupt on resume"""
+        sink = self._sink()
+        for index in range(5):
+            sink.write_chunk(index, self.chunks[index])
+        sink.suspend()
+        
+        with open(sink.temp_path, "r+b") as f:
+            f.seek(3 * self.chunk_size + 7)
+            f.write(b"\xff")
+        
+        resumed = UploadSink.resume(self.destination, len(self.data), self.chunk_size,
+                                    hashlib.md5(self.data).hexdigest())
+        
+        self.assertEqual(resumed.corrupt_chunks, {3})
+        self.assertEqual(resumed.missing_ranges()[0], (3, 4))
+        resumed.suspend()
+    
+    def test_resume_ignores_different_file(self):
+        """Test state for a different file is discarded instead of resumed"""
+        sink = self._sink()
+        sink.write_chunk(0, self.chunks[0])
+        sink.suspend()
+        
+        resumed = UploadSink.resume(self.destination, len(self.data), self.chunk_size, "0" * 32)
+        
+        self.assertIsNone(resumed)
+        self.assertFalse(sink.temp_path.exists())
+        self.assertFalse(sink.state_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,13 +6,19 @@ Test suite for WebSocket server functionality - Fixed version
 import unittest
 import asyncio
 import json
+import base64
+import hashlib
 import tempfile
 import shutil
+import time
 from pathlib import Path
 from unittest.mock import Mock, AsyncMock
 from src.bucika_gsr_pc.websocket_server import WebSocketServer, ConnectedDevice
 from src.bucika_gsr_pc.session_manager import SessionManager
 from src.bucika_gsr_pc.protocol import MessageType, HelloPayload, StartPayload, EmptyPayload, SyncMarkPayload, GSRSamplePayload
+from src.bucika_gsr_pc.protocol import MessageEnvelope, GSRSample, GSRSampleBatch, CAPABILITY_GSR_BINARY
+from src.bucika_gsr_pc.protocol import UploadBeginPayload, UploadChunkFrame, CAPABILITY_UPLOAD_BINARY
+from src.bucika_gsr_pc.protocol import UploadChunkPayload, ErrorPayload, AckPayload, MessagePayload
 
 
 class TestWebSocketServer(unittest.TestCase):
@@ -39,6 +45,7 @@ class TestWebSocketServer(unittest.TestCase):
                 asyncio.get_event_loop().run_until_complete(self.server.stop())
         except Exception:
             pass
+        self.session_manager.gsr_writer.shutdown()
         shutil.rmtree(self.temp_dir)
     
     def test_server_initialization(self):
@@ -182,6 +189,596 @@ class TestWebSocketServer(unittest.TestCase):
         
         asyncio.run(run_test())
 
+    
+    def test_binary_gsr_batch_handling(self):
+        """Test binary GSR batches are accepted once negotiated"""
+        async def run_test():
+            mock_websocket = AsyncMock()
+            
+            hello = MessageEnvelope.create(
+                msg_id="hello-1",
+                msg_type=MessageType.HELLO,
+                device_id="test-device",
+                payload=HelloPayload(deviceName="Test Device",
+                                     capabilities=["GSR", CAPABILITY_GSR_BINARY],
+                                     batteryLevel=85, version="1.0.0")
+            )
+            await self.server.handle_message(mock_websocket, hello.model_dump_json())
+            
+            register = json.loads(mock_websocket.send.call_args[0][0])
+            self.assertEqual(register["type"], "REGISTER")
+            self.assertEqual(register["payload"]["capabilities"], [CAPABILITY_GSR_BINARY])
+            
+            await self.session_manager.start_session("Binary Session", "test-device")
+            
+            samples = [
+                GSRSample(t_mono_ns=i, t_utc_ns=1_700_000_000_000_000_000 + i, seq=i,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                for i in range(3)
+            ]
+            await self.server.handle_message(mock_websocket, GSRSampleBatch.from_samples(samples).encode())
+            await self.server.ingest_queues["test-device"].join()
+            
+            session = self.session_manager.get_active_session("test-device")
+            self.assertEqual([s.seq for s in session.gsr_samples], [0, 1, 2])
+            
+            await self.session_manager.stop_session("test-device")
+            await self.server.stop()
+        
+        asyncio.run(run_test())
+    
+    def test_binary_gsr_batch_requires_negotiation(self):
+        """Test binary GSR batches are rejected for legacy clients"""
+        async def run_test():
+            mock_websocket = AsyncMock()
+            
+            hello = MessageEnvelope.create(
+                msg_id="hello-1",
+                msg_type=MessageType.HELLO,
+                device_id="legacy-device",
+                payload=HelloPayload(deviceName="Legacy Device", capabilities=["GSR"],
+                                     batteryLevel=85, version="1.0.0")
+            )
+            await self.server.handle_message(mock_websocket, hello.model_dump_json())
+            
+            sample = GSRSample(t_mono_ns=1, t_utc_ns=1, seq=1, gsr_raw_uS=2.5,
+                               gsr_filt_uS=2.4, temp_C=32.0)
+            await self.server.handle_message(mock_websocket, GSRSampleBatch.from_samples([sample]).encode())
+            
+            error = json.loads(mock_websocket.send.call_args[0][0])
+            self.assertEqual(error["type"], "ERROR")
+            self.assertEqual(error["payload"]["code"], "CAPABILITY_NOT_NEGOTIATED")
+            
+            await self.server.stop()
+        
+        asyncio.run(run_test())
+
+    
+    async def _register_device(self, websocket, device_id, capabilities):
+        """Send a HELLO for a mock connection"""
+        hello = MessageEnvelope.create(
+            msg_id="hello-1",
+            msg_type=MessageType.HELLO,
+            device_id=device_id,
+            payload=HelloPayload(deviceName="Test Device", capabilities=capabilities,
+                                 batteryLevel=85, version="1.0.0")
+        )
+        await self.server.handle_message(websocket, hello.model_dump_json())
+    
+    async def _begin_upload(self, websocket, device_id, data, upload_id, chunk_size):
+        """Send an UPLOAD_BEGIN for a mock connection"""
+        begin = MessageEnvelope.create(
+            msg_id="begin-1",
+            msg_type=MessageType.UPLOAD_BEGIN,
+            device_id=device_id,
+            payload=UploadBeginPayload(filename="thermal.bin", fileSize=len(data),
+                                       md5Hash=hashlib.md5(data).hexdigest(),
+                                       chunkSize=chunk_size, uploadId=upload_id)
+        )
+        await self.server.handle_message(websocket, begin.model_dump_json())
+    
+    def test_binary_upload_chunks(self):
+        """Test uploads sent as binary chunk frames"""
+        async def run_test():
+            mock_websocket = AsyncMock()
+            data = bytes(range(256)) * 100
+            chunk_size = 4096
+            
+            await self._register_device(mock_websocket, "test-device", [CAPABILITY_UPLOAD_BINARY])
+            await self._begin_upload(mock_websocket, "test-device", data, 42, chunk_size)
+            
+            chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+            for index, chunk in enumerate(chunks):
+                frame = UploadChunkFrame(upload_id=42, chunk_index=index, data=chunk,
+                                         is_last=(index == len(chunks) - 1))
+                await self.server.handle_message(mock_websocket, frame.encode())
+            
+            response = json.loads(mock_websocket.send.call_args[0][0])
+            self.assertEqual(response["type"], "UPLOAD_END")
+            self.assertTrue(response["payload"]["success"])
+            
+            saved = Path(self.temp_dir) / "test-device_uploads" / "thermal.bin"
+            self.assertEqual(saved.read_bytes(), data)
+            self.assertEqual(self.server.active_uploads, {})
+            self.assertEqual(self.server.connected_devices["test-device"].binary_uploads, {})
+        
+        asyncio.run(run_test())
+    
+    def test_binary_upload_chunk_crc_mismatch(self):
+        """Test corrupted binary chunks are rejected"""
+        async def run_test():
+            mock_websocket = AsyncMock()
+            data = b"thermal" * 100
+            
+            await self._register_device(mock_websocket, "test-device", [CAPABILITY_UPLOAD_BINARY])
+            await self._begin_upload(mock_websocket, "test-device", data, 1, len(data))
+            
+            frame = UploadChunkFrame(upload_id=1, chunk_index=0, data=data, is_last=True,
+                                     crc32=0)
+            await self.server.handle_message(mock_websocket, frame.encode())
+            
+            error = json.loads(mock_websocket.send.call_args[0][0])
+            self.assertEqual(error["type"], "ERROR")
+            self.assertEqual(error["payload"]["code"], "CHUNK_CRC_MISMATCH")
+            self.assertIn("test-device:thermal.bin", self.server.active_uploads)
+        
+        asyncio.run(run_test())
+
+    
+    def test_out_of_order_json_upload(self):
+        """Test JSON uploads are reassembled even when the last chunk arrives first"""
+        async def run_test():
+            mock_websocket = AsyncMock()
+            data = bytes(range(256)) * 40
+            chunk_size = 1024
+            
+            await self._register_device(mock_websocket, "test-device", [])
+            await self._begin_upload(mock_websocket, "test-device", data, None, chunk_size)
+            
+            chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+            for index in reversed(range(len(chunks))):
+                chunk = MessageEnvelope.create(
+                    msg_id=f"chunk-{index}",
+                    msg_type=MessageType.UPLOAD_CHUNK,
+                    device_id="test-device",
+                    payload=UploadChunkPayload(filename="thermal.bin", chunkIndex=index,
+                                               data=base64.b64encode(chunks[index]).decode(),
+                                               isLast=(index == len(chunks) - 1))
+                )
+                await self.server.handle_message(mock_websocket, chunk.model_dump_json())
+            
+            response = json.loads(mock_websocket.send.call_args[0][0])
+            self.assertEqual(response["type"], "UPLOAD_END")
+            self.assertEqual(response["payload"]["totalChunks"], len(chunks))
+            
+            saved = Path(self.temp_dir) / "test-device_uploads" / "thermal.bin"
+            self.assertEqual(saved.read_bytes(), data)
+            self.assertFalse(saved.with_name("thermal.bin.part").exists())
+        
+        asyncio.run(run_test())
+    
+    def test_upload_resumes_after_connection_drop(self):
+        """Test only missing chunks are retransmitted after a dropped connection"""
+        async def run_test():
+            data = bytes(range(256)) * 400
+            chunk_size = 4096
+            chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+            bytes_sent = 0
+            
+            async def send_chunks(websocket, indices):
+                nonlocal bytes_sent
+                for index in indices:
+                    frame = UploadChunkFrame(upload_id=5, chunk_index=index, data=chunks[index],
+                                             is_last=(index == len(chunks) - 1))
+                    await self.server.handle_message(websocket, frame.encode())
+                    bytes_sent += len(chunks[index])
+            
+            # First connection drops after 60% of the chunks
+            first_connection = AsyncMock()
+            await self._register_device(first_connection, "test-device", [CAPABILITY_UPLOAD_BINARY])
+            await self._begin_upload(first_connection, "test-device", data, 5, chunk_size)
+            sent_before_drop = int(len(chunks) * 0.6)
+            await send_chunks(first_connection, range(sent_before_drop))
+            await self.server.cleanup_connection(first_connection)
+            self.assertEqual(self.server.active_uploads, {})
+            
+            # Reconnect and begin the same file again
+            second_connection = AsyncMock()
+            await self._register_device(second_connection, "test-device", [CAPABILITY_UPLOAD_BINARY])
+            await self._begin_upload(second_connection, "test-device", data, 5, chunk_size)
+            
+            sent = [json.loads(call[0][0]) for call in second_connection.send.call_args_list]
+            self.assertEqual(sent[-2]["payload"]["status"], "UPLOAD_RESUMED")
+            status = sent[-1]
+            self.assertEqual(status["type"], "UPLOAD_STATUS")
+            self.assertEqual(status["payload"]["receivedChunks"], sent_before_drop)
+            
+            missing = [i for start, end in status["payload"]["missingRanges"] for i in range(start, end)]
+            retransmit_start = bytes_sent
+            await send_chunks(second_connection, missing)
+            retransmitted = bytes_sent - retransmit_start
+            
+            response = json.loads(second_connection.send.call_args[0][0])
+            self.assertEqual(response["type"], "UPLOAD_END")
+            self.assertTrue(response["payload"]["success"])
+            self.assertEqual(retransmitted, len(data) - sent_before_drop * chunk_size)
+            self.assertEqual(bytes_sent, len(data))
+            
+            saved = Path(self.temp_dir) / "test-device_uploads" / "thermal.bin"
+            self.assertEqual(saved.read_bytes(), data)
+        
+        asyncio.run(run_test())
+
+    
+    def test_control_messages_bypass_ingest_queue(self):
+        """Test SYNC_MARK and STOP are answered while sample batches wait for storage"""
+        async def run_test():
+            mock_websocket = AsyncMock()
+            await self._register_device(mock_websocket, "test-device", [CAPABILITY_GSR_BINARY])
+            await self.session_manager.start_session("Queued Session", "test-device")
+            session = self.session_manager.get_active_session("test-device")
+            
+            # Simulate storage that stalls until released
+            release = asyncio.Event()
+            store_gsr_batch = self.session_manager.store_gsr_batch
+            
+            async def slow_store(device_id, batch):
+                await release.wait()
+                await store_gsr_batch(device_id, batch)
+            
+            self.session_manager.store_gsr_batch = slow_store
+            
+            # More batches than the queue holds: the rest spill to disk
+            self.server.ingest_queue_size = 2
+            for first in range(0, 40, 4):
+                samples = [
+                    GSRSample(t_mono_ns=i, t_utc_ns=1_700_000_000_000_000_000 + i, seq=i,
+                              gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                    for i in range(first, first + 4)
+                ]
+                await self.server.handle_message(mock_websocket,
+                                                 GSRSampleBatch.from_samples(samples).encode())
+            
+            for msg_type, payload in ((MessageType.SYNC_MARK, SyncMarkPayload(markId="STIM_1")),
+                                      (MessageType.STOP, EmptyPayload())):
+                message = MessageEnvelope.create(msg_id=f"{msg_type.value}-1", msg_type=msg_type,
+                                                 device_id="test-device", payload=payload)
+                # Older Android clients stamp envelopes with System.nanoTime()
+                message.ts = time.monotonic_ns()
+                await asyncio.wait_for(self.server.handle_message(mock_websocket,
+                                                                  message.model_dump_json()), 1.0)
+            
+            acks = [json.loads(call[0][0])["payload"]["status"]
+                    for call in mock_websocket.send.call_args_list[-2:]]
+            self.assertEqual(acks, ["SYNC_MARK_RECORDED", "SESSION_STOPPED"])
+            self.assertEqual(len(session.sync_marks), 1)
+            self.assertIsNotNone(session.sync_marks[0]["envelope_ts_ns"])
+            self.assertIsNone(session.sync_marks[0]["corrected_ns"])
+            self.assertEqual(session.gsr_samples, [])
+            self.assertGreater(self.server.get_ingest_stats()["test-device"]["depth"], 0)
+            self.assertGreater(self.server.get_ingest_stats()["test-device"]["spilled_batches"], 0)
+            
+            # The session closes only after the earlier batches are stored
+            release.set()
+            await self.server.pending_stops["test-device"]
+            self.assertEqual([s.seq for s in session.gsr_samples], list(range(40)))
+            self.assertIsNone(self.session_manager.get_active_session("test-device"))
+            
+            await self.server.stop()
+        
+        asyncio.run(run_test())
+
+    
+    def test_registered_handler_dispatch_and_latency(self):
+        """Test plugin handlers are dispatched and timed per message type"""
+        async def run_test():
+            from src.bucika_gsr_pc.performance_monitor import PerformanceMonitor
+            monitor = PerformanceMonitor()
+            server = WebSocketServer(port=8082, session_manager=self.session_manager,
+                                     time_sync_service=self.time_sync_service,
+                                     performance_monitor=monitor)
+            mock_websocket = AsyncMock()
+            
+            received = []
+            
+            async def handle_error_report(websocket, envelope, payload):
+                received.append(payload.code)
+            
+            # ERROR messages from clients have no built-in handler
+            error = MessageEnvelope.create(msg_id="err-1", msg_type=MessageType.ERROR,
+                                           device_id="test-device",
+                                           payload=ErrorPayload(code="SENSOR_LOST", message="lost"))
+            await server.handle_message(mock_websocket, error.model_dump_json())
+            response = json.loads(mock_websocket.send.call_args[0][0])
+            self.assertEqual(response["payload"]["code"], "UNKNOWN_MESSAGE_TYPE")
+            
+            server.register_handler(MessageType.ERROR, handle_error_report)
+            await server.handle_message(mock_websocket, error.model_dump_json())
+            self.assertEqual(received, ["SENSOR_LOST"])
+            
+            ping = MessageEnvelope.create(msg_id="ping-1", msg_type=MessageType.PING,
+                                          device_id="test-device", payload=EmptyPayload())
+            await server.handle_message(mock_websocket, ping.model_dump_json())
+            
+            latencies = monitor.get_handler_latencies()
+            self.assertEqual(latencies["ERROR"]["count"], 1)
+            self.assertEqual(latencies["PING"]["count"], 1)
+            self.assertIn("p99_ms", latencies["PING"])
+            
+            server.unregister_handler(MessageType.ERROR)
+            self.assertNotIn(MessageType.ERROR, server.message_handlers)
+            
+            # A plugin can define a message type of its own with its payload model
+            class HeartRatePayload(MessagePayload):
+                bpm: int
+            
+            async def handle_heart_rate(websocket, envelope, payload):
+                received.append((envelope.type, payload.bpm))
+            
+            with self.assertRaises(ValueError):
+                server.register_handler("HEART_RATE", handle_heart_rate)
+            server.register_handler("HEART_RATE", handle_heart_rate, payload_model=HeartRatePayload)
+            message = json.dumps({"id": "hr-1", "type": "HEART_RATE", "ts": 0,
+                                  "deviceId": "test-device", "payload": {"bpm": 72}})
+            await server.handle_message(mock_websocket, message)
+            self.assertEqual(received[-1], ("HEART_RATE", 72))
+            self.assertEqual(monitor.get_handler_latencies()["HEART_RATE"]["count"], 1)
+        
+        asyncio.run(run_test())
+
+    
+    def test_heartbeat_pings_and_evicts(self):
+        """Test one heartbeat wheel pings due devices and evicts silent ones"""
+        async def run_test():
+            self.server.ping_interval = 3
+            self.server.heartbeat_timeout = 6
+            
+            sockets = {}
+            for i in range(20):
+                sockets[f"device-{i}"] = AsyncMock()
+                await self._register_device(sockets[f"device-{i}"], f"device-{i}", [])
+            
+            # A reconnect replaces the old connection instead of adding a second timer
+            old_socket = sockets["device-0"]
+            sockets["device-0"] = AsyncMock()
+            await self._register_device(sockets["device-0"], "device-0", [])
+            self.assertNotIn(old_socket, self.server.socket_devices)
+            self.assertEqual(len(self.server.heartbeat_wheel), 20)
+            self.server._heartbeat_task.cancel()
+            
+            def pings(websocket):
+                return sum(json.loads(call[0][0])["type"] == "PING"
+                           for call in websocket.send.call_args_list)
+            
+            # Pretend every device went quiet 4 s ago, except device-1
+            for device_id, device in self.server.connected_devices.items():
+                device.last_seen -= 4
+            ping = MessageEnvelope.create(msg_id="ping", msg_type=MessageType.PING,
+                                          device_id="device-1", payload=EmptyPayload())
+            
+            for _ in range(3):
+                await self.server.handle_message(sockets["device-1"], ping.model_dump_json())
+                await self.server.heartbeat_tick()
+            
+            self.assertEqual(pings(sockets["device-2"]), 1)
+            self.assertEqual(pings(sockets["device-1"]), 0)
+            
+            # Still silent after the timeout: evicted, without scanning other devices
+            for device_id, device in self.server.connected_devices.items():
+                if device_id != "device-1":
+                    device.last_seen -= 3
+            for _ in range(3):
+                await self.server.handle_message(sockets["device-1"], ping.model_dump_json())
+                await self.server.heartbeat_tick()
+            
+            self.assertEqual(list(self.server.connected_devices), ["device-1"])
+            self.assertEqual(list(self.server.socket_devices.values()), ["device-1"])
+            self.assertEqual(len(self.server.heartbeat_wheel), 1)
+            await asyncio.sleep(0)
+            sockets["device-2"].close.assert_awaited()
+        
+        asyncio.run(run_test())
+    
+    def test_heartbeat_tick_is_bounded(self):
+        """Test a tick handles at most max_heartbeats_per_tick devices"""
+        async def run_test():
+            self.server.ping_interval = 1
+            self.server.max_heartbeats_per_tick = 5
+            
+            for i in range(12):
+                await self._register_device(AsyncMock(), f"device-{i}", [])
+            self.server._heartbeat_task.cancel()
+            self.server.ping_interval = 10
+            for device in self.server.connected_devices.values():
+                device.last_seen -= 20
+            
+            sent = []
+            for _ in range(3):
+                await self.server.heartbeat_tick()
+                sent.append(sum(device.websocket.send.call_count - 1
+                                for device in self.server.connected_devices.values()))
+            
+            self.assertEqual(sent, [5, 10, 12])
+        
+        asyncio.run(run_test())
+    
+    def test_heartbeat_eviction_drains_in_background(self):
+        """Test evicting a silent device does not wait for its queue to be stored"""
+        async def run_test():
+            self.server.heartbeat_timeout = 6
+            await self._register_device(AsyncMock(), "device-0", [])
+            self.server._heartbeat_task.cancel()
+            
+            release = asyncio.Event()
+            stored = []
+            
+            async def slow_store(device_id, batch):
+                await release.wait()
+                stored.append(len(batch))
+            
+            self.server.store_gsr_batch = slow_store
+            samples = [
+                GSRSample(t_mono_ns=i, t_utc_ns=1_700_000_000_000_000_000 + i, seq=i,
+                          gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                for i in range(3)
+            ]
+            await self.server._get_ingest_queue("device-0").put(GSRSampleBatch.from_samples(samples))
+            self.server.connected_devices["device-0"].last_seen -= 10
+            self.server.heartbeat_wheel.schedule("device-0", 0)
+            
+            await asyncio.wait_for(self.server.heartbeat_tick(), timeout=1)
+            
+            self.assertEqual(self.server.connected_devices, {})
+            self.assertEqual(self.server.ingest_queues, {})
+            self.assertEqual(stored, [])
+            
+            release.set()
+            await asyncio.gather(*self.server._background_tasks)
+            self.assertEqual(stored, [3])
+        
+        asyncio.run(run_test())
+
+    
+    def test_broadcast_collects_acks(self):
+        """Test commands fan out concurrently and ACKs are matched by message id"""
+        async def run_test():
+            def simulated_device(device_id, delay):
+                websocket = AsyncMock()
+                
+                async def reply(message):
+                    envelope = json.loads(message)
+                    if envelope["type"] != "SYNC_MARK":
+                        return
+                    await asyncio.sleep(delay)
+                    ack = MessageEnvelope.create(msg_id="ack", msg_type=MessageType.ACK,
+                                                 device_id=device_id,
+                                                 payload=AckPayload(messageId=envelope["id"],
+                                                                    status="SYNC_MARK_RECORDED"))
+                    await self.server.handle_message(websocket, ack.model_dump_json())
+                
+                websocket.send.side_effect = lambda message: asyncio.ensure_future(reply(message))
+                return websocket
+            
+            for device_id, delay in (("fast", 0.01), ("slow", 0.05), ("silent", 10)):
+                await self._register_device(simulated_device(device_id, delay), device_id, [])
+            
+            # A connected device answering for "silent" must not complete its ACK
+            impostor = simulated_device("impostor", 0)
+            await self._register_device(impostor, "impostor", [])
+            
+            async def answer_for_silent():
+                await asyncio.sleep(0.02)
+                for (device_id, msg_id) in list(self.server.pending_acks):
+                    if device_id == "silent":
+                        ack = MessageEnvelope.create(msg_id="ack", msg_type=MessageType.ACK,
+                                                     device_id="silent",
+                                                     payload=AckPayload(messageId=msg_id,
+                                                                        status="SYNC_MARK_RECORDED"))
+                        await self.server.handle_message(impostor, ack.model_dump_json())
+            
+            spoof = asyncio.ensure_future(answer_for_silent())
+            
+            result = await self.server.broadcast_sync_mark("STIM_1", device_ids=["fast", "slow", "silent", "gone"],
+                                                           timeout=0.2)
+            
+            self.assertEqual(set(result.round_trip_ms), {"fast", "slow"})
+            self.assertLess(result.round_trip_ms["fast"], result.round_trip_ms["slow"])
+            self.assertLess(result.max_round_trip_ms, 200)
+            self.assertEqual(result.statuses["slow"], "SYNC_MARK_RECORDED")
+            await spoof
+            self.assertEqual(result.timed_out, ["silent"])
+            self.assertEqual(result.unreachable, ["gone"])
+            self.assertFalse(result.all_acknowledged)
+            self.assertEqual(self.server.pending_acks, {})
+        
+        asyncio.run(run_test())
+
+    
+    def test_synchronized_start(self):
+        """Test a scheduled START arms devices for one instant on their own clocks"""
+        async def run_test():
+            from src.bucika_gsr_pc.session_manager import SessionState
+            received = {}
+            
+            def simulated_device(device_id, host, answers):
+                websocket = AsyncMock()
+                websocket.remote_address = (host, 50000)
+                
+                async def reply(message):
+                    envelope = json.loads(message)
+                    if envelope["type"] != "START" or not answers:
+                        return
+                    received[device_id] = envelope["payload"]
+                    ack = MessageEnvelope.create(msg_id="ack", msg_type=MessageType.ACK,
+                                                 device_id=device_id,
+                                                 payload=AckPayload(messageId=envelope["id"], status="ARMED"))
+                    await self.server.handle_message(websocket, ack.model_dump_json())
+                
+                websocket.send.side_effect = lambda message: asyncio.ensure_future(reply(message))
+                return websocket
+            
+            # phone-a's clock is 40 ms ahead of the PC, phone-b was never seen by time sync
+            now_ns = self.time_sync_service.get_current_time_ns()
+            self.time_sync_service.record_client_time("10.0.0.2", now_ns + 41_000_000, now_ns)
+            self.time_sync_service.record_client_time("10.0.0.2", now_ns + 40_000_000, now_ns + 1_000_000)
+            self.assertEqual(self.time_sync_service.get_client_offset_ns("10.0.0.2"), 41_000_000)
+            
+            for device_id, host, answers in (("phone-a", "10.0.0.2", True), ("phone-b", "10.0.0.3", True),
+                                             ("phone-c", "10.0.0.4", False)):
+                await self._register_device(simulated_device(device_id, host, answers), device_id, [])
+            
+            start = await self.server.start_synchronized("Study", lead_time=0.2, timeout=0.1)
+            
+            self.assertEqual(sorted(start.session_ids), ["phone-a", "phone-b"])
+            self.assertEqual(start.broadcast.timed_out, ["phone-c"])
+            self.assertEqual(received["phone-a"]["startAtNs"], start.start_at_ns)
+            self.assertEqual(received["phone-a"]["deviceStartAtNs"], start.start_at_ns + 41_000_000)
+            self.assertIsNone(received["phone-b"]["deviceStartAtNs"])
+            
+            session_a = self.session_manager.get_active_session("phone-a")
+            self.assertEqual(session_a.state, SessionState.ARMED)
+            self.assertIsNone(self.session_manager.get_active_session("phone-c"))
+            
+            await asyncio.sleep(0.2)
+            self.assertEqual(session_a.state, SessionState.RECORDING)
+            
+            # phone-a's first sample lands 2 ms after the instant, on its own clock;
+            # one sent 5 ms before it is not part of the recording
+            early, first = (GSRSample(t_mono_ns=seq, t_utc_ns=start.start_at_ns + 41_000_000 + offset_ns,
+                                      seq=seq, gsr_raw_uS=2.5, gsr_filt_uS=2.4, temp_C=32.0)
+                            for seq, offset_ns in ((0, -5_000_000), (1, 2_000_000)))
+            await self.session_manager.store_gsr_samples("phone-a", [early, first])
+            self.assertEqual(session_a.start_skew_ns, 2_000_000)
+            self.assertEqual(session_a.pre_start_samples, 1)
+            self.assertEqual([sample.seq for sample in session_a.gsr_samples], [1])
+        
+        asyncio.run(run_test())
+    
+    def test_synchronized_start_deadline_is_start_instant(self):
+        """Test slow arming does not push the ACK deadline past the start instant"""
+        async def run_test():
+            for i in range(3):
+                await self._register_device(AsyncMock(), f"device-{i}", [])
+            
+            arm_session = self.session_manager.arm_session
+            
+            async def slow_arm(*args, **kwargs):
+                await asyncio.sleep(0.1)
+                return await arm_session(*args, **kwargs)
+            
+            self.session_manager.arm_session = slow_arm
+            
+            # None of the devices answer, so the call lasts until the deadline
+            start = await self.server.start_synchronized("Study", lead_time=0.3)
+            returned_ns = self.time_sync_service.get_current_time_ns()
+            
+            self.assertEqual(sorted(start.broadcast.timed_out), ["device-0", "device-1", "device-2"])
+            self.assertLess(returned_ns - start.start_at_ns, 50_000_000)
+            for i in range(3):
+                self.assertIsNone(self.session_manager.get_active_session(f"device-{i}"))
+        
+        asyncio.run(run_test())
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file